@@ -0,0 +1,136 @@
+"""Compare the number of PCD updates per second of the eager and compiled training steps.
+
+Usage:
+    python benchmarks/bench_pcd_step.py --device cuda --num_updates 200
+"""
+
+import argparse
+import time
+from types import SimpleNamespace
+
+import torch
+from torch.optim import SGD
+
+from rbms.bernoulli_bernoulli.classes import BBRBM
+from rbms.potts_bernoulli.classes import PBRBM
+from rbms.potts_bernoulli.utils import ensure_zero_sum_gauge
+from rbms.training.compiled import compile_pcd_step
+from rbms.training.pcd import fit_batch_pcd
+
+# (name, model, num_visibles, num_states, num_hiddens)
+SIZES = [
+    ("MNIST", "BBRBM", 784, 2, 500),
+    ("protein", "PBRBM", 112, 21, 500),
+]
+
+
+def make_setup(model, num_visibles, num_states, num_hiddens, args):
+    dtype = torch.float32
+    if model == "BBRBM":
+        data = torch.bernoulli(
+            torch.full((args.batch_size, num_visibles), 0.5, device=args.device)
+        ).to(dtype)
+        params = BBRBM.init_parameters(
+            num_hiddens=num_hiddens,
+            dataset=SimpleNamespace(data=data),
+            device=args.device,
+            dtype=dtype,
+        )
+    else:
+        data = torch.randint(
+            0, num_states, (args.batch_size, num_visibles), device=args.device
+        ).to(dtype)
+        params = PBRBM.init_parameters(
+            num_hiddens=num_hiddens,
+            dataset=SimpleNamespace(data=data),
+            device=args.device,
+            dtype=dtype,
+        )
+    for p in params.parameters():
+        p.grad = torch.zeros_like(p)
+    chains = params.init_chains(num_samples=args.num_chains)
+    batch = (data, torch.ones(args.batch_size, device=args.device, dtype=dtype))
+    return params, chains, batch
+
+
+def synchronize(device):
+    if torch.device(device).type == "cuda":
+        torch.cuda.synchronize()
+
+
+@torch.no_grad()
+def run_eager(params, chains, batch, args):
+    optimizer = SGD(params.parameters(), lr=args.learning_rate, maximize=True)
+    for _ in range(args.num_updates):
+        optimizer.zero_grad(set_to_none=False)
+        chains, _ = fit_batch_pcd(
+            batch=batch,
+            parallel_chains=chains,
+            params=params,
+            gibbs_steps=args.gibbs_steps,
+            beta=1.0,
+        )
+        optimizer.step()
+        if isinstance(params, PBRBM):
+            ensure_zero_sum_gauge(params)
+    return chains
+
+
+@torch.no_grad()
+def run_compiled(pcd_step, chains, batch, args):
+    for _ in range(args.num_updates):
+        chains, _ = pcd_step(
+            batch=batch,
+            parallel_chains=chains,
+            gibbs_steps=args.gibbs_steps,
+            beta=1.0,
+            learning_rate=args.learning_rate,
+        )
+    return chains
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--device", type=str, default="cpu")
+    parser.add_argument("--batch_size", type=int, default=2000)
+    parser.add_argument("--num_chains", type=int, default=2000)
+    parser.add_argument("--gibbs_steps", type=int, default=10)
+    parser.add_argument("--learning_rate", type=float, default=0.01)
+    parser.add_argument("--num_updates", type=int, default=50)
+    args = parser.parse_args()
+
+    for name, model, num_visibles, num_states, num_hiddens in SIZES:
+        params, chains, batch = make_setup(
+            model, num_visibles, num_states, num_hiddens, args
+        )
+        # Warm-up, also triggers the compilation
+        pcd_step = compile_pcd_step(params)
+        t = time.time()
+        chains = run_compiled(
+            pcd_step,
+            chains,
+            batch,
+            argparse.Namespace(**{**vars(args), "num_updates": 2}),
+        )
+        synchronize(args.device)
+        compile_time = time.time() - t
+
+        results = {}
+        for mode in ["eager", "compiled"]:
+            t = time.time()
+            if mode == "eager":
+                chains = run_eager(params, chains, batch, args)
+            else:
+                chains = run_compiled(pcd_step, chains, batch, args)
+            synchronize(args.device)
+            results[mode] = args.num_updates / (time.time() - t)
+        print(
+            f"{name:<8} ({model}, L={num_visibles}, q={num_states}, H={num_hiddens}): "
+            f"eager {results['eager']:.2f} upd/s | compiled {results['compiled']:.2f} upd/s "
+            f"| speedup x{results['compiled'] / results['eager']:.2f} "
+            f"| compilation {compile_time:.1f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+import json
+from typing import Tuple
+
+import h5py
+import numpy as np
+import torch
+
+
+def get_archive_format(f: h5py.File) -> int:
+    """Version of the layout of an open training archive.
+
+    Args:
+        f (h5py.File): The training archive.
+
+    Returns:
+        int: The version stored in the 'format_version' attribute, 1 if it is missing.
+    """
+    return int(f.attrs.get("format_version", 1))
+
+
+def is_checkpoint_key(key: str) -> bool:
+    """Whether a key of a training archive is a checkpoint group ('update_<n>')."""
+    return key.startswith("update_")
+
+
+def get_update_index(
+    filename: str,
+) -> Tuple[np.ndarray, np.ndarray, dict[str, np.ndarray]]:
+    """
+    Extracts the index of the checkpoints of an RBM training archive. It is read from the
+    index datasets of the archives of version 2, and built from the checkpoints otherwise.
+
+    Args:
+        filename (str): Path to the HDF5 training archive.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, dict[str, np.ndarray]]: The sorted updates, the
+        elapsed times and, for each flag, whether it is set on the checkpoints.
+    """
+    with h5py.File(filename, "r") as f:
+        if "update_flags" in f.keys():
+            names = json.loads(f["update_flags"].attrs["names"])
+            flags_table = f["update_flags"][()]
+            flags = {name: flags_table[:, i] for i, name in enumerate(names)}
+            return f["updates"][()], f["update_times"][()], flags
+
+        updates, times, checkpoint_flags = [], [], []
+        for key in f.keys():
+            if is_checkpoint_key(key):
+                updates.append(int(key.replace("update_", "")))
+                times.append(float(f[key]["time"][()]))
+                checkpoint_flags.append(
+                    {fl for fl, v in f[key]["flags"].items() if v[()]}
+                    if "flags" in f[key].keys()
+                    else set()
+                )
+    order = np.argsort(updates)
+    checkpoint_flags = [checkpoint_flags[i] for i in order]
+    names = sorted(set().union(*checkpoint_flags))
+    flags = {
+        name: np.array([name in fl for fl in checkpoint_flags], dtype=bool)
+        for name in names
+    }
+    return (
+        np.array(updates, dtype=np.int64)[order],
+        np.array(times, dtype=np.float64)[order],
+        flags,
+    )
+
+
+def get_saved_updates(filename: str) -> np.ndarray:
+    """
+    Extracts the saved index from an RBM training archive
+
+    Args:
+        filename (str): The path to the HDF5 file from which to extract update indices.
+
+    Returns:
+        np.ndarray: Sorted array of update indices.
+    """
+    updates = []
+    with h5py.File(filename, "r") as f:
+        # The archives of version 2 keep a sorted index of the checkpoints
+        if get_archive_format(f) >= 2:
+            return f["updates"][()]
+        for key in f.keys():
+            if is_checkpoint_key(key):
+                update = int(key.replace("update_", ""))
+                updates.append(update)
+    return np.sort(np.array(updates))
+
+
+def restore_rng_state(filename: str, index: int):
+    """
+    Restores the random number generator (RNG) states for both PyTorch and NumPy from a RBM training archive.
+
+    Args:
+        filename (str): Path to the HDF5 file.
+        index (int): Training index to load.
+
+    Raises:
+        KeyError: If the specified index does not exist in the HDF5 file.
+        OSError: If the file cannot be opened or read.
+        ValueError: If the RNG state data is not in the expected format.
+    """
+    last_file_key = f"update_{index}"
+    with h5py.File(filename, "r") as f:
+        torch.set_rng_state(torch.tensor(np.array(f[last_file_key]["torch_rng_state"])))
+        if "numpy_rng_state" in f[last_file_key]:
+            # Single dataset of the archives of version 2
+            state = f[last_file_key]["numpy_rng_state"]
+            np.random.set_state(
+                (
+                    state.attrs["algorithm"],
+                    state[()],
+                    int(state.attrs["pos"]),
+                    int(state.attrs["has_gauss"]),
+                    float(state.attrs["cached_gaussian"]),
+                )
+            )
+            return
+        np_rng_state = tuple(
+            [
+                f[last_file_key]["numpy_rng_arg0"][()].decode("utf-8"),
+                f[last_file_key]["numpy_rng_arg1"][()],
+                f[last_file_key]["numpy_rng_arg2"][()],
+                f[last_file_key]["numpy_rng_arg3"][()],
+                f[last_file_key]["numpy_rng_arg4"][()],
+            ]
+        )
+        np.random.set_state(np_rng_state)
+
+
+def get_flagged_updates(filename: str, flag: str) -> np.ndarray:
+    """
+    Retrieve a sorted list of update indices from an HDF5 file that have a specific flag set.
+
+    Args:
+        filename (str): Path to the HDF5 file.
+        flag (str): Flag to check for in the updates.
+
+    Returns:
+        np.ndarray: Sorted array of update indices that have the specified flag set.
+    """
+    flagged_updates = []
+    with h5py.File(filename, "r") as f:
+        # The flags are indexed in the archives of version 2
+        if "update_flags" in f.keys():
+            names = json.loads(f["update_flags"].attrs["names"])
+            updates = f["updates"][()]
+            if flag not in names:
+                return updates[:0]
+            return updates[f["update_flags"][:, names.index(flag)]]
+        for key in f.keys():
+            if is_checkpoint_key(key):
+                update = int(key.replace("update_", ""))
+                if flag in f[key]["flags"]:
+                    if f[key]["flags"][flag][()]:
+                        flagged_updates.append(update)
+    flagged_updates = np.sort(np.array(flagged_updates))
+    return flagged_updates
@@ -9,8 +9,11 @@ from rbms.bernoulli_bernoulli.implement import (
     _compute_energy_hiddens,
     _compute_energy_visibles,
     _compute_gradient,
+    _compute_gradient_from_statistics,
+    _compute_gradient_statistics,
+    _compute_pseudo_log_likelihood,
     _init_chains,
-    _init_parameters,
+    _init_parameters_from_method,
     _sample_hiddens,
     _sample_visibles,
 )
@@ -118,6 +121,36 @@ class BBRBM(RBM):
             centered=centered,
         )
 
+    def compute_gradient_statistics(self, data, chains, log_weight_shift, centered=True):
+        return _compute_gradient_statistics(
+            v_data=data["visible"],
+            mh_data=data["hidden_mag"],
+            w_data=data["weights"],
+            v_chain=chains["visible"],
+            h_chain=chains["hidden_mag"],
+            w_chain=chains["weights"],
+            log_weight_shift=log_weight_shift,
+            centered=centered,
+        )
+
+    def compute_gradient_from_statistics(self, statistics, centered=True):
+        _compute_gradient_from_statistics(
+            statistics=statistics,
+            vbias=self.vbias,
+            hbias=self.hbias,
+            weight_matrix=self.weight_matrix,
+            centered=centered,
+        )
+
+    def compute_pseudo_log_likelihood(self, v, max_elements=2**24):
+        return _compute_pseudo_log_likelihood(
+            v=v,
+            vbias=self.vbias,
+            hbias=self.hbias,
+            weight_matrix=self.weight_matrix,
+            max_elements=max_elements,
+        )
+
     def independent_model(self):
         return BBRBM(
             weight_matrix=torch.zeros_like(self.weight_matrix),
@@ -145,14 +178,18 @@ class BBRBM(RBM):
         )
 
     @staticmethod
-    def init_parameters(num_hiddens, dataset, device, dtype, var_init=0.0001):
+    def init_parameters(
+        num_hiddens, dataset, device, dtype, var_init=0.0001, init="random"
+    ):
         data = dataset.data
         # Convert to torch Tensor if necessary
         if isinstance(data, np.ndarray):
             data = torch.from_numpy(dataset.data).to(device=device, dtype=dtype)
-        vbias, hbias, weight_matrix = _init_parameters(
+        vbias, hbias, weight_matrix = _init_parameters_from_method(
+            init=init,
             num_hiddens=num_hiddens,
             data=data,
+            weights=torch.as_tensor(dataset.weights),
             device=device,
             dtype=dtype,
             var_init=var_init,
@@ -10,8 +10,9 @@ from rbms.bernoulli_bernoulli.implement import (
     _compute_energy_hiddens,
     _compute_energy_visibles,
     _compute_gradient,
+    _compute_pseudo_log_likelihood,
     _init_chains,
-    _init_parameters,
+    _init_parameters_from_method,
     _sample_hiddens,
     _sample_visibles,
 )
@@ -141,6 +142,29 @@ def compute_gradient(
     )
 
 
+def compute_pseudo_log_likelihood(
+    v: Tensor, params: BBRBM, max_elements: int = 2**24
+) -> Tensor:
+    """Returns the pseudo log-likelihood of the visible configurations.
+
+    Args:
+        v (Tensor): Visible configurations.
+        params (BBRBM): Parameters of the RBM.
+        max_elements (int, optional): Maximum number of elements of the intermediate tensors.
+            Defaults to 2**24.
+
+    Returns:
+        Tensor: The pseudo log-likelihood of each configuration.
+    """
+    return _compute_pseudo_log_likelihood(
+        v=v,
+        vbias=params.vbias,
+        hbias=params.hbias,
+        weight_matrix=params.weight_matrix,
+        max_elements=max_elements,
+    )
+
+
 def init_chains(
     num_samples: int,
     params: BBRBM,
@@ -185,6 +209,7 @@ def init_parameters(
     device: torch.device,
     dtype: torch.dtype,
     var_init: float = 1e-4,
+    init: str = "random",
 ) -> BBRBM:
     """Initialize the parameters of the RBM.
 
@@ -194,20 +219,25 @@ def init_parameters(
         device (torch.device): PyTorch device for the parameters.
         dtype (torch.dtype): PyTorch dtype for the parameters.
         var_init (float, optional): Variance of the weight matrix. Defaults to 1e-4.
+        init (str, optional): Initialization, 'random' or 'mean_field'.
+            Defaults to "random".
 
     Notes:
         - The number of visible units is induced from the dataset provided.
-        - Hidden biases are set to 0.
-        - Visible biases are set to the frequencies of the dataset.
-        - The weight matrix is initialized with a Gaussian distribution of variance `var_init`.
+        - With 'random', hidden biases are set to 0, visible biases are set to the
+          frequencies of the dataset and the weight matrix is initialized with a Gaussian
+          distribution of variance `var_init`.
+        - With 'mean_field', see `EBM.init_parameters`.
     """
     data = dataset.data
     # Convert to torch Tensor if necessary
     if isinstance(data, np.ndarray):
         data = torch.from_numpy(dataset.data).to(device=device, dtype=dtype)
-    vbias, hbias, weight_matrix = _init_parameters(
+    vbias, hbias, weight_matrix = _init_parameters_from_method(
+        init=init,
         num_hiddens=num_hiddens,
         data=data,
+        weights=torch.as_tensor(dataset.weights),
         device=device,
         dtype=dtype,
         var_init=var_init,
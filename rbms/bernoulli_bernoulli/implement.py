@@ -1,8 +1,10 @@
-from typing import Optional, Tuple
+from typing import Dict, Optional, Tuple
 
 import torch
 from torch import Tensor
-from torch.nn.functional import softmax
+from torch.nn.functional import softmax, softplus
+
+from rbms.mean_field import get_covariance_matrix, get_mean_field_low_rank_weights
 
 
 @torch.jit.script
@@ -65,6 +67,34 @@ def _compute_energy_hiddens(
     return -field - log_term.sum(1)
 
 
+@torch.jit.script
+def _compute_pseudo_log_likelihood(
+    v: Tensor,
+    vbias: Tensor,
+    hbias: Tensor,
+    weight_matrix: Tensor,
+    max_elements: int = 16777216,
+) -> Tensor:
+    num_samples, num_visibles = v.shape
+    num_hiddens = weight_matrix.shape[1]
+    # The hidden field is computed once, each flip is a rank-1 update of it
+    field = hbias + (v @ weight_matrix)
+    softplus_field = softplus(field).sum(1)
+    block_size = max(1, max_elements // max(1, num_samples * num_hiddens))
+    pll = torch.zeros(num_samples, device=v.device, dtype=v.dtype)
+    for start in range(0, num_visibles, block_size):
+        end = min(start + block_size, num_visibles)
+        # +1 if the site flips from 0 to 1, -1 otherwise
+        flip = 1.0 - 2.0 * v[:, start:end]
+        flipped_field = field.unsqueeze(1) + flip.unsqueeze(2) * weight_matrix[start:end]
+        # Difference of free energy between the flipped and the original configuration
+        delta_free_energy = -flip * vbias[start:end] - (
+            softplus(flipped_field).sum(2) - softplus_field.unsqueeze(1)
+        )
+        pll -= softplus(-delta_free_energy).sum(1)
+    return pll
+
+
 @torch.jit.script
 def _compute_gradient(
     v_data: Tensor,
@@ -78,51 +108,106 @@ def _compute_gradient(
     weight_matrix: Tensor,
     centered: bool = True,
 ) -> None:
-    w_data = w_data.view(-1, 1)
-    w_chain = w_chain.view(-1, 1)
-    # Turn the weights of the chains into normalized weights
-    chain_weights = softmax(-w_chain, dim=0)
-    w_data_norm = w_data.sum()
+    grad_weight_matrix = weight_matrix.grad
+    grad_vbias = vbias.grad
+    grad_hbias = hbias.grad
+    # Normalized weights of the data and of the chains
+    w_data = w_data.view(-1)
+    w_data = w_data / w_data.sum()
+    chain_weights = softmax(-w_chain.view(-1), dim=0)
 
-    # Averages over data and generated samples
-    v_data_mean = (v_data * w_data).sum(0) / w_data_norm
+    # Averages over data and generated samples, without centered copies of the samples
+    v_data_mean = w_data @ v_data
+    h_data_mean = w_data @ mh_data
+    v_gen_mean = chain_weights @ v_chain
+    h_gen_mean = chain_weights @ h_chain
+
+    # Second moments, written in place into the gradient of the weight matrix
+    torch.mm(v_data.T, mh_data * w_data.unsqueeze(1), out=grad_weight_matrix)
+    grad_weight_matrix.addmm_(v_chain.T, h_chain * chain_weights.unsqueeze(1), alpha=-1.0)
+
+    if centered:
+        # The centered moments differ from the uncentered ones by rank-one terms, the
+        # visible layer being centered on the clamped data average
+        v_center = torch.clamp(v_data_mean, min=1e-7, max=(1.0 - 1e-7))
+        grad_weight_matrix.addr_(v_gen_mean - v_data_mean, h_data_mean)
+        grad_weight_matrix.addr_(v_center, h_gen_mean - h_data_mean)
     torch.clamp_(v_data_mean, min=1e-7, max=(1.0 - 1e-7))
-    h_data_mean = (mh_data * w_data).sum(0) / w_data_norm
-    v_gen_mean = (v_chain * chain_weights).sum(0)
     torch.clamp_(v_gen_mean, min=1e-7, max=(1.0 - 1e-7))
-    h_gen_mean = (h_chain * chain_weights).sum(0)
-
+    torch.sub(v_data_mean, v_gen_mean, out=grad_vbias)
+    torch.sub(h_data_mean, h_gen_mean, out=grad_hbias)
     if centered:
-        # Centered variables
-        v_data_centered = v_data - v_data_mean
-        h_data_centered = mh_data - h_data_mean
-        v_gen_centered = v_chain - v_data_mean
-        h_gen_centered = h_chain - h_data_mean
+        grad_vbias.addmv_(grad_weight_matrix, h_data_mean, alpha=-1.0)
+        grad_hbias.addmv_(grad_weight_matrix.T, v_data_mean, alpha=-1.0)
 
-        # Gradient
+
+@torch.jit.script
+def _compute_gradient_statistics(
+    v_data: Tensor,
+    mh_data: Tensor,
+    w_data: Tensor,
+    v_chain: Tensor,
+    h_chain: Tensor,
+    w_chain: Tensor,
+    log_weight_shift: Tensor,
+    centered: bool = True,
+) -> Dict[str, Tensor]:
+    w_data = w_data.view(-1, 1)
+    # Unnormalized weights of the chains, the shift must be the same on all the shards
+    chain_weights = torch.exp(-w_chain.view(-1, 1) - log_weight_shift)
+    return {
+        "data_norm": w_data.sum(),
+        "data_v": (v_data * w_data).sum(0),
+        "data_h": (mh_data * w_data).sum(0),
+        "data_vh": (v_data * w_data).T @ mh_data,
+        "chain_norm": chain_weights.sum(),
+        "chain_v": (v_chain * chain_weights).sum(0),
+        "chain_h": (h_chain * chain_weights).sum(0),
+        "chain_vh": (v_chain * chain_weights).T @ h_chain,
+    }
+
+
+@torch.jit.script
+def _compute_gradient_from_statistics(
+    statistics: Dict[str, Tensor],
+    vbias: Tensor,
+    hbias: Tensor,
+    weight_matrix: Tensor,
+    centered: bool = True,
+) -> None:
+    # Averages over data and generated samples
+    v_data_mean = statistics["data_v"] / statistics["data_norm"]
+    h_data_mean = statistics["data_h"] / statistics["data_norm"]
+    v_gen_mean = statistics["chain_v"] / statistics["chain_norm"]
+    h_gen_mean = statistics["chain_h"] / statistics["chain_norm"]
+    vh_data_mean = statistics["data_vh"] / statistics["data_norm"]
+    vh_gen_mean = statistics["chain_vh"] / statistics["chain_norm"]
+
+    if centered:
+        # Expansion of the centered second moments around the clamped data averages
+        v_center = torch.clamp(v_data_mean, min=1e-7, max=(1.0 - 1e-7))
         grad_weight_matrix = (
-            (v_data_centered * w_data).T @ h_data_centered
-        ) / w_data_norm - ((v_gen_centered * chain_weights).T @ h_gen_centered)
+            vh_data_mean
+            - torch.outer(v_data_mean, h_data_mean)
+            - vh_gen_mean
+            + torch.outer(v_center, h_gen_mean)
+            + torch.outer(v_gen_mean, h_data_mean)
+            - torch.outer(v_center, h_data_mean)
+        )
+        torch.clamp_(v_data_mean, min=1e-7, max=(1.0 - 1e-7))
+        torch.clamp_(v_gen_mean, min=1e-7, max=(1.0 - 1e-7))
         grad_vbias = v_data_mean - v_gen_mean - (grad_weight_matrix @ h_data_mean)
         grad_hbias = h_data_mean - h_gen_mean - (v_data_mean @ grad_weight_matrix)
     else:
-        v_data_centered = v_data
-        h_data_centered = mh_data
-        v_gen_centered = v_chain
-        h_gen_centered = h_chain
-
-        # Gradient
-        grad_weight_matrix = ((v_data * w_data).T @ mh_data) / w_data_norm - (
-            (v_chain * chain_weights).T @ h_chain
-        )
+        grad_weight_matrix = vh_data_mean - vh_gen_mean
+        torch.clamp_(v_data_mean, min=1e-7, max=(1.0 - 1e-7))
+        torch.clamp_(v_gen_mean, min=1e-7, max=(1.0 - 1e-7))
         grad_vbias = v_data_mean - v_gen_mean
         grad_hbias = h_data_mean - h_gen_mean
 
-    # Attach to the parameters
-
-    weight_matrix.grad.set_(grad_weight_matrix)
-    vbias.grad.set_(grad_vbias)
-    hbias.grad.set_(grad_hbias)
+    weight_matrix.grad.copy_(grad_weight_matrix)
+    vbias.grad.copy_(grad_vbias)
+    hbias.grad.copy_(grad_hbias)
 
 
 @torch.jit.script
@@ -179,3 +264,69 @@ def _init_parameters(
     )
     hbias = torch.zeros(num_hiddens, device=device, dtype=dtype)
     return vbias, hbias, weight_matrix
+
+
+def _init_parameters_mean_field(
+    num_hiddens: int,
+    data: Tensor,
+    weights: Tensor,
+    device: torch.device,
+    dtype: torch.dtype,
+    var_init: float = 1e-4,
+) -> Tuple[Tensor, Tensor, Tensor]:
+    eps = 1e-4
+    cov_matrix = get_covariance_matrix(
+        data=data, weights=weights, center=True, device=device
+    ).to(torch.float64)
+    weights = weights.view(-1).to(device=device, dtype=torch.float64)
+    frequencies = (weights @ data.to(device=device, dtype=torch.float64)) / weights.sum()
+    frequencies = torch.clamp(frequencies, min=eps, max=(1.0 - eps))
+    weight_matrix, _ = get_mean_field_low_rank_weights(
+        cov_matrix=cov_matrix,
+        variances=frequencies * (1.0 - frequencies),
+        num_hiddens=num_hiddens,
+    )
+    weight_matrix += torch.randn_like(weight_matrix) * var_init
+    # The input of the hidden units vanishes on the mean of the data
+    hbias = -frequencies @ weight_matrix
+    vbias = (
+        torch.log(frequencies) - torch.log(1.0 - frequencies) - 0.5 * weight_matrix.sum(1)
+    )
+    return (
+        vbias.to(device=device, dtype=dtype),
+        hbias.to(device=device, dtype=dtype),
+        weight_matrix.to(device=device, dtype=dtype),
+    )
+
+
+def _init_parameters_from_method(
+    init: str,
+    num_hiddens: int,
+    data: Tensor,
+    weights: Tensor,
+    device: torch.device,
+    dtype: torch.dtype,
+    var_init: float = 1e-4,
+) -> Tuple[Tensor, Tensor, Tensor]:
+    match init:
+        case "random":
+            return _init_parameters(
+                num_hiddens=num_hiddens,
+                data=data,
+                device=device,
+                dtype=dtype,
+                var_init=var_init,
+            )
+        case "mean_field":
+            return _init_parameters_mean_field(
+                num_hiddens=num_hiddens,
+                data=data,
+                weights=weights,
+                device=device,
+                dtype=dtype,
+                var_init=var_init,
+            )
+        case _:
+            raise ValueError(
+                f"'init' should be one of ['random', 'mean_field'], got {init}"
+            )
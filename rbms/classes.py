@@ -52,6 +52,24 @@ class EBM(ABC):
         """
         ...
 
+    @abstractmethod
+    def compute_pseudo_log_likelihood(
+        self, v: Tensor, max_elements: int = 2**24
+    ) -> Tensor:
+        """Returns the pseudo log-likelihood of the visible configurations, i.e. the sum over
+        the visible units of the log-probability of each unit conditioned on all the others.
+
+        Args:
+            v (Tensor): Visible configurations.
+            max_elements (int, optional): Maximum number of elements of the intermediate
+                tensors, the visible units are processed by blocks to stay below it.
+                Defaults to 2**24.
+
+        Returns:
+            Tensor: The pseudo log-likelihood of each configuration.
+        """
+        ...
+
     @abstractmethod
     def init_chains(
         self,
@@ -87,6 +105,60 @@ class EBM(ABC):
         """
         ...
 
+    @classmethod
+    def has_gradient_statistics(cls) -> bool:
+        """Whether the model implements `compute_gradient_statistics` and
+        `compute_gradient_from_statistics`, required to stream the gradient in chunks or
+        to train with several workers.
+
+        Returns:
+            bool: True if the statistics are implemented.
+        """
+        return (
+            cls.compute_gradient_statistics is not EBM.compute_gradient_statistics
+            and cls.compute_gradient_from_statistics
+            is not EBM.compute_gradient_from_statistics
+        )
+
+    def compute_gradient_statistics(
+        self,
+        data: dict[str, Tensor],
+        chains: dict[str, Tensor],
+        log_weight_shift: Tensor,
+        centered: bool = True,
+    ) -> dict[str, Tensor]:
+        """Compute the sums over the samples from which the gradient is obtained. The
+        statistics of several shards of the data and chains can be summed before calling
+        `compute_gradient_from_statistics`.
+
+        Args:
+            data (dict[str, Tensor]): The data state.
+            chains (dict[str, Tensor]): The parallel chains used for gradient computation.
+            log_weight_shift (Tensor): Shift applied to the log-weights of the chains to avoid
+                overflows, it must be the same for all the shards.
+            centered (bool, optional): Whether to use centered gradients. Defaults to True.
+
+        Returns:
+            dict[str, Tensor]: The statistics.
+        """
+        raise NotImplementedError(
+            f"Sufficient statistics are not implemented for {type(self).__name__}."
+        )
+
+    def compute_gradient_from_statistics(
+        self, statistics: dict[str, Tensor], centered: bool = True
+    ) -> None:
+        """Compute the gradient from the output of `compute_gradient_statistics` and attach
+        it to the parameters.
+
+        Args:
+            statistics (dict[str, Tensor]): The statistics summed over all the shards.
+            centered (bool, optional): Whether to use centered gradients. Defaults to True.
+        """
+        raise NotImplementedError(
+            f"Sufficient statistics are not implemented for {type(self).__name__}."
+        )
+
     @abstractmethod
     def parameters(self) -> List[Tensor]:
         """Returns a list containing the parameters of the RBM.
@@ -147,6 +219,7 @@ class EBM(ABC):
         device: torch.device,
         dtype: torch.dtype,
         var_init: float = 1e-4,
+        init: str = "random",
     ) -> Self:
         """Initialize the parameters of the RBM.
 
@@ -156,12 +229,20 @@ class EBM(ABC):
             device (torch.device): PyTorch device for the parameters.
             dtype (torch.dtype): PyTorch dtype for the parameters.
             var_init (float, optional): Variance of the weight matrix. Defaults to 1e-4.
+            init (str, optional): Initialization, 'random' or 'mean_field'.
+                Defaults to "random".
 
         Notes:
             - The number of visible units is induced from the dataset provided.
-            - Hidden biases are set to 0.
-            - Visible biases are set to the frequencies of the dataset.
-            - The weight matrix is initialized with a Gaussian distribution of variance `var_init`.
+            - With 'random':
+                - Hidden biases are set to 0.
+                - Visible biases are set to the frequencies of the dataset.
+                - The weight matrix is initialized with a Gaussian distribution of variance `var_init`.
+            - With 'mean_field', the weight matrix reproduces the leading principal modes of
+              the weighted covariance matrix of the dataset in the mean-field approximation
+              (see `rbms.mean_field.get_mean_field_low_rank_weights`), plus a Gaussian noise
+              of variance `var_init`. The biases are set such that the input of the hidden
+              units vanishes on the mean of the data.
         """
         ...
 
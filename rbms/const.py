@@ -1,4 +1,23 @@
 import torch
 
-LOG_FILE_HEADER = ["empty_col"]
+LOG_FILE_HEADER = [
+    "empty_col",
+    "update",
+    "pll_train",
+    "gibbs_steps",
+    "energy_autocorr",
+    "pll_test",
+    "mean_error",
+    "corr_error",
+    "aats_truth",
+    "aats_syn",
+    "num_edges",
+    "ess",
+]
 INT_DTYPE = torch.int32
+# Data types of the Gibbs steps of the mixed-precision training, see `--sampling_dtype`
+SAMPLING_DTYPES = {"bfloat16": torch.bfloat16, "half": torch.float16}
+# Minimum norm of the couplings of the edges kept by the pruning, see `--prune_threshold`
+PRUNE_THRESHOLD = 1e-3
+# Version of the layout of the training archives written by default, see `rbms.io`
+ARCHIVE_FORMAT = 2
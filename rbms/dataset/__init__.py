@@ -7,9 +7,16 @@ import torch
 from rbms.dataset.dataset_class import RBMDataset
 from rbms.dataset.load_fasta import load_FASTA
 from rbms.dataset.load_h5 import load_HDF5
+from rbms.dataset.on_disk import OnDiskArray
 from rbms.dataset.utils import get_subset_labels
 
 
+def _select(data: np.ndarray | OnDiskArray, index: np.ndarray):
+    if isinstance(data, OnDiskArray):
+        return data.subset(index)
+    return data[index]
+
+
 def load_dataset(
     dataset_name: str,
     subset_labels: Optional[List[int]] = None,
@@ -21,6 +28,7 @@ def load_dataset(
     seed: int = 19023741073419046239412739401234901,
     device: str = "cpu",
     dtype: torch.dtype = torch.float32,
+    in_memory: bool = True,
 ):
     rng = np.random.default_rng(seed)
     data = None
@@ -33,8 +41,20 @@ def load_dataset(
 
     match dataset_name.suffix:
         case ".h5":
-            data, labels = load_HDF5(filename=dataset_name, binarize=binarize)
+            data, labels = load_HDF5(
+                filename=dataset_name, binarize=binarize, in_memory=in_memory
+            )
+        case ".npy":
+            # Array of integer states, memory-mapped when kept on disk
+            data = np.load(dataset_name, mmap_mode=None if in_memory else "r")
+            if in_memory:
+                is_binary = bool(data.max() <= 1)
+            else:
+                data = OnDiskArray(data)
+                is_binary = bool(data.first_block().max() <= 1)
         case ".fasta":
+            if not in_memory:
+                raise ValueError("Only '.h5' and '.npy' datasets can be kept on disk.")
             data, weights, names = load_FASTA(
                 filename=dataset_name,
                 binarize=binarize,
@@ -50,12 +70,17 @@ def load_dataset(
             Dataset could not be loaded as the type is not recognized.
             It should be either:
                 - '.h5',
+                - '.npy',
                 - '.fasta'
             """
             )
     # Select subset of dataset w.r.t. labels
     if subset_labels is not None and labels is not None:
-        data, labels = get_subset_labels(data, labels, subset_labels)
+        if isinstance(data, OnDiskArray):
+            mask = np.isin(labels, subset_labels)
+            data, labels = data.subset(np.flatnonzero(mask)), labels[mask]
+        else:
+            data, labels = get_subset_labels(data, labels, subset_labels)
 
     if weights is None:
         weights = np.ones(data.shape[0])
@@ -73,12 +98,17 @@ def load_dataset(
         test_size = int(test_size * data.shape[0])
     else:
         test_size = data.shape[0] - train_size
+    train_index = permutation_index[:train_size]
+    test_index = permutation_index[train_size : train_size + test_size]
+    if isinstance(data, OnDiskArray):
+        # The samples on disk are kept in the order of the storage to be read by blocks
+        train_index, test_index = np.sort(train_index), np.sort(test_index)
 
     train_dataset = RBMDataset(
-        data=data[permutation_index[:train_size]],
-        labels=labels[permutation_index[:train_size]],
-        weights=weights[permutation_index[:train_size]],
-        names=names[permutation_index[:train_size]],
+        data=_select(data, train_index),
+        labels=labels[train_index],
+        weights=weights[train_index],
+        names=names[train_index],
         dataset_name=dataset_name,
         is_binary=is_binary,
         device=device,
@@ -87,10 +117,10 @@ def load_dataset(
     test_dataset = None
     if test_size > 0:
         test_dataset = RBMDataset(
-            data=data[permutation_index[train_size : train_size + test_size]],
-            labels=labels[permutation_index[train_size : train_size + test_size]],
-            weights=weights[permutation_index[train_size : train_size + test_size]],
-            names=names[permutation_index[train_size : train_size + test_size]],
+            data=_select(data, test_index),
+            labels=labels[test_index],
+            weights=weights[test_index],
+            names=names[test_index],
             dataset_name=dataset_name,
             is_binary=is_binary,
             device=device,
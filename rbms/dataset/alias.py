@@ -0,0 +1,76 @@
+from typing import Optional
+
+import numpy as np
+import torch
+from torch import Tensor
+
+
+class AliasTable:
+    """Walker's alias table, built with Vose's method, to draw indices proportionally to
+    a set of non-negative weights.
+
+    The table is built once in O(N) and each draw costs one uniform index and one uniform
+    number, independently of the number of weights.
+    """
+
+    def __init__(self, weights: Tensor) -> None:
+        """
+        Args:
+            weights (Tensor): Non-negative weights of the indices, they do not need to be
+                normalized.
+        """
+        weights = weights.detach().reshape(-1).cpu().to(torch.float64).numpy()
+        if weights.size == 0:
+            raise ValueError("'weights' should not be empty")
+        if np.any(weights < 0) or not np.all(np.isfinite(weights)):
+            raise ValueError("'weights' should be non-negative and finite")
+        total = weights.sum()
+        if total <= 0:
+            raise ValueError("'weights' should have a positive sum")
+        num_entries = weights.size
+        scaled = weights * (num_entries / total)
+        small = np.flatnonzero(scaled < 1.0).tolist()
+        large = np.flatnonzero(scaled >= 1.0).tolist()
+        # Python lists are much faster than numpy arrays for the scalar updates below
+        scaled = scaled.tolist()
+
+        prob = [1.0] * num_entries
+        alias = list(range(num_entries))
+        while small and large:
+            i = small.pop()
+            j = large.pop()
+            # Entry i is completed with the excess of entry j
+            prob[i] = scaled[i]
+            alias[i] = j
+            scaled[j] = (scaled[j] + scaled[i]) - 1.0
+            if scaled[j] < 1.0:
+                small.append(j)
+            else:
+                large.append(j)
+        # The remaining entries are equal to 1 up to rounding errors and keep prob = 1,
+        # except null weights left over by the rounding errors
+        for i in small:
+            if weights[i] == 0:
+                prob[i] = 0.0
+                alias[i] = int(np.argmax(weights))
+
+        self.num_entries = num_entries
+        self.prob = torch.tensor(prob, dtype=torch.float64)
+        self.alias = torch.tensor(alias, dtype=torch.int64)
+
+    def sample(
+        self, num_samples: int, generator: Optional[torch.Generator] = None
+    ) -> Tensor:
+        """Draw indices with replacement.
+
+        Args:
+            num_samples (int): Number of indices to draw.
+            generator (Optional[torch.Generator], optional): Random generator.
+                Defaults to the global torch generator.
+
+        Returns:
+            Tensor: The indices, of shape (num_samples,).
+        """
+        idx = torch.randint(self.num_entries, (num_samples,), generator=generator)
+        u = torch.rand(num_samples, generator=generator, dtype=torch.float64)
+        return torch.where(u < self.prob[idx], idx, self.alias[idx])
@@ -1,19 +1,21 @@
 import gzip
 import textwrap
-from typing import Dict, Union
+from typing import Dict, Optional, Union
 
 import numpy as np
 import torch
 from torch.utils.data import Dataset
 from tqdm import tqdm
 
+from rbms.dataset.on_disk import OnDiskArray
+
 
 class RBMDataset(Dataset):
     """A dataset class for RBM training and evaluation."""
 
     def __init__(
         self,
-        data: np.ndarray,
+        data: np.ndarray | OnDiskArray,
         labels: np.ndarray,
         weights: np.ndarray,
         names: np.ndarray,
@@ -28,7 +30,12 @@ class RBMDataset(Dataset):
         self.device = device
         self.dtype = dtype
         self.is_binary = is_binary
-        self.data = torch.from_numpy(data).to(device=self.device, dtype=self.dtype)
+        if isinstance(data, OnDiskArray):
+            # The samples stay on disk and are read on demand
+            data.device, data.dtype = torch.device(self.device), self.dtype
+            self.data = data
+        else:
+            self.data = torch.from_numpy(data).to(device=self.device, dtype=self.dtype)
         # Weights should have shape n_visibles
         self.weights = (
             torch.from_numpy(weights).view(-1).to(device=self.device, dtype=self.dtype)
@@ -91,6 +98,44 @@ class RBMDataset(Dataset):
         """
         return int(self.data.max() + 1)
 
+    def is_on_disk(self) -> bool:
+        """Whether the samples are kept on disk.
+
+        Returns:
+            bool: True if the samples are an `OnDiskArray`.
+        """
+        return isinstance(self.data, OnDiskArray)
+
+    def in_memory(self, max_samples: Optional[int] = None, seed: int = 0) -> "RBMDataset":
+        """Get the dataset with its samples in memory.
+
+        Args:
+            max_samples (Optional[int], optional): Maximal number of samples read when the
+                samples are on disk, drawn at random. Defaults to all of them.
+            seed (int, optional): Seed of the draw of the samples. Defaults to 0.
+
+        Returns:
+            RBMDataset: The dataset itself if its samples are already in memory, a new
+            dataset otherwise.
+        """
+        if not self.is_on_disk():
+            return self
+        idx = np.arange(len(self))
+        if max_samples is not None and max_samples < len(self):
+            idx = np.sort(
+                np.random.default_rng(seed).choice(len(self), max_samples, replace=False)
+            )
+        return RBMDataset(
+            data=self.data[idx].cpu().numpy(),
+            labels=self.labels[idx].cpu().numpy(),
+            weights=self.weights[idx].cpu().numpy(),
+            names=self.names[idx],
+            dataset_name=self.dataset_name,
+            is_binary=self.is_binary,
+            device=self.device,
+            dtype=self.dtype,
+        )
+
     def get_effective_size(self) -> int:
         """Get the effective size of the dataset.
 
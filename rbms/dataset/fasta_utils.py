@@ -10,6 +10,9 @@ TOKENS_PROTEIN = "-ACDEFGHIKLMNPQRSTVWY"
 TOKENS_RNA = "-ACGU"
 TOKENS_DNA = "-ACGT"
 
+# Number of bytes encoded at once when importing a fasta file
+CHUNK_BYTES = 2**24
+
 
 def get_tokens(alphabet: str):
     """Load the vocabulary associated to the alphabet type.
@@ -57,6 +60,61 @@ def decode_sequence(sequence: ArrayLike, tokens: str) -> str:
     return "".join([tokens[aa] for aa in sequence])
 
 
+def _parse_fasta(
+    fasta_name: Union[str, Path],
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Split a fasta file in headers and sequences on its bytes.
+
+    The header lines and the whitespaces are masked out of the whole file at once, so that
+    the bytes left are the concatenated sequences, whatever the number of lines per
+    record.
+
+    Args:
+        fasta_name (Union[str, Path]): Path to the fasta file.
+
+    Raises:
+        RuntimeError: The file is not in fasta format.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: headers, concatenated sequences as bytes
+        and length of each sequence.
+    """
+    raw = Path(fasta_name).read_bytes()
+    content = np.frombuffer(raw, dtype=np.uint8)
+    if content.shape[0] == 0 or content[0] != ord(">"):
+        raise RuntimeError(f"The file {fasta_name} is not in a fasta format.")
+    num_bytes = content.shape[0]
+    line_ends = np.flatnonzero(content == ord("\n"))
+    line_starts = np.concatenate([[0], line_ends[line_ends + 1 < num_bytes] + 1])
+    header_starts = line_starts[content[line_starts] == ord(">")]
+    header_ends = np.append(line_ends, num_bytes)[
+        np.searchsorted(line_ends, header_starts)
+    ]
+
+    # The file alternates between header lines and sequence lines
+    boundaries = np.stack([header_starts, header_ends], axis=1).reshape(-1)
+    in_header = np.repeat(
+        np.arange(boundaries.shape[0]) % 2 == 0,
+        np.diff(np.append(boundaries, num_bytes)),
+    )
+    # Drop the whitespaces and control characters of the sequence lines
+    is_space = content <= ord(" ")
+    sequences = content[~in_header & ~is_space]
+    spaces = np.flatnonzero(~in_header & is_space)
+    sequence_ends = np.append(header_starts[1:], num_bytes)
+    lengths = (sequence_ends - header_ends) - (
+        np.searchsorted(spaces, sequence_ends) - np.searchsorted(spaces, header_ends)
+    )
+
+    names = np.array(
+        [
+            raw[start + 1 : end].decode("utf-8").strip().replace(" ", "_")
+            for start, end in zip(header_starts.tolist(), header_ends.tolist())
+        ]
+    )
+    return names, sequences, lengths
+
+
 def import_from_fasta(fasta_name: Union[str, Path]) -> Tuple[np.ndarray, np.ndarray]:
     """Import data from a fasta file.
 
@@ -69,28 +127,80 @@ def import_from_fasta(fasta_name: Union[str, Path]) -> Tuple[np.ndarray, np.ndar
     Returns:
         Tuple[list, list]: headers, sequences.
     """
-    sequences = []
-    names = []
-    seq = ""
-    with open(fasta_name, "r", encoding="utf-8") as f:
-        first_line = f.readline()
-        if not first_line.startswith(">"):
-            raise RuntimeError(f"The file {fasta_name} is not in a fasta format.")
-        f.seek(0)
-        for line in f:
-            if not line.strip():
-                continue
-            if line.startswith(">"):
-                if seq:
-                    sequences.append(seq)
-                header = line[1:].strip().replace(" ", "_")
-                names.append(header)
-                seq = ""
-            else:
-                seq += line.strip()
-    if seq:
-        sequences.append(seq)
-    return np.array(names), np.array(sequences)
+    names, sequences, lengths = _parse_fasta(fasta_name)
+    # Records without sequence are skipped
+    names, lengths = names[lengths > 0], lengths[lengths > 0]
+    ends = np.cumsum(lengths)
+    sequences = [
+        sequences[end - length : end].tobytes().decode("utf-8")
+        for end, length in zip(ends, lengths)
+    ]
+    return names, np.array(sequences)
+
+
+def get_encoding_table(tokens: str) -> np.ndarray:
+    """Lookup table from the bytes of the characters to their numeric encoding.
+
+    Args:
+        tokens (str): Vocabulary.
+
+    Returns:
+        np.ndarray: Table of 256 entries, the bytes outside of the vocabulary being
+        mapped to 255.
+    """
+    table = np.full(256, 255, dtype=np.uint8)
+    table[np.frombuffer(tokens.encode("ascii"), dtype=np.uint8)] = np.arange(
+        len(tokens), dtype=np.uint8
+    )
+    return table
+
+
+def import_encoded_fasta(
+    fasta_name: Union[str, Path], tokens: str
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Import the aligned sequences of a fasta file with their numeric encoding. The
+    bytes of the sequences are encoded through a lookup table, without building the
+    sequences as strings.
+
+    Args:
+        fasta_name (Union[str, Path]): Path to the fasta file.
+        tokens (str): Vocabulary.
+
+    Raises:
+        RuntimeError: The file is not in fasta format.
+        ValueError: The sequences do not have the same length.
+        KeyError: The alphabet is incompatible with the sequences.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: headers and encoded sequences of shape
+        (num_sequences, sequence_length).
+    """
+    if len(tokens) > np.iinfo(np.int8).max:
+        raise ValueError(
+            f"The vocabulary should have at most {np.iinfo(np.int8).max} tokens, got {len(tokens)}."
+        )
+    names, sequences, lengths = _parse_fasta(fasta_name)
+    if np.any(lengths != lengths[0]):
+        raise ValueError(
+            f"The sequences of {fasta_name} should be aligned, got lengths between {lengths.min()} and {lengths.max()}."
+        )
+    # The bytes are encoded by chunks to bound the size of the index arrays
+    table = get_encoding_table(tokens)
+    encoded = np.empty_like(sequences)
+    present = np.zeros(256, dtype=bool)
+    for i in range(0, sequences.shape[0], CHUNK_BYTES):
+        chunk = sequences[i : i + CHUNK_BYTES]
+        encoded[i : i + CHUNK_BYTES] = table[chunk]
+        present[chunk] = True
+    # Same check as validate_alphabet, on the bytes present in the sequences
+    tokens_data = "".join(chr(c) for c in np.flatnonzero(present))
+    sorted_tokens = "".join(sorted(tokens))
+    if sorted_tokens != tokens_data:
+        raise KeyError(
+            f"The chosen alphabet is incompatible with the Multi-Sequence Alignment. The missing tokens are: {[c for c in tokens_data if c not in sorted_tokens]}"
+        )
+    encoded = encoded.view(np.int8)
+    return names, encoded.reshape(names.shape[0], lengths[0])
 
 
 def write_fasta(
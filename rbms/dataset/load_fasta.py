@@ -5,10 +5,8 @@ import numpy as np
 
 from rbms.dataset.fasta_utils import (
     compute_weights,
-    encode_sequence,
     get_tokens,
-    import_from_fasta,
-    validate_alphabet,
+    import_encoded_fasta,
 )
 from rbms.custom_fn import one_hot
 import torch
@@ -35,12 +33,7 @@ def load_FASTA(
     """
     # Select the proper encoding
     tokens = get_tokens(alphabet)
-    names, sequences = import_from_fasta(filename)
-    validate_alphabet(sequences=sequences, tokens=tokens)
-    names = np.array(names)
-    dataset = np.vectorize(
-        encode_sequence, excluded=["tokens"], signature="(), () -> (n)"
-    )(sequences, tokens)
+    names, dataset = import_encoded_fasta(filename, tokens)
 
     num_data = len(dataset)
     if use_weights:
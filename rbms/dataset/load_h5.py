@@ -4,35 +4,57 @@ from typing import Tuple
 import h5py
 import numpy as np
 
+from rbms.dataset.on_disk import OnDiskArray
+
 
 def load_HDF5(
-    filename: str | Path, binarize: bool = True
-) -> Tuple[np.ndarray, np.ndarray | None]:
+    filename: str | Path, binarize: bool = True, in_memory: bool = True
+) -> Tuple[np.ndarray | OnDiskArray, np.ndarray | None]:
     """Load a dataset from an HDF5 file.
 
     Args:
         filename (str): The name of the HDF5 file to load.
         binarize (str, optional): Binarize the dataset. Defaults to True.
+        in_memory (bool, optional): Read the whole dataset in memory. Otherwise the file is
+            kept open until `OnDiskArray.close` and the samples are read on demand, the
+            values being checked on the first block only. Defaults to True.
 
     Returns:
-        Tuple[np.ndarray, np.ndarray]: The dataset and labels.
+        Tuple[np.ndarray | OnDiskArray, np.ndarray]: The dataset and labels.
     """
+    f = h5py.File(filename, "r")
+    try:
+        dataset, labels = _read_HDF5(f, filename, binarize=binarize, in_memory=in_memory)
+    except BaseException:
+        f.close()
+        raise
+    if in_memory:
+        f.close()
+    return dataset, labels
+
+
+def _read_HDF5(
+    f: h5py.File, filename: str | Path, binarize: bool, in_memory: bool
+) -> Tuple[np.ndarray | OnDiskArray, np.ndarray | None]:
     labels = None
-    with h5py.File(filename, "r") as f:
-        if "samples" not in f.keys():
-            raise ValueError(
-                f"Could not find 'samples' key if hdf5 file keys: {f.keys()}"
-            )
+    if "samples" not in f.keys():
+        raise ValueError(f"Could not find 'samples' key if hdf5 file keys: {f.keys()}")
+    if in_memory:
         dataset = np.array(f["samples"][()])
-        if "labels" in f.keys():
-            labels = np.array(f["labels"][()])
-            if labels.shape[0] != dataset.shape[0]:
-                print(
-                    f"Ignoring labels since its dimension ({labels.shape[0]}) does not match the number of samples ({dataset.shape[0]})."
-                )
-                labels = None
+    else:
+        dataset = OnDiskArray(f["samples"])
+    if "labels" in f.keys():
+        labels = np.array(f["labels"][()])
+        if labels.shape[0] != dataset.shape[0]:
+            print(
+                f"Ignoring labels since its dimension ({labels.shape[0]}) does not match the number of samples ({dataset.shape[0]})."
+            )
+            labels = None
     if "cont" not in str(filename.resolve()):
-        unique_values = np.unique(dataset)
+        if in_memory:
+            unique_values = np.unique(dataset)
+        else:
+            unique_values = np.unique(dataset.first_block())
         is_ising = np.all(unique_values == np.array([-1, 1]))
         is_bernoulli = np.all(unique_values == np.array([0, 1]))
     else:
@@ -48,6 +70,8 @@ def load_HDF5(
             f"The dataset should have either [0, 1] or [-1, 1] values, got {unique_values}"
         )
     if binarize:
-        if is_ising:
+        if is_ising and in_memory:
             dataset = (dataset + 1) / 2
+        elif is_ising:
+            dataset.ising = True
     return dataset, labels
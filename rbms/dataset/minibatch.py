@@ -0,0 +1,359 @@
+import queue
+import threading
+from typing import Any, Iterator, Optional, Tuple
+
+import torch
+from torch import Tensor
+
+from rbms.dataset.alias import AliasTable
+from rbms.dataset.on_disk import OnDiskArray
+
+
+class MinibatchIterator:
+    """Infinite iterator over the minibatches of a dataset.
+
+    The dataset is shuffled once per epoch and the permutation is walked through in
+    contiguous slices of `batch_size` samples, so that each sample is seen once per epoch.
+    The last incomplete slice of an epoch is dropped to keep a constant batch size.
+
+    In weighted mode, the indices of an epoch are drawn with replacement proportionally to
+    the weights of the samples using an alias table, and the returned weights are all set
+    to 1, which gives an unbiased estimate of the weighted averages.
+
+    The next minibatch is prepared on a background thread, including the copy to `device`
+    when it differs from the device of the data.
+
+    `state_dict` gives the position of the last returned minibatch, the state of the
+    generator at the start of its epoch and the number of minibatches drawn in that
+    epoch, from which an iterator restarts with the same sequence of minibatches. It is
+    also a context manager stopping the background thread when leaving the block.
+    """
+
+    def __init__(
+        self,
+        data: Tensor,
+        weights: Tensor,
+        batch_size: int,
+        weighted: bool = False,
+        device: Optional[torch.device] = None,
+        seed: Optional[int] = None,
+        prefetch: bool = True,
+        state: Optional[dict[str, Any]] = None,
+    ) -> None:
+        """
+        Args:
+            data (Tensor): Dataset samples.
+            weights (Tensor): Weights associated to the samples.
+            batch_size (int): Number of samples per minibatch. Set to the size of the dataset
+                if it is larger.
+            weighted (bool, optional): Sample the minibatches proportionally to the weights.
+                Defaults to False.
+            device (Optional[torch.device], optional): Device on which the minibatches are
+                returned. Defaults to the device of the data.
+            seed (Optional[int], optional): Seed of the generator used to shuffle the
+                dataset. Defaults to a seed drawn from the global torch generator.
+            prefetch (bool, optional): Prepare the next minibatch on a background thread.
+                Defaults to True.
+            state (Optional[dict[str, Any]], optional): State returned by `state_dict`,
+                the iteration resumes after the corresponding minibatch and `seed` is
+                ignored. Defaults to None.
+        """
+        self.data = data
+        self.weights = weights.view(-1)
+        self.num_samples = data.shape[0]
+        self.batch_size = min(batch_size, self.num_samples)
+        self.weighted = weighted
+        self.device = data.device if device is None else torch.device(device)
+        self.generator = torch.Generator()
+        if state is None:
+            if seed is None:
+                seed = int(torch.randint(2**62, (1,)).item())
+            self.generator.manual_seed(seed)
+        # Epoch of the last minibatch returned, the producer may already be one batch ahead
+        self.epoch = 0
+        self._epoch = 0
+        self._epoch_generator_state = None
+        self._num_batches = 0
+        self._state = None
+        self._permutation = None
+        self._position = self.num_samples
+        self._pin_memory = self.device.type == "cuda" and data.device.type == "cpu"
+        self._alias_table = AliasTable(self.weights) if weighted else None
+        if state is not None:
+            # Replay the epoch of the last returned minibatch
+            self.generator.set_state(state["generator_state"])
+            self._new_epoch()
+            self._skip(int(state["num_batches"]))
+            self._epoch = self.epoch = int(state["epoch"])
+            self._state = state
+
+        self._queue = None
+        self._stop = threading.Event()
+        self._thread = None
+        if prefetch:
+            self._queue = queue.Queue(maxsize=1)
+            self._thread = threading.Thread(target=self._producer, daemon=True)
+            self._thread.start()
+
+    def _new_epoch(self) -> None:
+        self._epoch_generator_state = self.generator.get_state()
+        self._num_batches = 0
+        if self.weighted:
+            permutation = self._alias_table.sample(
+                self.num_samples, generator=self.generator
+            )
+        else:
+            permutation = torch.randperm(self.num_samples, generator=self.generator)
+        self._permutation = permutation.to(self.data.device)
+        self._position = 0
+        self._epoch += 1
+
+    def _skip(self, num_batches: int) -> None:
+        self._position += num_batches * self.batch_size
+        self._num_batches += num_batches
+
+    def _get_state(self) -> dict[str, Any]:
+        return {
+            "generator_state": self._epoch_generator_state,
+            "epoch": self._epoch,
+            "num_batches": self._num_batches,
+        }
+
+    def _next_batch(self) -> Tuple[Tuple[Tensor, Tensor], dict[str, Any]]:
+        if self._position + self.batch_size > self.num_samples:
+            self._new_epoch()
+        idx = self._permutation[self._position : self._position + self.batch_size]
+        self._skip(1)
+        v_batch = self.data[idx]
+        if self.weighted:
+            w_batch = torch.ones(
+                self.batch_size, device=self.data.device, dtype=self.weights.dtype
+            )
+        else:
+            w_batch = self.weights[idx]
+        if self.device != self.data.device:
+            if self._pin_memory:
+                v_batch, w_batch = v_batch.pin_memory(), w_batch.pin_memory()
+            v_batch = v_batch.to(self.device, non_blocking=True)
+            w_batch = w_batch.to(self.device, non_blocking=True)
+        return (v_batch, w_batch), self._get_state()
+
+    def _producer(self) -> None:
+        try:
+            while not self._stop.is_set():
+                item = self._next_batch()
+                while not self._stop.is_set():
+                    try:
+                        self._queue.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+        except Exception as e:
+            # Forward the error to the main thread
+            self._queue.put(e)
+
+    def __iter__(self) -> Iterator[Tuple[Tensor, Tensor]]:
+        return self
+
+    def __next__(self) -> Tuple[Tensor, Tensor]:
+        if self._queue is None:
+            item = self._next_batch()
+        else:
+            item = self._queue.get()
+            if isinstance(item, Exception):
+                raise item
+        batch, self._state = item
+        self.epoch = self._state["epoch"]
+        return batch
+
+    def state_dict(self) -> Optional[dict[str, Any]]:
+        """State of the iterator after the last returned minibatch.
+
+        Returns:
+            Optional[dict[str, Any]]: The state of the generator at the start of the epoch
+            ('generator_state'), the epoch ('epoch') and the number of minibatches returned
+            in this epoch ('num_batches'), None if no minibatch was returned.
+        """
+        return self._state
+
+    def close(self) -> None:
+        """Stop the background thread."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self) -> "MinibatchIterator":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class BlockShuffleIterator(MinibatchIterator):
+    """Infinite iterator over the minibatches of a dataset kept on disk.
+
+    The samples are read by contiguous blocks of the storage. At each epoch, the blocks
+    are shuffled and read `buffer_blocks` at a time, and the samples of the buffer are
+    shuffled before being split in minibatches. The samples left in the buffer are mixed
+    with the next blocks, and the last incomplete minibatch of an epoch is dropped. Each
+    sample is seen once per epoch, and only the buffer is held in memory.
+
+    The next minibatch is prepared on a background thread, including the reads.
+    """
+
+    def __init__(
+        self,
+        data: OnDiskArray,
+        weights: Tensor,
+        batch_size: int,
+        buffer_blocks: Optional[int] = None,
+        device: Optional[torch.device] = None,
+        seed: Optional[int] = None,
+        prefetch: bool = True,
+        state: Optional[dict[str, Any]] = None,
+    ) -> None:
+        """
+        Args:
+            data (OnDiskArray): Dataset samples.
+            weights (Tensor): Weights associated to the samples.
+            batch_size (int): Number of samples per minibatch. Set to the size of the dataset
+                if it is larger.
+            buffer_blocks (Optional[int], optional): Number of blocks read at once.
+                Defaults to enough blocks to hold 16 minibatches.
+            device (Optional[torch.device], optional): Device on which the minibatches are
+                returned. Defaults to the device of the data.
+            seed (Optional[int], optional): Seed of the generator used to shuffle the
+                dataset. Defaults to a seed drawn from the global torch generator.
+            prefetch (bool, optional): Prepare the next minibatch on a background thread.
+                Defaults to True.
+            state (Optional[dict[str, Any]], optional): State returned by `state_dict`,
+                the iteration resumes after the corresponding minibatch and `seed` is
+                ignored. Defaults to None.
+        """
+        self.block_size = data.block_size
+        self.num_blocks = -(-data.shape[0] // self.block_size)
+        if buffer_blocks is None:
+            buffer_blocks = -(-16 * min(batch_size, data.shape[0]) // self.block_size)
+        self.buffer_blocks = max(buffer_blocks, 1)
+        self._block_order = torch.arange(0)
+        self._block_position = self.num_blocks
+        self._buffer = None
+        self._buffer_positions = torch.arange(0)
+        super().__init__(
+            data=data,
+            weights=weights,
+            batch_size=batch_size,
+            device=device,
+            seed=seed,
+            prefetch=prefetch,
+            state=state,
+        )
+
+    def _new_epoch(self) -> None:
+        self._epoch_generator_state = self.generator.get_state()
+        self._num_batches = 0
+        self._block_order = torch.randperm(self.num_blocks, generator=self.generator)
+        self._block_position = 0
+        self._buffer = None
+        self._buffer_positions = torch.arange(0)
+        self._position = 0
+        self._epoch += 1
+
+    def _fill_buffer(self, read: bool = True) -> None:
+        # Blocks are read in the order of the storage
+        blocks = torch.sort(
+            self._block_order[
+                self._block_position : self._block_position + self.buffer_blocks
+            ]
+        ).values
+        self._block_position += self.buffer_blocks
+        positions = [
+            torch.arange(
+                b * self.block_size, min((b + 1) * self.block_size, self.num_samples)
+            )
+            for b in blocks.tolist()
+        ]
+        # Keep the samples left from the previous blocks
+        buffer_positions = torch.cat(
+            [self._buffer_positions[self._position :]] + positions
+        )
+        permutation = torch.randperm(buffer_positions.shape[0], generator=self.generator)
+        self._buffer_positions = buffer_positions[permutation]
+        if read:
+            # Each block is a contiguous read
+            samples = [torch.from_numpy(self.data.read(p.numpy())) for p in positions]
+            if self._buffer is not None:
+                samples = [self._buffer[self._position :]] + samples
+            self._buffer = torch.cat(samples)[permutation]
+        self._position = 0
+
+    def _advance(self, read: bool = True) -> int:
+        while self._position + self.batch_size > self._buffer_positions.shape[0]:
+            if self._block_position >= self.num_blocks:
+                self._new_epoch()
+            self._fill_buffer(read=read)
+        start = self._position
+        self._position += self.batch_size
+        self._num_batches += 1
+        return start
+
+    def _skip(self, num_batches: int) -> None:
+        # Replay the shuffling without reading the samples, then read the buffer
+        for _ in range(num_batches):
+            self._advance(read=False)
+        self._buffer = torch.from_numpy(self.data.read(self._buffer_positions.numpy()))
+
+    def _next_batch(self) -> Tuple[Tuple[Tensor, Tensor], dict[str, Any]]:
+        start = self._advance()
+        v_batch = self._buffer[start : start + self.batch_size]
+        positions = self._buffer_positions[start : start + self.batch_size]
+        w_batch = self.weights[positions.to(self.weights.device)].cpu()
+        if self.device.type == "cuda":
+            v_batch, w_batch = v_batch.pin_memory(), w_batch.pin_memory()
+        v_batch = self.data.to_tensor(v_batch.to(self.device, non_blocking=True))
+        w_batch = w_batch.to(self.device, non_blocking=True)
+        return (v_batch, w_batch), self._get_state()
+
+
+def get_minibatch_iterator(
+    data: Tensor | OnDiskArray,
+    weights: Tensor,
+    batch_size: int,
+    weighted: bool = False,
+    device: Optional[torch.device] = None,
+    state: Optional[dict[str, Any]] = None,
+) -> MinibatchIterator:
+    """Iterator over the minibatches of a dataset, read by blocks when the samples are
+    kept on disk.
+
+    Args:
+        data (Tensor | OnDiskArray): Dataset samples.
+        weights (Tensor): Weights associated to the samples.
+        batch_size (int): Number of samples per minibatch.
+        weighted (bool, optional): Sample the minibatches proportionally to the weights.
+            Defaults to False.
+        device (Optional[torch.device], optional): Device on which the minibatches are
+            returned. Defaults to the device of the data.
+        state (Optional[dict[str, Any]], optional): State of an iterator to resume.
+            Defaults to None.
+
+    Returns:
+        MinibatchIterator: The iterator.
+    """
+    if isinstance(data, OnDiskArray):
+        if weighted:
+            raise ValueError(
+                "Importance sampling of the minibatches is not supported for datasets kept on disk."
+            )
+        return BlockShuffleIterator(
+            data=data, weights=weights, batch_size=batch_size, device=device, state=state
+        )
+    return MinibatchIterator(
+        data=data,
+        weights=weights,
+        batch_size=batch_size,
+        weighted=weighted,
+        device=device,
+        state=state,
+    )
@@ -0,0 +1,201 @@
+from pathlib import Path
+from typing import Any, Optional
+
+import h5py
+import numpy as np
+import torch
+from torch import Tensor
+
+# Number of bytes of the blocks read at once when the storage is not chunked
+BLOCK_BYTES = 2**20
+
+
+class OnDiskArray:
+    """Read-only array of samples kept on disk, in an HDF5 dataset or in a memory-mapped
+    `.npy` file, and read on demand.
+
+    Indexing returns a tensor on `device` with type `dtype`, like the samples of an
+    in-memory dataset. The reads are sorted and grouped by contiguous ranges of rows, so
+    that the storage is accessed sequentially. A view on a subset of the rows is built
+    with `subset`.
+
+    The array is pickled as the path of its file, which is reopened when unpickled, so
+    that it can be sent to other processes. `close` closes the HDF5 file, shared with the
+    views of the array, and the array can be used as a context manager.
+    """
+
+    def __init__(
+        self,
+        source: h5py.Dataset | np.ndarray,
+        rows: Optional[np.ndarray] = None,
+        ising: bool = False,
+        device: torch.device | str = "cpu",
+        dtype: torch.dtype = torch.float32,
+    ) -> None:
+        """
+        Args:
+            source (h5py.Dataset | np.ndarray): Samples of shape (num_samples, num_visibles),
+                as an HDF5 dataset or a memory-mapped array.
+            rows (Optional[np.ndarray], optional): Sorted rows of `source` in the array.
+                Defaults to all of them.
+            ising (bool, optional): Map the values in {-1, 1} to {0, 1} when reading.
+                Defaults to False.
+            device (torch.device | str, optional): Device of the returned samples.
+                Defaults to "cpu".
+            dtype (torch.dtype, optional): Type of the returned samples.
+                Defaults to torch.float32.
+        """
+        if len(source.shape) != 2:
+            raise ValueError(
+                f"The samples should have 2 dimensions, got shape {source.shape}."
+            )
+        self.source = source
+        self.rows = rows
+        self.ising = ising
+        self.device = torch.device(device)
+        self.dtype = dtype
+        num_samples = source.shape[0] if rows is None else rows.shape[0]
+        self.shape = torch.Size((num_samples, source.shape[1]))
+
+    @property
+    def block_size(self) -> int:
+        """Number of rows of the blocks of the storage, the chunks of an HDF5 dataset or
+        about `BLOCK_BYTES` bytes otherwise."""
+        chunks = getattr(self.source, "chunks", None)
+        if chunks is not None:
+            return chunks[0]
+        row_bytes = self.source.shape[1] * self.source.dtype.itemsize
+        return max(BLOCK_BYTES // row_bytes, 1)
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def read(self, positions: np.ndarray) -> np.ndarray:
+        """Read the samples at the given positions without conversion.
+
+        Args:
+            positions (np.ndarray): Positions of the samples in the array.
+
+        Returns:
+            np.ndarray: The samples, in the type of the storage.
+        """
+        positions = np.asarray(positions, dtype=np.int64).reshape(-1)
+        if positions.shape[0] == 0:
+            return np.empty((0, self.shape[1]), dtype=self.source.dtype)
+        # HDF5 selections should be strictly increasing
+        unique_positions, inverse = np.unique(positions, return_inverse=True)
+        rows = unique_positions if self.rows is None else self.rows[unique_positions]
+        start, stop = rows[0], rows[-1] + 1
+        if stop - start <= 2 * rows.shape[0]:
+            # Dense selection, a single contiguous read is faster
+            samples = self.source[start:stop][rows - start]
+        else:
+            samples = self.source[rows]
+        return samples[inverse]
+
+    def first_block(self) -> np.ndarray:
+        """Samples of the first block, without conversion, used to check the values."""
+        return self.read(np.arange(min(self.block_size, self.shape[0])))
+
+    def to_tensor(self, samples: np.ndarray | Tensor) -> Tensor:
+        """Convert samples read from the storage to the type and device of the array."""
+        samples = torch.as_tensor(samples).to(device=self.device, dtype=self.dtype)
+        if self.ising:
+            samples = (samples + 1) / 2
+        return samples
+
+    def __getitem__(self, index) -> Tensor:
+        if isinstance(index, (int, np.integer)):
+            return self.to_tensor(self.read(np.array([index])))[0]
+        if isinstance(index, slice):
+            positions = np.arange(self.shape[0])[index]
+        elif isinstance(index, Tensor):
+            positions = index.cpu().numpy()
+        else:
+            positions = np.asarray(index)
+        if positions.dtype == bool:
+            positions = np.flatnonzero(positions)
+        return self.to_tensor(self.read(positions))
+
+    def close(self) -> None:
+        """Close the HDF5 file of the samples, shared with the views of the array. A
+        memory-mapped file is closed when the array is garbage collected."""
+        if isinstance(self.source, h5py.Dataset) and self.source.id.valid:
+            self.source.file.close()
+
+    def __enter__(self) -> "OnDiskArray":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __getstate__(self) -> dict[str, Any]:
+        state = self.__dict__.copy()
+        # The file is reopened instead of copying the samples
+        if isinstance(self.source, h5py.Dataset):
+            state["source"] = ("hdf5", self.source.file.filename, self.source.name)
+        elif isinstance(self.source, np.memmap):
+            state["source"] = ("npy", self.source.filename)
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        source = state["source"]
+        if isinstance(source, tuple) and source[0] == "hdf5":
+            state["source"] = h5py.File(source[1], "r")[source[2]]
+        elif isinstance(source, tuple) and source[0] == "npy":
+            state["source"] = np.load(source[1], mmap_mode="r")
+        self.__dict__.update(state)
+
+    def subset(self, positions: np.ndarray) -> "OnDiskArray":
+        """View on a subset of the samples, kept on disk. The samples are kept in the
+        order of the storage.
+
+        Args:
+            positions (np.ndarray): Positions of the samples in the array.
+
+        Returns:
+            OnDiskArray: The view.
+        """
+        positions = np.sort(np.asarray(positions, dtype=np.int64))
+        rows = positions if self.rows is None else self.rows[positions]
+        return OnDiskArray(
+            self.source,
+            rows=rows,
+            ising=self.ising,
+            device=self.device,
+            dtype=self.dtype,
+        )
+
+    def max(self) -> float:
+        """Largest value of the samples, computed block by block."""
+        block_size = self.block_size
+        return max(
+            self.to_tensor(self.read(np.arange(i, min(i + block_size, self.shape[0]))))
+            .max()
+            .item()
+            for i in range(0, self.shape[0], block_size)
+        )
+
+
+def convert_HDF5_to_npy(filename: str | Path, out_file: str | Path) -> None:
+    """Copy the samples of an HDF5 dataset block by block to a `.npy` file of type uint8,
+    which can be memory-mapped. Values in {-1, 1} are mapped to {0, 1}.
+
+    Args:
+        filename (str | Path): The HDF5 file, with the samples in 'samples'.
+        out_file (str | Path): The `.npy` file to create.
+    """
+    with h5py.File(filename, "r") as f:
+        samples = f["samples"]
+        block_size = OnDiskArray(samples).block_size
+        ising = samples[:block_size].min() < 0
+        out = np.lib.format.open_memmap(
+            out_file, mode="w+", dtype=np.uint8, shape=samples.shape
+        )
+        for i in range(0, samples.shape[0], block_size):
+            block = samples[i : i + block_size]
+            if ising:
+                block = (block + 1) // 2
+            out[i : i + block.shape[0]] = block
+        out.flush()
+        del out
@@ -38,6 +38,12 @@ def add_args_dataset(parser: argparse.ArgumentParser) -> argparse.ArgumentParser
         action="store_true",
         help="Compute the weights associated to each sequence.",
     )
+    dataset_args.add_argument(
+        "--importance_sampling",
+        default=False,
+        action="store_true",
+        help="(Defaults to False). Draw the minibatches proportionally to the weights of the sequences instead of weighting the gradient.",
+    )
     dataset_args.add_argument(
         "--alphabet",
         type=str,
@@ -51,4 +57,16 @@ def add_args_dataset(parser: argparse.ArgumentParser) -> argparse.ArgumentParser
         action="store_true",
         help="(Defaults to False). Binarize the dataset.",
     )
+    dataset_args.add_argument(
+        "--on_disk",
+        default=False,
+        action="store_true",
+        help="(Defaults to False). Keep the samples of a '.h5' or '.npy' dataset on disk and read the minibatches by blocks, for datasets larger than the memory.",
+    )
+    dataset_args.add_argument(
+        "--num_samples_init",
+        type=int,
+        default=100_000,
+        help="(Defaults to 100 000). Number of samples read to initialize the parameters when the dataset is kept on disk.",
+    )
     return parser
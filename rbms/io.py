@@ -1,13 +1,287 @@
-from typing import List, Tuple
+import atexit
+import json
+import queue
+import threading
+from typing import Any, List, Optional, Tuple
 
 import h5py
 import numpy as np
 import torch
 from torch import Tensor
+from torch.optim import Optimizer
 
+from rbms.archive import get_archive_format, is_checkpoint_key, restore_rng_state
 from rbms.classes import EBM
 from rbms.map_model import map_model
-from rbms.utils import restore_rng_state
+from rbms.const import ARCHIVE_FORMAT
+
+
+def _snapshot_checkpoint(
+    params: EBM,
+    chains: dict[str, Tensor],
+    copy: bool = False,
+    optimizer: Optional[Optimizer] = None,
+    minibatch_state: Optional[dict[str, Any] | List[dict[str, Any]]] = None,
+    hyperparameters: Optional[dict[str, Any]] = None,
+) -> dict[str, Any]:
+    """Capture everything written by a checkpoint. The random states are read at call
+    time, so that they match the state of the training when the checkpoint is requested.
+
+    Args:
+        params (EBM): The parameters of the model.
+        chains (dict[str, Tensor]): The parallel chains used for sampling.
+        copy (bool, optional): Clone the tensors on their device, so that they can be
+            converted to numpy later while the training goes on. Defaults to False.
+        optimizer (Optional[Optimizer], optional): Optimizer whose state is saved along
+            with the parameters. Defaults to None.
+        minibatch_state (Optional[dict[str, Any] | List[dict[str, Any]]], optional): State
+            of the minibatch iterator, from `MinibatchIterator.state_dict`, or the states
+            of the iterators of the workers of a distributed training. Defaults to None.
+        hyperparameters (Optional[dict[str, Any]], optional): State of the training
+            written to the hyperparameters of the archive, scalars or groups of scalars.
+            Defaults to None.
+
+    Returns:
+        dict[str, Any]: The snapshot.
+    """
+    named_params = params.named_parameters()
+    optimizer_state = None
+    if optimizer is not None:
+        optimizer_state = optimizer.state_dict()
+        # The state is indexed by the position of the parameters
+        names = list(named_params.keys())
+        optimizer_state = {
+            "param_groups": optimizer_state["param_groups"],
+            "state": {
+                names[i]: {
+                    k: v.detach().clone() if copy else v
+                    for k, v in state.items()
+                    if isinstance(v, Tensor)
+                }
+                for i, state in optimizer_state["state"].items()
+            },
+        }
+    visible = chains["visible"]
+    weights = chains.get("weights", None)
+    if copy:
+        named_params = {n: p.detach().clone() for n, p in named_params.items()}
+        visible = visible.clone()
+        if weights is not None:
+            weights = weights.clone()
+    return {
+        "name": params.name,
+        "params": named_params,
+        "visible": visible,
+        "weights": weights,
+        "torch_rng_state": torch.get_rng_state(),
+        "numpy_rng_state": np.random.get_state(),
+        "optimizer": optimizer_state,
+        "minibatch_state": minibatch_state,
+        "hyperparameters": hyperparameters,
+    }
+
+
+def _write_dataset(group: h5py.Group, name: str, data: Any, compress: bool) -> None:
+    """Create a dataset, chunked and compressed in the archives of version 2."""
+    data = np.asarray(data)
+    if compress and data.ndim > 0 and data.size > 0:
+        group.create_dataset(
+            name,
+            data=data,
+            chunks=True,
+            compression="gzip",
+            compression_opts=4,
+            shuffle=True,
+        )
+    else:
+        group[name] = data
+
+
+def _write_numpy_rng_state(group: h5py.Group, numpy_rng_state: tuple) -> None:
+    """Store the state of the numpy random generator in a single dataset."""
+    state = group.create_dataset("numpy_rng_state", data=numpy_rng_state[1])
+    state.attrs["algorithm"] = numpy_rng_state[0]
+    state.attrs["pos"] = numpy_rng_state[2]
+    state.attrs["has_gauss"] = numpy_rng_state[3]
+    state.attrs["cached_gaussian"] = numpy_rng_state[4]
+
+
+def _write_hyperparameters(group: h5py.Group, hyperparameters: dict[str, Any]) -> None:
+    """Overwrite hyperparameters, nested dictionaries being stored as groups."""
+    for k, v in hyperparameters.items():
+        if k in group:
+            del group[k]
+        if isinstance(v, dict):
+            _write_hyperparameters(group.create_group(k), v)
+        else:
+            group[k] = v
+
+
+def _write_minibatch_state(group: h5py.Group, state: dict[str, Any]) -> None:
+    """Store the state of a minibatch iterator."""
+    group["generator_state"] = state["generator_state"].numpy()
+    group["epoch"] = state["epoch"]
+    group["num_batches"] = state["num_batches"]
+
+
+def _write_update_index(
+    f: h5py.File, updates: np.ndarray, times: np.ndarray, flags: List[List[str]]
+) -> None:
+    """Add checkpoints to the index of an archive of version 2. The index is made of the
+    sorted updates ('updates'), the elapsed times ('update_times') and a boolean table of
+    the flags ('update_flags'), whose columns are listed in its 'names' attribute.
+
+    Args:
+        f (h5py.File): The archive.
+        updates (np.ndarray): The updates of the new checkpoints.
+        times (np.ndarray): The elapsed times of the new checkpoints.
+        flags (List[List[str]]): The flags of each new checkpoint.
+    """
+    if "updates" not in f.keys():
+        f.create_dataset(
+            "updates", shape=(0,), maxshape=(None,), dtype=np.int64, chunks=(1024,)
+        )
+    if "update_times" not in f.keys():
+        f.create_dataset(
+            "update_times", shape=(0,), maxshape=(None,), dtype=np.float64, chunks=(1024,)
+        )
+    if "update_flags" not in f.keys():
+        f.create_dataset(
+            "update_flags",
+            shape=(0, 0),
+            maxshape=(None, None),
+            dtype=bool,
+            chunks=(1024, 8),
+        )
+        f["update_flags"].attrs["names"] = json.dumps([])
+    names = json.loads(f["update_flags"].attrs["names"])
+    num_names = len(names)
+    for name in sorted({fl for checkpoint_flags in flags for fl in checkpoint_flags}):
+        if name not in names:
+            names.append(name)
+    new_flags = np.zeros((len(updates), len(names)), dtype=bool)
+    for i, checkpoint_flags in enumerate(flags):
+        for fl in checkpoint_flags:
+            new_flags[i, names.index(fl)] = True
+
+    # Checkpoints written in order with known flags are appended
+    num_checkpoints = f["updates"].shape[0]
+    sorted_updates = np.all(np.diff(updates) > 0)
+    if (
+        len(names) == num_names
+        and sorted_updates
+        and (num_checkpoints == 0 or f["updates"][-1] < updates[0])
+    ):
+        num_total = num_checkpoints + len(updates)
+        f["updates"].resize((num_total,))
+        f["updates"][num_checkpoints:] = updates
+        f["update_times"].resize((num_total,))
+        f["update_times"][num_checkpoints:] = times
+        f["update_flags"].resize((num_total, len(names)))
+        f["update_flags"][num_checkpoints:] = new_flags
+        return
+
+    old_flags = f["update_flags"][()]
+    all_updates = np.concatenate([f["updates"][()], updates]).astype(np.int64)
+    all_times = np.concatenate([f["update_times"][()], times]).astype(np.float64)
+    all_flags = np.zeros((len(all_updates), len(names)), dtype=bool)
+    all_flags[: old_flags.shape[0], : old_flags.shape[1]] = old_flags
+    all_flags[old_flags.shape[0] :] = new_flags
+    order = np.argsort(all_updates, kind="stable")
+
+    f["updates"].resize(all_updates.shape)
+    f["updates"][...] = all_updates[order]
+    f["update_times"].resize(all_times.shape)
+    f["update_times"][...] = all_times[order]
+    f["update_flags"].resize(all_flags.shape)
+    f["update_flags"][...] = all_flags[order]
+    f["update_flags"].attrs["names"] = json.dumps(names)
+
+
+def _write_checkpoint(
+    f: h5py.File,
+    snapshot: dict[str, Any],
+    num_updates: int,
+    time: float,
+    flags: List[str],
+) -> None:
+    # The archives of version 2 store each array once, in compressed datasets
+    compact = get_archive_format(f) >= 2
+    checkpoint = f.create_group(f"update_{num_updates}")
+
+    # Save the parameters of the model
+    params_ckpt = checkpoint.create_group("params")
+    for n, p in snapshot["params"].items():
+        _write_dataset(params_ckpt, n, p.detach().cpu().numpy(), compress=compact)
+        if not compact:
+            # This is for retrocompatibility purpose
+            checkpoint[n] = params_ckpt[n]
+    # Save current random state
+    numpy_rng_state = snapshot["numpy_rng_state"]
+    checkpoint["torch_rng_state"] = snapshot["torch_rng_state"]
+    if compact:
+        _write_numpy_rng_state(checkpoint, numpy_rng_state)
+    else:
+        checkpoint["numpy_rng_arg0"] = numpy_rng_state[0]
+        checkpoint["numpy_rng_arg1"] = numpy_rng_state[1]
+        checkpoint["numpy_rng_arg2"] = numpy_rng_state[2]
+        checkpoint["numpy_rng_arg3"] = numpy_rng_state[3]
+        checkpoint["numpy_rng_arg4"] = numpy_rng_state[4]
+    checkpoint["time"] = time
+
+    # Update the parallel chains to resume training
+    if "parallel_chains" in f.keys():
+        f["parallel_chains"][...] = snapshot["visible"].cpu().numpy()
+    else:
+        _write_dataset(
+            f, "parallel_chains", snapshot["visible"].cpu().numpy(), compress=compact
+        )
+    # The importance weights of the chains
+    if snapshot["weights"] is not None:
+        if "parallel_chains_weights" in f.keys():
+            f["parallel_chains_weights"][...] = snapshot["weights"].cpu().numpy()
+        else:
+            f["parallel_chains_weights"] = snapshot["weights"].cpu().numpy()
+
+    if "model_type" not in f.keys():
+        f["model_type"] = snapshot["name"]
+    if snapshot["optimizer"] is not None:
+        optimizer_ckpt = checkpoint.create_group("optimizer")
+        optimizer_ckpt.attrs["param_groups"] = json.dumps(
+            snapshot["optimizer"]["param_groups"]
+        )
+        for n, state in snapshot["optimizer"]["state"].items():
+            state_ckpt = optimizer_ckpt.create_group(n)
+            for k, v in state.items():
+                _write_dataset(state_ckpt, k, v.detach().cpu().numpy(), compress=compact)
+    if snapshot.get("minibatch_state") is not None:
+        # Position of the training in the sequence of minibatches
+        minibatch_ckpt = checkpoint.create_group("minibatches")
+        minibatch_state = snapshot["minibatch_state"]
+        if isinstance(minibatch_state, list):
+            # One iterator per worker of a distributed training
+            minibatch_ckpt.attrs["num_workers"] = len(minibatch_state)
+            for rank, state in enumerate(minibatch_state):
+                _write_minibatch_state(
+                    minibatch_ckpt.create_group(f"worker_{rank}"), state
+                )
+        else:
+            _write_minibatch_state(minibatch_ckpt, minibatch_state)
+    if snapshot.get("hyperparameters") is not None:
+        # Training state restored along with the hyperparameters
+        _write_hyperparameters(
+            f.require_group("hyperparameters"), snapshot["hyperparameters"]
+        )
+    flag = checkpoint.create_group("flags")
+    for fl in flags:
+        flag[fl] = True
+        if not compact:
+            # This is for retrocompatibility purpose
+            checkpoint[f"save_{fl}"] = True
+    if compact:
+        _write_update_index(
+            f, updates=np.array([num_updates]), times=np.array([time]), flags=[flags]
+        )
 
 
 def save_model(
@@ -17,6 +291,9 @@ def save_model(
     num_updates: int,
     time: float,
     flags: List[str] = [],
+    optimizer: Optional[Optimizer] = None,
+    minibatch_state: Optional[dict[str, Any] | List[dict[str, Any]]] = None,
+    hyperparameters: Optional[dict[str, Any]] = None,
 ) -> None:
     """Save the current state of the model.
 
@@ -27,41 +304,201 @@ def save_model(
         num_updates (int): The number of updates performed.
         time (float): Elapsed time.
         flags (List[str]): flags for the current update. Defaults to []
+        optimizer (Optional[Optimizer], optional): Optimizer whose state is saved to
+            resume the training. Defaults to None.
+        minibatch_state (Optional[dict[str, Any] | List[dict[str, Any]]], optional): State
+            of the minibatch iterator, or of the iterators of the workers, saved to resume
+            the training with the same minibatches. Defaults to None.
+        hyperparameters (Optional[dict[str, Any]], optional): State of the training,
+            such as the number of Gibbs steps of an adaptive schedule, overwriting the
+            hyperparameters of the archive. Defaults to None.
     """
-
-    named_params = params.named_parameters()
-    name = params.name
+    snapshot = _snapshot_checkpoint(
+        params=params,
+        chains=chains,
+        optimizer=optimizer,
+        minibatch_state=minibatch_state,
+        hyperparameters=hyperparameters,
+    )
     with h5py.File(filename, "a") as f:
-        checkpoint = f.create_group(f"update_{num_updates}")
+        _write_checkpoint(
+            f, snapshot=snapshot, num_updates=num_updates, time=time, flags=flags
+        )
 
-        # Save the parameters of the model
-        params_ckpt = checkpoint.create_group("params")
-        for n, p in named_params.items():
-            params_ckpt[n] = p.detach().cpu().numpy()
-            # This is for retrocompatibility purpose
-            checkpoint[n] = params_ckpt[n]
-        # Save current random state
-        checkpoint["torch_rng_state"] = torch.get_rng_state()
-        checkpoint["numpy_rng_arg0"] = np.random.get_state()[0]
-        checkpoint["numpy_rng_arg1"] = np.random.get_state()[1]
-        checkpoint["numpy_rng_arg2"] = np.random.get_state()[2]
-        checkpoint["numpy_rng_arg3"] = np.random.get_state()[3]
-        checkpoint["numpy_rng_arg4"] = np.random.get_state()[4]
-        checkpoint["time"] = time
-
-        # Update the parallel chains to resume training
-        if "parallel_chains" in f.keys():
-            f["parallel_chains"][...] = chains["visible"].cpu().numpy()
-        else:
-            f["parallel_chains"] = chains["visible"].cpu().numpy()
 
-        if "model_type" not in f.keys():
-            f["model_type"] = name
-        flag = checkpoint.create_group("flags")
-        for fl in flags:
-            flag[fl] = True
-            # This is for retrocompatibility purpose
-            checkpoint[f"save_{fl}"] = True
+class AsyncCheckpointWriter:
+    """Write the checkpoints of a training on a background thread.
+
+    `save` only takes a copy of the parameters, chains and random states, the conversion
+    to numpy and the writing to the archive happen on the writer thread. The pending
+    checkpoints are written in order, several of them in a single opening of the file
+    when the writer falls behind. `close` waits for all of them and is also registered
+    with `atexit`, so that the last checkpoints are flushed when the training is
+    interrupted.
+
+    `hold` keeps a copy of a checkpoint which is only written at the next call of `save`
+    or when closing the writer, and is replaced if `hold` is called again before. It is
+    used for the best model, so that a training improving at each evaluation writes it
+    once per checkpoint instead of once per evaluation.
+    """
+
+    def __init__(self, filename: str) -> None:
+        """
+        Args:
+            filename (str): The archive in which the checkpoints are written.
+        """
+        self.filename = filename
+        self._queue = queue.Queue()
+        self._held = None
+        self._error = None
+        self._thread = threading.Thread(target=self._writer, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _writer(self) -> None:
+        while True:
+            items = [self._queue.get()]
+            # Write all the pending checkpoints at once
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(item is None for item in items)
+            items = [item for item in items if item is not None]
+            try:
+                if len(items) > 0 and self._error is None:
+                    with h5py.File(self.filename, "a") as f:
+                        for item in items:
+                            _write_checkpoint(f, **item)
+            except Exception as e:
+                self._error = e
+            finally:
+                for _ in range(len(items) + stop):
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def _check_error(self) -> None:
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError(
+                f"Failed to write a checkpoint to {self.filename}"
+            ) from error
+
+    def save(
+        self,
+        params: EBM,
+        chains: dict[str, Tensor],
+        num_updates: int,
+        time: float,
+        flags: List[str] = [],
+        optimizer: Optional[Optimizer] = None,
+        minibatch_state: Optional[dict[str, Any] | List[dict[str, Any]]] = None,
+        hyperparameters: Optional[dict[str, Any]] = None,
+    ) -> None:
+        """Queue a checkpoint. Same arguments as `save_model`.
+
+        Args:
+            params (RBM): The parameters of the RBM.
+            chains (dict[str, Tensor]): The parallel chains used for sampling.
+            num_updates (int): The number of updates performed.
+            time (float): Elapsed time.
+            flags (List[str]): flags for the current update. Defaults to []
+            optimizer (Optional[Optimizer], optional): Optimizer whose state is saved to
+                resume the training. Defaults to None.
+            minibatch_state (Optional[dict[str, Any] | List[dict[str, Any]]], optional): State
+                of the minibatch iterator, or of the iterators of the workers, saved to resume
+                the training with the same minibatches. Defaults to None.
+            hyperparameters (Optional[dict[str, Any]], optional): State of the training,
+                such as the number of Gibbs steps of an adaptive schedule, overwriting the
+                hyperparameters of the archive. Defaults to None.
+        """
+        self._check_error()
+        if self._thread is None:
+            raise RuntimeError("The checkpoint writer is closed.")
+        item = {
+            "snapshot": _snapshot_checkpoint(
+                params=params,
+                chains=chains,
+                copy=True,
+                optimizer=optimizer,
+                minibatch_state=minibatch_state,
+                hyperparameters=hyperparameters,
+            ),
+            "num_updates": num_updates,
+            "time": time,
+            "flags": list(flags),
+        }
+        if self._held is not None and (
+            self._held["num_updates"] == num_updates
+            or set(self._held["flags"]) <= set(flags)
+        ):
+            # The held checkpoint is superseded by this one, its flags are kept
+            item["flags"] += [fl for fl in self._held["flags"] if fl not in flags]
+            self._held = None
+        self._write_held()
+        self._queue.put(item)
+
+    def hold(
+        self,
+        params: EBM,
+        chains: dict[str, Tensor],
+        num_updates: int,
+        time: float,
+        flags: List[str] = [],
+        optimizer: Optional[Optimizer] = None,
+        minibatch_state: Optional[dict[str, Any] | List[dict[str, Any]]] = None,
+        hyperparameters: Optional[dict[str, Any]] = None,
+    ) -> None:
+        """Keep a copy of a checkpoint, written at the next call of `save` or when closing
+        the writer. Same arguments as `save`. A checkpoint held before and not written
+        yet is discarded, as well as the held checkpoint when `save` is called with the
+        same update or with all of its flags.
+        """
+        self._check_error()
+        if self._thread is None:
+            raise RuntimeError("The checkpoint writer is closed.")
+        self._held = {
+            "snapshot": _snapshot_checkpoint(
+                params=params,
+                chains=chains,
+                copy=True,
+                optimizer=optimizer,
+                minibatch_state=minibatch_state,
+                hyperparameters=hyperparameters,
+            ),
+            "num_updates": num_updates,
+            "time": time,
+            "flags": list(flags),
+        }
+
+    def _write_held(self) -> None:
+        if self._held is not None:
+            self._queue.put(self._held)
+            self._held = None
+
+    def __enter__(self) -> "AsyncCheckpointWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def flush(self) -> None:
+        """Wait until all the queued checkpoints are written."""
+        self._queue.join()
+        self._check_error()
+
+    def close(self) -> None:
+        """Write the queued checkpoints and stop the writer thread."""
+        if self._thread is None:
+            return
+        self._write_held()
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        atexit.unregister(self.close)
+        self._check_error()
 
 
 def load_params(
@@ -121,6 +558,11 @@ def load_model(
         visible = torch.from_numpy(f["parallel_chains"][()]).to(
             device=device, dtype=dtype
         )
+        weights = None
+        if "parallel_chains_weights" in f.keys():
+            weights = torch.from_numpy(f["parallel_chains_weights"][()]).to(
+                device=device, dtype=dtype
+            )
         # Elapsed time
         start = np.array(f[last_file_key]["time"]).item()
 
@@ -130,12 +572,254 @@ def load_model(
         hyperparameters["learning_rate"] = float(
             f["hyperparameters"]["learning_rate"][()]
         )
+        if "optimizer" in f["hyperparameters"]:
+            hyperparameters["optimizer"] = f["hyperparameters"]["optimizer"][()].decode()
+        # Options of the optimizer and of the learning rate schedule
+        if "momentum" in f["hyperparameters"]:
+            hyperparameters["momentum"] = float(f["hyperparameters"]["momentum"][()])
+        if "lr_schedule" in f["hyperparameters"]:
+            lr_schedule = f["hyperparameters"]["lr_schedule"][()]
+            hyperparameters["lr_schedule"] = lr_schedule.decode()
+        if "learning_rate_final" in f["hyperparameters"]:
+            hyperparameters["learning_rate_final"] = float(
+                f["hyperparameters"]["learning_rate_final"][()]
+            )
+        if "reservoir_size" in f["hyperparameters"]:
+            # The chains saved in the archive are the whole pool
+            hyperparameters["reservoir_size"] = int(
+                f["hyperparameters"]["reservoir_size"][()]
+            )
+            hyperparameters["num_chains"] = int(f["hyperparameters"]["num_chains"][()])
+        if "gibbs_controller" in f["hyperparameters"]:
+            # State of the adaptive number of Gibbs steps
+            hyperparameters["gibbs_controller"] = {
+                k: v[()].item()
+                for k, v in f["hyperparameters"]["gibbs_controller"].items()
+            }
 
     params = load_params(
         filename=filename, index=index, device=device, dtype=dtype, map_model=map_model
     )
-    perm_chains = params.init_chains(visible.shape[0], start_v=visible)
+    perm_chains = params.init_chains(visible.shape[0], weights=weights, start_v=visible)
 
     if restore:
         restore_rng_state(filename=filename, index=index)
     return (params, perm_chains, start, hyperparameters)
+
+
+def load_optimizer_state(
+    filename: str, index: int, optimizer: Optimizer, params: EBM
+) -> bool:
+    """Restore the state of the optimizer saved at the given update.
+
+    Args:
+        filename (str): The name of the file containing the RBM model.
+        index (int): The update index from which to load the state.
+        optimizer (Optimizer): The optimizer, built on the parameters of `params`.
+        params (EBM): The parameters of the model.
+
+    Returns:
+        bool: Whether a state was found in the checkpoint.
+    """
+    named_params = params.named_parameters()
+    with h5py.File(filename, "r") as f:
+        checkpoint = f[f"update_{index}"]
+        if "optimizer" not in checkpoint.keys():
+            return False
+        param_groups = json.loads(checkpoint["optimizer"].attrs["param_groups"])
+        state = {}
+        for i, (n, p) in enumerate(named_params.items()):
+            if n in checkpoint["optimizer"].keys():
+                state[i] = {
+                    k: torch.as_tensor(v[()], device=p.device)
+                    for k, v in checkpoint["optimizer"][n].items()
+                }
+    optimizer.load_state_dict({"state": state, "param_groups": param_groups})
+    return True
+
+
+def load_minibatch_state(
+    filename: str,
+    index: int,
+    rank: Optional[int] = None,
+    world_size: Optional[int] = None,
+) -> Optional[dict[str, Any]]:
+    """Load the state of the minibatch iterator saved at the given update.
+
+    Args:
+        filename (str): The name of the file containing the RBM model.
+        index (int): The update index from which to load the state.
+        rank (Optional[int], optional): Rank of the worker of a distributed training.
+            Defaults to None.
+        world_size (Optional[int], optional): Number of workers of the distributed
+            training. Defaults to None.
+
+    Returns:
+        Optional[dict[str, Any]]: The state, to be given to `get_minibatch_iterator`, or
+        None if it was not saved with the checkpoint, or for another number of workers.
+    """
+    with h5py.File(filename, "r") as f:
+        checkpoint = f[f"update_{index}"]
+        if "minibatches" not in checkpoint.keys():
+            return None
+        group = checkpoint["minibatches"]
+        num_workers = group.attrs.get("num_workers", None)
+        if rank is None:
+            if num_workers is not None:
+                return None
+        else:
+            if num_workers != world_size:
+                return None
+            group = group[f"worker_{rank}"]
+        return {
+            "generator_state": torch.from_numpy(group["generator_state"][()]),
+            "epoch": int(group["epoch"][()]),
+            "num_batches": int(group["num_batches"][()]),
+        }
+
+
+def _serialize_settings(settings: dict[str, Any]) -> str:
+    """Serialize the estimator settings so that two sets of settings can be compared."""
+    return json.dumps(
+        {k: (v.item() if isinstance(v, np.generic) else v) for k, v in settings.items()},
+        sort_keys=True,
+    )
+
+
+def save_metric(
+    filename: str,
+    index: int,
+    name: str,
+    values: dict[str, Any],
+    settings: dict[str, Any],
+) -> None:
+    """Store the result of an estimator in the `metrics` group of a checkpoint.
+
+    Any previously stored result with the same name is overwritten.
+
+    Args:
+        filename (str): The name of the file containing the RBM.
+        index (int): The update index of the checkpoint.
+        name (str): Name of the metric (e.g. 'log_z').
+        values (dict[str, Any]): Values to store. Each entry is saved as a dataset.
+        settings (dict[str, Any]): Settings of the estimator used to compute the values.
+    """
+    with h5py.File(filename, "a") as f:
+        checkpoint = f[f"update_{index}"]
+        metrics = checkpoint.require_group("metrics")
+        if name in metrics.keys():
+            del metrics[name]
+        metric = metrics.create_group(name)
+        metric.attrs["settings"] = _serialize_settings(settings)
+        for k, v in values.items():
+            metric[k] = v
+
+
+def load_metric(
+    filename: str,
+    index: int,
+    name: str,
+    settings: dict[str, Any],
+) -> Optional[dict[str, Any]]:
+    """Read a metric stored in a checkpoint.
+
+    Args:
+        filename (str): The name of the file containing the RBM.
+        index (int): The update index of the checkpoint.
+        name (str): Name of the metric.
+        settings (dict[str, Any]): Settings of the estimator the values should have been
+            computed with.
+
+    Returns:
+        Optional[dict[str, Any]]: The stored values, or None if the metric is not stored or
+        was computed with different settings.
+    """
+    with h5py.File(filename, "r") as f:
+        checkpoint = f[f"update_{index}"]
+        if "metrics" not in checkpoint.keys() or name not in checkpoint["metrics"]:
+            return None
+        metric = checkpoint["metrics"][name]
+        if metric.attrs.get("settings") != _serialize_settings(settings):
+            return None
+        values = {}
+        for k in metric.keys():
+            v = metric[k][()]
+            values[k] = v.item() if np.ndim(v) == 0 else v
+    return values
+
+
+def _convert_checkpoint(src: h5py.Group, dst: h5py.Group) -> None:
+    """Copy a checkpoint of an archive of version 1 to the layout of version 2."""
+    params_ckpt = dst.create_group("params")
+    for n in src["params"].keys():
+        _write_dataset(params_ckpt, n, src["params"][n][()], compress=True)
+    if "numpy_rng_arg0" in src.keys():
+        _write_numpy_rng_state(
+            dst,
+            (
+                src["numpy_rng_arg0"][()].decode("utf-8"),
+                src["numpy_rng_arg1"][()],
+                src["numpy_rng_arg2"][()],
+                src["numpy_rng_arg3"][()],
+                src["numpy_rng_arg4"][()],
+            ),
+        )
+    if "optimizer" in src.keys():
+        optimizer_ckpt = dst.create_group("optimizer")
+        for k, v in src["optimizer"].attrs.items():
+            optimizer_ckpt.attrs[k] = v
+        for n in src["optimizer"].keys():
+            state_ckpt = optimizer_ckpt.create_group(n)
+            for k in src["optimizer"][n].keys():
+                _write_dataset(state_ckpt, k, src["optimizer"][n][k][()], compress=True)
+    # The retrocompatibility copies are dropped, everything else is copied as is
+    dropped = set(src["params"].keys()) | {"params", "optimizer"}
+    for key in src.keys():
+        if key in dropped or key.startswith("numpy_rng_arg") or key.startswith("save_"):
+            continue
+        src.copy(src[key], dst, name=key)
+
+
+def convert_archive(filename: str, out_file: str) -> None:
+    """Convert a training archive of version 1 to the layout of version 2.
+
+    The archives of version 2 store the parameters once, in chunked and compressed
+    datasets, the state of the numpy random generator in a single dataset, and keep an
+    index of the updates, elapsed times and flags of the checkpoints. Both versions are read by
+    the functions of `rbms.io` and `rbms.utils`.
+
+    Args:
+        filename (str): The archive to convert.
+        out_file (str): The path of the converted archive, overwritten if it exists.
+
+    Raises:
+        ValueError: If the archive is already in the layout of version 2.
+    """
+    with h5py.File(filename, "r") as f_in:
+        if get_archive_format(f_in) >= ARCHIVE_FORMAT:
+            raise ValueError(
+                f"{filename} already has the layout of version {get_archive_format(f_in)}."
+            )
+        with h5py.File(out_file, "w") as f_out:
+            f_out.attrs["format_version"] = ARCHIVE_FORMAT
+            updates, times, flags = [], [], []
+            for key in f_in.keys():
+                if is_checkpoint_key(key):
+                    _convert_checkpoint(f_in[key], f_out.create_group(key))
+                    updates.append(int(key.replace("update_", "")))
+                    times.append(float(f_in[key]["time"][()]))
+                    flags.append(
+                        [fl for fl, v in f_in[key]["flags"].items() if v[()]]
+                        if "flags" in f_in[key].keys()
+                        else []
+                    )
+                elif key == "parallel_chains":
+                    _write_dataset(f_out, key, f_in[key][()], compress=True)
+                else:
+                    f_in.copy(f_in[key], f_out, name=key)
+            _write_update_index(
+                f_out,
+                updates=np.array(updates, dtype=np.int64),
+                times=np.array(times, dtype=np.float64),
+                flags=flags,
+            )
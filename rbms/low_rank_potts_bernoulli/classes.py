@@ -0,0 +1,329 @@
+from typing import List, Optional
+
+import numpy as np
+import torch
+from torch import Tensor
+
+from rbms.classes import RBM
+from rbms.low_rank_potts_bernoulli.implement import (
+    _compute_energy,
+    _compute_energy_hiddens,
+    _compute_energy_visibles,
+    _compute_gradient,
+    _compute_pseudo_log_likelihood,
+    _init_chains,
+    _init_parameters,
+    _init_parameters_mean_field,
+    _sample_hiddens,
+    _sample_visibles,
+)
+
+
+class LowRankPBRBM(RBM):
+    """Parameters of the Potts-Bernoulli RBM with a factorized weight matrix.
+
+    The weight matrix of shape (num_visibles, num_states, num_hiddens) is the product of
+    the visible factor of shape (num_visibles, num_states, rank) and of the hidden factor
+    of shape (rank, num_hiddens). The sampling, the energies and the gradient only use the
+    factors, so that the memory and the cost of an update scale with the rank instead of
+    the number of hidden units for very wide visible layers.
+    """
+
+    def __init__(
+        self,
+        visible_factor: Tensor,
+        hidden_factor: Tensor,
+        vbias: Tensor,
+        hbias: Tensor,
+        device: Optional[torch.device] = None,
+        dtype: Optional[torch.dtype] = None,
+    ):
+        """Initialize the parameters of the low-rank Potts-Bernoulli RBM.
+
+        Args:
+            visible_factor (Tensor): The visible factor of the weight matrix, of shape
+                (num_visibles, num_states, rank).
+            hidden_factor (Tensor): The hidden factor of the weight matrix, of shape
+                (rank, num_hiddens).
+            vbias (Tensor): The visible bias of the RBM.
+            hbias (Tensor): The hidden bias of the RBM.
+            device (Optional[torch.device], optional): The device for the parameters.
+                Defaults to the device of `visible_factor`.
+            dtype (Optional[torch.dtype], optional): The data type for the parameters.
+                Defaults to the data type of `visible_factor`.
+        """
+        if device is None:
+            device = visible_factor.device
+        if dtype is None:
+            dtype = visible_factor.dtype
+        self.device = device
+        self.dtype = dtype
+        self.visible_factor = visible_factor.to(device=self.device, dtype=self.dtype)
+        self.hidden_factor = hidden_factor.to(device=self.device, dtype=self.dtype)
+        self.vbias = vbias.to(device=self.device, dtype=self.dtype)
+        self.hbias = hbias.to(device=self.device, dtype=self.dtype)
+        self.name = "LowRankPBRBM"
+
+    def __add__(self, other):
+        # The sum of two factorized matrices is factorized with the concatenated factors
+        return LowRankPBRBM(
+            visible_factor=torch.cat([self.visible_factor, other.visible_factor], 2),
+            hidden_factor=torch.cat([self.hidden_factor, other.hidden_factor], 0),
+            vbias=self.vbias + other.vbias,
+            hbias=self.hbias + other.hbias,
+        )
+
+    def __mul__(self, other):
+        return LowRankPBRBM(
+            visible_factor=self.visible_factor * other,
+            hidden_factor=self.hidden_factor.clone(),
+            vbias=self.vbias * other,
+            hbias=self.hbias * other,
+        )
+
+    @torch.jit.export
+    def clone(
+        self, device: Optional[torch.device] = None, dtype: Optional[torch.dtype] = None
+    ):
+        if device is None:
+            device = self.device
+        if dtype is None:
+            dtype = self.dtype
+        return LowRankPBRBM(
+            visible_factor=self.visible_factor.clone(),
+            hidden_factor=self.hidden_factor.clone(),
+            vbias=self.vbias.clone(),
+            hbias=self.hbias.clone(),
+            device=device,
+            dtype=dtype,
+        )
+
+    def compute_energy(self, v, h):
+        return _compute_energy(
+            v=v,
+            h=h,
+            vbias=self.vbias,
+            hbias=self.hbias,
+            visible_factor=self.visible_factor,
+            hidden_factor=self.hidden_factor,
+        )
+
+    def compute_energy_hiddens(self, h):
+        return _compute_energy_hiddens(
+            h=h,
+            vbias=self.vbias,
+            hbias=self.hbias,
+            visible_factor=self.visible_factor,
+            hidden_factor=self.hidden_factor,
+        )
+
+    def compute_energy_visibles(self, v):
+        return _compute_energy_visibles(
+            v=v,
+            vbias=self.vbias,
+            hbias=self.hbias,
+            visible_factor=self.visible_factor,
+            hidden_factor=self.hidden_factor,
+        )
+
+    def compute_gradient(self, data, chains, centered=True):
+        _compute_gradient(
+            v_data=data["visible"],
+            mh_data=data["hidden_mag"],
+            w_data=data["weights"],
+            v_chain=chains["visible"],
+            h_chain=chains["hidden_mag"],
+            w_chain=chains["weights"],
+            vbias=self.vbias,
+            hbias=self.hbias,
+            visible_factor=self.visible_factor,
+            hidden_factor=self.hidden_factor,
+            centered=centered,
+        )
+
+    def compute_pseudo_log_likelihood(self, v, max_elements=2**24):
+        return _compute_pseudo_log_likelihood(
+            v=v,
+            vbias=self.vbias,
+            hbias=self.hbias,
+            visible_factor=self.visible_factor,
+            hidden_factor=self.hidden_factor,
+            max_elements=max_elements,
+        )
+
+    def independent_model(self):
+        return LowRankPBRBM(
+            visible_factor=torch.zeros_like(self.visible_factor),
+            hidden_factor=torch.zeros_like(self.hidden_factor),
+            vbias=torch.zeros_like(self.vbias),
+            hbias=torch.zeros_like(self.hbias),
+        )
+
+    def init_chains(self, num_samples, weights=None, start_v=None):
+        visible, hidden, mean_visible, mean_hidden = _init_chains(
+            num_samples=num_samples,
+            visible_factor=self.visible_factor,
+            hidden_factor=self.hidden_factor,
+            hbias=self.hbias,
+            start_v=start_v,
+        )
+        if weights is None:
+            weights = torch.ones(
+                visible.shape[0], device=visible.device, dtype=visible.dtype
+            )
+        return dict(
+            visible=visible,
+            hidden=hidden,
+            visible_mag=mean_visible,
+            hidden_mag=mean_hidden,
+            weights=weights,
+        )
+
+    @staticmethod
+    def init_parameters(
+        num_hiddens,
+        dataset,
+        device,
+        dtype,
+        var_init=0.0001,
+        init="random",
+        rank=None,
+    ):
+        """Initialize the parameters of the low-rank RBM, see `RBM.init_parameters`.
+
+        Args:
+            rank (Optional[int], optional): Rank of the weight matrix, at most the
+                number of hidden units. Defaults to the number of hidden units.
+        """
+        data = dataset.data
+        # Convert to torch Tensor if necessary
+        if isinstance(data, np.ndarray):
+            data = torch.from_numpy(dataset.data).to(device=device, dtype=dtype)
+        if rank is None:
+            rank = num_hiddens
+        if rank <= 0:
+            raise ValueError(f"'rank' should be positive, got {rank}")
+        rank = min(rank, num_hiddens)
+        match init:
+            case "random":
+                vbias, hbias, visible_factor, hidden_factor = _init_parameters(
+                    num_hiddens=num_hiddens,
+                    rank=rank,
+                    data=data,
+                    device=device,
+                    dtype=dtype,
+                    var_init=var_init,
+                )
+            case "mean_field":
+                vbias, hbias, visible_factor, hidden_factor = _init_parameters_mean_field(
+                    num_hiddens=num_hiddens,
+                    rank=rank,
+                    data=data,
+                    weights=torch.as_tensor(dataset.weights),
+                    device=device,
+                    dtype=dtype,
+                    var_init=var_init,
+                )
+            case _:
+                raise ValueError(
+                    f"'init' should be one of ['random', 'mean_field'], got {init}"
+                )
+        params = LowRankPBRBM(
+            visible_factor=visible_factor,
+            hidden_factor=hidden_factor,
+            vbias=vbias,
+            hbias=hbias,
+        )
+        from rbms.low_rank_potts_bernoulli.utils import ensure_zero_sum_gauge
+
+        ensure_zero_sum_gauge(params)
+        return params
+
+    def named_parameters(self):
+        return {
+            "visible_factor": self.visible_factor,
+            "hidden_factor": self.hidden_factor,
+            "vbias": self.vbias,
+            "hbias": self.hbias,
+        }
+
+    def num_hiddens(self):
+        return self.hbias.shape[0]
+
+    def num_states(self) -> int:
+        """Number of colors for the Potts variables"""
+        return self.visible_factor.shape[1]
+
+    def num_visibles(self):
+        return self.vbias.shape[0]
+
+    def parameters(self) -> List[Tensor]:
+        return [self.visible_factor, self.hidden_factor, self.vbias, self.hbias]
+
+    def rank(self) -> int:
+        """Rank of the factorization of the weight matrix"""
+        return self.hidden_factor.shape[0]
+
+    def ref_log_z(self):
+        return (
+            self.num_hiddens() * np.log(2)
+            + self.num_visibles() * np.log(self.num_states())
+        ).item()
+
+    def sample_hiddens(self, chains, beta=1):
+        chains["hidden"], chains["hidden_mag"] = _sample_hiddens(
+            chains["visible"],
+            self.visible_factor,
+            self.hidden_factor,
+            self.hbias,
+            beta=beta,
+        )
+        return chains
+
+    def sample_visibles(self, chains, beta=1):
+        chains["visible"], chains["visible_mag"] = _sample_visibles(
+            chains["hidden"],
+            self.visible_factor,
+            self.hidden_factor,
+            self.vbias,
+            beta=beta,
+        )
+        return chains
+
+    @staticmethod
+    def set_named_parameters(named_params):
+        names = ["vbias", "hbias", "visible_factor", "hidden_factor"]
+        for k in names:
+            if k not in named_params.keys():
+                raise ValueError(
+                    f"""Dictionary params missing key '{k}'\n Provided keys : {named_params.keys()}\n Expected keys: {names}"""
+                )
+        params = LowRankPBRBM(
+            visible_factor=named_params.pop("visible_factor"),
+            hidden_factor=named_params.pop("hidden_factor"),
+            vbias=named_params.pop("vbias"),
+            hbias=named_params.pop("hbias"),
+        )
+        if len(named_params.keys()) > 0:
+            raise ValueError(
+                f"Too many keys in params dictionary. Remaining keys: {named_params.keys()}"
+            )
+        return params
+
+    def to(
+        self, device: Optional[torch.device] = None, dtype: Optional[torch.dtype] = None
+    ):
+        if device is not None:
+            self.device = device
+        if dtype is not None:
+            self.dtype = dtype
+        self.visible_factor = self.visible_factor.to(device=self.device, dtype=self.dtype)
+        self.hidden_factor = self.hidden_factor.to(device=self.device, dtype=self.dtype)
+        self.vbias = self.vbias.to(device=self.device, dtype=self.dtype)
+        self.hbias = self.hbias.to(device=self.device, dtype=self.dtype)
+        return self
+
+    def weight_matrix(self) -> Tensor:
+        """Dense weight matrix of shape (num_visibles, num_states, num_hiddens), only
+        meant for analysis of small models."""
+        return torch.tensordot(self.visible_factor, self.hidden_factor, dims=[[2], [0]])
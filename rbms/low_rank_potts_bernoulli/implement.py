@@ -0,0 +1,324 @@
+from typing import Optional, Tuple
+
+import torch
+from torch import Tensor
+from torch.nn.functional import embedding_bag, softmax, softplus
+
+from rbms.potts_bernoulli.implement import (
+    _init_parameters as _init_parameters_pbrbm,
+)
+from rbms.potts_bernoulli.implement import (
+    _init_parameters_mean_field as _init_parameters_mean_field_pbrbm,
+)
+
+# The weight matrix W of shape (num_visibles, num_states, num_hiddens) is stored as the
+# product of the visible factor U of shape (num_visibles, num_states, rank) and of the
+# hidden factor V of shape (rank, num_hiddens), W[i, a, :] = U[i, a, :] @ V. The one-hot
+# representation of the visible layer is never built: a configuration is represented by
+# the indices of its active rows in the flattened (num_visibles * num_states) layout.
+
+
+@torch.jit.script
+def _flat_indices(v: Tensor, num_states: int) -> Tensor:
+    num_visibles = v.shape[1]
+    offsets = torch.arange(num_visibles, device=v.device) * num_states
+    return v.to(torch.int64) + offsets
+
+
+@torch.jit.script
+def _project_visibles(v_idx: Tensor, visible_factor: Tensor) -> Tensor:
+    # (num_samples, rank) sum of the rows of U selected by the visible configurations
+    rank = visible_factor.shape[2]
+    return embedding_bag(v_idx, visible_factor.view(-1, rank), mode="sum")
+
+
+@torch.jit.script
+def _sample_hiddens(
+    v: Tensor,
+    visible_factor: Tensor,
+    hidden_factor: Tensor,
+    hbias: Tensor,
+    beta: float = 1.0,
+) -> Tuple[Tensor, Tensor]:
+    v_idx = _flat_indices(v, visible_factor.shape[1])
+    projection = _project_visibles(v_idx, visible_factor)
+    mh = torch.sigmoid(beta * (hbias + projection @ hidden_factor))
+    h = torch.bernoulli(mh).to(visible_factor.dtype)
+    return h, mh
+
+
+@torch.jit.script
+def _sample_visibles(
+    h: Tensor,
+    visible_factor: Tensor,
+    hidden_factor: Tensor,
+    vbias: Tensor,
+    beta: float = 1.0,
+) -> Tuple[Tensor, Tensor]:
+    num_visibles, num_states, _ = visible_factor.shape
+    projection = h @ hidden_factor.T
+    mv = torch.softmax(
+        beta * (vbias + torch.tensordot(projection, visible_factor, dims=[[1], [2]])),
+        dim=-1,
+    )
+    v = (
+        torch.multinomial(mv.view(-1, num_states), 1)
+        .view(-1, num_visibles)
+        .to(visible_factor.dtype)
+    )
+    return v, mv
+
+
+@torch.jit.script
+def _compute_energy(
+    v: Tensor,
+    h: Tensor,
+    vbias: Tensor,
+    hbias: Tensor,
+    visible_factor: Tensor,
+    hidden_factor: Tensor,
+):
+    v_idx = _flat_indices(v, visible_factor.shape[1])
+    fields = vbias.flatten()[v_idx].sum(1) + (h @ hbias)
+    interaction = (_project_visibles(v_idx, visible_factor) * (h @ hidden_factor.T)).sum(
+        1
+    )
+    return -fields - interaction
+
+
+@torch.jit.script
+def _compute_energy_visibles(
+    v: Tensor,
+    vbias: Tensor,
+    hbias: Tensor,
+    visible_factor: Tensor,
+    hidden_factor: Tensor,
+):
+    v_idx = _flat_indices(v, visible_factor.shape[1])
+    field = vbias.flatten()[v_idx].sum(1)
+    exponent = hbias + _project_visibles(v_idx, visible_factor) @ hidden_factor
+    log_term = torch.where(exponent < 10, torch.log(1.0 + torch.exp(exponent)), exponent)
+    return -field - log_term.sum(1)
+
+
+@torch.jit.script
+def _compute_energy_hiddens(
+    h: Tensor,
+    vbias: Tensor,
+    hbias: Tensor,
+    visible_factor: Tensor,
+    hidden_factor: Tensor,
+):
+    field = h @ hbias
+    arg_lse = vbias + torch.tensordot(
+        h @ hidden_factor.T, visible_factor, dims=[[1], [2]]
+    )
+    lse = torch.logsumexp(arg_lse, dim=2).sum(1)
+    return -field - lse
+
+
+@torch.jit.script
+def _compute_pseudo_log_likelihood(
+    v: Tensor,
+    vbias: Tensor,
+    hbias: Tensor,
+    visible_factor: Tensor,
+    hidden_factor: Tensor,
+    max_elements: int = 16777216,
+) -> Tensor:
+    dtype = visible_factor.dtype
+    num_visibles, num_states, rank = visible_factor.shape
+    num_hiddens = hidden_factor.shape[1]
+    num_samples = v.shape[0]
+    v_int = v.to(torch.int64)
+    v_idx = _flat_indices(v, num_states)
+    # The projection on the factors is computed once, each change of state is a rank-1
+    # update of it
+    projection = _project_visibles(v_idx, visible_factor)
+    block_size = max(
+        1, max_elements // max(1, num_samples * num_states * max(num_hiddens, rank))
+    )
+    pll = torch.zeros(num_samples, device=v.device, dtype=dtype)
+    for start in range(0, num_visibles, block_size):
+        end = min(start + block_size, num_visibles)
+        sites = torch.arange(end - start, device=v.device)
+        factor_block = visible_factor[start:end]
+        # (num_samples, block, rank) rows of the current states
+        factor_curr = factor_block[sites.unsqueeze(0), v_int[:, start:end]]
+        projection_states = (projection.unsqueeze(1) - factor_curr).unsqueeze(
+            2
+        ) + factor_block
+        field_states = hbias + projection_states @ hidden_factor
+        # Minus the free energy of each state of each site, up to a constant
+        neg_free_energy = vbias[start:end] + softplus(field_states).sum(3)
+        neg_free_energy_curr = neg_free_energy.gather(
+            2, v_int[:, start:end].unsqueeze(2)
+        ).squeeze(2)
+        pll += (neg_free_energy_curr - torch.logsumexp(neg_free_energy, 2)).sum(1)
+    return pll
+
+
+@torch.jit.script
+def _scatter_rows(v_idx: Tensor, values: Tensor, num_rows: int) -> Tensor:
+    # sum_n one_hot(v_n)^T values_n, of shape (num_rows, *values.shape[1:])
+    num_visibles = v_idx.shape[1]
+    src = values.unsqueeze(1).expand([values.shape[0], num_visibles] + values.shape[1:])
+    out = torch.zeros(
+        [num_rows] + values.shape[1:], device=values.device, dtype=values.dtype
+    )
+    return out.index_add_(0, v_idx.reshape(-1), src.reshape([-1] + values.shape[1:]))
+
+
+@torch.jit.script
+def _compute_gradient(
+    v_data: Tensor,
+    mh_data: Tensor,
+    w_data: Tensor,
+    v_chain: Tensor,
+    h_chain: Tensor,
+    w_chain: Tensor,
+    vbias: Tensor,
+    hbias: Tensor,
+    visible_factor: Tensor,
+    hidden_factor: Tensor,
+    centered: bool = True,
+):
+    # The gradient G of the weight matrix, of shape (num_visibles * num_states,
+    # num_hiddens), is never formed: the gradients of the factors are G V^T and U^T G
+    num_visibles, num_states, rank = visible_factor.shape
+    num_rows = num_visibles * num_states
+    visible_factor_flat = visible_factor.view(num_rows, rank)
+    v_data_idx = _flat_indices(v_data, num_states)
+    v_gen_idx = _flat_indices(v_chain, num_states)
+
+    # Normalized weights of the data and of the chains
+    w_data = w_data.view(-1)
+    w_data = w_data / w_data.sum()
+    chain_weights = softmax(-w_chain.view(-1), dim=0)
+
+    # Averages over data and generated samples
+    v_data_mean = _scatter_rows(v_data_idx, w_data, num_rows)
+    h_data_mean = w_data @ mh_data
+    v_gen_mean = _scatter_rows(v_gen_idx, chain_weights, num_rows)
+    h_gen_mean = chain_weights @ h_chain
+    torch.clamp_(v_data_mean, min=1e-7, max=(1.0 - 1e-7))
+    torch.clamp_(v_gen_mean, min=1e-7, max=(1.0 - 1e-7))
+
+    # Coefficients of the samples in the second moments. As for the PBRBM, the centered
+    # products are not weighted, they differ from the uncentered ones by rank-one terms
+    if centered:
+        coef_data = torch.full_like(w_data, 1.0 / v_data.shape[0])
+        coef_gen = torch.full_like(chain_weights, 1.0 / v_chain.shape[0])
+    else:
+        coef_data = w_data
+        coef_gen = chain_weights
+    h_data = mh_data * coef_data.unsqueeze(1)
+    h_gen = h_chain * coef_gen.unsqueeze(1)
+    # G V^T and U^T G
+    grad_visible_factor = _scatter_rows(
+        v_data_idx, h_data @ hidden_factor.T, num_rows
+    ) - _scatter_rows(v_gen_idx, h_gen @ hidden_factor.T, num_rows)
+    grad_hidden_factor = _project_visibles(v_data_idx, visible_factor).T @ h_data
+    grad_hidden_factor -= _project_visibles(v_gen_idx, visible_factor).T @ h_gen
+
+    grad_vbias = v_data_mean - v_gen_mean
+    grad_hbias = h_data_mean - h_gen_mean
+    if centered:
+        # G = P + v_data_mean (x) delta_h + delta_v (x) h_data_mean, with P the difference
+        # of the products accumulated above
+        delta_h = h_chain.mean(0) - mh_data.mean(0)
+        delta_v = _scatter_rows(v_gen_idx, coef_gen, num_rows) - _scatter_rows(
+            v_data_idx, coef_data, num_rows
+        )
+        # G h_data_mean and v_data_mean^T G
+        grad_w_h = (
+            _scatter_rows(v_data_idx, h_data @ h_data_mean, num_rows)
+            - _scatter_rows(v_gen_idx, h_gen @ h_data_mean, num_rows)
+            + v_data_mean * (delta_h @ h_data_mean)
+            + delta_v * (h_data_mean @ h_data_mean)
+        )
+        grad_v_w = (
+            v_data_mean[v_data_idx].sum(1) @ h_data
+            - v_data_mean[v_gen_idx].sum(1) @ h_gen
+            + (v_data_mean @ v_data_mean) * delta_h
+            + (v_data_mean @ delta_v) * h_data_mean
+        )
+        grad_visible_factor += torch.outer(v_data_mean, delta_h @ hidden_factor.T)
+        grad_visible_factor += torch.outer(delta_v, hidden_factor @ h_data_mean)
+        grad_hidden_factor += torch.outer(visible_factor_flat.T @ v_data_mean, delta_h)
+        grad_hidden_factor += torch.outer(visible_factor_flat.T @ delta_v, h_data_mean)
+        grad_vbias -= grad_w_h
+        grad_hbias -= grad_v_w
+    visible_factor.grad.view(num_rows, rank).copy_(grad_visible_factor)
+    hidden_factor.grad.copy_(grad_hidden_factor)
+    vbias.grad.view(-1).copy_(grad_vbias)
+    hbias.grad.copy_(grad_hbias)
+
+
+def _init_chains(
+    num_samples: int,
+    visible_factor: Tensor,
+    hidden_factor: Tensor,
+    hbias: Tensor,
+    start_v: Optional[Tensor] = None,
+):
+    num_visibles, num_states, _ = visible_factor.shape
+    if start_v is None:
+        v = torch.randint(
+            0,
+            num_states,
+            size=(num_samples, num_visibles),
+            device=visible_factor.device,
+            dtype=visible_factor.dtype,
+        )
+    else:
+        v = start_v.to(visible_factor.dtype)
+    mv = torch.zeros(v.shape[0], v.shape[1], num_states)
+    v_idx = _flat_indices(v, num_states)
+    mh = torch.sigmoid(hbias + _project_visibles(v_idx, visible_factor) @ hidden_factor)
+    h = torch.bernoulli(mh)
+    return v, h, mv, mh
+
+
+def _init_parameters(
+    num_hiddens: int,
+    rank: int,
+    data: Tensor,
+    device: torch.device,
+    dtype: torch.dtype,
+    var_init: float = 1e-4,
+) -> Tuple[Tensor, Tensor, Tensor, Tensor]:
+    vbias, hbias, visible_factor = _init_parameters_pbrbm(
+        num_hiddens=rank, data=data, device=device, dtype=dtype, var_init=var_init
+    )
+    hbias = torch.zeros(num_hiddens, device=device, dtype=dtype)
+    # The entries of the weight matrix have the same scale as for the PBRBM
+    hidden_factor = torch.randn(size=(rank, num_hiddens), device=device, dtype=dtype) / (
+        rank**0.5
+    )
+    return vbias, hbias, visible_factor, hidden_factor
+
+
+def _init_parameters_mean_field(
+    num_hiddens: int,
+    rank: int,
+    data: Tensor,
+    weights: Tensor,
+    device: torch.device,
+    dtype: torch.dtype,
+    var_init: float = 1e-4,
+) -> Tuple[Tensor, Tensor, Tensor, Tensor]:
+    # The leading `rank` mean-field modes are assigned to the first hidden units, the
+    # other hidden units start disconnected
+    vbias, hbias_modes, visible_factor = _init_parameters_mean_field_pbrbm(
+        num_hiddens=rank,
+        data=data,
+        weights=weights,
+        device=device,
+        dtype=dtype,
+        var_init=var_init,
+    )
+    hbias = torch.zeros(num_hiddens, device=device, dtype=dtype)
+    hbias[:rank] = hbias_modes
+    hidden_factor = torch.eye(rank, num_hiddens, device=device, dtype=dtype)
+    return vbias, hbias, visible_factor, hidden_factor
@@ -0,0 +1,15 @@
+from rbms.low_rank_potts_bernoulli.classes import LowRankPBRBM
+
+
+def ensure_zero_sum_gauge(params: LowRankPBRBM) -> None:
+    """Ensure the weight matrix has a zero-sum gauge. The gauge is fixed on the visible
+    factor, the mean over the states of the weight matrix being the product of the mean of
+    the visible factor with the hidden factor.
+
+    Args:
+        params (LowRankPBRBM): The parameters of the RBM.
+    """
+    mean_U = params.visible_factor.mean(1, keepdim=True)
+    params.visible_factor -= mean_U
+    params.hbias += mean_U.squeeze(1).sum(0) @ params.hidden_factor
+    params.vbias -= params.vbias.mean(1, keepdim=True)
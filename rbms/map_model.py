@@ -1,5 +1,12 @@
 from rbms.bernoulli_bernoulli.classes import BBRBM
 from rbms.classes import EBM
+from rbms.low_rank_potts_bernoulli.classes import LowRankPBRBM
 from rbms.potts_bernoulli.classes import PBRBM
+from rbms.sparse_potts_bernoulli.classes import SparsePBRBM
 
-map_model: dict[str, EBM] = {"BBRBM": BBRBM, "PBRBM": PBRBM}
+map_model: dict[str, EBM] = {
+    "BBRBM": BBRBM,
+    "PBRBM": PBRBM,
+    "LowRankPBRBM": LowRankPBRBM,
+    "SparsePBRBM": SparsePBRBM,
+}
@@ -0,0 +1,106 @@
+from typing import Optional, Tuple
+
+import numpy as np
+import torch
+from torch import Tensor
+
+from rbms.custom_fn import one_hot
+
+
+def get_covariance_matrix(
+    data: Tensor,
+    weights: Optional[Tensor] = None,
+    num_extract: Optional[int] = None,
+    center: bool = True,
+    device: torch.device = torch.device("cpu"),
+    dtype: torch.dtype = torch.float32,
+) -> Tensor:
+    """Returns the covariance matrix of the data. If weights is specified, the weighted covariance matrix is computed.
+
+    Args:
+        data (Tensor): Data.
+        weights (Tensor, optional): Weights of the data. Defaults to None.
+        num_extract (int, optional): Number of data to extract to compute the covariance matrix. Defaults to None.
+        center (bool): Center the data. Defaults to True.
+        device (torch.device): Device. Defaults to 'cpu'.
+        dtype (torch.dtype): DType. Defaults to torch.float32.
+
+    Returns:
+        Tensor: Covariance matrix of the dataset.
+    """
+    num_data = len(data)
+    num_classes = int(data.max().item() + 1)
+
+    if weights is None:
+        weights = torch.ones(num_data)
+    weights = weights.to(device=device, dtype=torch.float32)
+
+    if num_extract is not None:
+        idxs = np.random.choice(a=np.arange(num_data), size=(num_extract,), replace=False)
+        data = data[idxs]
+        weights = weights[idxs]
+        num_data = num_extract
+
+    if num_classes != 2:
+        data = data.to(device=device, dtype=torch.int32)
+        data_oh = one_hot(data, num_classes=num_classes).reshape(num_data, -1)
+    else:
+        data_oh = data.to(device=device, dtype=torch.float32)
+
+    norm_weights = weights.reshape(-1, 1) / weights.sum()
+    data_mean = (data_oh * norm_weights).sum(0, keepdim=True)
+    cov_matrix = ((data_oh * norm_weights).mT @ data_oh) - int(center) * (
+        data_mean.mT @ data_mean
+    )
+    return cov_matrix
+
+
+def get_mean_field_low_rank_weights(
+    cov_matrix: Tensor,
+    variances: Tensor,
+    num_hiddens: int,
+    num_iter: int = 4,
+    oversampling: int = 10,
+) -> Tuple[Tensor, Tensor]:
+    """Low-rank weight matrix of a RBM reproducing the leading principal modes of the data
+    in the Gaussian mean-field approximation.
+
+    Marginalizing hidden units with zero input field gives couplings
+    J = W W^T / 4 between the visible variables. The mean-field linear response relates
+    them to the covariance matrix C of the visible variables,
+    C^{-1} = diag(variances)^{-1} - J. Writing the whitened covariance
+    D^{-1/2} C D^{-1/2} = sum_a lambda_a u_a u_a^T, the modes with lambda_a > 1 are
+    reproduced by the columns W_a = 2 sqrt(1 - 1 / lambda_a) D^{-1/2} u_a. The leading modes
+    are obtained with a randomized truncated SVD.
+
+    Args:
+        cov_matrix (Tensor): Covariance matrix of the visible variables, of shape (D, D).
+        variances (Tensor): Variances of the visible variables in the independent model,
+            of shape (D,).
+        num_hiddens (int): Number of hidden units, the number of computed modes is at most
+            the number of visible variables.
+        num_iter (int, optional): Number of subspace iterations of the randomized SVD.
+            Defaults to 4.
+        oversampling (int, optional): Number of additional random vectors of the
+            randomized SVD. Defaults to 10.
+
+    Returns:
+        Tuple[Tensor, Tensor]: The weight matrix of shape (D, num_hiddens), zero for the
+        hidden units beyond the modes with lambda_a > 1, and the eigenvalues lambda_a.
+    """
+    num_visibles = cov_matrix.shape[0]
+    num_modes = min(num_hiddens, num_visibles)
+    inv_std = 1.0 / torch.sqrt(variances)
+    whitened_cov = inv_std.unsqueeze(1) * cov_matrix * inv_std.unsqueeze(0)
+    # The whitened covariance is symmetric positive, its SVD is its eigendecomposition
+    u, eigenvalues, _ = torch.svd_lowrank(
+        whitened_cov, q=min(num_modes + oversampling, num_visibles), niter=num_iter
+    )
+    u = u[:, :num_modes]
+    eigenvalues = eigenvalues[:num_modes]
+    scale = 2.0 * torch.sqrt(torch.clamp(1.0 - 1.0 / eigenvalues, min=0.0))
+    weight_matrix = torch.zeros(
+        num_visibles, num_hiddens, device=cov_matrix.device, dtype=cov_matrix.dtype
+    )
+    weight_matrix[:, :num_modes] = inv_std.unsqueeze(1) * u * scale
+    return weight_matrix, eigenvalues
@@ -0,0 +1,228 @@
+import hashlib
+from typing import Any, Optional
+
+import torch
+from torch import Tensor
+
+from rbms.classes import EBM
+from rbms.io import load_metric, load_params, save_metric
+from rbms.map_model import map_model
+from rbms.partition_function.ais import compute_partition_function_ais_stats
+from rbms.partition_function.exact import compute_partition_function
+from rbms.utils import compute_log_likelihood
+
+
+def get_data_fingerprint(v_data: Tensor, w_data: Tensor) -> str:
+    """Short hash identifying a dataset, used to tag the cached log-likelihoods.
+
+    Args:
+        v_data (Tensor): Data samples.
+        w_data (Tensor): Weights associated to the samples.
+
+    Returns:
+        str: Hexadecimal fingerprint of the data and weights.
+    """
+    return _fingerprint(v_data, w_data)
+
+
+def _fingerprint(*tensors: Tensor) -> str:
+    h = hashlib.sha1()
+    for t in tensors:
+        h.update(t.detach().cpu().numpy().tobytes())
+    return h.hexdigest()[:16]
+
+
+def _log_z_settings(
+    method: str,
+    dtype: torch.dtype,
+    num_chains: Optional[int] = None,
+    num_beta: Optional[int] = None,
+    num_replicates: int = 10,
+    all_config: Optional[Tensor] = None,
+) -> dict[str, Any]:
+    match method:
+        case "ais":
+            if num_chains is None or num_beta is None:
+                raise ValueError("'num_chains' and 'num_beta' must be set for AIS.")
+            return {
+                "method": "ais",
+                "num_chains": num_chains,
+                "num_beta": num_beta,
+                "num_replicates": num_replicates,
+                "dtype": str(dtype),
+            }
+        case "exact":
+            if all_config is None:
+                raise ValueError("'all_config' must be set for the exact computation.")
+            return {
+                "method": "exact",
+                "num_configs": all_config.shape[0],
+                "num_dims": all_config.shape[1],
+                # Enumerations of the same shape may differ, e.g. in the number of states
+                "configs": _fingerprint(all_config),
+                "dtype": str(dtype),
+            }
+        case _:
+            raise ValueError(f"'method' should be one of ('ais', 'exact'), got {method}")
+
+
+def get_log_z(
+    filename: str,
+    index: int,
+    device: torch.device,
+    dtype: torch.dtype,
+    method: str = "ais",
+    num_chains: Optional[int] = None,
+    num_beta: Optional[int] = None,
+    num_replicates: int = 10,
+    all_config: Optional[Tensor] = None,
+    recompute: bool = False,
+    params: Optional[EBM] = None,
+    map_model: dict[str, EBM] = map_model,
+) -> float:
+    """Return the log partition function of a checkpoint, reading it from the archive when it
+    has already been computed with the same settings.
+
+    For AIS, the error estimates returned by `compute_partition_function_ais_stats` are
+    stored alongside the value and can be read with `load_metric`.
+
+    Args:
+        filename (str): Path to the HDF5 training archive.
+        index (int): The update index of the checkpoint.
+        device (torch.device): Device used for the computation.
+        dtype (torch.dtype): Dtype used for the computation.
+        method (str, optional): Either 'ais' or 'exact'. Defaults to 'ais'.
+        num_chains (Optional[int], optional): Number of chains for AIS. Defaults to None.
+        num_beta (Optional[int], optional): Number of temperatures for AIS. Defaults to None.
+        num_replicates (int, optional): Number of independent AIS runs used to estimate
+            the error. Defaults to 10.
+        all_config (Optional[Tensor], optional): Enumeration of all the configurations of one
+            of the layers for the exact computation. Defaults to None.
+        recompute (bool, optional): Ignore the cached value and overwrite it. Defaults to False.
+        params (Optional[EBM], optional): Already loaded parameters of the checkpoint.
+            Defaults to None.
+
+    Returns:
+        float: The log partition function.
+    """
+    settings = _log_z_settings(
+        method=method,
+        dtype=dtype,
+        num_chains=num_chains,
+        num_beta=num_beta,
+        num_replicates=num_replicates,
+        all_config=all_config,
+    )
+    if not recompute:
+        cached = load_metric(filename, index, "log_z", settings)
+        if cached is not None:
+            return float(cached["log_z"])
+
+    if params is None:
+        params = load_params(
+            filename=filename,
+            index=index,
+            device=device,
+            dtype=dtype,
+            map_model=map_model,
+        )
+    match method:
+        case "ais":
+            # Keep the reliability estimates of AIS along with the value
+            values = compute_partition_function_ais_stats(
+                num_chains=num_chains,
+                num_beta=num_beta,
+                params=params,
+                num_replicates=num_replicates,
+            )
+        case "exact":
+            values = {
+                "log_z": compute_partition_function(
+                    params=params, all_config=all_config.to(device=device, dtype=dtype)
+                )
+            }
+    save_metric(filename, index, "log_z", values, settings)
+    return values["log_z"]
+
+
+def get_log_likelihood(
+    filename: str,
+    index: int,
+    v_data: Tensor,
+    w_data: Tensor,
+    device: torch.device,
+    dtype: torch.dtype,
+    method: str = "ais",
+    num_chains: Optional[int] = None,
+    num_beta: Optional[int] = None,
+    num_replicates: int = 10,
+    all_config: Optional[Tensor] = None,
+    name: str = "log_likelihood",
+    recompute: bool = False,
+    map_model: dict[str, EBM] = map_model,
+) -> float:
+    """Return the log-likelihood of a checkpoint on the provided data, reading it from the
+    archive when it has already been computed on the same data with the same settings.
+
+    Args:
+        filename (str): Path to the HDF5 training archive.
+        index (int): The update index of the checkpoint.
+        v_data (Tensor): Data to estimate the log likelihood.
+        w_data (Tensor): Weights associated to the samples.
+        device (torch.device): Device used for the computation.
+        dtype (torch.dtype): Dtype used for the computation.
+        method (str, optional): Estimator of the log partition function, either 'ais' or
+            'exact'. Defaults to 'ais'.
+        num_chains (Optional[int], optional): Number of chains for AIS. Defaults to None.
+        num_beta (Optional[int], optional): Number of temperatures for AIS. Defaults to None.
+        num_replicates (int, optional): Number of independent AIS runs used to estimate
+            the error. Defaults to 10.
+        all_config (Optional[Tensor], optional): Enumeration of all the configurations of one
+            of the layers for the exact computation. Defaults to None.
+        name (str, optional): Name under which the value is stored, e.g. to keep the train
+            and test log-likelihoods side by side. Defaults to 'log_likelihood'.
+        recompute (bool, optional): Ignore the cached values and overwrite them.
+            Defaults to False.
+
+    Returns:
+        float: Log-likelihood.
+    """
+    settings = _log_z_settings(
+        method=method,
+        dtype=dtype,
+        num_chains=num_chains,
+        num_beta=num_beta,
+        num_replicates=num_replicates,
+        all_config=all_config,
+    )
+    settings["data"] = get_data_fingerprint(v_data, w_data)
+    if not recompute:
+        cached = load_metric(filename, index, name, settings)
+        if cached is not None:
+            return float(cached[name])
+
+    params = load_params(
+        filename=filename, index=index, device=device, dtype=dtype, map_model=map_model
+    )
+    log_z = get_log_z(
+        filename=filename,
+        index=index,
+        device=device,
+        dtype=dtype,
+        method=method,
+        num_chains=num_chains,
+        num_beta=num_beta,
+        num_replicates=num_replicates,
+        all_config=all_config,
+        recompute=recompute,
+        params=params,
+        map_model=map_model,
+    )
+    ll = compute_log_likelihood(
+        v_data=v_data.to(device=device, dtype=dtype),
+        w_data=w_data.to(device=device, dtype=dtype),
+        params=params,
+        log_z=log_z,
+    )
+    save_metric(filename, index, name, {name: ll, "log_z": log_z}, settings)
+    return ll
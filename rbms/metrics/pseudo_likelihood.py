@@ -0,0 +1,49 @@
+from typing import Optional
+
+import torch
+from torch import Tensor
+
+from rbms.classes import EBM
+
+
+def compute_pseudo_log_likelihood(
+    params: EBM,
+    v_data: Tensor,
+    w_data: Optional[Tensor] = None,
+    batch_size: int = 1024,
+    max_elements: int = 2**24,
+) -> float:
+    """Compute the average pseudo log-likelihood of the model on a dataset.
+
+    The dataset is processed by batches which are moved to the device of the model one at a
+    time, so that the memory footprint does not depend on the number of samples.
+
+    Args:
+        params (EBM): Parameters of the model.
+        v_data (Tensor): Data samples, can be stored on a different device than the model.
+        w_data (Optional[Tensor], optional): Weights associated to the samples.
+            Defaults to None.
+        batch_size (int, optional): Number of samples processed at once. Defaults to 1024.
+        max_elements (int, optional): Maximum number of elements of the intermediate tensors
+            for each batch. Defaults to 2**24.
+
+    Returns:
+        float: Weighted average of the pseudo log-likelihood of the samples.
+    """
+    num_samples = v_data.shape[0]
+    if w_data is None:
+        w_data = torch.ones(num_samples, device=v_data.device)
+    w_data = w_data.view(-1)
+    pll = torch.zeros((), device=params.device, dtype=torch.float64)
+    for start in range(0, num_samples, batch_size):
+        v_batch = v_data[start : start + batch_size].to(
+            device=params.device, dtype=params.dtype
+        )
+        w_batch = w_data[start : start + batch_size].to(
+            device=params.device, dtype=torch.float64
+        )
+        pll_batch = params.compute_pseudo_log_likelihood(
+            v=v_batch, max_elements=max_elements
+        )
+        pll += pll_batch.to(torch.float64) @ w_batch
+    return (pll / w_data.sum().to(pll.device, torch.float64)).item()
@@ -0,0 +1,210 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, List, Optional, Tuple
+
+import h5py
+import numpy as np
+import torch
+from torch import Tensor
+
+from rbms.archive import get_saved_updates
+from rbms.io import load_metric, save_metric
+
+
+def _load_weight_matrix(checkpoint: h5py.Group) -> Tensor:
+    """Matrix of shape (num_visibles * num_states, num_hiddens), or a smaller matrix with
+    the same singular values, of the couplings of a checkpoint."""
+    params = checkpoint["params"]
+    if "weight_matrix" in params:
+        weight_matrix = params["weight_matrix"][()]
+        weight_matrix = weight_matrix.reshape(-1, weight_matrix.shape[-1])
+    elif "edges" in params:
+        # Couplings of the allowed edges of a sparse weight matrix
+        weight_values = params["weight_values"][()]
+        edges = params["edges"][()].astype(np.int64)
+        num_visibles = params["vbias"].shape[0]
+        num_hiddens = params["hbias"].shape[0]
+        weight_matrix = np.zeros(
+            (num_visibles, weight_values.shape[1], num_hiddens),
+            dtype=weight_values.dtype,
+        )
+        weight_matrix[edges[0], :, edges[1]] = weight_values
+        weight_matrix = weight_matrix.reshape(-1, num_hiddens)
+    else:
+        # Factorized weight matrix U V: its singular values are the ones of R V, with U = Q R
+        visible_factor = params["visible_factor"][()]
+        hidden_factor = params["hidden_factor"][()]
+        r = np.linalg.qr(visible_factor.reshape(-1, visible_factor.shape[-1]), mode="r")
+        weight_matrix = r @ hidden_factor
+    return torch.from_numpy(weight_matrix).to(torch.float64)
+
+
+def compute_top_singular_values(
+    weight_matrix: Tensor,
+    k: Optional[int] = None,
+    start: Optional[Tensor] = None,
+    num_iter: int = 2,
+    oversampling: int = 10,
+    generator: Optional[torch.Generator] = None,
+) -> Tuple[Tensor, Tensor]:
+    """Leading singular values and right singular vectors of a matrix, computed with a
+    randomized subspace iteration.
+
+    The iteration starts from `start` when it is provided, typically the right singular
+    vectors of the previous checkpoint of a training, which span a subspace close to the
+    one of `weight_matrix` so that fewer iterations are needed. The missing directions are
+    drawn at random.
+
+    Args:
+        weight_matrix (Tensor): Matrix of shape (M, N).
+        k (Optional[int], optional): Number of singular values. Defaults to all of them,
+            with a full SVD.
+        start (Optional[Tensor], optional): Initial subspace of shape (N, l).
+            Defaults to None.
+        num_iter (int, optional): Number of subspace iterations. Defaults to 2.
+        oversampling (int, optional): Number of additional directions of the subspace.
+            Defaults to 10.
+        generator (Optional[torch.Generator], optional): Random generator used to draw the
+            random directions. Defaults to None.
+
+    Returns:
+        Tuple[Tensor, Tensor]: The singular values in decreasing order, and the right
+        singular vectors of shape (N, k).
+    """
+    max_rank = min(weight_matrix.shape)
+    if k is None or k + oversampling >= max_rank:
+        _, s, vt = torch.linalg.svd(weight_matrix, full_matrices=False)
+        k = max_rank if k is None else min(k, max_rank)
+        return s[:k], vt[:k].T
+    if k <= 0:
+        raise ValueError(f"'k' should be positive, got {k}")
+
+    size = k + oversampling
+    omega = torch.randn(
+        weight_matrix.shape[1], size, dtype=weight_matrix.dtype, generator=generator
+    )
+    if start is not None:
+        num_start = min(start.shape[1], size)
+        omega[:, :num_start] = start[:, :num_start]
+    q, _ = torch.linalg.qr(weight_matrix @ omega)
+    for _ in range(num_iter):
+        z, _ = torch.linalg.qr(weight_matrix.T @ q)
+        q, _ = torch.linalg.qr(weight_matrix @ z)
+    _, s, vt = torch.linalg.svd(q.T @ weight_matrix, full_matrices=False)
+    return s[:k], vt[:k].T
+
+
+def _spectrum_worker(
+    filename: str,
+    updates: List[int],
+    k: Optional[int],
+    num_iter: int,
+    oversampling: int,
+    start: Optional[Tensor],
+    seed: int,
+) -> List[Tuple[Tensor, Tensor]]:
+    """Spectra of consecutive checkpoints, each one warm-starting the next one."""
+    generator = torch.Generator().manual_seed(seed)
+    results = []
+    with h5py.File(filename, "r") as f:
+        for update in updates:
+            singular_values, right_vectors = compute_top_singular_values(
+                _load_weight_matrix(f[f"update_{update}"]),
+                k=k,
+                start=start,
+                num_iter=num_iter,
+                oversampling=oversampling,
+                generator=generator,
+            )
+            start = right_vectors
+            results.append((singular_values, right_vectors))
+    return results
+
+
+def get_spectral_history(
+    filename: str,
+    k: Optional[int] = None,
+    num_iter: int = 2,
+    oversampling: int = 10,
+    num_workers: int = 1,
+    cache: bool = True,
+    recompute: bool = False,
+    seed: int = 0,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Leading singular values and right singular vectors of the weight matrix along
+    training.
+
+    The checkpoints are split in `num_workers` contiguous blocks processed in a pool of
+    processes. Within a block, the randomized SVD of each checkpoint starts from the
+    singular vectors of the previous one. The results are stored in the 'spectrum' metric
+    of each checkpoint, and read back on the next calls with the same settings.
+
+    Args:
+        filename (str): Path to the HDF5 training archive.
+        k (Optional[int], optional): Number of singular values. Defaults to all of them.
+        num_iter (int, optional): Number of subspace iterations of the randomized SVD.
+            Defaults to 2.
+        oversampling (int, optional): Number of additional directions of the randomized
+            SVD. Defaults to 10.
+        num_workers (int, optional): Number of processes. Defaults to 1.
+        cache (bool, optional): Store the results in the archive. Defaults to True.
+        recompute (bool, optional): Ignore the stored results. Defaults to False.
+        seed (int, optional): Seed of the random directions. Defaults to 0.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: The sorted updates, the singular values
+        of shape (num_checkpoints, k) and the right singular vectors of shape
+        (num_checkpoints, num_hiddens, k).
+    """
+    settings = {"k": k, "num_iter": num_iter, "oversampling": oversampling}
+    updates = get_saved_updates(filename).tolist()
+    results: dict[int, Tuple[Any, Any]] = {}
+    if cache and not recompute:
+        for update in updates:
+            cached = load_metric(filename, update, "spectrum", settings)
+            if cached is not None:
+                results[update] = (
+                    cached["singular_values"],
+                    cached["right_vectors"],
+                )
+    missing = [update for update in updates if update not in results]
+
+    if len(missing) > 0:
+        num_workers = max(min(num_workers, len(missing)), 1)
+        blocks = [block.tolist() for block in np.array_split(missing, num_workers)]
+        # Start from the closest earlier checkpoint already computed
+        starts = []
+        for block in blocks:
+            earlier = [u for u in results if u < block[0]]
+            starts.append(
+                torch.from_numpy(results[max(earlier)][1]) if len(earlier) > 0 else None
+            )
+        worker_args = [
+            (filename, block, k, num_iter, oversampling, start, seed + i)
+            for i, (block, start) in enumerate(zip(blocks, starts))
+        ]
+        if num_workers == 1:
+            computed = [_spectrum_worker(*worker_args[0])]
+        else:
+            with ProcessPoolExecutor(
+                max_workers=num_workers, mp_context=multiprocessing.get_context("spawn")
+            ) as executor:
+                computed = list(executor.map(_spectrum_worker, *zip(*worker_args)))
+        for block, block_results in zip(blocks, computed):
+            for update, (singular_values, right_vectors) in zip(block, block_results):
+                results[update] = (singular_values.numpy(), right_vectors.numpy())
+                if cache:
+                    save_metric(
+                        filename,
+                        update,
+                        "spectrum",
+                        {
+                            "singular_values": results[update][0],
+                            "right_vectors": results[update][1],
+                        },
+                        settings,
+                    )
+
+    singular_values = np.stack([results[update][0] for update in updates])
+    right_vectors = np.stack([results[update][1] for update in updates])
+    return np.array(updates), singular_values, right_vectors
@@ -3,6 +3,8 @@ from typing import Any
 
 import torch
 
+from rbms.const import PRUNE_THRESHOLD, SAMPLING_DTYPES
+
 
 def add_args_pytorch(parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
     """Add an argument group to the parser for pytorch device and dtype
@@ -24,6 +26,13 @@ def add_args_pytorch(parser: argparse.ArgumentParser) -> argparse.ArgumentParser
         default="float",
         help="(Defaults to float). The dtype to use in PyTorch.",
     )
+    pytorch_args.add_argument(
+        "--sampling_dtype",
+        type=str,
+        choices=list(SAMPLING_DTYPES.keys()),
+        default=None,
+        help="(Defaults to None). Perform the Gibbs steps of the training in this dtype while the parameters and the gradient stay in --dtype.",
+    )
     return parser
 
 
@@ -41,6 +50,13 @@ def add_args_saves(parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
         default="RBM.h5",
         help="(Defaults to RBM.h5). Path to the file where to save the model or load if training is restored.",
     )
+    save_args.add_argument(
+        "--archive_format",
+        type=int,
+        choices=[1, 2],
+        default=2,
+        help="(Defaults to 2). Layout of the archive of a new training. Version 2 stores the parameters once in compressed datasets and keeps an index of the checkpoints, version 1 is the layout of the previous releases.",
+    )
     save_args.add_argument(
         "--n_save",
         type=int,
@@ -69,6 +85,43 @@ def add_args_saves(parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
     save_args.add_argument(
         "--log", default=False, action="store_true", help="Log metrics during training."
     )
+    save_args.add_argument(
+        "--num_samples_pll",
+        type=int,
+        default=10_000,
+        help="(Defaults to 10 000). Number of training samples on which the pseudo log-likelihood is logged at each checkpoint.",
+    )
+    save_args.add_argument(
+        "--eval_interval",
+        type=int,
+        default=None,
+        help="(Defaults to None). Evaluate the model on a subset of the test set every eval_interval updates.",
+    )
+    save_args.add_argument(
+        "--num_samples_eval",
+        type=int,
+        default=2000,
+        help="(Defaults to 2000). Number of test samples used for the evaluation.",
+    )
+    save_args.add_argument(
+        "--eval_metric",
+        type=str,
+        default="pll_test",
+        choices=["pll_test", "mean_error", "corr_error", "aats"],
+        help="(Defaults to pll_test). Metric used to select the best model and for early stopping.",
+    )
+    save_args.add_argument(
+        "--patience",
+        type=int,
+        default=None,
+        help="(Defaults to None). Stop the training after patience evaluations without improvement of the metric.",
+    )
+    save_args.add_argument(
+        "--min_delta",
+        type=float,
+        default=0.0,
+        help="(Defaults to 0.0). Minimum change of the metric counted as an improvement.",
+    )
     save_args.add_argument(
         "--overwrite",
         default=True,
@@ -109,12 +162,44 @@ def add_args_rbm(parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
         default=0.01,
         help="(Defaults to 0.01). Learning rate.",
     )
+    rbm_args.add_argument(
+        "--optimizer",
+        type=str,
+        choices=["sgd", "momentum", "adam", "rmsprop"],
+        default="sgd",
+        help="(Defaults to sgd). Optimizer used for the gradient ascent. Its state is saved with each checkpoint.",
+    )
+    rbm_args.add_argument(
+        "--momentum",
+        type=float,
+        default=0.9,
+        help="(Defaults to 0.9). Momentum of the 'momentum' optimizer and first moment decay of 'adam'.",
+    )
+    rbm_args.add_argument(
+        "--lr_schedule",
+        type=str,
+        choices=["constant", "linear", "exp", "cosine"],
+        default="constant",
+        help="(Defaults to constant). Evolution of the learning rate from --learning_rate to --learning_rate_final over the training.",
+    )
+    rbm_args.add_argument(
+        "--learning_rate_final",
+        type=float,
+        default=None,
+        help="(Defaults to learning_rate / 100). Learning rate at the end of the training for the non-constant schedules.",
+    )
     rbm_args.add_argument(
         "--num_chains",
         type=int,
         default=2000,
         help="(Defaults to 2000). Number of parallel chains.",
     )
+    rbm_args.add_argument(
+        "--reservoir_size",
+        type=int,
+        default=None,
+        help="(Defaults to None). Size of the pool of permanent chains. When set, only a rotating subset of num_chains chains of the pool is sampled and used at each update, the pool being stored on the host.",
+    )
     rbm_args.add_argument(
         "--num_updates",
         default=10_000,
@@ -133,6 +218,91 @@ def add_args_rbm(parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
         action="store_true",
         help="(Defaults to False). Restore the training",
     )
+    rbm_args.add_argument(
+        "--compile",
+        default=False,
+        action="store_true",
+        help="(Defaults to False). Compile the training update with torch.compile.",
+    )
+    rbm_args.add_argument(
+        "--adaptive_gibbs_steps",
+        default=False,
+        action="store_true",
+        help="(Defaults to False). Adapt the number of Gibbs steps of each update to the energy autocorrelation of the permanent chains, starting from --gibbs_steps.",
+    )
+    rbm_args.add_argument(
+        "--min_gibbs_steps",
+        type=int,
+        default=1,
+        help="(Defaults to 1). Lower bound on the number of Gibbs steps with --adaptive_gibbs_steps.",
+    )
+    rbm_args.add_argument(
+        "--max_gibbs_steps",
+        type=int,
+        default=100,
+        help="(Defaults to 100). Upper bound on the number of Gibbs steps with --adaptive_gibbs_steps.",
+    )
+    rbm_args.add_argument(
+        "--target_autocorr",
+        type=float,
+        default=0.5,
+        help="(Defaults to 0.5). Target correlation between the energies of the chains before and after an update with --adaptive_gibbs_steps.",
+    )
+    rbm_args.add_argument(
+        "--num_workers",
+        type=int,
+        default=1,
+        help="(Defaults to 1). Number of CPU processes sharing the chains and the minibatches. The gradient statistics are all-reduced with the gloo backend.",
+    )
+    rbm_args.add_argument(
+        "--init",
+        type=str,
+        default="random",
+        choices=["random", "mean_field"],
+        help="(Defaults to random). Initialization of the parameters. 'mean_field' sets the leading modes of the weight matrix from the covariance matrix of the dataset.",
+    )
+    rbm_args.add_argument(
+        "--rank",
+        type=int,
+        default=None,
+        help="(Defaults to None). Rank of the weight matrix. When set, the weight matrix is stored as the product of two factors (LowRankPBRBM), binary variables being treated as Potts variables with 2 states.",
+    )
+    rbm_args.add_argument(
+        "--num_connections",
+        type=int,
+        default=None,
+        help="(Defaults to None). Number of visible sites connected to each hidden unit. When set, the RBM has a sparse connectivity (SparsePBRBM), binary variables being treated as Potts variables with 2 states.",
+    )
+    rbm_args.add_argument(
+        "--prune_interval",
+        type=int,
+        default=None,
+        help="(Defaults to None). Remove the edges of a sparse RBM whose couplings have a norm below prune_threshold every prune_interval updates.",
+    )
+    rbm_args.add_argument(
+        "--prune_threshold",
+        type=float,
+        default=PRUNE_THRESHOLD,
+        help="(Defaults to 1e-3). Minimum norm of the couplings of the edges kept by the pruning.",
+    )
+    rbm_args.add_argument(
+        "--jarzynski",
+        default=False,
+        action="store_true",
+        help="(Defaults to False). Accumulate importance weights on the permanent chains from the change of their energy at each update of the parameters, and use them in the gradient.",
+    )
+    rbm_args.add_argument(
+        "--ess_threshold",
+        type=float,
+        default=0.5,
+        help="(Defaults to 0.5). With --jarzynski, the chains are resampled when their normalized effective sample size drops below this threshold.",
+    )
+    rbm_args.add_argument(
+        "--chunk_size",
+        type=int,
+        default=None,
+        help="(Defaults to None). Stream the minibatch and the permanent chains in blocks of chunk_size samples when sampling and computing the gradient.",
+    )
     return parser
 
 
@@ -145,6 +315,9 @@ def remove_argument(parser, arg):
         opts = action.option_strings
         if (opts and opts[0] == arg) or action.dest == arg:
             parser._remove_action(action)
+            # The option would still be parsed otherwise
+            for opt in opts:
+                parser._option_string_actions.pop(opt, None)
             break
 
     for action in parser._action_groups:
@@ -165,4 +338,6 @@ def match_args_dtype(args: dict[str, Any]) -> dict[str, Any]:
             args["dtype"] = torch.float32
         case "double":
             args["dtype"] = torch.float64
+    if args.get("sampling_dtype", None) is not None:
+        args["sampling_dtype"] = SAMPLING_DTYPES[args["sampling_dtype"]]
     return args
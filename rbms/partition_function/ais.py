@@ -6,6 +6,9 @@ from torch import Tensor
 
 from rbms.classes import EBM
 
+# Maximal number of chain indices drawn at once for the bootstrap
+BOOTSTRAP_BATCH_ELEMENTS = 2**22
+
 
 def update_weights_ais(
     prev_params: EBM,
@@ -40,19 +43,17 @@ def interpolate_ebm(
         yield params_1 * (1 - step) + params_2 * step
 
 
-def compute_partition_function_ais(
-    num_chains: int, num_beta: int, params: EBM
-) -> float:
-    """Compute the log partition function using Annealed Importance Sampling with temperature.
+def _run_ais(num_chains: int, num_beta: int, params: EBM) -> Tuple[Tensor, float]:
+    """Anneal a population of chains from the independent model to the target model.
 
     Args:
         num_chains (int): Number of parallel chains for sampling.
         num_beta (int): Number of temperature steps.
-        params (RBM): Parameters of the RBM.
-        vbias_ref (Optional[Tensor], optional): Reference visible bias. Defaults to None.
+        params (EBM): Parameters of the EBM.
 
     Returns:
-        float: The computed log partition function.
+        Tuple[Tensor, float]: The final log weights of each chain and the log partition
+        function of the reference model.
     """
     device = params.device
 
@@ -81,5 +82,106 @@ def compute_partition_function_ais(
             chains=chains,
             log_weights=log_weights,
         )
+    return log_weights, log_z_init
+
+
+def compute_partition_function_ais(num_chains: int, num_beta: int, params: EBM) -> float:
+    """Compute the log partition function using Annealed Importance Sampling with temperature.
+
+    Args:
+        num_chains (int): Number of parallel chains for sampling.
+        num_beta (int): Number of temperature steps.
+        params (RBM): Parameters of the RBM.
+
+    Returns:
+        float: The computed log partition function.
+    """
+    log_weights, log_z_init = _run_ais(
+        num_chains=num_chains, num_beta=num_beta, params=params
+    )
     log_z = torch.logsumexp(log_weights, 0) - np.log(num_chains) + log_z_init
     return log_z.item()
+
+
+def compute_partition_function_ais_stats(
+    num_chains: int,
+    num_beta: int,
+    params: EBM,
+    num_replicates: int = 10,
+    num_bootstrap: int = 1000,
+) -> dict[str, float]:
+    """Compute the log partition function using Annealed Importance Sampling together with
+    estimates of its reliability.
+
+    The chains are split into `num_replicates` groups which are annealed together as a single
+    batched population but provide independent estimates of the log partition function.
+
+    Args:
+        num_chains (int): Number of parallel chains for sampling.
+        num_beta (int): Number of temperature steps.
+        params (EBM): Parameters of the EBM.
+        num_replicates (int, optional): Number of independent AIS runs among the chains.
+            Defaults to 10.
+        num_bootstrap (int, optional): Number of bootstrap resamplings of the final weights.
+            Defaults to 1000.
+
+    Returns:
+        dict[str, float]: A dictionary containing:
+            - 'log_z': The log partition function estimated on all the chains.
+            - 'std_err': Bootstrap standard error of 'log_z'.
+            - 'replicate_std_err': Standard error of 'log_z' estimated from the spread of
+              the independent replicates.
+            - 'ess': Effective sample size of the final importance weights.
+            - 'log_weights_var': Variance of the final log weights.
+    """
+    if num_replicates < 1 or num_replicates > num_chains:
+        raise ValueError(
+            f"'num_replicates' should be between 1 and num_chains ({num_chains}), got {num_replicates}"
+        )
+    log_weights, log_z_init = _run_ais(
+        num_chains=num_chains, num_beta=num_beta, params=params
+    )
+    log_weights = log_weights.to(torch.float64)
+    device = log_weights.device
+
+    log_z = torch.logsumexp(log_weights, 0) - np.log(num_chains) + log_z_init
+
+    # Bootstrap over the chains, the resamplings are drawn in batches of at most
+    # BOOTSTRAP_BATCH_ELEMENTS indices to bound the memory
+    batch_size = max(BOOTSTRAP_BATCH_ELEMENTS // num_chains, 1)
+    log_z_bootstrap = []
+    for start in range(0, num_bootstrap, batch_size):
+        idx = torch.randint(
+            0,
+            num_chains,
+            (min(batch_size, num_bootstrap - start), num_chains),
+            device=device,
+        )
+        log_z_bootstrap.append(torch.logsumexp(log_weights[idx], 1))
+    std_err = (torch.cat(log_z_bootstrap) - np.log(num_chains)).std()
+
+    # Independent replicates
+    groups = torch.arange(num_chains, device=device) % num_replicates
+    log_z_replicates = torch.stack(
+        [
+            torch.logsumexp(log_weights[groups == r], 0)
+            - np.log((groups == r).sum().item())
+            for r in range(num_replicates)
+        ]
+    )
+    if num_replicates > 1:
+        replicate_std_err = log_z_replicates.std() / np.sqrt(num_replicates)
+    else:
+        replicate_std_err = torch.tensor(float("nan"))
+
+    # Effective sample size of the normalized weights
+    ess = torch.exp(
+        2 * torch.logsumexp(log_weights, 0) - torch.logsumexp(2 * log_weights, 0)
+    )
+    return {
+        "log_z": log_z.item(),
+        "std_err": std_err.item(),
+        "replicate_std_err": replicate_std_err.item(),
+        "ess": ess.item(),
+        "log_weights_var": log_weights.var().item(),
+    }
@@ -1,10 +1,11 @@
-from typing import Optional, Tuple
+from typing import Dict, Optional, Tuple
 
 import torch
 from torch import Tensor
-from torch.nn.functional import softmax
+from torch.nn.functional import softmax, softplus
 
 from rbms.custom_fn import one_hot
+from rbms.mean_field import get_covariance_matrix, get_mean_field_low_rank_weights
 
 
 @torch.jit.script
@@ -85,6 +86,42 @@ def _compute_energy_hiddens(
     return -field - lse
 
 
+@torch.jit.script
+def _compute_pseudo_log_likelihood(
+    v: Tensor,
+    vbias: Tensor,
+    hbias: Tensor,
+    weight_matrix: Tensor,
+    max_elements: int = 16777216,
+) -> Tensor:
+    dtype = weight_matrix.dtype
+    num_visibles, num_states, num_hiddens = weight_matrix.shape
+    num_samples = v.shape[0]
+    v_int = v.to(torch.int64)
+    v_oh = one_hot(v.to(torch.int32), num_classes=num_states, dtype=dtype).view(
+        -1, num_visibles * num_states
+    )
+    weight_matrix_oh = weight_matrix.view(num_visibles * num_states, num_hiddens)
+    # The hidden field is computed once, each change of state is a rank-1 update of it
+    field = hbias + (v_oh @ weight_matrix_oh)
+    block_size = max(1, max_elements // max(1, num_samples * num_states * num_hiddens))
+    pll = torch.zeros(num_samples, device=v.device, dtype=dtype)
+    for start in range(0, num_visibles, block_size):
+        end = min(start + block_size, num_visibles)
+        sites = torch.arange(end - start, device=v.device)
+        weight_block = weight_matrix[start:end]
+        # (num_samples, block, num_hiddens) couplings of the current states
+        weight_curr = weight_block[sites.unsqueeze(0), v_int[:, start:end]]
+        field_states = (field.unsqueeze(1) - weight_curr).unsqueeze(2) + weight_block
+        # Minus the free energy of each state of each site, up to a constant
+        neg_free_energy = vbias[start:end] + softplus(field_states).sum(3)
+        neg_free_energy_curr = neg_free_energy.gather(
+            2, v_int[:, start:end].unsqueeze(2)
+        ).squeeze(2)
+        pll += (neg_free_energy_curr - torch.logsumexp(neg_free_energy, 2)).sum(1)
+    return pll
+
+
 @torch.jit.script
 def _compute_gradient(
     v_data: Tensor,
@@ -98,8 +135,69 @@ def _compute_gradient(
     weight_matrix: Tensor,
     centered: bool = True,
 ):
+    num_visibles, num_states, num_hiddens = weight_matrix.shape
+    dtype = weight_matrix.dtype
+    # Flat views of the gradients, written in place
+    grad_weight_matrix = weight_matrix.grad.view(num_visibles * num_states, num_hiddens)
+    grad_vbias = vbias.grad.view(-1)
+    grad_hbias = hbias.grad
+
+    # One-hot representation of the data
+    v_data_one_hot = one_hot(
+        v_data.to(torch.int32), num_classes=num_states, dtype=dtype
+    ).view(-1, num_visibles * num_states)
+    v_gen_one_hot = one_hot(
+        v_chain.to(torch.int32), num_classes=num_states, dtype=dtype
+    ).view(-1, num_visibles * num_states)
+
+    # Normalized weights of the data and of the chains
+    w_data = w_data.view(-1)
+    w_data = w_data / w_data.sum()
+    chain_weights = softmax(-w_chain.view(-1), dim=0)
+
+    # Averages over data and generated samples
+    v_data_mean = w_data @ v_data_one_hot
+    h_data_mean = w_data @ mh_data
+    v_gen_mean = chain_weights @ v_gen_one_hot
+    h_gen_mean = chain_weights @ h_chain
+    torch.clamp_(v_data_mean, min=1e-7, max=(1.0 - 1e-7))
+    torch.clamp_(v_gen_mean, min=1e-7, max=(1.0 - 1e-7))
+
+    if centered:
+        # The centered products are not weighted, they differ from the uncentered ones
+        # by rank-one terms
+        torch.mm(v_data_one_hot.T, mh_data, out=grad_weight_matrix)
+        grad_weight_matrix.div_(v_data.shape[0])
+        grad_weight_matrix.addmm_(v_gen_one_hot.T, h_chain, alpha=-1.0 / v_chain.shape[0])
+        grad_weight_matrix.addr_(v_data_mean, h_chain.mean(0) - mh_data.mean(0))
+        grad_weight_matrix.addr_(
+            v_gen_one_hot.mean(0) - v_data_one_hot.mean(0), h_data_mean
+        )
+    else:
+        torch.mm(v_data_one_hot.T, mh_data * w_data.unsqueeze(1), out=grad_weight_matrix)
+        grad_weight_matrix.addmm_(
+            v_gen_one_hot.T, h_chain * chain_weights.unsqueeze(1), alpha=-1.0
+        )
+    torch.sub(v_data_mean, v_gen_mean, out=grad_vbias)
+    torch.sub(h_data_mean, h_gen_mean, out=grad_hbias)
+    if centered:
+        grad_vbias.addmv_(grad_weight_matrix, h_data_mean, alpha=-1.0)
+        grad_hbias.addmv_(grad_weight_matrix.T, v_data_mean, alpha=-1.0)
+
+
+@torch.jit.script
+def _compute_gradient_statistics(
+    v_data: Tensor,
+    mh_data: Tensor,
+    w_data: Tensor,
+    v_chain: Tensor,
+    h_chain: Tensor,
+    w_chain: Tensor,
+    weight_matrix: Tensor,
+    log_weight_shift: Tensor,
+    centered: bool = True,
+) -> Dict[str, Tensor]:
     w_data = w_data.view(-1, 1, 1)
-    w_chain = w_chain.view(-1, 1, 1)
     int_dtype = torch.int32
     dtype = weight_matrix.dtype
     num_states = weight_matrix.shape[1]
@@ -108,38 +206,87 @@ def _compute_gradient(
     v_data_one_hot = one_hot(v_data.to(int_dtype), num_classes=num_states, dtype=dtype)
     v_gen_one_hot = one_hot(v_chain.to(int_dtype), num_classes=num_states, dtype=dtype)
 
-    # Turn the weights of the chains into normalized weights
-    chain_weights = softmax(-w_chain, dim=0)
-    w_chain_norm = chain_weights.sum()
-    w_data_norm = w_data.sum()
+    # Unnormalized weights of the chains, the shift must be the same on all the shards
+    chain_weights = torch.exp(-w_chain.view(-1, 1, 1) - log_weight_shift)
+    statistics = {
+        "data_norm": w_data.sum(),
+        "data_v": (v_data_one_hot * w_data).sum(0),
+        "data_h": (mh_data * w_data.view(-1, 1)).sum(0),
+        "chain_norm": chain_weights.sum(),
+        "chain_v": (v_gen_one_hot * chain_weights).sum(0),
+        "chain_h": (h_chain * chain_weights.view(-1, 1)).sum(0),
+    }
+    if centered:
+        # The centered second moments are not weighted
+        statistics["data_count"] = torch.tensor(
+            float(v_data.shape[0]), device=weight_matrix.device, dtype=dtype
+        )
+        statistics["data_v_sum"] = v_data_one_hot.sum(0)
+        statistics["data_h_sum"] = mh_data.sum(0)
+        statistics["data_vh"] = torch.tensordot(v_data_one_hot, mh_data, dims=[[0], [0]])
+        statistics["chain_count"] = torch.tensor(
+            float(v_chain.shape[0]), device=weight_matrix.device, dtype=dtype
+        )
+        statistics["chain_v_sum"] = v_gen_one_hot.sum(0)
+        statistics["chain_h_sum"] = h_chain.sum(0)
+        statistics["chain_vh"] = torch.tensordot(v_gen_one_hot, h_chain, dims=[[0], [0]])
+    else:
+        statistics["data_vh"] = torch.tensordot(
+            v_data_one_hot * w_data, mh_data, dims=[[0], [0]]
+        )
+        statistics["chain_vh"] = torch.tensordot(
+            v_gen_one_hot * chain_weights, h_chain, dims=[[0], [0]]
+        )
+    return statistics
+
+
+def _centered_second_moment(
+    vh_sum: Tensor,
+    v_sum: Tensor,
+    h_sum: Tensor,
+    count: Tensor,
+    v_center: Tensor,
+    h_center: Tensor,
+) -> Tensor:
+    # sum_n (v_n - v_center)(h_n - h_center) / count
+    return (
+        vh_sum
+        - v_center.unsqueeze(-1) * h_sum
+        - v_sum.unsqueeze(-1) * h_center
+        + count * v_center.unsqueeze(-1) * h_center
+    ) / count
+
+
+@torch.jit.script
+def _compute_gradient_from_statistics(
+    statistics: Dict[str, Tensor],
+    vbias: Tensor,
+    hbias: Tensor,
+    weight_matrix: Tensor,
+    centered: bool = True,
+) -> None:
     # Averages over data and generated samples
-    v_data_mean = (v_data_one_hot * w_data).sum(0) / w_data_norm
-    h_data_mean = (mh_data * w_data.view(-1, 1)).sum(0) / w_data_norm
-    v_gen_mean = (v_gen_one_hot * chain_weights).sum(0) / w_chain_norm
-    h_gen_mean = (h_chain * chain_weights.view(-1, 1)).sum(0) / w_chain_norm
+    v_data_mean = statistics["data_v"] / statistics["data_norm"]
+    h_data_mean = statistics["data_h"] / statistics["data_norm"]
+    v_gen_mean = statistics["chain_v"] / statistics["chain_norm"]
+    h_gen_mean = statistics["chain_h"] / statistics["chain_norm"]
     torch.clamp_(v_data_mean, min=1e-7, max=(1.0 - 1e-7))
     torch.clamp_(v_gen_mean, min=1e-7, max=(1.0 - 1e-7))
     if centered:
-        # Centered variables
-        v_data_centered = v_data_one_hot - v_data_mean
-        h_data_centered = mh_data - h_data_mean
-        v_gen_centered = v_gen_one_hot - v_data_mean
-        h_gen_centered = h_chain - h_data_mean
-
-        # Gradient
-        grad_weight_matrix = (
-            torch.tensordot(
-                v_data_centered,
-                h_data_centered,
-                dims=[[0], [0]],
-            )
-            / v_data.shape[0]
-            - torch.tensordot(
-                v_gen_centered,
-                h_gen_centered,
-                dims=[[0], [0]],
-            )
-            / v_chain.shape[0]
+        grad_weight_matrix = _centered_second_moment(
+            statistics["data_vh"],
+            statistics["data_v_sum"],
+            statistics["data_h_sum"],
+            statistics["data_count"],
+            v_data_mean,
+            h_data_mean,
+        ) - _centered_second_moment(
+            statistics["chain_vh"],
+            statistics["chain_v_sum"],
+            statistics["chain_h_sum"],
+            statistics["chain_count"],
+            v_data_mean,
+            h_data_mean,
         )
         grad_vbias = (
             v_data_mean
@@ -152,26 +299,15 @@ def _compute_gradient(
             - torch.tensordot(v_data_mean, grad_weight_matrix, dims=[[0, 1], [0, 1]])
         )
     else:
-        v_data_centered = v_data_one_hot
-        h_data_centered = mh_data
-        v_gen_centered = v_gen_one_hot
-        h_gen_centered = h_chain
-
-        # Gradient
-        grad_weight_matrix = torch.tensordot(
-            (v_data_one_hot * w_data),
-            mh_data,
-            dims=[[0], [0]],
-        ) / w_data_norm - torch.tensordot(
-            (v_gen_one_hot * chain_weights),
-            h_chain,
-            dims=[[0], [0]],
+        grad_weight_matrix = (
+            statistics["data_vh"] / statistics["data_norm"]
+            - statistics["chain_vh"] / statistics["chain_norm"]
         )
         grad_vbias = v_data_mean - v_gen_mean
         grad_hbias = h_data_mean - h_gen_mean
-    weight_matrix.grad.set_(grad_weight_matrix)
-    vbias.grad.set_(grad_vbias)
-    hbias.grad.set_(grad_hbias)
+    weight_matrix.grad.copy_(grad_weight_matrix)
+    vbias.grad.copy_(grad_vbias)
+    hbias.grad.copy_(grad_hbias)
 
 
 def _init_chains(
@@ -230,3 +366,85 @@ def _init_parameters(
         * var_init
     )
     return vbias, hbias, weight_matrix
+
+
+def _init_parameters_mean_field(
+    num_hiddens: int,
+    data: Tensor,
+    weights: Tensor,
+    device: torch.device,
+    dtype: torch.dtype,
+    var_init: float = 1e-4,
+) -> Tuple[Tensor, Tensor, Tensor]:
+    num_samples, num_visibles = data.shape
+    eps = 1e-4
+    num_states = int(torch.max(data) + 1)
+    cov_matrix = get_covariance_matrix(
+        data=data, weights=weights, center=True, device=device
+    ).to(torch.float64)
+    if num_states == 2:
+        # get_covariance_matrix does not one-hot encode binary variables
+        cov_matrix = torch.kron(
+            cov_matrix,
+            torch.tensor([[1.0, -1.0], [-1.0, 1.0]], device=device, dtype=torch.float64),
+        )
+    data_one_hot = one_hot(
+        data.to(device=device, dtype=torch.int32),
+        num_classes=num_states,
+        dtype=torch.float64,
+    ).view(num_samples, num_visibles * num_states)
+    weights = weights.view(-1).to(device=device, dtype=torch.float64)
+    frequencies = (weights @ data_one_hot) / weights.sum()
+    frequencies = torch.clamp(frequencies, min=eps, max=(1.0 - eps))
+    # The variances of the one-hot variables are replaced by the frequencies, so that the
+    # whitened covariance of an independent model has eigenvalues 0 and 1
+    weight_matrix, _ = get_mean_field_low_rank_weights(
+        cov_matrix=cov_matrix, variances=frequencies, num_hiddens=num_hiddens
+    )
+    weight_matrix += torch.randn_like(weight_matrix) * var_init
+    # The input of the hidden units vanishes on the mean of the data
+    hbias = -frequencies @ weight_matrix
+    vbias = (torch.log(frequencies) - 0.5 * weight_matrix.sum(1)).view(
+        num_visibles, num_states
+    )
+    vbias -= vbias.mean(1, keepdim=True)
+    return (
+        vbias.to(device=device, dtype=dtype),
+        hbias.to(device=device, dtype=dtype),
+        weight_matrix.view(num_visibles, num_states, num_hiddens).to(
+            device=device, dtype=dtype
+        ),
+    )
+
+
+def _init_parameters_from_method(
+    init: str,
+    num_hiddens: int,
+    data: Tensor,
+    weights: Tensor,
+    device: torch.device,
+    dtype: torch.dtype,
+    var_init: float = 1e-4,
+) -> Tuple[Tensor, Tensor, Tensor]:
+    match init:
+        case "random":
+            return _init_parameters(
+                num_hiddens=num_hiddens,
+                data=data,
+                device=device,
+                dtype=dtype,
+                var_init=var_init,
+            )
+        case "mean_field":
+            return _init_parameters_mean_field(
+                num_hiddens=num_hiddens,
+                data=data,
+                weights=weights,
+                device=device,
+                dtype=dtype,
+                var_init=var_init,
+            )
+        case _:
+            raise ValueError(
+                f"'init' should be one of ['random', 'mean_field'], got {init}"
+            )
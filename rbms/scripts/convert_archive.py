@@ -0,0 +1,33 @@
+import argparse
+
+from rbms.io import convert_archive
+from rbms.utils import check_file_existence
+
+
+def create_parser():
+    parser = argparse.ArgumentParser(
+        "Convert a training archive to the compressed layout of version 2"
+    )
+    parser.add_argument("-i", "--filename", type=str, help="Archive to convert")
+    parser.add_argument(
+        "-o", "--out_file", type=str, help="Path of the converted archive"
+    )
+    parser.add_argument(
+        "--overwrite",
+        default=False,
+        action="store_true",
+        help="(Defaults to False). Overwrite the output file if it exists.",
+    )
+    return parser
+
+
+def main():
+    parser = create_parser()
+    args = vars(parser.parse_args())
+    if not (args["overwrite"]):
+        check_file_existence(args["out_file"])
+    convert_archive(filename=args["filename"], out_file=args["out_file"])
+
+
+if __name__ == "__main__":
+    main()
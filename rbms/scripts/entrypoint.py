@@ -10,7 +10,9 @@ def main():
 
     # Check if the first positional argument is provided
     if len(sys.argv) < 2:
-        print("Error: No command provided. Use 'train' or 'pt_sampling'.")
+        print(
+            "Error: No command provided. Use 'train', 'train_ensemble', 'pt_sampling' or 'convert_archive'."
+        )
         sys.exit(1)
 
     # Assign the first positional argument to a variable
@@ -22,8 +24,15 @@ def main():
             SCRIPT = "train_rbm.py"
         case "pt_sampling":
             SCRIPT = "pt_sampling.py"
+        case "train_ensemble":
+            SCRIPT = "train_ensemble.py"
+        case "convert_archive":
+            SCRIPT = "convert_archive.py"
         case _:
-            print(f"Error: Invalid command '{COMMAND}'. Use 'train' or 'pt_sampling'.")
+            print(
+                f"Error: Invalid command '{COMMAND}'. "
+                "Use 'train', 'train_ensemble', 'pt_sampling' or 'convert_archive'."
+            )
             sys.exit(1)
 
     # Run the corresponding Python script with the remaining optional arguments
@@ -5,7 +5,7 @@ import h5py
 from rbms.classes import RBM
 from rbms.io import load_params
 from rbms.map_model import map_model
-from rbms.parser import add_args_pytorch, match_args_dtype
+from rbms.parser import add_args_pytorch, match_args_dtype, remove_argument
 from rbms.sampling.pt import pt_sampling
 from rbms.utils import check_file_existence, get_saved_updates
 
@@ -49,6 +49,7 @@ def create_parser():
         help="(Defaults to 1). Number of Gibbs steps to perform between each swap.",
     )
     parser = add_args_pytorch(parser)
+    remove_argument(parser, "sampling_dtype")
 
     return parser
 
@@ -0,0 +1,140 @@
+import pathlib
+
+from rbms.dataset import load_dataset
+from rbms.map_model import map_model
+from rbms.parser import match_args_dtype, remove_argument
+from rbms.scripts.train_rbm import create_parser as create_parser_train
+from rbms.training.ensemble import train_ensemble
+from rbms.training.utils import get_checkpoints
+
+
+def create_parser():
+    parser = create_parser_train()
+    parser.description = "Train several Restricted Boltzmann Machines together"
+    # The models are trained with plain PCD and no evaluation
+    for arg in [
+        "importance_sampling",
+        "optimizer",
+        "momentum",
+        "lr_schedule",
+        "learning_rate_final",
+        "adaptive_gibbs_steps",
+        "min_gibbs_steps",
+        "max_gibbs_steps",
+        "target_autocorr",
+        "chunk_size",
+        "log",
+        "num_samples_pll",
+        "eval_interval",
+        "num_samples_eval",
+        "eval_metric",
+        "patience",
+        "min_delta",
+        "compile",
+        "num_workers",
+        "sampling_dtype",
+        "rank",
+        "num_connections",
+        "prune_interval",
+        "prune_threshold",
+        "reservoir_size",
+        "jarzynski",
+        "ess_threshold",
+    ]:
+        remove_argument(parser, arg)
+    # The per-model options replace the ones of the train script
+    parser.conflict_handler = "resolve"
+    ensemble_args = parser.add_argument_group("Ensemble")
+    ensemble_args.add_argument(
+        "--num_hiddens",
+        type=int,
+        nargs="+",
+        default=[100],
+        help="(Defaults to 100). Number of hidden units of each model.",
+    )
+    ensemble_args.add_argument(
+        "--learning_rate",
+        type=float,
+        nargs="+",
+        default=[0.01],
+        help="(Defaults to 0.01). Learning rate of each model.",
+    )
+    ensemble_args.add_argument(
+        "--seeds",
+        type=int,
+        nargs="+",
+        default=[0],
+        help="(Defaults to 0). Seed of each model.",
+    )
+    ensemble_args.add_argument(
+        "-o",
+        "--filename",
+        type=str,
+        default="RBM.h5",
+        help="(Defaults to RBM.h5). The model i is saved to '<stem>_<i>.h5'.",
+    )
+    return parser
+
+
+def train_ensemble_rbm(args: dict):
+    # Options given once are shared by all the models
+    num_models = max(
+        len(args["num_hiddens"]), len(args["learning_rate"]), len(args["seeds"])
+    )
+    for k in ["num_hiddens", "learning_rate", "seeds"]:
+        if len(args[k]) == 1:
+            args[k] = args[k] * num_models
+        elif len(args[k]) != num_models:
+            raise ValueError(
+                f"'{k}' should have 1 or {num_models} values, got {len(args[k])}"
+            )
+    filename = pathlib.Path(args["filename"])
+    filenames = [
+        filename.parent / f"{filename.stem}_{i}{filename.suffix}"
+        for i in range(num_models)
+    ]
+
+    checkpoints = get_checkpoints(
+        num_updates=args["num_updates"], n_save=args["n_save"], spacing=args["spacing"]
+    )
+    train_dataset, _ = load_dataset(
+        dataset_name=args["data"],
+        subset_labels=args["subset_labels"],
+        use_weights=args["use_weights"],
+        alphabet=args["alphabet"],
+        binarize=args["binarize"],
+        train_size=args["train_size"],
+        test_size=args["test_size"],
+        device=args["device"],
+        dtype=args["dtype"],
+        in_memory=not args.get("on_disk", False),
+    )
+    print(train_dataset)
+    if train_dataset.is_binary:
+        model_type = "BBRBM"
+    else:
+        model_type = "PBRBM"
+    train_ensemble(
+        dataset=train_dataset,
+        model_type=model_type,
+        filenames=filenames,
+        num_hiddens=args["num_hiddens"],
+        learning_rates=args["learning_rate"],
+        seeds=args["seeds"],
+        args=args,
+        dtype=args["dtype"],
+        checkpoints=checkpoints,
+        map_model=map_model,
+    )
+
+
+def main():
+    parser = create_parser()
+    args = parser.parse_args()
+    args = vars(args)
+    args = match_args_dtype(args)
+    train_ensemble_rbm(args=args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import argparse
+import os
 
 import torch
 
@@ -12,6 +13,7 @@ from rbms.parser import (
     match_args_dtype,
     remove_argument,
 )
+from rbms.training.distributed import launch_distributed_training
 from rbms.training.pcd import train
 from rbms.training.utils import get_checkpoints
 
@@ -40,21 +42,41 @@ def train_rbm(args: dict):
         test_size=args["test_size"],
         device=args["device"],
         dtype=args["dtype"],
+        in_memory=not args.get("on_disk", False),
     )
     print(train_dataset)
-    if train_dataset.is_binary:
+    if args.get("rank") is not None and args.get("num_connections") is not None:
+        raise ValueError("'rank' and 'num_connections' cannot be used together.")
+    if args.get("rank") is not None:
+        model_type = "LowRankPBRBM"
+    elif args.get("num_connections") is not None:
+        model_type = "SparsePBRBM"
+    elif train_dataset.is_binary:
         model_type = "BBRBM"
     else:
         model_type = "PBRBM"
-    train(
-        dataset=train_dataset,
-        test_dataset=test_dataset,
-        model_type=model_type,
-        args=args,
-        dtype=args["dtype"],
-        checkpoints=checkpoints,
-        map_model=map_model,
-    )
+    num_workers = args.get("num_workers", 1)
+    if num_workers > 1 or "WORLD_SIZE" in os.environ:
+        launch_distributed_training(
+            dataset=train_dataset,
+            test_dataset=test_dataset,
+            model_type=model_type,
+            args=args,
+            dtype=args["dtype"],
+            checkpoints=checkpoints,
+            num_workers=num_workers,
+            map_model=map_model,
+        )
+    else:
+        train(
+            dataset=train_dataset,
+            test_dataset=test_dataset,
+            model_type=model_type,
+            args=args,
+            dtype=args["dtype"],
+            checkpoints=checkpoints,
+            map_model=map_model,
+        )
 
 
 def main():
@@ -0,0 +1,384 @@
+from typing import List, Optional
+
+import numpy as np
+import torch
+from torch import Tensor
+
+from rbms.classes import RBM
+from rbms.sparse_potts_bernoulli.implement import (
+    _compute_energy,
+    _compute_energy_hiddens,
+    _compute_energy_visibles,
+    _compute_gradient,
+    _compute_pseudo_log_likelihood,
+    _dense_weight_block,
+    _init_chains,
+    _init_parameters,
+    _init_parameters_mean_field,
+    _sample_hiddens,
+    _sample_visibles,
+    _sparse_structure,
+)
+
+
+class SparsePBRBM(RBM):
+    """Parameters of the Potts-Bernoulli RBM with a sparse connectivity.
+
+    Each hidden unit is only connected to a subset of the visible sites. The allowed edges
+    are stored in `edges`, of shape (2, num_edges), whose rows are the visible sites and the
+    hidden units, and their couplings in `weight_values`, of shape (num_edges, num_states).
+    The sampling and the energies use sparse matrix products, and the gradient is only
+    computed on the allowed edges, so that the cost of an update scales with the number of
+    edges.
+    """
+
+    def __init__(
+        self,
+        weight_values: Tensor,
+        edges: Tensor,
+        vbias: Tensor,
+        hbias: Tensor,
+        device: Optional[torch.device] = None,
+        dtype: Optional[torch.dtype] = None,
+    ):
+        """Initialize the parameters of the sparse Potts-Bernoulli RBM.
+
+        Args:
+            weight_values (Tensor): The couplings of the allowed edges, of shape
+                (num_edges, num_states).
+            edges (Tensor): The allowed edges, of shape (2, num_edges). The first row
+                holds the visible sites and the second one the hidden units.
+            vbias (Tensor): The visible bias of the RBM.
+            hbias (Tensor): The hidden bias of the RBM.
+            device (Optional[torch.device], optional): The device for the parameters.
+                Defaults to the device of `weight_values`.
+            dtype (Optional[torch.dtype], optional): The data type for the parameters.
+                Defaults to the data type of `weight_values`.
+        """
+        if device is None:
+            device = weight_values.device
+        if dtype is None:
+            dtype = weight_values.dtype
+        self.device = device
+        self.dtype = dtype
+        self.vbias = vbias.to(device=self.device, dtype=self.dtype)
+        self.hbias = hbias.to(device=self.device, dtype=self.dtype)
+        # The edges are kept sorted by site, the couplings follow the same order
+        edges = edges.to(device=self.device, dtype=torch.int64)
+        order = torch.argsort(edges[0] * self.num_hiddens() + edges[1])
+        self.edges = edges[:, order]
+        self.weight_values = weight_values[order].to(device=self.device, dtype=self.dtype)
+        self._update_structure()
+        self.name = "SparsePBRBM"
+
+    def _update_structure(self) -> None:
+        self._indices_w, self._perm_w, self._indices_wt, self._perm_wt = (
+            _sparse_structure(
+                self.edges, self.num_visibles(), self.num_states(), self.num_hiddens()
+            )
+        )
+
+    def __add__(self, other):
+        # Couplings on the edges of both models are summed
+        num_edges = self.edges.shape[1]
+        edges, inverse = torch.unique(
+            torch.cat([self.edges, other.edges], 1), dim=1, return_inverse=True
+        )
+        weight_values = torch.zeros(
+            edges.shape[1], self.num_states(), device=self.device, dtype=self.dtype
+        )
+        weight_values.index_add_(0, inverse[:num_edges], self.weight_values)
+        weight_values.index_add_(0, inverse[num_edges:], other.weight_values)
+        return SparsePBRBM(
+            weight_values=weight_values,
+            edges=edges,
+            vbias=self.vbias + other.vbias,
+            hbias=self.hbias + other.hbias,
+        )
+
+    def __mul__(self, other):
+        return SparsePBRBM(
+            weight_values=self.weight_values * other,
+            edges=self.edges.clone(),
+            vbias=self.vbias * other,
+            hbias=self.hbias * other,
+        )
+
+    @torch.jit.export
+    def clone(
+        self, device: Optional[torch.device] = None, dtype: Optional[torch.dtype] = None
+    ):
+        if device is None:
+            device = self.device
+        if dtype is None:
+            dtype = self.dtype
+        return SparsePBRBM(
+            weight_values=self.weight_values.clone(),
+            edges=self.edges.clone(),
+            vbias=self.vbias.clone(),
+            hbias=self.hbias.clone(),
+            device=device,
+            dtype=dtype,
+        )
+
+    def compute_energy(self, v, h):
+        return _compute_energy(
+            v=v,
+            h=h,
+            vbias=self.vbias,
+            hbias=self.hbias,
+            weight_values=self.weight_values,
+            indices_wt=self._indices_wt,
+            perm_wt=self._perm_wt,
+        )
+
+    def compute_energy_hiddens(self, h):
+        return _compute_energy_hiddens(
+            h=h,
+            vbias=self.vbias,
+            hbias=self.hbias,
+            weight_values=self.weight_values,
+            indices_w=self._indices_w,
+            perm_w=self._perm_w,
+        )
+
+    def compute_energy_visibles(self, v):
+        return _compute_energy_visibles(
+            v=v,
+            vbias=self.vbias,
+            hbias=self.hbias,
+            weight_values=self.weight_values,
+            indices_wt=self._indices_wt,
+            perm_wt=self._perm_wt,
+        )
+
+    def compute_gradient(self, data, chains, centered=True):
+        _compute_gradient(
+            v_data=data["visible"],
+            mh_data=data["hidden_mag"],
+            w_data=data["weights"],
+            v_chain=chains["visible"],
+            h_chain=chains["hidden_mag"],
+            w_chain=chains["weights"],
+            vbias=self.vbias,
+            hbias=self.hbias,
+            weight_values=self.weight_values,
+            edges=self.edges,
+            centered=centered,
+        )
+
+    def compute_pseudo_log_likelihood(self, v, max_elements=2**24):
+        return _compute_pseudo_log_likelihood(
+            v=v,
+            vbias=self.vbias,
+            hbias=self.hbias,
+            weight_values=self.weight_values,
+            edges=self.edges,
+            indices_wt=self._indices_wt,
+            perm_wt=self._perm_wt,
+            max_elements=max_elements,
+        )
+
+    def independent_model(self):
+        return SparsePBRBM(
+            weight_values=torch.zeros_like(self.weight_values),
+            edges=self.edges.clone(),
+            vbias=torch.zeros_like(self.vbias),
+            hbias=torch.zeros_like(self.hbias),
+        )
+
+    def init_chains(self, num_samples, weights=None, start_v=None):
+        visible, hidden, mean_visible, mean_hidden = _init_chains(
+            num_samples=num_samples,
+            weight_values=self.weight_values,
+            indices_wt=self._indices_wt,
+            perm_wt=self._perm_wt,
+            vbias=self.vbias,
+            hbias=self.hbias,
+            start_v=start_v,
+        )
+        if weights is None:
+            weights = torch.ones(
+                visible.shape[0], device=visible.device, dtype=visible.dtype
+            )
+        return dict(
+            visible=visible,
+            hidden=hidden,
+            visible_mag=mean_visible,
+            hidden_mag=mean_hidden,
+            weights=weights,
+        )
+
+    @staticmethod
+    def init_parameters(
+        num_hiddens,
+        dataset,
+        device,
+        dtype,
+        var_init=0.0001,
+        init="random",
+        num_connections=None,
+    ):
+        """Initialize the parameters of the sparse RBM, see `RBM.init_parameters`.
+
+        Args:
+            num_connections (Optional[int], optional): Number of visible sites connected
+                to each hidden unit. With 'random' the sites are drawn uniformly, with
+                'mean_field' they are the sites with the largest couplings of the
+                mean-field modes. Defaults to all the sites.
+        """
+        data = dataset.data
+        # Convert to torch Tensor if necessary
+        if isinstance(data, np.ndarray):
+            data = torch.from_numpy(dataset.data).to(device=device, dtype=dtype)
+        if num_connections is None:
+            num_connections = data.shape[1]
+        if num_connections <= 0:
+            raise ValueError(
+                f"'num_connections' should be positive, got {num_connections}"
+            )
+        match init:
+            case "random":
+                vbias, hbias, weight_values, edges = _init_parameters(
+                    num_hiddens=num_hiddens,
+                    num_connections=num_connections,
+                    data=data,
+                    device=device,
+                    dtype=dtype,
+                    var_init=var_init,
+                )
+            case "mean_field":
+                vbias, hbias, weight_values, edges = _init_parameters_mean_field(
+                    num_hiddens=num_hiddens,
+                    num_connections=num_connections,
+                    data=data,
+                    weights=torch.as_tensor(dataset.weights),
+                    device=device,
+                    dtype=dtype,
+                    var_init=var_init,
+                )
+            case _:
+                raise ValueError(
+                    f"'init' should be one of ['random', 'mean_field'], got {init}"
+                )
+        params = SparsePBRBM(
+            weight_values=weight_values, edges=edges, vbias=vbias, hbias=hbias
+        )
+        from rbms.sparse_potts_bernoulli.utils import ensure_zero_sum_gauge
+
+        ensure_zero_sum_gauge(params)
+        return params
+
+    def named_parameters(self):
+        # The edges come last, the first entries match `parameters`
+        return {
+            "weight_values": self.weight_values,
+            "vbias": self.vbias,
+            "hbias": self.hbias,
+            "edges": self.edges,
+        }
+
+    def num_edges(self) -> int:
+        """Number of allowed edges between the visible sites and the hidden units"""
+        return self.edges.shape[1]
+
+    def num_hiddens(self):
+        return self.hbias.shape[0]
+
+    def num_states(self) -> int:
+        """Number of colors for the Potts variables"""
+        return self.vbias.shape[1]
+
+    def num_visibles(self):
+        return self.vbias.shape[0]
+
+    def parameters(self) -> List[Tensor]:
+        return [self.weight_values, self.vbias, self.hbias]
+
+    def prune(self, threshold: float) -> Tensor:
+        """Remove the edges whose couplings have a L2 norm below `threshold`. The tensor
+        `weight_values` is shrunk in place, so that it remains the one registered in the
+        optimizers.
+
+        Args:
+            threshold (float): Minimum norm of the couplings of the kept edges.
+
+        Returns:
+            Tensor: The boolean mask of the kept edges, in the previous order.
+        """
+        keep = torch.linalg.vector_norm(self.weight_values, dim=1) >= threshold
+        self.weight_values.data = self.weight_values.data[keep]
+        self.edges = self.edges[:, keep]
+        self._update_structure()
+        return keep
+
+    def ref_log_z(self):
+        return (
+            self.num_hiddens() * np.log(2)
+            + self.num_visibles() * np.log(self.num_states())
+        ).item()
+
+    def sample_hiddens(self, chains, beta=1):
+        chains["hidden"], chains["hidden_mag"] = _sample_hiddens(
+            chains["visible"],
+            self.weight_values,
+            self._indices_wt,
+            self._perm_wt,
+            self.hbias,
+            beta=beta,
+        )
+        return chains
+
+    def sample_visibles(self, chains, beta=1):
+        chains["visible"], chains["visible_mag"] = _sample_visibles(
+            chains["hidden"],
+            self.weight_values,
+            self._indices_w,
+            self._perm_w,
+            self.vbias,
+            beta=beta,
+        )
+        return chains
+
+    @staticmethod
+    def set_named_parameters(named_params):
+        names = ["vbias", "hbias", "weight_values", "edges"]
+        for k in names:
+            if k not in named_params.keys():
+                raise ValueError(
+                    f"""Dictionary params missing key '{k}'\n Provided keys : {named_params.keys()}\n Expected keys: {names}"""
+                )
+        weight_values = named_params.pop("weight_values")
+        params = SparsePBRBM(
+            weight_values=weight_values,
+            # The edges may have been converted to the data type of the parameters
+            edges=named_params.pop("edges").to(torch.int64),
+            vbias=named_params.pop("vbias"),
+            hbias=named_params.pop("hbias"),
+        )
+        if len(named_params.keys()) > 0:
+            raise ValueError(
+                f"Too many keys in params dictionary. Remaining keys: {named_params.keys()}"
+            )
+        return params
+
+    def to(
+        self, device: Optional[torch.device] = None, dtype: Optional[torch.dtype] = None
+    ):
+        if device is not None:
+            self.device = device
+        if dtype is not None:
+            self.dtype = dtype
+        self.weight_values = self.weight_values.to(device=self.device, dtype=self.dtype)
+        self.vbias = self.vbias.to(device=self.device, dtype=self.dtype)
+        self.hbias = self.hbias.to(device=self.device, dtype=self.dtype)
+        self.edges = self.edges.to(device=self.device)
+        self._update_structure()
+        return self
+
+    def weight_matrix(self) -> Tensor:
+        """Dense weight matrix of shape (num_visibles, num_states, num_hiddens), only
+        meant for analysis of small models."""
+        return _dense_weight_block(
+            self.weight_values, self.edges, 0, self.num_visibles(), self.num_hiddens()
+        )
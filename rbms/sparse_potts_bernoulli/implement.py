@@ -0,0 +1,397 @@
+from typing import Optional, Tuple
+
+import torch
+from torch import Tensor
+from torch.nn.functional import softmax, softplus
+
+from rbms.custom_fn import one_hot
+from rbms.potts_bernoulli.implement import (
+    _init_parameters as _init_parameters_pbrbm,
+)
+from rbms.potts_bernoulli.implement import (
+    _init_parameters_mean_field as _init_parameters_mean_field_pbrbm,
+)
+
+# The allowed edges between the visible sites and the hidden units are stored in `edges`,
+# of shape (2, num_edges), sorted by site then by hidden unit. The couplings of the edge
+# e with the states of its site are `weight_values[e]`, of shape (num_states,). The weight
+# matrix is the sparse matrix of shape (num_visibles * num_states, num_hiddens) whose
+# entry (site_e * num_states + s, hidden_e) is weight_values[e, s]. Its COO indices in
+# row-major order, for W and for W^T, and the permutations of the flattened
+# `weight_values` into these orders only depend on the edges and are computed once.
+
+
+@torch.jit.script
+def _sort_edges(edges: Tensor, num_hiddens: int) -> Tensor:
+    order = torch.argsort(edges[0] * num_hiddens + edges[1])
+    return edges[:, order]
+
+
+@torch.jit.script
+def _sparse_structure(
+    edges: Tensor, num_visibles: int, num_states: int, num_hiddens: int
+) -> Tuple[Tensor, Tensor, Tensor, Tensor]:
+    num_rows = num_visibles * num_states
+    states = torch.arange(num_states, device=edges.device)
+    rows = (edges[0].unsqueeze(1) * num_states + states).flatten()
+    cols = edges[1].repeat_interleave(num_states)
+    perm_w = torch.argsort(rows * num_hiddens + cols)
+    perm_wt = torch.argsort(cols * num_rows + rows)
+    indices_w = torch.stack([rows[perm_w], cols[perm_w]])
+    indices_wt = torch.stack([cols[perm_wt], rows[perm_wt]])
+    return indices_w, perm_w, indices_wt, perm_wt
+
+
+@torch.jit.script
+def _hidden_inputs(
+    v: Tensor,
+    weight_values: Tensor,
+    indices_wt: Tensor,
+    perm_wt: Tensor,
+    num_hiddens: int,
+) -> Tensor:
+    # v_oh @ W as the sparse product W^T v_oh^T
+    num_visibles = v.shape[1]
+    num_states = weight_values.shape[1]
+    v_oh = one_hot(
+        v.to(torch.int32), num_classes=num_states, dtype=weight_values.dtype
+    ).view(-1, num_visibles * num_states)
+    weight_matrix_t = torch.sparse_coo_tensor(
+        indices_wt,
+        weight_values.flatten()[perm_wt],
+        [num_hiddens, num_visibles * num_states],
+        is_coalesced=True,
+    )
+    # The sparse kernels are much slower with a strided dense operand
+    return torch.sparse.mm(weight_matrix_t, v_oh.T.contiguous()).T
+
+
+@torch.jit.script
+def _visible_inputs(
+    h: Tensor,
+    weight_values: Tensor,
+    indices_w: Tensor,
+    perm_w: Tensor,
+    num_visibles: int,
+) -> Tensor:
+    # h @ W^T as the sparse product W h^T, of shape (num_samples, num_visibles, num_states)
+    num_states = weight_values.shape[1]
+    weight_matrix = torch.sparse_coo_tensor(
+        indices_w,
+        weight_values.flatten()[perm_w],
+        [num_visibles * num_states, h.shape[1]],
+        is_coalesced=True,
+    )
+    return torch.sparse.mm(weight_matrix, h.T.contiguous()).T.reshape(
+        -1, num_visibles, num_states
+    )
+
+
+@torch.jit.script
+def _sample_hiddens(
+    v: Tensor,
+    weight_values: Tensor,
+    indices_wt: Tensor,
+    perm_wt: Tensor,
+    hbias: Tensor,
+    beta: float = 1.0,
+) -> Tuple[Tensor, Tensor]:
+    inputs = _hidden_inputs(v, weight_values, indices_wt, perm_wt, hbias.shape[0])
+    mh = torch.sigmoid(beta * (hbias + inputs))
+    h = torch.bernoulli(mh).to(weight_values.dtype)
+    return h, mh
+
+
+@torch.jit.script
+def _sample_visibles(
+    h: Tensor,
+    weight_values: Tensor,
+    indices_w: Tensor,
+    perm_w: Tensor,
+    vbias: Tensor,
+    beta: float = 1.0,
+) -> Tuple[Tensor, Tensor]:
+    num_visibles, num_states = vbias.shape
+    inputs = _visible_inputs(h, weight_values, indices_w, perm_w, num_visibles)
+    mv = torch.softmax(beta * (vbias + inputs), dim=-1)
+    v = (
+        torch.multinomial(mv.view(-1, num_states), 1)
+        .view(-1, num_visibles)
+        .to(weight_values.dtype)
+    )
+    return v, mv
+
+
+@torch.jit.script
+def _compute_energy(
+    v: Tensor,
+    h: Tensor,
+    vbias: Tensor,
+    hbias: Tensor,
+    weight_values: Tensor,
+    indices_wt: Tensor,
+    perm_wt: Tensor,
+):
+    num_visibles, num_states = vbias.shape
+    v_idx = v.to(torch.int64) + torch.arange(num_visibles, device=v.device) * num_states
+    fields = vbias.flatten()[v_idx].sum(1) + (h @ hbias)
+    interaction = (
+        _hidden_inputs(v, weight_values, indices_wt, perm_wt, hbias.shape[0]) * h
+    ).sum(1)
+    return -fields - interaction
+
+
+@torch.jit.script
+def _compute_energy_visibles(
+    v: Tensor,
+    vbias: Tensor,
+    hbias: Tensor,
+    weight_values: Tensor,
+    indices_wt: Tensor,
+    perm_wt: Tensor,
+):
+    num_visibles, num_states = vbias.shape
+    v_idx = v.to(torch.int64) + torch.arange(num_visibles, device=v.device) * num_states
+    field = vbias.flatten()[v_idx].sum(1)
+    exponent = hbias + _hidden_inputs(
+        v, weight_values, indices_wt, perm_wt, hbias.shape[0]
+    )
+    log_term = torch.where(exponent < 10, torch.log(1.0 + torch.exp(exponent)), exponent)
+    return -field - log_term.sum(1)
+
+
+@torch.jit.script
+def _compute_energy_hiddens(
+    h: Tensor,
+    vbias: Tensor,
+    hbias: Tensor,
+    weight_values: Tensor,
+    indices_w: Tensor,
+    perm_w: Tensor,
+):
+    field = h @ hbias
+    arg_lse = vbias + _visible_inputs(h, weight_values, indices_w, perm_w, vbias.shape[0])
+    lse = torch.logsumexp(arg_lse, dim=2).sum(1)
+    return -field - lse
+
+
+@torch.jit.script
+def _dense_weight_block(
+    weight_values: Tensor, edges: Tensor, start: int, end: int, num_hiddens: int
+) -> Tensor:
+    # Dense couplings of the sites [start, end), of shape (end - start, num_states,
+    # num_hiddens). The edges are sorted by site.
+    bounds = torch.searchsorted(edges[0], torch.tensor([start, end], device=edges.device))
+    lo = int(bounds[0])
+    hi = int(bounds[1])
+    block = torch.zeros(
+        end - start,
+        weight_values.shape[1],
+        num_hiddens,
+        device=weight_values.device,
+        dtype=weight_values.dtype,
+    )
+    block[edges[0, lo:hi] - start, :, edges[1, lo:hi]] = weight_values[lo:hi]
+    return block
+
+
+@torch.jit.script
+def _compute_pseudo_log_likelihood(
+    v: Tensor,
+    vbias: Tensor,
+    hbias: Tensor,
+    weight_values: Tensor,
+    edges: Tensor,
+    indices_wt: Tensor,
+    perm_wt: Tensor,
+    max_elements: int = 16777216,
+) -> Tensor:
+    dtype = weight_values.dtype
+    num_visibles, num_states = vbias.shape
+    num_hiddens = hbias.shape[0]
+    num_samples = v.shape[0]
+    v_int = v.to(torch.int64)
+    # The hidden field is computed once, each change of state is a rank-1 update of it
+    field = hbias + _hidden_inputs(v, weight_values, indices_wt, perm_wt, num_hiddens)
+    block_size = max(1, max_elements // max(1, num_samples * num_states * num_hiddens))
+    pll = torch.zeros(num_samples, device=v.device, dtype=dtype)
+    for start in range(0, num_visibles, block_size):
+        end = min(start + block_size, num_visibles)
+        sites = torch.arange(end - start, device=v.device)
+        weight_block = _dense_weight_block(weight_values, edges, start, end, num_hiddens)
+        # (num_samples, block, num_hiddens) couplings of the current states
+        weight_curr = weight_block[sites.unsqueeze(0), v_int[:, start:end]]
+        field_states = (field.unsqueeze(1) - weight_curr).unsqueeze(2) + weight_block
+        # Minus the free energy of each state of each site, up to a constant
+        neg_free_energy = vbias[start:end] + softplus(field_states).sum(3)
+        neg_free_energy_curr = neg_free_energy.gather(
+            2, v_int[:, start:end].unsqueeze(2)
+        ).squeeze(2)
+        pll += (neg_free_energy_curr - torch.logsumexp(neg_free_energy, 2)).sum(1)
+    return pll
+
+
+@torch.jit.script
+def _edge_products(v: Tensor, h: Tensor, coef: Tensor, edges: Tensor, num_states: int):
+    # sum_n coef_n [v_n[site_e] == s] h_n[hidden_e] on the allowed edges only, of shape
+    # (num_edges, num_states)
+    num_edges = edges.shape[1]
+    keys = (
+        torch.arange(num_edges, device=v.device) * num_states
+        + v[:, edges[0]].to(torch.int64)
+    ).flatten()
+    values = (h * coef.unsqueeze(1))[:, edges[1]].flatten()
+    products = torch.zeros(num_edges * num_states, device=h.device, dtype=h.dtype)
+    return products.index_add_(0, keys, values).view(num_edges, num_states)
+
+
+@torch.jit.script
+def _compute_gradient(
+    v_data: Tensor,
+    mh_data: Tensor,
+    w_data: Tensor,
+    v_chain: Tensor,
+    h_chain: Tensor,
+    w_chain: Tensor,
+    vbias: Tensor,
+    hbias: Tensor,
+    weight_values: Tensor,
+    edges: Tensor,
+    centered: bool = True,
+):
+    num_visibles, num_states = vbias.shape
+    dtype = weight_values.dtype
+    sites = edges[0]
+    hiddens = edges[1]
+
+    # One-hot representation of the data
+    v_data_one_hot = one_hot(v_data.to(torch.int32), num_classes=num_states, dtype=dtype)
+    v_gen_one_hot = one_hot(v_chain.to(torch.int32), num_classes=num_states, dtype=dtype)
+
+    # Normalized weights of the data and of the chains
+    w_data = w_data.view(-1)
+    w_data = w_data / w_data.sum()
+    chain_weights = softmax(-w_chain.view(-1), dim=0)
+
+    # Averages over data and generated samples
+    v_data_mean = torch.tensordot(w_data, v_data_one_hot, dims=[[0], [0]])
+    h_data_mean = w_data @ mh_data
+    v_gen_mean = torch.tensordot(chain_weights, v_gen_one_hot, dims=[[0], [0]])
+    h_gen_mean = chain_weights @ h_chain
+    torch.clamp_(v_data_mean, min=1e-7, max=(1.0 - 1e-7))
+    torch.clamp_(v_gen_mean, min=1e-7, max=(1.0 - 1e-7))
+
+    # The second moments are only computed on the allowed edges. As for the PBRBM, the
+    # centered products are not weighted, they differ from the uncentered ones by rank-one
+    # terms
+    if centered:
+        coef_data = torch.full_like(w_data, 1.0 / v_data.shape[0])
+        coef_gen = torch.full_like(chain_weights, 1.0 / v_chain.shape[0])
+    else:
+        coef_data = w_data
+        coef_gen = chain_weights
+    grad_weight_values = _edge_products(
+        v_data, mh_data, coef_data, edges, num_states
+    ) - _edge_products(v_chain, h_chain, coef_gen, edges, num_states)
+    grad_vbias = v_data_mean - v_gen_mean
+    grad_hbias = h_data_mean - h_gen_mean
+    if centered:
+        delta_h = h_chain.mean(0) - mh_data.mean(0)
+        delta_v = v_gen_one_hot.mean(0) - v_data_one_hot.mean(0)
+        grad_weight_values += v_data_mean[sites] * delta_h[hiddens].unsqueeze(1)
+        grad_weight_values += delta_v[sites] * h_data_mean[hiddens].unsqueeze(1)
+        grad_vbias -= torch.zeros_like(grad_vbias).index_add_(
+            0, sites, grad_weight_values * h_data_mean[hiddens].unsqueeze(1)
+        )
+        grad_hbias -= torch.zeros_like(grad_hbias).index_add_(
+            0, hiddens, (grad_weight_values * v_data_mean[sites]).sum(1)
+        )
+    weight_values.grad.copy_(grad_weight_values)
+    vbias.grad.copy_(grad_vbias)
+    hbias.grad.copy_(grad_hbias)
+
+
+def _init_chains(
+    num_samples: int,
+    weight_values: Tensor,
+    indices_wt: Tensor,
+    perm_wt: Tensor,
+    vbias: Tensor,
+    hbias: Tensor,
+    start_v: Optional[Tensor] = None,
+):
+    num_visibles, num_states = vbias.shape
+    if start_v is None:
+        v = torch.randint(
+            0,
+            num_states,
+            size=(num_samples, num_visibles),
+            device=weight_values.device,
+            dtype=weight_values.dtype,
+        )
+    else:
+        v = start_v.to(weight_values.dtype)
+    mv = torch.zeros(v.shape[0], v.shape[1], num_states)
+    mh = torch.sigmoid(
+        hbias + _hidden_inputs(v, weight_values, indices_wt, perm_wt, hbias.shape[0])
+    )
+    h = torch.bernoulli(mh)
+    return v, h, mv, mh
+
+
+def _select_edges(scores: Tensor, num_connections: int) -> Tensor:
+    # Connect each hidden unit to the `num_connections` sites with the largest scores,
+    # given as a tensor of shape (num_visibles, num_hiddens)
+    num_visibles, num_hiddens = scores.shape
+    num_connections = min(num_connections, num_visibles)
+    sites = torch.topk(scores, num_connections, dim=0).indices
+    hiddens = torch.arange(num_hiddens, device=scores.device).expand_as(sites)
+    edges = torch.stack([sites.flatten(), hiddens.flatten()])
+    return _sort_edges(edges, num_hiddens)
+
+
+def _init_parameters(
+    num_hiddens: int,
+    num_connections: int,
+    data: Tensor,
+    device: torch.device,
+    dtype: torch.dtype,
+    var_init: float = 1e-4,
+) -> Tuple[Tensor, Tensor, Tensor, Tensor]:
+    num_visibles = data.shape[1]
+    vbias, hbias, _ = _init_parameters_pbrbm(
+        num_hiddens=0, data=data, device=device, dtype=dtype, var_init=var_init
+    )
+    hbias = torch.zeros(num_hiddens, device=device, dtype=dtype)
+    # Random sites for each hidden unit
+    edges = _select_edges(
+        torch.rand(num_visibles, num_hiddens, device=device), num_connections
+    )
+    weight_values = (
+        torch.randn(edges.shape[1], vbias.shape[1], device=device, dtype=dtype) * var_init
+    )
+    return vbias, hbias, weight_values, edges
+
+
+def _init_parameters_mean_field(
+    num_hiddens: int,
+    num_connections: int,
+    data: Tensor,
+    weights: Tensor,
+    device: torch.device,
+    dtype: torch.dtype,
+    var_init: float = 1e-4,
+) -> Tuple[Tensor, Tensor, Tensor, Tensor]:
+    vbias, hbias, weight_matrix = _init_parameters_mean_field_pbrbm(
+        num_hiddens=num_hiddens,
+        data=data,
+        weights=weights,
+        device=device,
+        dtype=dtype,
+        var_init=var_init,
+    )
+    # Each hidden unit keeps the sites on which its mean-field mode is the largest. The
+    # biases computed for the dense modes are kept.
+    edges = _select_edges(torch.linalg.vector_norm(weight_matrix, dim=1), num_connections)
+    weight_values = weight_matrix[edges[0], :, edges[1]]
+    return vbias, hbias, weight_values, edges
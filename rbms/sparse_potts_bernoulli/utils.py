@@ -0,0 +1,49 @@
+from typing import Optional
+
+import torch
+from torch.optim import Optimizer
+
+from rbms.sparse_potts_bernoulli.classes import SparsePBRBM
+
+
+def ensure_zero_sum_gauge(params: SparsePBRBM) -> None:
+    """Ensure the weight matrix has a zero-sum gauge on each allowed edge.
+
+    Args:
+        params (SparsePBRBM): The parameters of the RBM.
+    """
+    mean_W = params.weight_values.mean(1, keepdim=True)
+    params.weight_values -= mean_W
+    params.hbias.index_add_(0, params.edges[1], mean_W.squeeze(1))
+    params.vbias -= params.vbias.mean(1, keepdim=True)
+
+
+def prune_weights(
+    params: SparsePBRBM, threshold: float, optimizer: Optional[Optimizer] = None
+) -> int:
+    """Magnitude-based pruning: remove the edges whose couplings have a L2 norm below
+    `threshold`. The gradient and the state of the optimizer attached to the couplings
+    are restricted to the kept edges.
+
+    Args:
+        params (SparsePBRBM): The parameters of the RBM.
+        threshold (float): Minimum norm of the couplings of the kept edges.
+        optimizer (Optional[Optimizer], optional): The optimizer updating the parameters.
+            Defaults to None.
+
+    Returns:
+        int: The number of removed edges.
+    """
+    keep = params.prune(threshold)
+    num_pruned = int((~keep).sum())
+    if num_pruned == 0:
+        return 0
+    if params.weight_values.grad is not None:
+        params.weight_values.grad = torch.zeros_like(params.weight_values)
+    if optimizer is not None and params.weight_values in optimizer.state:
+        state = optimizer.state[params.weight_values]
+        for k, v in state.items():
+            # Per-entry buffers (momentum, moments) follow the edges
+            if torch.is_tensor(v) and v.dim() > 0 and v.shape[0] == keep.shape[0]:
+                state[k] = v[keep]
+    return num_pruned
@@ -0,0 +1,151 @@
+import math
+from typing import Optional, Tuple
+
+import torch
+from torch import Tensor
+
+from rbms.classes import EBM
+from rbms.training.mixed_precision import sample_state_mixed_precision
+
+
+def _block(chains: dict[str, Tensor], block: slice) -> dict[str, Tensor]:
+    return {k: v[block] for k, v in chains.items()}
+
+
+def sample_and_accumulate_statistics(
+    params: EBM,
+    v_data: Tensor,
+    w_data: Tensor,
+    parallel_chains: dict[str, Tensor],
+    gibbs_steps: int,
+    beta: float,
+    log_weight_shift: Tensor,
+    chunk_size: Optional[int] = None,
+    centered: bool = True,
+    sampling_dtype: Optional[torch.dtype] = None,
+) -> Tuple[dict[str, Tensor], dict[str, Tensor]]:
+    """Sample the permanent chains and compute the statistics of the gradient, streaming the
+    minibatch and the chains in blocks of `chunk_size` samples. Only one block of the
+    minibatch and one block of the chains are expanded at a time, the statistics of the
+    blocks are summed.
+
+    Args:
+        params (EBM): Parameters of the EBM.
+        v_data (Tensor): Minibatch.
+        w_data (Tensor): Weights of the minibatch.
+        parallel_chains (dict[str, Tensor]): Permanent chains.
+        gibbs_steps (int): Number of Gibbs steps to perform.
+        beta (float): Inverse temperature.
+        log_weight_shift (Tensor): Shift applied to the log-weights of the chains, see
+            `EBM.compute_gradient_statistics`.
+        chunk_size (Optional[int], optional): Number of samples per block. Defaults to a
+            single block.
+        centered (bool, optional): Whether to use centered gradients. Defaults to True.
+        sampling_dtype (Optional[torch.dtype], optional): Data type of the Gibbs steps, see
+            `sample_state_mixed_precision`. Defaults to the data type of the parameters.
+
+    Returns:
+        Tuple[dict[str, Tensor], dict[str, Tensor]]: The updated chains and the summed
+        statistics.
+    """
+    num_samples = v_data.shape[0]
+    num_chains = parallel_chains["visible"].shape[0]
+    if chunk_size is None:
+        chunk_size = max(num_samples, num_chains, 1)
+    if chunk_size <= 0:
+        raise ValueError(f"'chunk_size' should be positive, got {chunk_size}")
+    num_blocks = max(math.ceil(max(num_samples, num_chains) / chunk_size), 1)
+    sampling_params = None
+    if sampling_dtype is not None:
+        sampling_params = params.clone(dtype=sampling_dtype)
+
+    new_chains = {}
+    statistics = {}
+    for i in range(num_blocks):
+        # The last blocks of the smallest of the two sets are empty
+        block = slice(i * chunk_size, (i + 1) * chunk_size)
+        data_block = params.init_chains(
+            num_samples=v_data[block].shape[0],
+            weights=w_data[block],
+            start_v=v_data[block],
+        )
+        if sampling_params is None:
+            chain_block = params.sample_state(
+                chains=_block(parallel_chains, block), n_steps=gibbs_steps, beta=beta
+            )
+        else:
+            chain_block = sample_state_mixed_precision(
+                params=params,
+                sampling_params=sampling_params,
+                chains=_block(parallel_chains, block),
+                n_steps=gibbs_steps,
+                beta=beta,
+            )
+        block_statistics = params.compute_gradient_statistics(
+            data=data_block,
+            chains=chain_block,
+            log_weight_shift=log_weight_shift,
+            centered=centered,
+        )
+        for k, v in block_statistics.items():
+            if k in statistics:
+                statistics[k].add_(v)
+            else:
+                statistics[k] = v.clone()
+        # The visible magnetizations are not kept, they are the largest tensors for PBRBMs
+        for k, v in chain_block.items():
+            if k == "visible_mag":
+                continue
+            if k not in new_chains:
+                new_chains[k] = torch.empty(
+                    (num_chains, *v.shape[1:]), device=v.device, dtype=v.dtype
+                )
+            new_chains[k][block] = v
+    return new_chains, statistics
+
+
+def fit_batch_pcd_chunked(
+    batch: Tuple[Tensor, Tensor],
+    parallel_chains: dict[str, Tensor],
+    params: EBM,
+    gibbs_steps: int,
+    beta: float,
+    chunk_size: int,
+    centered: bool = True,
+    sampling_dtype: Optional[torch.dtype] = None,
+) -> Tuple[dict[str, Tensor], dict]:
+    """Same as `fit_batch_pcd`, with the minibatch and the chains streamed in blocks of
+    `chunk_size` samples through the sampling and the computation of the gradient.
+
+    Args:
+        batch (Tuple[Tensor, Tensor]): Dataset samples and associated weights.
+        parallel_chains (dict[str, Tensor]): Parallel chains used for gradient computation.
+        params (EBM): Parameters of the EBM.
+        gibbs_steps (int): Number of Gibbs steps to perform.
+        beta (float): Inverse temperature.
+        chunk_size (int): Number of samples per block.
+        centered (bool, optional): Whether to use centered gradients. Defaults to True.
+        sampling_dtype (Optional[torch.dtype], optional): Data type of the Gibbs steps.
+            Defaults to the data type of the parameters.
+
+    Returns:
+        Tuple[dict[str, Tensor], dict]: A tuple containing the updated chains and the logs.
+    """
+    v_data, w_data = batch
+    # The chains are normalized with the same shift in every block
+    log_weight_shift = (-parallel_chains["weights"]).max().reshape(1)
+    parallel_chains, statistics = sample_and_accumulate_statistics(
+        params=params,
+        v_data=v_data,
+        w_data=w_data,
+        parallel_chains=parallel_chains,
+        gibbs_steps=gibbs_steps,
+        beta=beta,
+        log_weight_shift=log_weight_shift,
+        chunk_size=chunk_size,
+        centered=centered,
+        sampling_dtype=sampling_dtype,
+    )
+    params.compute_gradient_from_statistics(statistics=statistics, centered=centered)
+    logs = {}
+    return parallel_chains, logs
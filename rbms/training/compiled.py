@@ -0,0 +1,81 @@
+from typing import Callable, Tuple
+
+import torch
+from torch import Tensor
+
+from rbms.classes import EBM
+from rbms.training.utils import apply_gauge
+
+
+def _gibbs_sweep(
+    params: EBM, chains: dict[str, Tensor], beta: float
+) -> dict[str, Tensor]:
+    chains = params.sample_hiddens(chains=chains, beta=beta)
+    chains = params.sample_visibles(chains=chains, beta=beta)
+    return chains
+
+
+def _gradient_ascent_step(
+    params: EBM,
+    v_data: Tensor,
+    w_data: Tensor,
+    parallel_chains: dict[str, Tensor],
+    learning_rate: Tensor,
+    centered: bool,
+) -> None:
+    curr_batch = params.init_chains(
+        num_samples=v_data.shape[0],
+        weights=w_data,
+        start_v=v_data,
+    )
+    params.compute_gradient(data=curr_batch, chains=parallel_chains, centered=centered)
+    for p in params.parameters():
+        p.add_(learning_rate * p.grad)
+    apply_gauge(params)
+
+
+def compile_pcd_step(
+    params: EBM, backend: str = "inductor"
+) -> Callable[..., Tuple[dict[str, Tensor], dict]]:
+    """Build a compiled version of a PCD update performing the sampling of the permanent
+    chains, the gradient computation, the SGD update and the gauge fixing.
+
+    The update is captured as two graphs: one Gibbs sweep, called `gibbs_steps` times, and
+    the gradient ascent step. Unrolling the whole Gibbs loop in a single graph would make
+    the compilation time grow with the number of Gibbs steps.
+
+    Args:
+        params (EBM): Parameters of the EBM. They are updated in place by the returned
+            function.
+        backend (str, optional): Backend used by `torch.compile`. Defaults to "inductor".
+
+    Returns:
+        Callable[..., Tuple[dict[str, Tensor], dict]]: A function with the same signature as
+        `fit_batch_pcd` plus the learning rate, performing the whole update.
+    """
+    gibbs_sweep = torch.compile(_gibbs_sweep, backend=backend)
+    gradient_ascent_step = torch.compile(_gradient_ascent_step, backend=backend)
+
+    def pcd_step(
+        batch: Tuple[Tensor, Tensor],
+        parallel_chains: dict[str, Tensor],
+        gibbs_steps: int,
+        beta: float,
+        learning_rate: float,
+        centered: bool = True,
+    ) -> Tuple[dict[str, Tensor], dict]:
+        v_data, w_data = batch
+        parallel_chains = {
+            "visible": parallel_chains["visible"],
+            "weights": parallel_chains["weights"],
+        }
+        for _ in range(gibbs_steps):
+            parallel_chains = gibbs_sweep(params, parallel_chains, beta)
+        parallel_chains = params.sample_hiddens(chains=parallel_chains, beta=beta)
+        # Passed as a tensor so that a change of learning rate does not trigger a recompilation
+        lr = torch.tensor(learning_rate, device=params.device, dtype=params.dtype)
+        gradient_ascent_step(params, v_data, w_data, parallel_chains, lr, centered)
+        logs = {}
+        return parallel_chains, logs
+
+    return pcd_step
@@ -0,0 +1,445 @@
+import os
+import socket
+import time
+from contextlib import nullcontext
+from typing import Optional, Tuple
+
+import numpy as np
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from torch import Tensor
+
+from rbms.classes import EBM
+from rbms.const import ARCHIVE_FORMAT
+from rbms.dataset.dataset_class import RBMDataset
+from rbms.dataset.minibatch import get_minibatch_iterator
+from rbms.io import (
+    AsyncCheckpointWriter,
+    load_minibatch_state,
+    load_optimizer_state,
+)
+from rbms.map_model import map_model
+from rbms.metrics.pseudo_likelihood import compute_pseudo_log_likelihood
+from rbms.training.chunked import sample_and_accumulate_statistics
+from rbms.training.optimizer import get_learning_rate, get_optimizer, set_learning_rate
+from rbms.training.utils import (
+    apply_gauge,
+    create_machine,
+    get_init_kwargs,
+    setup_training,
+)
+from rbms.utils import check_file_existence, log_to_csv
+
+# Options of `train` which are not implemented by the distributed training
+UNSUPPORTED_OPTIONS = [
+    "compile",
+    "reservoir_size",
+    "jarzynski",
+    "adaptive_gibbs_steps",
+    "eval_interval",
+    "patience",
+    "prune_interval",
+]
+
+
+def all_reduce_statistics(statistics: dict[str, Tensor]) -> dict[str, Tensor]:
+    """Sum the gradient statistics over all the workers with a single all-reduce.
+
+    Args:
+        statistics (dict[str, Tensor]): Statistics computed on the local shard.
+
+    Returns:
+        dict[str, Tensor]: Statistics summed over all the shards.
+    """
+    keys = sorted(statistics.keys())
+    flat = torch.cat([statistics[k].reshape(-1) for k in keys])
+    dist.all_reduce(flat, op=dist.ReduceOp.SUM)
+    reduced = {}
+    offset = 0
+    for k in keys:
+        numel = statistics[k].numel()
+        reduced[k] = flat[offset : offset + numel].view_as(statistics[k])
+        offset += numel
+    return reduced
+
+
+def fit_batch_pcd_distributed(
+    batch: Tuple[Tensor, Tensor],
+    parallel_chains: dict[str, Tensor],
+    params: EBM,
+    gibbs_steps: int,
+    beta: float,
+    centered: bool = True,
+    chunk_size: Optional[int] = None,
+    sampling_dtype: Optional[torch.dtype] = None,
+) -> Tuple[dict[str, Tensor], dict]:
+    """Sample the local shard of the permanent chains and compute the gradient from the
+    statistics summed over all the workers.
+
+    Args:
+        batch (Tuple[Tensor, Tensor]): Local shard of the minibatch and associated weights.
+        parallel_chains (dict[str, Tensor]): Local shard of the parallel chains.
+        params (EBM): Parameters of the EBM, identical on all the workers.
+        gibbs_steps (int): Number of Gibbs steps to perform.
+        beta (float): Inverse temperature.
+        centered (bool, optional): Whether to use centered gradients. Defaults to True.
+        chunk_size (Optional[int], optional): Stream the local shards in blocks of
+            `chunk_size` samples. Defaults to None.
+        sampling_dtype (Optional[torch.dtype], optional): Data type of the Gibbs steps.
+            Defaults to the data type of the parameters.
+
+    Returns:
+        Tuple[dict[str, Tensor], dict]: A tuple containing the updated chains and the logs.
+    """
+    v_data, w_data = batch
+    # The chain weights are normalized over all the shards
+    log_weight_shift = (-parallel_chains["weights"]).max().reshape(1)
+    dist.all_reduce(log_weight_shift, op=dist.ReduceOp.MAX)
+    parallel_chains, statistics = sample_and_accumulate_statistics(
+        params=params,
+        v_data=v_data,
+        w_data=w_data,
+        parallel_chains=parallel_chains,
+        gibbs_steps=gibbs_steps,
+        beta=beta,
+        log_weight_shift=log_weight_shift,
+        chunk_size=chunk_size,
+        centered=centered,
+        sampling_dtype=sampling_dtype,
+    )
+    statistics = all_reduce_statistics(statistics)
+    params.compute_gradient_from_statistics(statistics=statistics, centered=centered)
+    logs = {}
+    return parallel_chains, logs
+
+
+def _get_shard(num_samples: int, rank: int, world_size: int) -> slice:
+    bounds = np.linspace(0, num_samples, world_size + 1).astype(int)
+    return slice(bounds[rank], bounds[rank + 1])
+
+
+def _gather_chains(parallel_chains: dict[str, Tensor]) -> dict[str, Tensor]:
+    gathered = [None] * dist.get_world_size()
+    dist.all_gather_object(gathered, {k: v.cpu() for k, v in parallel_chains.items()})
+    device = parallel_chains["visible"].device
+    return {
+        k: torch.cat([chains[k] for chains in gathered]).to(device)
+        for k in parallel_chains.keys()
+    }
+
+
+def check_distributed_args(
+    model_type: str, args: dict, map_model: dict[str, EBM]
+) -> None:
+    """Check that the training options are supported by the distributed training.
+
+    Args:
+        model_type (str): Type of RBM used.
+        args (dict): A dictionary of training arguments.
+        map_model (dict[str, EBM]): Map from the model types to their classes.
+
+    Raises:
+        ValueError: If the model does not implement the gradient statistics or if an
+            unsupported option is set.
+    """
+    if not map_model[model_type].has_gradient_statistics():
+        raise ValueError(f"The distributed training does not support {model_type}.")
+    for key in UNSUPPORTED_OPTIONS:
+        if args.get(key, None) not in (None, False):
+            raise ValueError(f"The distributed training does not support '{key}'.")
+
+
+def _get_init_method() -> str:
+    # The address of torchrun when set, otherwise a free port of the local node, so
+    # that several trainings can run at the same time
+    address = os.environ.get("MASTER_ADDR", "127.0.0.1")
+    port = os.environ.get("MASTER_PORT", None)
+    if port is None:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.bind((address, 0))
+            port = s.getsockname()[1]
+    return f"tcp://{address}:{port}"
+
+
+def train_distributed(
+    dataset: RBMDataset,
+    test_dataset: RBMDataset,
+    model_type: str,
+    args: dict,
+    dtype: torch.dtype,
+    checkpoints: np.ndarray,
+    map_model: dict[str, EBM] = map_model,
+) -> None:
+    """Train an EBM with data parallelism. Must be called by every worker of an initialized
+    process group. Each worker owns a shard of the permanent chains and draws its own
+    shard of the minibatch, the gradient statistics are summed over all the workers before
+    the update. Only the first worker writes to the archive, which has the same format as
+    with `train`.
+
+    Args:
+        dataset (RBMDataset): The training dataset.
+        test_dataset (RBMDataset): The test dataset (not used).
+        model_type (str): Type of RBM used (BBRBM or PBRBM)
+        args (dict): A dictionary of training arguments.
+        dtype (torch.dtype): The data type for the parameters.
+        checkpoints (np.ndarray): An array of checkpoints for saving model states.
+    """
+    check_distributed_args(model_type, args, map_model)
+    rank = dist.get_rank()
+    world_size = dist.get_world_size()
+    filename = args["filename"]
+
+    # Create a first archive with the initialized model
+    if rank == 0:
+        if not (args["overwrite"]):
+            check_file_existence(filename)
+        if not (args["restore"]):
+            params = map_model[model_type].init_parameters(
+                num_hiddens=args["num_hiddens"],
+                dataset=dataset.in_memory(args.get("num_samples_init", 100_000)),
+                device=args["device"],
+                dtype=dtype,
+                init=args.get("init", "random"),
+                **get_init_kwargs(model_type, args),
+            )
+            create_machine(
+                filename=filename,
+                params=params,
+                num_visibles=dataset.get_num_visibles(),
+                num_hiddens=args["num_hiddens"],
+                num_chains=args["num_chains"],
+                batch_size=args["batch_size"],
+                gibbs_steps=args["gibbs_steps"],
+                learning_rate=args["learning_rate"],
+                log=args["log"],
+                flags=["checkpoint"],
+                optimizer=args.get("optimizer", "sgd"),
+                archive_format=args.get("archive_format", ARCHIVE_FORMAT),
+                momentum=args.get("momentum", 0.9),
+                lr_schedule=args.get("lr_schedule", "constant"),
+                learning_rate_final=args.get("learning_rate_final", None),
+            )
+    dist.barrier()
+
+    (
+        params,
+        parallel_chains,
+        args,
+        learning_rate,
+        num_updates,
+        start,
+        elapsed_time,
+        log_filename,
+        pbar,
+    ) = setup_training(args, map_model=map_model)
+    if rank != 0:
+        pbar.disable = True
+    # All the workers restored the same random state, decorrelate them
+    torch.manual_seed(int(torch.randint(2**62, (1,)).item()) + rank)
+
+    # Each worker owns a shard of the chains and of the dataset. The number of chains
+    # is the one of the archive when the training is restored
+    chain_shard = _get_shard(parallel_chains["visible"].shape[0], rank, world_size)
+    parallel_chains = {k: v[chain_shard] for k, v in parallel_chains.items()}
+    data_shard = _get_shard(len(dataset), rank, world_size)
+    if args.get("importance_sampling", False):
+        # Sampling within a shard would weight the shards equally, each worker draws
+        # from the whole dataset with its own seed instead
+        data_shard = slice(None)
+    # The iterators of all the workers are saved in the checkpoints, a restored training
+    # resumes their sequences of minibatches when the number of workers is the same
+    batches = get_minibatch_iterator(
+        data=(
+            dataset.data.subset(np.arange(len(dataset))[data_shard])
+            if dataset.is_on_disk()
+            else dataset.data[data_shard]
+        ),
+        weights=dataset.weights[data_shard],
+        batch_size=max(args["batch_size"] // world_size, 1),
+        weighted=args.get("importance_sampling", False),
+        device=params.device,
+        state=load_minibatch_state(
+            filename=args["filename"],
+            index=num_updates,
+            rank=rank,
+            world_size=world_size,
+        ),
+    )
+
+    optimizer = get_optimizer(
+        name=args.get("optimizer", "sgd"),
+        parameters=params.parameters(),
+        learning_rate=learning_rate,
+        momentum=args.get("momentum", 0.9),
+    )
+    load_optimizer_state(
+        filename=args["filename"], index=num_updates, optimizer=optimizer, params=params
+    )
+
+    if rank == 0:
+        for k, v in args.items():
+            print(f"{k} : {v}")
+
+    # Fixed subset of the training set on which the pseudo log-likelihood is logged
+    pll_idx = torch.randperm(len(dataset), generator=torch.Generator().manual_seed(0))[
+        : args.get("num_samples_pll", 10_000)
+    ]
+
+    # Only the first worker writes the archive
+    writer = AsyncCheckpointWriter(args["filename"]) if rank == 0 else nullcontext()
+    with torch.no_grad(), writer, batches:
+        for idx in range(num_updates + 1, args["num_updates"] + 1):
+            batch = next(batches)
+            set_learning_rate(
+                optimizer,
+                get_learning_rate(
+                    schedule=args.get("lr_schedule", "constant"),
+                    learning_rate=learning_rate,
+                    update=idx,
+                    num_updates=args["num_updates"],
+                    learning_rate_final=args.get("learning_rate_final", None),
+                ),
+            )
+
+            optimizer.zero_grad(set_to_none=False)
+            parallel_chains, logs = fit_batch_pcd_distributed(
+                batch=batch,
+                parallel_chains=parallel_chains,
+                params=params,
+                gibbs_steps=args["gibbs_steps"],
+                beta=args["beta"],
+                chunk_size=args.get("chunk_size", None),
+                sampling_dtype=args.get("sampling_dtype", None),
+            )
+            optimizer.step()
+            apply_gauge(params)
+
+            # Save current model if necessary
+            if idx in checkpoints:
+                all_chains = _gather_chains(parallel_chains)
+                minibatch_states = [None] * world_size
+                dist.all_gather_object(minibatch_states, batches.state_dict())
+                if rank == 0:
+                    curr_time = time.time() - start
+                    writer.save(
+                        params=params,
+                        chains=all_chains,
+                        num_updates=idx,
+                        time=curr_time + elapsed_time,
+                        flags=["checkpoint"],
+                        optimizer=optimizer,
+                        minibatch_state=minibatch_states,
+                    )
+
+            if args["log"] and rank == 0:
+                logs["update"] = idx
+                if idx in checkpoints:
+                    logs["pll_train"] = compute_pseudo_log_likelihood(
+                        params=params,
+                        v_data=dataset.data[pll_idx],
+                        w_data=dataset.weights[pll_idx],
+                    )
+                log_to_csv(logs, log_file=log_filename)
+
+            # Update progress bar
+            pbar.update(1)
+    dist.barrier()
+
+
+def _worker(
+    rank: int,
+    world_size: int,
+    init_method: str,
+    dataset: RBMDataset,
+    test_dataset: RBMDataset,
+    model_type: str,
+    args: dict,
+    dtype: torch.dtype,
+    checkpoints: np.ndarray,
+    map_model: dict[str, EBM],
+) -> None:
+    # Share the cores of the node between the workers
+    torch.set_num_threads(max(os.cpu_count() // world_size, 1))
+    dist.init_process_group(
+        backend="gloo", init_method=init_method, rank=rank, world_size=world_size
+    )
+    try:
+        train_distributed(
+            dataset=dataset,
+            test_dataset=test_dataset,
+            model_type=model_type,
+            args=args,
+            dtype=dtype,
+            checkpoints=checkpoints,
+            map_model=map_model,
+        )
+    finally:
+        dist.destroy_process_group()
+        # The samples kept on disk were reopened when the datasets were unpickled
+        for d in (dataset, test_dataset):
+            if d is not None and d.is_on_disk():
+                d.data.close()
+
+
+def launch_distributed_training(
+    dataset: RBMDataset,
+    test_dataset: RBMDataset,
+    model_type: str,
+    args: dict,
+    dtype: torch.dtype,
+    checkpoints: np.ndarray,
+    num_workers: int,
+    init_method: Optional[str] = None,
+    map_model: dict[str, EBM] = map_model,
+) -> None:
+    """Spawn `num_workers` processes on the current node and train the EBM with
+    `train_distributed` using the gloo backend. When the script is already launched by
+    `torchrun`, `train_distributed` is called directly on the existing process group.
+
+    Args:
+        dataset (RBMDataset): The training dataset.
+        test_dataset (RBMDataset): The test dataset (not used).
+        model_type (str): Type of RBM used (BBRBM or PBRBM)
+        args (dict): A dictionary of training arguments.
+        dtype (torch.dtype): The data type for the parameters.
+        checkpoints (np.ndarray): An array of checkpoints for saving model states.
+        num_workers (int): Number of worker processes.
+        init_method (Optional[str], optional): URL used to initialize the process group.
+            Defaults to MASTER_ADDR and MASTER_PORT when they are set, otherwise to a free
+            port of the local node.
+    """
+    check_distributed_args(model_type, args, map_model)
+    if "WORLD_SIZE" in os.environ:
+        dist.init_process_group(backend="gloo")
+        try:
+            train_distributed(
+                dataset=dataset,
+                test_dataset=test_dataset,
+                model_type=model_type,
+                args=args,
+                dtype=dtype,
+                checkpoints=checkpoints,
+                map_model=map_model,
+            )
+        finally:
+            dist.destroy_process_group()
+        return
+    if init_method is None:
+        init_method = _get_init_method()
+    mp.spawn(
+        _worker,
+        args=(
+            num_workers,
+            init_method,
+            dataset,
+            test_dataset,
+            model_type,
+            args,
+            dtype,
+            checkpoints,
+            map_model,
+        ),
+        nprocs=num_workers,
+        join=True,
+    )
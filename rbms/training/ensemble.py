@@ -0,0 +1,462 @@
+import time
+from typing import List, Optional
+
+import numpy as np
+import torch
+from torch import Tensor
+from tqdm import tqdm
+
+from rbms.bernoulli_bernoulli.classes import BBRBM
+from rbms.classes import EBM
+from rbms.const import ARCHIVE_FORMAT
+from rbms.custom_fn import one_hot
+from rbms.dataset.dataset_class import RBMDataset
+from rbms.dataset.minibatch import get_minibatch_iterator
+from rbms.io import AsyncCheckpointWriter, load_minibatch_state, load_model
+from rbms.map_model import map_model
+from rbms.potts_bernoulli.classes import PBRBM
+from rbms.training.utils import create_machine
+from rbms.utils import check_file_existence, get_saved_updates
+
+
+class RBMEnsemble:
+    """M RBMs of the same type and number of visible units stacked along a leading
+    dimension, so that sampling and gradient computations run as batched matmuls.
+
+    The models can have different numbers of hidden units: the hidden layers are padded to
+    the largest one and the padded units are masked, their weights stay at zero. The
+    visible configurations of the PBRBM are handled in one-hot representation, flattened
+    over the visible units and states.
+    """
+
+    def __init__(self, models: List[EBM]) -> None:
+        """
+        Args:
+            models (List[EBM]): The BBRBM or PBRBM to stack. They must all have the same
+                type, number of visible units, device and dtype.
+        """
+        if len(models) == 0:
+            raise ValueError("The ensemble must contain at least one model.")
+        self.name = models[0].name
+        if self.name not in ("BBRBM", "PBRBM") or any(
+            m.name != self.name for m in models
+        ):
+            raise ValueError(
+                f"All the models should be BBRBM or all PBRBM, got {[m.name for m in models]}"
+            )
+        self.device = models[0].device
+        self.dtype = models[0].dtype
+        self.num_models = len(models)
+        self.num_hiddens = [m.hbias.shape[0] for m in models]
+        self.num_visibles = models[0].vbias.shape[0]
+        self.num_states = models[0].vbias.shape[1] if self.name == "PBRBM" else 1
+        num_features = self.num_visibles * self.num_states
+        max_hiddens = max(self.num_hiddens)
+
+        self.weight_matrix = torch.zeros(
+            self.num_models,
+            num_features,
+            max_hiddens,
+            device=self.device,
+            dtype=self.dtype,
+        )
+        self.vbias = torch.zeros(
+            self.num_models, num_features, device=self.device, dtype=self.dtype
+        )
+        self.hbias = torch.zeros(
+            self.num_models, max_hiddens, device=self.device, dtype=self.dtype
+        )
+        self.hidden_mask = torch.zeros(
+            self.num_models, max_hiddens, device=self.device, dtype=self.dtype
+        )
+        for i, m in enumerate(models):
+            num_hiddens = self.num_hiddens[i]
+            self.weight_matrix[i, :, :num_hiddens] = m.weight_matrix.reshape(
+                num_features, num_hiddens
+            )
+            self.vbias[i] = m.vbias.reshape(-1)
+            self.hbias[i, :num_hiddens] = m.hbias
+            self.hidden_mask[i, :num_hiddens] = 1.0
+
+    def _to_features(self, v: Tensor) -> Tensor:
+        if self.name == "PBRBM":
+            return one_hot(
+                v.reshape(-1, self.num_visibles).to(torch.int32),
+                num_classes=self.num_states,
+                dtype=self.dtype,
+            ).view(*v.shape[:-1], self.num_visibles * self.num_states)
+        return v
+
+    def sample_hiddens(
+        self, chains: dict[str, Tensor], beta: float = 1.0
+    ) -> dict[str, Tensor]:
+        """Sample the hidden layers of all the models.
+
+        Args:
+            chains (dict[str, Tensor]): Chains with visible configurations of shape
+                (num_models, num_chains, num_visibles).
+            beta (float, optional): The inverse temperature. Defaults to 1.0.
+
+        Returns:
+            dict[str, Tensor]: The updated chains.
+        """
+        v = self._to_features(chains["visible"])
+        mh = torch.sigmoid(beta * (self.hbias.unsqueeze(1) + v @ self.weight_matrix))
+        mh = mh * self.hidden_mask.unsqueeze(1)
+        chains["hidden_mag"] = mh
+        chains["hidden"] = torch.bernoulli(mh)
+        return chains
+
+    def sample_visibles(
+        self, chains: dict[str, Tensor], beta: float = 1.0
+    ) -> dict[str, Tensor]:
+        """Sample the visible layers of all the models.
+
+        Args:
+            chains (dict[str, Tensor]): Chains with hidden configurations of shape
+                (num_models, num_chains, max_hiddens).
+            beta (float, optional): The inverse temperature. Defaults to 1.0.
+
+        Returns:
+            dict[str, Tensor]: The updated chains.
+        """
+        field = beta * (
+            self.vbias.unsqueeze(1)
+            + chains["hidden"] @ self.weight_matrix.transpose(1, 2)
+        )
+        if self.name == "PBRBM":
+            mv = torch.softmax(
+                field.view(*field.shape[:2], self.num_visibles, self.num_states), dim=-1
+            )
+            v = (
+                torch.multinomial(mv.view(-1, self.num_states), 1)
+                .view(*field.shape[:2], self.num_visibles)
+                .to(self.dtype)
+            )
+        else:
+            mv = torch.sigmoid(field)
+            v = torch.bernoulli(mv)
+        chains["visible_mag"] = mv
+        chains["visible"] = v
+        return chains
+
+    def sample_state(
+        self, chains: dict[str, Tensor], n_steps: int, beta: float = 1.0
+    ) -> dict[str, Tensor]:
+        """Sample all the models for n_steps.
+
+        Args:
+            chains (dict[str, Tensor]): The starting position of the chains.
+            n_steps (int): The number of sampling steps.
+            beta (float, optional): The inverse temperature. Defaults to 1.0
+
+        Returns:
+            dict[str, Tensor]: The updated chains after n_steps of sampling.
+        """
+        new_chains = {"visible": chains["visible"].clone()}
+        for _ in range(n_steps):
+            new_chains = self.sample_hiddens(chains=new_chains, beta=beta)
+            new_chains = self.sample_visibles(chains=new_chains, beta=beta)
+        new_chains = self.sample_hiddens(chains=new_chains, beta=beta)
+        return new_chains
+
+    def init_chains(
+        self, num_samples: int, start_v: Optional[Tensor] = None
+    ) -> dict[str, Tensor]:
+        """Initialize the chains of all the models.
+
+        Args:
+            num_samples (int): Number of chains per model.
+            start_v (Optional[Tensor], optional): Initial visible configurations, of shape
+                (num_models, num_samples, num_visibles) or (num_samples, num_visibles) to
+                use the same ones for all the models. Defaults to uniform random
+                configurations.
+
+        Returns:
+            dict[str, Tensor]: The initialized chains.
+        """
+        if start_v is None:
+            start_v = torch.randint(
+                0,
+                max(self.num_states, 2),
+                (self.num_models, num_samples, self.num_visibles),
+                device=self.device,
+            )
+        elif start_v.dim() == 2:
+            start_v = start_v.unsqueeze(0).expand(self.num_models, -1, -1)
+        chains = {"visible": start_v.to(device=self.device, dtype=self.dtype)}
+        return self.sample_hiddens(chains)
+
+    def compute_gradient(
+        self,
+        v_data: Tensor,
+        w_data: Tensor,
+        chains: dict[str, Tensor],
+        centered: bool = True,
+    ) -> dict[str, Tensor]:
+        """Compute the log-likelihood gradient of all the models, the same minibatch being
+        used for all of them. The chains are given the same weight.
+
+        Args:
+            v_data (Tensor): Minibatch of shape (batch_size, num_visibles).
+            w_data (Tensor): Weights of the samples of the minibatch.
+            chains (dict[str, Tensor]): The chains of all the models.
+            centered (bool, optional): Whether to use centered gradients. Defaults to True.
+
+        Returns:
+            dict[str, Tensor]: The gradients with respect to the stacked parameters.
+        """
+        v_data = self._to_features(v_data.to(self.dtype))
+        v_chain = self._to_features(chains["visible"])
+        h_chain = chains["hidden_mag"]
+        num_chains = v_chain.shape[1]
+        w_data = w_data.view(-1).to(self.dtype)
+        w_data_norm = w_data / w_data.sum()
+        mh_data = torch.sigmoid(self.hbias.unsqueeze(1) + v_data @ self.weight_matrix)
+        mh_data = mh_data * self.hidden_mask.unsqueeze(1)
+
+        # Averages over data and generated samples
+        v_data_mean = torch.clamp(w_data_norm @ v_data, min=1e-7, max=(1.0 - 1e-7))
+        h_data_mean = torch.einsum("n,mnh->mh", w_data_norm, mh_data)
+        v_gen_mean = torch.clamp(v_chain.mean(1), min=1e-7, max=(1.0 - 1e-7))
+        h_gen_mean = h_chain.mean(1)
+
+        if centered:
+            # As in PBRBM._compute_gradient, the centered products of the PBRBM are not
+            # weighted
+            if self.name == "PBRBM":
+                w_cross = torch.full_like(w_data, 1.0 / w_data.shape[0])
+            else:
+                w_cross = w_data_norm
+            grad_weight_matrix = (
+                torch.einsum(
+                    "nd,mnh->mdh",
+                    (v_data - v_data_mean) * w_cross.unsqueeze(1),
+                    mh_data - h_data_mean.unsqueeze(1),
+                )
+                - (v_chain - v_data_mean).transpose(1, 2)
+                @ (h_chain - h_data_mean.unsqueeze(1))
+                / num_chains
+            )
+            grad_vbias = (
+                v_data_mean
+                - v_gen_mean
+                - torch.einsum("mdh,mh->md", grad_weight_matrix, h_data_mean)
+            )
+            grad_hbias = (
+                h_data_mean
+                - h_gen_mean
+                - torch.einsum("d,mdh->mh", v_data_mean, grad_weight_matrix)
+            )
+        else:
+            grad_weight_matrix = (
+                torch.einsum("nd,mnh->mdh", v_data * w_data_norm.unsqueeze(1), mh_data)
+                - v_chain.transpose(1, 2) @ h_chain / num_chains
+            )
+            grad_vbias = v_data_mean - v_gen_mean
+            grad_hbias = h_data_mean - h_gen_mean
+        return {
+            "weight_matrix": grad_weight_matrix * self.hidden_mask.unsqueeze(1),
+            "vbias": grad_vbias,
+            "hbias": grad_hbias * self.hidden_mask,
+        }
+
+    def gradient_ascent_step(
+        self, gradients: dict[str, Tensor], learning_rates: Tensor
+    ) -> None:
+        """Update the parameters of all the models, each with its own learning rate. The
+        zero-sum gauge is enforced for the PBRBM.
+
+        Args:
+            gradients (dict[str, Tensor]): Output of `compute_gradient`.
+            learning_rates (Tensor): Learning rates of the models, of shape (num_models,).
+        """
+        learning_rates = learning_rates.to(device=self.device, dtype=self.dtype)
+        self.weight_matrix.add_(
+            learning_rates.view(-1, 1, 1) * gradients["weight_matrix"]
+        )
+        self.vbias.add_(learning_rates.view(-1, 1) * gradients["vbias"])
+        self.hbias.add_(learning_rates.view(-1, 1) * gradients["hbias"])
+        if self.name == "PBRBM":
+            weight_matrix = self.weight_matrix.view(
+                self.num_models, self.num_visibles, self.num_states, -1
+            )
+            mean_W = weight_matrix.mean(2, keepdim=True)
+            weight_matrix -= mean_W
+            self.hbias += mean_W.sum((1, 2))
+            vbias = self.vbias.view(self.num_models, self.num_visibles, self.num_states)
+            vbias -= vbias.mean(2, keepdim=True)
+
+    def get_model(self, index: int) -> EBM:
+        """Extract one of the models of the ensemble.
+
+        Args:
+            index (int): Index of the model.
+
+        Returns:
+            EBM: A copy of the parameters of the model.
+        """
+        num_hiddens = self.num_hiddens[index]
+        weight_matrix = self.weight_matrix[index, :, :num_hiddens].clone()
+        vbias = self.vbias[index].clone()
+        hbias = self.hbias[index, :num_hiddens].clone()
+        if self.name == "PBRBM":
+            return PBRBM(
+                weight_matrix=weight_matrix.view(
+                    self.num_visibles, self.num_states, num_hiddens
+                ),
+                vbias=vbias.view(self.num_visibles, self.num_states),
+                hbias=hbias,
+            )
+        return BBRBM(weight_matrix=weight_matrix, vbias=vbias, hbias=hbias)
+
+    def get_chains(self, chains: dict[str, Tensor], index: int) -> dict[str, Tensor]:
+        """Extract the chains of one of the models of the ensemble.
+
+        Args:
+            chains (dict[str, Tensor]): The chains of the ensemble.
+            index (int): Index of the model.
+
+        Returns:
+            dict[str, Tensor]: The chains of the model.
+        """
+        return self.get_model(index).init_chains(
+            num_samples=chains["visible"].shape[1], start_v=chains["visible"][index]
+        )
+
+
+def train_ensemble(
+    dataset: RBMDataset,
+    model_type: str,
+    filenames: List[str],
+    num_hiddens: List[int],
+    learning_rates: List[float],
+    seeds: List[int],
+    args: dict,
+    dtype: torch.dtype,
+    checkpoints: np.ndarray,
+    map_model: dict[str, EBM] = map_model,
+) -> None:
+    """Train several RBMs of the same type together on the same minibatches. Each model
+    has its own seed, number of hidden units and learning rate and is saved in its own
+    archive, with the same format as with `train`.
+
+    Args:
+        dataset (RBMDataset): The training dataset.
+        model_type (str): Type of RBM used (BBRBM or PBRBM)
+        filenames (List[str]): Archive of each model.
+        num_hiddens (List[int]): Number of hidden units of each model.
+        learning_rates (List[float]): Learning rate of each model.
+        seeds (List[int]): Seed used to initialize each model and its chains.
+        args (dict): A dictionary of training arguments, shared by all the models.
+        dtype (torch.dtype): The data type for the parameters.
+        checkpoints (np.ndarray): An array of checkpoints for saving model states.
+    """
+    num_models = len(filenames)
+    if not (len(num_hiddens) == len(learning_rates) == len(seeds) == num_models):
+        raise ValueError(
+            "'filenames', 'num_hiddens', 'learning_rates' and 'seeds' should have the same length."
+        )
+
+    if not (args["restore"]):
+        for i in range(num_models):
+            if not (args["overwrite"]):
+                check_file_existence(filenames[i])
+            torch.manual_seed(seeds[i])
+            params = map_model[model_type].init_parameters(
+                num_hiddens=num_hiddens[i],
+                dataset=dataset.in_memory(args.get("num_samples_init", 100_000)),
+                device=args["device"],
+                dtype=dtype,
+                init=args.get("init", "random"),
+            )
+            create_machine(
+                filename=filenames[i],
+                params=params,
+                num_visibles=dataset.get_num_visibles(),
+                num_hiddens=num_hiddens[i],
+                num_chains=args["num_chains"],
+                batch_size=args["batch_size"],
+                gibbs_steps=args["gibbs_steps"],
+                learning_rate=learning_rates[i],
+                log=False,
+                flags=["checkpoint"],
+                archive_format=args.get("archive_format", ARCHIVE_FORMAT),
+            )
+
+    # The models advance together, they must have been saved at the same update
+    num_updates = {get_saved_updates(filename=f)[-1] for f in filenames}
+    if len(num_updates) != 1:
+        raise RuntimeError(
+            f"The archives have been trained for different numbers of updates: {num_updates}"
+        )
+    num_updates = num_updates.pop()
+    if args["num_updates"] <= num_updates:
+        raise RuntimeError(
+            f"The parameter /'num_updates/' ({args['num_updates']}) must be greater than the previous number of updates ({num_updates})."
+        )
+    models, visibles, elapsed_times = [], [], []
+    for f in filenames:
+        params, chains, elapsed_time, _ = load_model(
+            f,
+            num_updates,
+            device=args["device"],
+            dtype=dtype,
+            restore=True,
+            map_model=map_model,
+        )
+        models.append(params)
+        visibles.append(chains["visible"])
+        elapsed_times.append(elapsed_time)
+    ensemble = RBMEnsemble(models)
+    # The Gibbs steps start from the visible units, no random number is drawn after the
+    # random state of the archives is restored
+    parallel_chains = {"visible": torch.stack(visibles)}
+    learning_rates = torch.tensor(learning_rates, device=ensemble.device, dtype=dtype)
+
+    batches = get_minibatch_iterator(
+        data=dataset.data,
+        weights=dataset.weights,
+        batch_size=args["batch_size"],
+        device=ensemble.device,
+        state=load_minibatch_state(filename=filenames[0], index=num_updates),
+    )
+    pbar = tqdm(
+        initial=num_updates,
+        total=args["num_updates"],
+        colour="red",
+        dynamic_ncols=True,
+        ascii="-#",
+    )
+    pbar.set_description(f"Training {num_models} {model_type}")
+    writers = [AsyncCheckpointWriter(f) for f in filenames]
+    start = time.time()
+    try:
+        with torch.no_grad():
+            for idx in range(num_updates + 1, args["num_updates"] + 1):
+                v_data, w_data = next(batches)
+                parallel_chains = ensemble.sample_state(
+                    chains=parallel_chains, n_steps=args["gibbs_steps"], beta=args["beta"]
+                )
+                gradients = ensemble.compute_gradient(
+                    v_data=v_data, w_data=w_data, chains=parallel_chains
+                )
+                ensemble.gradient_ascent_step(gradients, learning_rates)
+
+                # Save current models if necessary
+                if idx in checkpoints:
+                    curr_time = time.time() - start
+                    for i, writer in enumerate(writers):
+                        writer.save(
+                            params=ensemble.get_model(i),
+                            chains={"visible": parallel_chains["visible"][i]},
+                            num_updates=idx,
+                            time=curr_time + elapsed_times[i],
+                            flags=["checkpoint"],
+                            minibatch_state=batches.state_dict(),
+                        )
+                pbar.update(1)
+    finally:
+        for writer in writers:
+            writer.close()
+        batches.close()
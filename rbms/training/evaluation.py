@@ -0,0 +1,193 @@
+from typing import Optional
+
+import numpy as np
+import torch
+from torch import Tensor
+
+from rbms.classes import EBM
+from rbms.custom_fn import one_hot
+from rbms.metrics.aats import compute_aats
+from rbms.metrics.pseudo_likelihood import compute_pseudo_log_likelihood
+
+# Metrics which can be monitored for early stopping, and whether they should be maximized
+EVAL_METRICS = {
+    "pll_test": "max",
+    "mean_error": "min",
+    "corr_error": "min",
+    "aats": "min",
+}
+
+# Number of elements of the blocks of the correlation matrices computed at once
+MOMENTS_BLOCK_ELEMENTS = 2**22
+
+
+def compute_moment_errors(
+    v_data: Tensor,
+    w_data: Tensor,
+    v_gen: Tensor,
+    num_states: Optional[int] = None,
+) -> dict[str, float]:
+    """Root mean square errors between the first and second moments of the data and of the
+    generated samples. The second moments are the connected correlations between pairs of
+    distinct visible variables, computed by blocks of rows so that the correlation
+    matrices are never formed.
+
+    Args:
+        v_data (Tensor): Data samples.
+        w_data (Tensor): Weights associated to the samples.
+        v_gen (Tensor): Generated samples.
+        num_states (Optional[int], optional): Number of states of categorical variables,
+            which are one-hot encoded. Defaults to None for binary variables.
+
+    Returns:
+        dict[str, float]: The errors on the first ('mean_error') and second
+        ('corr_error') moments.
+    """
+    num_visibles = v_data.shape[1]
+    dtype = torch.float64
+    v_gen = v_gen.to(device=v_data.device)
+    if num_states is None:
+        site = torch.arange(num_visibles, device=v_data.device)
+        x_data = v_data.to(dtype)
+        x_gen = v_gen.to(dtype)
+    else:
+        site = torch.arange(num_visibles, device=v_data.device).repeat_interleave(
+            num_states
+        )
+        x_data = one_hot(v_data.to(torch.int32), num_classes=num_states, dtype=dtype)
+        x_data = x_data.view(v_data.shape[0], -1)
+        x_gen = one_hot(v_gen.to(torch.int32), num_classes=num_states, dtype=dtype)
+        x_gen = x_gen.view(v_gen.shape[0], -1)
+    p_data = w_data.view(-1).to(dtype)
+    p_data = p_data / p_data.sum()
+
+    mean_data = p_data @ x_data
+    mean_gen = x_gen.mean(0)
+    x_data_weighted = x_data * p_data.unsqueeze(1)
+    x_gen_weighted = x_gen / x_gen.shape[0]
+
+    num_columns = x_data.shape[1]
+    block_size = max(MOMENTS_BLOCK_ELEMENTS // num_columns, 1)
+    squared_error = torch.zeros((), device=v_data.device, dtype=dtype)
+    num_pairs = 0
+    for start in range(0, num_columns, block_size):
+        rows = slice(start, min(start + block_size, num_columns))
+        # Only the columns after the first row of the block hold pairs counted once
+        corr_data = x_data_weighted[:, rows].T @ x_data[:, start:] - torch.outer(
+            mean_data[rows], mean_data[start:]
+        )
+        corr_gen = x_gen_weighted[:, rows].T @ x_gen[:, start:] - torch.outer(
+            mean_gen[rows], mean_gen[start:]
+        )
+        # Pairs of distinct variables, counted once
+        mask = torch.triu(
+            site[rows].unsqueeze(1) != site[start:].unsqueeze(0), diagonal=1
+        )
+        squared_error += ((corr_data - corr_gen)[mask] ** 2).sum()
+        num_pairs += int(mask.sum().item())
+    return {
+        "mean_error": torch.sqrt(((mean_data - mean_gen) ** 2).mean()).item(),
+        "corr_error": torch.sqrt(squared_error / num_pairs).item(),
+    }
+
+
+def evaluate_test_set(
+    params: EBM,
+    v_test: Tensor,
+    w_test: Tensor,
+    v_gen: Tensor,
+) -> dict[str, float]:
+    """Cheap metrics of the model on a subset of the test set, used to monitor the
+    training.
+
+    Args:
+        params (EBM): Parameters of the model.
+        v_test (Tensor): Test samples.
+        w_test (Tensor): Weights associated to the test samples.
+        v_gen (Tensor): Samples of the model, usually the permanent chains.
+
+    Returns:
+        dict[str, float]: The pseudo log-likelihood ('pll_test'), the moment errors
+        ('mean_error', 'corr_error'), the AATS scores ('aats_truth', 'aats_syn') and their
+        mean distance to 0.5 ('aats').
+    """
+    num_states = params.num_states() if hasattr(params, "num_states") else None
+    logs = {
+        "pll_test": compute_pseudo_log_likelihood(
+            params=params, v_data=v_test, w_data=w_test
+        )
+    }
+    logs.update(
+        compute_moment_errors(
+            v_data=v_test, w_data=w_test, v_gen=v_gen, num_states=num_states
+        )
+    )
+    n_sample = min(v_test.shape[0], v_gen.shape[0])
+    aats_truth, aats_syn = compute_aats(
+        sample_data=v_test.to(device=v_gen.device, dtype=torch.float32),
+        sample_gen=v_gen.to(torch.float32),
+        n_sample=n_sample,
+        dist="hamming",
+    )
+    logs["aats_truth"] = float(aats_truth)
+    logs["aats_syn"] = float(aats_syn)
+    logs["aats"] = 0.5 * (abs(logs["aats_truth"] - 0.5) + abs(logs["aats_syn"] - 0.5))
+    return logs
+
+
+class EarlyStopping:
+    """Keep track of the best evaluation of a metric and decide when to stop the training.
+
+    The training should stop when the metric did not improve by more than `min_delta` over
+    `patience` consecutive evaluations.
+    """
+
+    def __init__(
+        self,
+        metric: str = "pll_test",
+        patience: Optional[int] = None,
+        min_delta: float = 0.0,
+    ) -> None:
+        """
+        Args:
+            metric (str, optional): The monitored metric, one of 'pll_test', 'mean_error',
+                'corr_error' or 'aats'. Defaults to "pll_test".
+            patience (Optional[int], optional): Number of evaluations without improvement
+                before stopping. Defaults to None, which never stops.
+            min_delta (float, optional): Minimum change counted as an improvement.
+                Defaults to 0.0.
+        """
+        if metric not in EVAL_METRICS:
+            raise ValueError(
+                f"'metric' should be one of {list(EVAL_METRICS.keys())}, got {metric}"
+            )
+        self.metric = metric
+        self.patience = patience
+        self.min_delta = min_delta
+        self._sign = 1.0 if EVAL_METRICS[metric] == "max" else -1.0
+        self.best_value = -np.inf if self._sign > 0 else np.inf
+        self.best_update: Optional[int] = None
+        self.num_bad_evaluations = 0
+
+    @property
+    def should_stop(self) -> bool:
+        return self.patience is not None and self.num_bad_evaluations >= self.patience
+
+    def update(self, logs: dict[str, float], update: int) -> bool:
+        """Record an evaluation.
+
+        Args:
+            logs (dict[str, float]): Output of `evaluate_test_set`.
+            update (int): Index of the evaluated update.
+
+        Returns:
+            bool: Whether the evaluated model is the best one so far.
+        """
+        value = logs[self.metric]
+        if self._sign * (value - self.best_value) > self.min_delta:
+            self.best_value = value
+            self.best_update = update
+            self.num_bad_evaluations = 0
+            return True
+        self.num_bad_evaluations += 1
+        return False
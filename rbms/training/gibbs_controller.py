@@ -0,0 +1,155 @@
+import math
+from typing import Any, Optional
+
+import torch
+from torch import Tensor
+
+
+class GibbsStepsController:
+    """Adapt the number of Gibbs steps performed at each PCD update.
+
+    The mixing signal is the correlation, across the permanent chains, between the energy
+    of the chains before and after the Gibbs steps of an update. A correlation close to 1
+    means the chains barely moved and the number of steps is increased, a correlation close
+    to 0 means the chains decorrelate within an update and steps can be saved. The
+    correlation is smoothed with an exponential moving average and the number of steps is
+    changed at most once every `interval` updates.
+
+    `state_dict` gives the number of steps and the smoothed autocorrelation, from which a
+    restored training resumes with `load_state_dict`.
+    """
+
+    def __init__(
+        self,
+        gibbs_steps: int,
+        min_gibbs_steps: int = 1,
+        max_gibbs_steps: int = 100,
+        target_autocorr: float = 0.5,
+        tolerance: float = 0.1,
+        factor: float = 1.2,
+        smoothing: float = 0.9,
+        interval: int = 10,
+    ) -> None:
+        """
+        Args:
+            gibbs_steps (int): Initial number of Gibbs steps.
+            min_gibbs_steps (int, optional): Lower bound on the number of Gibbs steps.
+                Defaults to 1.
+            max_gibbs_steps (int, optional): Upper bound on the number of Gibbs steps.
+                Defaults to 100.
+            target_autocorr (float, optional): Target energy autocorrelation over one
+                update. Defaults to 0.5.
+            tolerance (float, optional): The number of steps is kept while the smoothed
+                autocorrelation is within `tolerance` of the target. Defaults to 0.1.
+            factor (float, optional): Multiplicative change of the number of steps.
+                Defaults to 1.2.
+            smoothing (float, optional): Coefficient of the exponential moving average of
+                the autocorrelation. Defaults to 0.9.
+            interval (int, optional): Minimum number of updates between two changes.
+                Defaults to 10.
+        """
+        if not (1 <= min_gibbs_steps <= max_gibbs_steps):
+            raise ValueError(
+                f"Expected 1 <= min_gibbs_steps <= max_gibbs_steps, got {min_gibbs_steps} and {max_gibbs_steps}"
+            )
+        self.min_gibbs_steps = min_gibbs_steps
+        self.max_gibbs_steps = max_gibbs_steps
+        self.gibbs_steps = min(max(gibbs_steps, min_gibbs_steps), max_gibbs_steps)
+        self.target_autocorr = target_autocorr
+        self.tolerance = tolerance
+        self.factor = factor
+        self.smoothing = smoothing
+        self.interval = interval
+        self.autocorr: Optional[float] = None
+        self._num_observations = 0
+
+    @staticmethod
+    def energy_autocorrelation(energy_before: Tensor, energy_after: Tensor) -> float:
+        """Pearson correlation across the chains between two energy measurements.
+
+        Args:
+            energy_before (Tensor): Energy of the chains before the Gibbs steps.
+            energy_after (Tensor): Energy of the chains after the Gibbs steps.
+
+        Returns:
+            float: The correlation, 1 if the energies are constant over the chains.
+        """
+        x = energy_before - energy_before.mean()
+        y = energy_after - energy_after.mean()
+        norm = torch.sqrt((x**2).sum() * (y**2).sum())
+        if norm <= 0:
+            return 1.0
+        return float((x * y).sum() / norm)
+
+    def update(self, energy_before: Tensor, energy_after: Tensor) -> dict[str, float]:
+        """Record the mixing of the last update and choose the number of Gibbs steps of the
+        next one.
+
+        Args:
+            energy_before (Tensor): Energy of the chains before the Gibbs steps.
+            energy_after (Tensor): Energy of the chains after the Gibbs steps.
+
+        Returns:
+            dict[str, float]: The number of steps used by the last update and the measured
+            autocorrelation, to be logged.
+        """
+        logs = {
+            "gibbs_steps": self.gibbs_steps,
+            "energy_autocorr": self.energy_autocorrelation(energy_before, energy_after),
+        }
+        if self.autocorr is None:
+            self.autocorr = logs["energy_autocorr"]
+        else:
+            self.autocorr = (
+                self.smoothing * self.autocorr
+                + (1 - self.smoothing) * logs["energy_autocorr"]
+            )
+        self._num_observations += 1
+
+        if self._num_observations >= self.interval:
+            new_gibbs_steps = self.gibbs_steps
+            if self.autocorr > self.target_autocorr + self.tolerance:
+                new_gibbs_steps = max(
+                    self.gibbs_steps + 1, math.ceil(self.gibbs_steps * self.factor)
+                )
+            elif self.autocorr < self.target_autocorr - self.tolerance:
+                new_gibbs_steps = min(
+                    self.gibbs_steps - 1, math.floor(self.gibbs_steps / self.factor)
+                )
+            new_gibbs_steps = min(
+                max(new_gibbs_steps, self.min_gibbs_steps), self.max_gibbs_steps
+            )
+            if new_gibbs_steps != self.gibbs_steps:
+                # Measurements made with the previous number of steps are discarded
+                self.gibbs_steps = new_gibbs_steps
+                self.autocorr = None
+                self._num_observations = 0
+        return logs
+
+    def state_dict(self) -> dict[str, Any]:
+        """State of the controller.
+
+        Returns:
+            dict[str, Any]: The number of Gibbs steps ('gibbs_steps'), the smoothed
+            autocorrelation ('autocorr', NaN before the first measurement) and the number
+            of measurements made with this number of steps ('num_observations').
+        """
+        return {
+            "gibbs_steps": self.gibbs_steps,
+            "autocorr": math.nan if self.autocorr is None else self.autocorr,
+            "num_observations": self._num_observations,
+        }
+
+    def load_state_dict(self, state: dict[str, Any]) -> None:
+        """Restore a state returned by `state_dict`, the number of steps being kept within
+        the bounds of the controller.
+
+        Args:
+            state (dict[str, Any]): The state.
+        """
+        self.gibbs_steps = min(
+            max(int(state["gibbs_steps"]), self.min_gibbs_steps), self.max_gibbs_steps
+        )
+        autocorr = float(state["autocorr"])
+        self.autocorr = None if math.isnan(autocorr) else autocorr
+        self._num_observations = int(state["num_observations"])
@@ -0,0 +1,64 @@
+import torch
+from torch import Tensor
+
+
+def get_ess(weights: Tensor) -> float:
+    """Normalized effective sample size of the permanent chains.
+
+    Args:
+        weights (Tensor): The weights of the chains, i.e. minus their log-weights.
+
+    Returns:
+        float: The effective sample size divided by the number of chains, between
+        1 / num_chains and 1.
+    """
+    log_weights = -weights.view(-1)
+    log_ess = 2 * torch.logsumexp(log_weights, 0) - torch.logsumexp(2 * log_weights, 0)
+    return torch.exp(log_ess).item() / log_weights.shape[0]
+
+
+def update_weights(
+    chains: dict[str, Tensor], energy_before: Tensor, energy_after: Tensor
+) -> dict[str, Tensor]:
+    """Accumulate the Jarzynski importance weights of the chains over a change of the
+    parameters. The log-weight of a chain is decreased by the increase of the energy of
+    its visible configuration.
+
+    Args:
+        chains (dict[str, Tensor]): The permanent chains.
+        energy_before (Tensor): Energy of the visible configurations before the update of
+            the parameters.
+        energy_after (Tensor): Energy of the visible configurations after the update of
+            the parameters.
+
+    Returns:
+        dict[str, Tensor]: The chains with the updated weights.
+    """
+    chains["weights"] = chains["weights"] + (energy_after - energy_before).view_as(
+        chains["weights"]
+    ).to(chains["weights"].dtype)
+    return chains
+
+
+def systematic_resampling(chains: dict[str, Tensor]) -> dict[str, Tensor]:
+    """Resample the chains proportionally to their importance weights with systematic
+    resampling, a single uniform offset being shared by all the draws. The weights of the
+    resampled chains are reset to be uniform.
+
+    Args:
+        chains (dict[str, Tensor]): The permanent chains.
+
+    Returns:
+        dict[str, Tensor]: The resampled chains.
+    """
+    weights = chains["weights"]
+    num_chains = weights.shape[0]
+    cumulative = torch.cumsum(torch.softmax(-weights.view(-1), 0), 0)
+    positions = (
+        torch.rand(1, device=weights.device, dtype=cumulative.dtype)
+        + torch.arange(num_chains, device=weights.device, dtype=cumulative.dtype)
+    ) / num_chains
+    idx = torch.searchsorted(cumulative, positions).clamp_(max=num_chains - 1)
+    resampled = {k: v[idx] for k, v in chains.items()}
+    resampled["weights"] = torch.ones_like(weights)
+    return resampled
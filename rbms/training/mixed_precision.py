@@ -0,0 +1,37 @@
+from torch import Tensor
+
+from rbms.classes import RBM
+
+
+def sample_state_mixed_precision(
+    params: RBM,
+    sampling_params: RBM,
+    chains: dict[str, Tensor],
+    n_steps: int,
+    beta: float = 1.0,
+) -> dict[str, Tensor]:
+    """Same as `RBM.sample_state`, with the Gibbs steps performed by a low precision copy
+    of the parameters. The last hidden layer, which enters the gradient, is sampled with
+    the full precision parameters and the returned chains have the data type of `params`.
+
+    Args:
+        params (RBM): Full precision parameters of the model.
+        sampling_params (RBM): Copy of `params` in a lower precision.
+        chains (dict[str, Tensor]): The starting position of the chains.
+        n_steps (int): The number of sampling steps.
+        beta (float, optional): The inverse temperature. Defaults to 1.0.
+
+    Returns:
+        dict[str, Tensor]: The updated chains after n_steps of sampling.
+    """
+    # The visible variables are binary or small integers, exactly represented in
+    # half precision
+    new_chains = {"visible": chains["visible"].to(sampling_params.dtype)}
+    for _ in range(n_steps):
+        new_chains = sampling_params.sample_hiddens(chains=new_chains, beta=beta)
+        new_chains = sampling_params.sample_visibles(chains=new_chains, beta=beta)
+    new_chains = {
+        "visible": new_chains["visible"].to(params.dtype),
+        "weights": chains["weights"].clone(),
+    }
+    return params.sample_hiddens(chains=new_chains, beta=beta)
@@ -0,0 +1,93 @@
+import math
+from typing import List, Optional
+
+from torch import Tensor
+from torch.optim import SGD, Adam, Optimizer, RMSprop
+
+OPTIMIZERS = ["sgd", "momentum", "adam", "rmsprop"]
+LR_SCHEDULES = ["constant", "linear", "exp", "cosine"]
+
+
+def get_optimizer(
+    name: str,
+    parameters: List[Tensor],
+    learning_rate: float,
+    momentum: float = 0.9,
+) -> Optimizer:
+    """Build the optimizer performing the gradient ascent on the log-likelihood.
+
+    Args:
+        name (str): One of 'sgd', 'momentum', 'adam' or 'rmsprop'.
+        parameters (List[Tensor]): The parameters of the model.
+        learning_rate (float): Initial learning rate.
+        momentum (float, optional): Momentum of the 'momentum' optimizer, and first
+            moment decay of 'adam'. Defaults to 0.9.
+
+    Returns:
+        Optimizer: The optimizer, with `maximize=True`.
+    """
+    match name:
+        case "sgd":
+            return SGD(parameters, lr=learning_rate, maximize=True)
+        case "momentum":
+            return SGD(parameters, lr=learning_rate, momentum=momentum, maximize=True)
+        case "adam":
+            return Adam(
+                parameters, lr=learning_rate, betas=(momentum, 0.999), maximize=True
+            )
+        case "rmsprop":
+            return RMSprop(parameters, lr=learning_rate, maximize=True)
+        case _:
+            raise ValueError(f"'optimizer' should be one of {OPTIMIZERS}, got {name}")
+
+
+def get_learning_rate(
+    schedule: str,
+    learning_rate: float,
+    update: int,
+    num_updates: int,
+    learning_rate_final: Optional[float] = None,
+) -> float:
+    """Learning rate at a given update. The schedule only depends on the update index, so
+    that a restored training follows the same schedule.
+
+    Args:
+        schedule (str): One of 'constant', 'linear', 'exp' or 'cosine'.
+        learning_rate (float): Initial learning rate.
+        update (int): Index of the current update.
+        num_updates (int): Total number of updates of the training.
+        learning_rate_final (Optional[float], optional): Learning rate at the end of the
+            training. Defaults to `learning_rate / 100`.
+
+    Returns:
+        float: The learning rate.
+    """
+    if learning_rate_final is None:
+        learning_rate_final = learning_rate / 100
+    progress = min(max(update / num_updates, 0.0), 1.0)
+    match schedule:
+        case "constant":
+            return learning_rate
+        case "linear":
+            return learning_rate + progress * (learning_rate_final - learning_rate)
+        case "exp":
+            return learning_rate * (learning_rate_final / learning_rate) ** progress
+        case "cosine":
+            return learning_rate_final + 0.5 * (learning_rate - learning_rate_final) * (
+                1 + math.cos(math.pi * progress)
+            )
+        case _:
+            raise ValueError(
+                f"'lr_schedule' should be one of {LR_SCHEDULES}, got {schedule}"
+            )
+
+
+def set_learning_rate(optimizer: Optimizer, learning_rate: float) -> None:
+    """Set the learning rate of all the parameter groups of the optimizer.
+
+    Args:
+        optimizer (Optimizer): The optimizer.
+        learning_rate (float): The new learning rate.
+    """
+    for group in optimizer.param_groups:
+        group["lr"] = learning_rate
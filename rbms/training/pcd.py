@@ -1,18 +1,33 @@
 import time
-from typing import Tuple
+from typing import Optional, Tuple
 
 import numpy as np
 import torch
 from torch import Tensor
-from torch.optim import SGD
 
 from rbms.classes import EBM
+from rbms.const import ARCHIVE_FORMAT, PRUNE_THRESHOLD
 from rbms.dataset.dataset_class import RBMDataset
-from rbms.io import save_model
+from rbms.dataset.minibatch import get_minibatch_iterator
+from rbms.io import AsyncCheckpointWriter, load_minibatch_state, load_optimizer_state
 from rbms.map_model import map_model
-from rbms.potts_bernoulli.classes import PBRBM
-from rbms.potts_bernoulli.utils import ensure_zero_sum_gauge
-from rbms.training.utils import create_machine, setup_training
+from rbms.metrics.pseudo_likelihood import compute_pseudo_log_likelihood
+from rbms.sparse_potts_bernoulli.classes import SparsePBRBM
+from rbms.sparse_potts_bernoulli.utils import prune_weights
+from rbms.training.chunked import fit_batch_pcd_chunked
+from rbms.training.compiled import compile_pcd_step
+from rbms.training.evaluation import EarlyStopping, evaluate_test_set
+from rbms.training.gibbs_controller import GibbsStepsController
+from rbms.training.jarzynski import get_ess, systematic_resampling, update_weights
+from rbms.training.mixed_precision import sample_state_mixed_precision
+from rbms.training.optimizer import get_learning_rate, get_optimizer, set_learning_rate
+from rbms.training.reservoir import ChainReservoir
+from rbms.training.utils import (
+    apply_gauge,
+    create_machine,
+    get_init_kwargs,
+    setup_training,
+)
 from rbms.utils import check_file_existence, log_to_csv
 
 
@@ -23,6 +38,8 @@ def fit_batch_pcd(
     gibbs_steps: int,
     beta: float,
     centered: bool = True,
+    chunk_size: Optional[int] = None,
+    sampling_dtype: Optional[torch.dtype] = None,
 ) -> Tuple[dict[str, Tensor], dict]:
     """Sample the EBM and compute the gradient.
 
@@ -32,10 +49,27 @@ def fit_batch_pcd(
         params (EBM): Parameters of the EBM.
         gibbs_steps (int): Number of Gibbs steps to perform.
         beta (float): Inverse temperature.
+        centered (bool, optional): Whether to use centered gradients. Defaults to True.
+        chunk_size (Optional[int], optional): Stream the minibatch and the chains in blocks
+            of `chunk_size` samples. Defaults to None.
+        sampling_dtype (Optional[torch.dtype], optional): Perform the Gibbs steps with a
+            copy of the parameters in this data type, the gradient is computed in the data
+            type of the parameters. Defaults to None.
 
     Returns:
         Tuple[dict[str, Tensor], dict]: A tuple containing the updated chains and the logs.
     """
+    if chunk_size is not None:
+        return fit_batch_pcd_chunked(
+            batch=batch,
+            parallel_chains=parallel_chains,
+            params=params,
+            gibbs_steps=gibbs_steps,
+            beta=beta,
+            chunk_size=chunk_size,
+            centered=centered,
+            sampling_dtype=sampling_dtype,
+        )
     v_data, w_data = batch
     # Initialize batch
     curr_batch = params.init_chains(
@@ -44,9 +78,18 @@ def fit_batch_pcd(
         start_v=v_data,
     )
     # sample permanent chains
-    parallel_chains = params.sample_state(
-        chains=parallel_chains, n_steps=gibbs_steps, beta=beta
-    )
+    if sampling_dtype is None:
+        parallel_chains = params.sample_state(
+            chains=parallel_chains, n_steps=gibbs_steps, beta=beta
+        )
+    else:
+        parallel_chains = sample_state_mixed_precision(
+            params=params,
+            sampling_params=params.clone(dtype=sampling_dtype),
+            chains=parallel_chains,
+            n_steps=gibbs_steps,
+            beta=beta,
+        )
     params.compute_gradient(data=curr_batch, chains=parallel_chains, centered=centered)
     logs = {}
     return parallel_chains, logs
@@ -65,25 +108,51 @@ def train(
 
     Args:
         dataset (RBMDataset): The training dataset.
-        test_dataset (RBMDataset): The test dataset (not used).
+        test_dataset (RBMDataset): The test dataset, used when 'eval_interval' is set.
         model_type (str): Type of RBM used (BBRBM or PBRBM)
         args (dict): A dictionary of training arguments.
         dtype (torch.dtype): The data type for the parameters.
         checkpoints (np.ndarray): An array of checkpoints for saving model states.
     """
     filename = args["filename"]
+    if args.get("eval_interval", None) is not None and test_dataset is None:
+        raise ValueError("Evaluating the model during training requires a test set.")
     if not (args["overwrite"]):
         check_file_existence(filename)
+    if (
+        args.get("chunk_size", None) is not None
+        and not map_model[model_type].has_gradient_statistics()
+    ):
+        raise ValueError(f"'chunk_size' is not supported by {model_type}.")
+    # The options of the compiled update are checked before creating the archive, the
+    # optimizer is checked once restored from it
+    if args.get("compile", False):
+        if args.get("chunk_size", None) is not None:
+            raise ValueError("The compiled update does not support 'chunk_size'.")
+        if args.get("sampling_dtype", None) is not None:
+            raise ValueError("The compiled update does not support 'sampling_dtype'.")
+        if args.get("jarzynski", False):
+            raise ValueError("The compiled update does not support 'jarzynski'.")
+        if args.get("prune_interval", None) is not None:
+            # The compiled update keeps the couplings removed by the pruning
+            raise ValueError("The compiled update does not support 'prune_interval'.")
 
     num_visibles = dataset.get_num_visibles()
 
     # Create a first archive with the initialized model
     if not (args["restore"]):
+        reservoir_size = args.get("reservoir_size", None)
+        if reservoir_size is not None and reservoir_size < args["num_chains"]:
+            raise ValueError(
+                f"'reservoir_size' ({reservoir_size}) should be at least 'num_chains' ({args['num_chains']})."
+            )
         params = map_model[model_type].init_parameters(
             num_hiddens=args["num_hiddens"],
-            dataset=dataset,
+            dataset=dataset.in_memory(args.get("num_samples_init", 100_000)),
             device=args["device"],
             dtype=dtype,
+            init=args.get("init", "random"),
+            **get_init_kwargs(model_type, args),
         )
         create_machine(
             filename=filename,
@@ -96,6 +165,12 @@ def train(
             learning_rate=args["learning_rate"],
             log=args["log"],
             flags=["checkpoint"],
+            optimizer=args.get("optimizer", "sgd"),
+            archive_format=args.get("archive_format", ARCHIVE_FORMAT),
+            momentum=args.get("momentum", 0.9),
+            lr_schedule=args.get("lr_schedule", "constant"),
+            learning_rate_final=args.get("learning_rate_final", None),
+            reservoir_size=reservoir_size,
         )
 
     (
@@ -110,43 +185,224 @@ def train(
         pbar,
     ) = setup_training(args, map_model=map_model)
 
-    optimizer = SGD(params.parameters(), lr=learning_rate, maximize=True)
+    optimizer = get_optimizer(
+        name=args.get("optimizer", "sgd"),
+        parameters=params.parameters(),
+        learning_rate=learning_rate,
+        momentum=args.get("momentum", 0.9),
+    )
+    load_optimizer_state(
+        filename=args["filename"], index=num_updates, optimizer=optimizer, params=params
+    )
+    # The compiled update also performs the SGD step and the gauge fixing
+    pcd_step = None
+    if args.get("compile", False):
+        if args.get("optimizer", "sgd") != "sgd":
+            raise ValueError("The compiled update only supports the 'sgd' optimizer.")
+        pcd_step = compile_pcd_step(params)
+
+    # Only a rotating subset of 'num_chains' chains of the pool is used at each update
+    reservoir = None
+    if args.get("reservoir_size", None) is not None:
+        reservoir = ChainReservoir(chains=parallel_chains, num_chains=args["num_chains"])
+
+    # Importance weights of the chains accumulated over the updates of the parameters,
+    # the chains are resampled when the effective sample size drops below 'ess_threshold'
+    jarzynski = args.get("jarzynski", False)
+    if jarzynski and reservoir is not None:
+        raise ValueError("'jarzynski' does not support 'reservoir_size'.")
+
+    # Magnitude-based pruning of the couplings of a sparse model
+    prune_interval = args.get("prune_interval", None)
+    if prune_interval is not None and not isinstance(params, SparsePBRBM):
+        raise ValueError(f"Pruning requires a SparsePBRBM, got {params.name}.")
+
+    # Adapt the number of Gibbs steps from the energy autocorrelation of the chains
+    gibbs_controller = None
+    if args.get("adaptive_gibbs_steps", False):
+        gibbs_controller = GibbsStepsController(
+            gibbs_steps=args["gibbs_steps"],
+            min_gibbs_steps=args.get("min_gibbs_steps", 1),
+            max_gibbs_steps=args.get("max_gibbs_steps", 100),
+            target_autocorr=args.get("target_autocorr", 0.5),
+        )
+    # State saved with the hyperparameters of the archive
+    gibbs_controller_state = args.pop("gibbs_controller", None)
+    if gibbs_controller is not None and gibbs_controller_state is not None:
+        gibbs_controller.load_state_dict(gibbs_controller_state)
 
     for k, v in args.items():
         print(f"{k} : {v}")
 
-    # Continue the training
-    with torch.no_grad():
+    # Fixed subset of the training set on which the pseudo log-likelihood is logged
+    pll_idx = torch.randperm(len(dataset), generator=torch.Generator().manual_seed(0))[
+        : args.get("num_samples_pll", 10_000)
+    ]
+
+    # Evaluation on a fixed subset of the test set every 'eval_interval' updates
+    eval_interval = args.get("eval_interval", None)
+    early_stopping = None
+    if eval_interval is not None:
+        eval_idx = torch.randperm(
+            len(test_dataset), generator=torch.Generator().manual_seed(0)
+        )[: args.get("num_samples_eval", 2000)]
+        early_stopping = EarlyStopping(
+            metric=args.get("eval_metric", "pll_test"),
+            patience=args.get("patience", None),
+            min_delta=args.get("min_delta", 0.0),
+        )
+
+    # Minibatches are drawn epoch by epoch and prefetched on a background thread, a
+    # restored training resumes the sequence of minibatches of the checkpoint
+    batches = get_minibatch_iterator(
+        data=dataset.data,
+        weights=dataset.weights,
+        batch_size=args["batch_size"],
+        weighted=args.get("importance_sampling", False),
+        device=params.device,
+        state=load_minibatch_state(filename=args["filename"], index=num_updates),
+    )
+
+    # Continue the training, the checkpoints are written on a background thread and
+    # flushed when leaving the block, including on KeyboardInterrupt
+    with torch.no_grad(), AsyncCheckpointWriter(args["filename"]) as writer, batches:
         for idx in range(num_updates + 1, args["num_updates"] + 1):
-            rand_idx = torch.randperm(len(dataset))[: args["batch_size"]]
-            batch = (dataset.data[rand_idx], dataset.weights[rand_idx])
-
-            optimizer.zero_grad(set_to_none=False)
-            parallel_chains, logs = fit_batch_pcd(
-                batch=batch,
-                parallel_chains=parallel_chains,
-                params=params,
-                gibbs_steps=args["gibbs_steps"],
-                beta=args["beta"],
+            batch = next(batches)
+            if reservoir is not None:
+                parallel_chains = reservoir.draw(params)
+            curr_learning_rate = get_learning_rate(
+                schedule=args.get("lr_schedule", "constant"),
+                learning_rate=learning_rate,
+                update=idx,
+                num_updates=args["num_updates"],
+                learning_rate_final=args.get("learning_rate_final", None),
             )
-            optimizer.step()
-            if isinstance(params, PBRBM):
-                ensure_zero_sum_gauge(params)
+            set_learning_rate(optimizer, curr_learning_rate)
+            gibbs_steps = args["gibbs_steps"]
+            if gibbs_controller is not None:
+                gibbs_steps = gibbs_controller.gibbs_steps
+                chains_before = parallel_chains["visible"]
 
-            # Save current model if necessary
+            if pcd_step is not None:
+                parallel_chains, logs = pcd_step(
+                    batch=batch,
+                    parallel_chains=parallel_chains,
+                    gibbs_steps=gibbs_steps,
+                    beta=args["beta"],
+                    learning_rate=curr_learning_rate,
+                )
+                if gibbs_controller is not None:
+                    # The parameters are already updated, both energies use the new ones
+                    energy_before = params.compute_energy_visibles(chains_before)
+                    energy_after = params.compute_energy_visibles(
+                        parallel_chains["visible"]
+                    )
+            else:
+                optimizer.zero_grad(set_to_none=False)
+                parallel_chains, logs = fit_batch_pcd(
+                    batch=batch,
+                    parallel_chains=parallel_chains,
+                    params=params,
+                    gibbs_steps=gibbs_steps,
+                    beta=args["beta"],
+                    chunk_size=args.get("chunk_size", None),
+                    sampling_dtype=args.get("sampling_dtype", None),
+                )
+                if gibbs_controller is not None:
+                    # The mixing is measured with the parameters used for the sampling
+                    energy_before = params.compute_energy_visibles(chains_before)
+                    energy_after = params.compute_energy_visibles(
+                        parallel_chains["visible"]
+                    )
+                if jarzynski:
+                    energy_chains = params.compute_energy_visibles(
+                        parallel_chains["visible"]
+                    )
+                optimizer.step()
+                apply_gauge(params)
+            if reservoir is not None:
+                reservoir.store(parallel_chains)
+            if prune_interval is not None and idx % prune_interval == 0:
+                prune_weights(
+                    params,
+                    threshold=args.get("prune_threshold", PRUNE_THRESHOLD),
+                    optimizer=optimizer,
+                )
+            if isinstance(params, SparsePBRBM):
+                logs["num_edges"] = params.num_edges()
+            if gibbs_controller is not None:
+                logs.update(
+                    gibbs_controller.update(
+                        energy_before=energy_before, energy_after=energy_after
+                    )
+                )
+            if jarzynski:
+                parallel_chains = update_weights(
+                    parallel_chains,
+                    energy_before=energy_chains,
+                    energy_after=params.compute_energy_visibles(
+                        parallel_chains["visible"]
+                    ),
+                )
+                logs["ess"] = get_ess(parallel_chains["weights"])
+                if logs["ess"] < args.get("ess_threshold", 0.5):
+                    parallel_chains = systematic_resampling(parallel_chains)
+
+            flags = []
             if idx in checkpoints:
+                flags.append("checkpoint")
+            stop = False
+            if early_stopping is not None and (
+                idx % eval_interval == 0 or idx == args["num_updates"]
+            ):
+                eval_logs = evaluate_test_set(
+                    params=params,
+                    v_test=test_dataset.data[eval_idx],
+                    w_test=test_dataset.weights[eval_idx],
+                    v_gen=parallel_chains["visible"],
+                )
+                logs.update(eval_logs)
+                if early_stopping.update(eval_logs, update=idx):
+                    flags.append("best")
+                stop = early_stopping.should_stop
+                # Keep the last state of an interrupted training
+                if stop and "checkpoint" not in flags:
+                    flags.append("checkpoint")
+
+            # Save current model if necessary, a best model between two checkpoints is
+            # held in memory and written with the next checkpoint
+            if len(flags) > 0:
                 curr_time = time.time() - start
-                save_model(
-                    filename=args["filename"],
+                save = writer.save if "checkpoint" in flags else writer.hold
+                save(
                     params=params,
-                    chains=parallel_chains,
+                    chains=parallel_chains if reservoir is None else reservoir.chains(),
                     num_updates=idx,
                     time=curr_time + elapsed_time,
-                    flags=["checkpoint"],
+                    flags=flags,
+                    optimizer=optimizer,
+                    minibatch_state=batches.state_dict(),
+                    hyperparameters=(
+                        None
+                        if gibbs_controller is None
+                        else {"gibbs_controller": gibbs_controller.state_dict()}
+                    ),
                 )
 
             if args["log"]:
+                logs["update"] = idx
+                if idx in checkpoints:
+                    logs["pll_train"] = compute_pseudo_log_likelihood(
+                        params=params,
+                        v_data=dataset.data[pll_idx],
+                        w_data=dataset.weights[pll_idx],
+                    )
                 log_to_csv(logs, log_file=log_filename)
 
             # Update progress bar
             pbar.update(1)
+            if stop:
+                print(
+                    f"Early stopping at update {idx}, best {early_stopping.metric} at update {early_stopping.best_update}"
+                )
+                break
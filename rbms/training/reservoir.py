@@ -0,0 +1,122 @@
+from typing import Optional
+
+import torch
+from torch import Tensor
+
+from rbms.classes import EBM
+
+
+def get_storage_dtype(visible: Tensor) -> torch.dtype:
+    """Most compact data type holding the visible states exactly.
+
+    Args:
+        visible (Tensor): The visible states of the chains.
+
+    Returns:
+        torch.dtype: `torch.uint8` for binary and Potts variables with at most 256 states,
+        the data type of `visible` otherwise.
+    """
+    if visible.numel() == 0:
+        return torch.uint8
+    is_integer = torch.all(visible == torch.round(visible))
+    if is_integer and visible.min() >= 0 and visible.max() <= 255:
+        return torch.uint8
+    return visible.dtype
+
+
+class ChainReservoir:
+    """Large pool of persistent chains of which only a rotating subset is used at each
+    PCD update.
+
+    The pool is kept on the host, with the visible states stored in a compact data type. At
+    each update, `draw` returns the next `num_chains` chains of a random permutation of the
+    pool on the device and in the data type of the model, and `store` writes them back
+    after the Gibbs steps. A new permutation is drawn once the whole pool has been used, so
+    that each chain is advanced every `size / num_chains` updates on average while the
+    cost of an update only depends on `num_chains`.
+    """
+
+    def __init__(
+        self,
+        chains: dict[str, Tensor],
+        num_chains: int,
+        storage_dtype: Optional[torch.dtype] = None,
+    ) -> None:
+        """
+        Args:
+            chains (dict[str, Tensor]): The chains of the pool.
+            num_chains (int): Number of chains used at each update.
+            storage_dtype (Optional[torch.dtype], optional): Data type of the stored visible
+                states. Defaults to the output of `get_storage_dtype`.
+        """
+        size = chains["visible"].shape[0]
+        if not (0 < num_chains <= size):
+            raise ValueError(
+                f"Expected 0 < num_chains <= {size} (size of the reservoir), got {num_chains}"
+            )
+        self.num_chains = num_chains
+        self.device = chains["visible"].device
+        self.dtype = chains["visible"].dtype
+        if storage_dtype is None:
+            storage_dtype = get_storage_dtype(chains["visible"])
+        self.visible = chains["visible"].to(device="cpu", dtype=storage_dtype)
+        self.weights = chains["weights"].to(device="cpu")
+        if self.device.type == "cuda":
+            # Faster host to device copies
+            self.visible = self.visible.pin_memory()
+            self.weights = self.weights.pin_memory()
+        self._order = torch.randperm(size)
+        self._position = 0
+        self._indices: Optional[Tensor] = None
+
+    def __len__(self) -> int:
+        return self.visible.shape[0]
+
+    def draw(self, params: EBM) -> dict[str, Tensor]:
+        """Next subset of chains to update.
+
+        Args:
+            params (EBM): Parameters of the model, used to initialize the hidden layer.
+
+        Returns:
+            dict[str, Tensor]: `num_chains` chains of the pool.
+        """
+        if self._position + self.num_chains > len(self):
+            self._order = torch.randperm(len(self))
+            self._position = 0
+        self._indices = self._order[self._position : self._position + self.num_chains]
+        self._position += self.num_chains
+        return params.init_chains(
+            num_samples=self.num_chains,
+            weights=self.weights[self._indices].to(self.device, non_blocking=True),
+            start_v=self.visible[self._indices].to(
+                device=self.device, dtype=self.dtype, non_blocking=True
+            ),
+        )
+
+    def store(self, chains: dict[str, Tensor]) -> None:
+        """Write back the chains returned by the last call to `draw`.
+
+        Args:
+            chains (dict[str, Tensor]): The updated chains.
+        """
+        if self._indices is None:
+            raise RuntimeError("'store' must be called after 'draw'.")
+        self.visible[self._indices] = chains["visible"].to(
+            device="cpu", dtype=self.visible.dtype
+        )
+        self.weights[self._indices] = chains["weights"].to(
+            device="cpu", dtype=self.weights.dtype
+        )
+        self._indices = None
+
+    def chains(self) -> dict[str, Tensor]:
+        """The whole pool, in the data type of the model and on the host.
+
+        Returns:
+            dict[str, Tensor]: The visible states and the weights of all the chains.
+        """
+        return {
+            "visible": self.visible.to(dtype=self.dtype),
+            "weights": self.weights.clone(),
+        }
@@ -1,18 +1,29 @@
 import pathlib
 import time
-from typing import Any, List, Tuple
+from typing import Any, List, Optional, Tuple
 
 import h5py
 import numpy as np
 import torch
+import torch.distributed as dist
 from torch import Tensor
 from tqdm import tqdm
 
 from rbms.classes import EBM
-from rbms.const import LOG_FILE_HEADER
+from rbms.const import ARCHIVE_FORMAT, LOG_FILE_HEADER
 from rbms.io import load_model, save_model
+from rbms.low_rank_potts_bernoulli.classes import LowRankPBRBM
+from rbms.low_rank_potts_bernoulli.utils import (
+    ensure_zero_sum_gauge as ensure_zero_sum_gauge_low_rank,
+)
 from rbms.map_model import map_model
-from rbms.utils import get_saved_updates
+from rbms.potts_bernoulli.classes import PBRBM
+from rbms.potts_bernoulli.utils import ensure_zero_sum_gauge
+from rbms.sparse_potts_bernoulli.classes import SparsePBRBM
+from rbms.sparse_potts_bernoulli.utils import (
+    ensure_zero_sum_gauge as ensure_zero_sum_gauge_sparse,
+)
+from rbms.utils import get_saved_updates, upgrade_log_file
 
 
 def setup_training(
@@ -48,6 +59,10 @@ def setup_training(
         f"log-{pathlib.Path(args['filename']).stem}.csv"
     )
     args["log"] = log_filename.exists()
+    if args["log"] and (not dist.is_initialized() or dist.get_rank() == 0):
+        # Logs written by a previous version may have other columns. Only the first
+        # worker of a distributed training writes to the log file
+        upgrade_log_file(log_filename)
 
     # Progress bar
     pbar = tqdm(
@@ -90,6 +105,12 @@ def create_machine(
     learning_rate: float,
     log: bool,
     flags: List[str],
+    optimizer: str = "sgd",
+    reservoir_size: Optional[int] = None,
+    archive_format: int = ARCHIVE_FORMAT,
+    momentum: float = 0.9,
+    lr_schedule: str = "constant",
+    learning_rate_final: Optional[float] = None,
 ) -> None:
     """Create a RBM and save it to a new file.
 
@@ -103,11 +124,29 @@ def create_machine(
         gibbs_steps (int): Number of Gibbs steps to perform.
         learning_rate (float): Learning rate for training.
         log (bool): Whether to enable logging.
+        optimizer (str, optional): Name of the optimizer. Defaults to "sgd".
+        reservoir_size (Optional[int], optional): Size of the pool of permanent chains, of
+            which `num_chains` are used at each update. Defaults to None.
+        archive_format (int, optional): Version of the layout of the archive, see
+            `rbms.io.convert_archive`. Defaults to `ARCHIVE_FORMAT`.
+        momentum (float, optional): Momentum of the optimizer. Defaults to 0.9.
+        lr_schedule (str, optional): Schedule of the learning rate. Defaults to "constant".
+        learning_rate_final (Optional[float], optional): Learning rate at the end of the
+            schedule. Defaults to None.
     """
+    if archive_format not in [1, 2]:
+        raise ValueError(
+            f"'archive_format' should be one of [1, 2], got {archive_format}"
+        )
     # Permanent chains
-    parallel_chains = params.init_chains(num_samples=num_chains)
+    parallel_chains = params.init_chains(
+        num_samples=num_chains if reservoir_size is None else reservoir_size
+    )
     parallel_chains = params.sample_state(chains=parallel_chains, n_steps=gibbs_steps)
     with h5py.File(filename, "w") as file_model:
+        # The archives of version 1 have no version attribute
+        if archive_format >= 2:
+            file_model.attrs["format_version"] = archive_format
         hyperparameters = file_model.create_group("hyperparameters")
         hyperparameters["num_hiddens"] = num_hiddens
         hyperparameters["num_visibles"] = num_visibles
@@ -116,6 +155,13 @@ def create_machine(
         hyperparameters["gibbs_steps"] = gibbs_steps
         hyperparameters["filename"] = str(filename)
         hyperparameters["learning_rate"] = learning_rate
+        hyperparameters["optimizer"] = optimizer
+        hyperparameters["momentum"] = momentum
+        hyperparameters["lr_schedule"] = lr_schedule
+        if learning_rate_final is not None:
+            hyperparameters["learning_rate_final"] = learning_rate_final
+        if reservoir_size is not None:
+            hyperparameters["reservoir_size"] = reservoir_size
 
     save_model(
         filename=filename,
@@ -159,3 +205,37 @@ def get_checkpoints(num_updates: int, n_save: int, spacing: str = "exp") -> np.n
             )
     checkpoints = np.unique(np.append(checkpoints, num_updates))
     return checkpoints
+
+
+def get_init_kwargs(model_type: str, args: dict) -> dict[str, Any]:
+    """Model specific keyword arguments of `init_parameters`.
+
+    Args:
+        model_type (str): Type of RBM used.
+        args (dict): A dictionary of training arguments.
+
+    Returns:
+        dict[str, Any]: The keyword arguments to pass to `init_parameters`.
+    """
+    match model_type:
+        case "LowRankPBRBM":
+            return {"rank": args.get("rank", None)}
+        case "SparsePBRBM":
+            return {"num_connections": args.get("num_connections", None)}
+        case _:
+            return {}
+
+
+def apply_gauge(params: EBM) -> None:
+    """Set the zero-sum gauge of the Potts models in place after an update, the other
+    models are left unchanged.
+
+    Args:
+        params (EBM): Parameters of the model.
+    """
+    if isinstance(params, PBRBM):
+        ensure_zero_sum_gauge(params)
+    elif isinstance(params, LowRankPBRBM):
+        ensure_zero_sum_gauge_low_rank(params)
+    elif isinstance(params, SparsePBRBM):
+        ensure_zero_sum_gauge_sparse(params)
@@ -1,65 +1,49 @@
 import itertools
 import pathlib
 import sys
-from typing import Tuple
+from typing import Optional, Tuple
 
-import h5py
 import numpy as np
 import torch
 from torch import Tensor
 
+from rbms.archive import get_archive_format as get_archive_format
+from rbms.archive import get_flagged_updates as get_flagged_updates
+from rbms.archive import get_saved_updates as get_saved_updates
+from rbms.archive import get_update_index as get_update_index
+from rbms.archive import is_checkpoint_key as is_checkpoint_key
+from rbms.archive import restore_rng_state as restore_rng_state
 from rbms.classes import RBM
 from rbms.const import LOG_FILE_HEADER
+from rbms.metrics.spectrum import get_spectral_history
 
 
-def get_eigenvalues_history(filename: str):
+def get_eigenvalues_history(
+    filename: str, k: Optional[int] = None, num_workers: int = 1
+) -> Tuple[np.ndarray, np.ndarray]:
     """
     Extracts the history of eigenvalues of the RBM's weight matrix.
 
     Args:
         filename (str): Path to the HDF5 training archive.
+        k (Optional[int], optional): Number of leading singular values, computed with a
+            randomized SVD warm-started from the previous checkpoint. Defaults to all of
+            them.
+        num_workers (int, optional): Number of processes. Defaults to 1.
 
     Returns:
         tuple: A tuple containing two elements:
             - gradient_updates (np.ndarray): Array of gradient update steps.
             - eigenvalues (np.ndarray): Eigenvalues along training.
-    """
-    with h5py.File(filename, "r") as f:
-        gradient_updates = []
-        eigenvalues = []
-        for key in f.keys():
-            if "update" in key:
-                weight_matrix = f[key]["params"]["weight_matrix"][()]
-                weight_matrix = weight_matrix.reshape(-1, weight_matrix.shape[-1])
-                eig = np.linalg.svd(weight_matrix, compute_uv=False)
-                eigenvalues.append(eig.reshape(*eig.shape, 1))
-                gradient_updates.append(int(key.split("_")[1]))
-
-        # Sort the results
-        sorting = np.argsort(gradient_updates)
-        gradient_updates = np.array(gradient_updates)[sorting]
-        eigenvalues = np.array(np.hstack(eigenvalues).T)[sorting]
-
-    return gradient_updates, eigenvalues
-
-
-def get_saved_updates(filename: str) -> np.ndarray:
-    """
-    Extracts the saved index from an RBM training archive
-
-    Args:
-        filename (str): The path to the HDF5 file from which to extract update indices.
 
-    Returns:
-        np.ndarray: Sorted array of update indices.
+    Notes:
+        See `rbms.metrics.spectrum.get_spectral_history` to also get the singular vectors
+        and store the results in the archive.
     """
-    updates = []
-    with h5py.File(filename, "r") as f:
-        for key in f.keys():
-            if "update" in key:
-                update = int(key.replace("update_", ""))
-                updates.append(update)
-    return np.sort(np.array(updates))
+    gradient_updates, eigenvalues, _ = get_spectral_history(
+        filename=filename, k=k, num_workers=num_workers, cache=False
+    )
+    return gradient_updates, eigenvalues
 
 
 def get_categorical_configurations(
@@ -149,34 +133,6 @@ def check_file_existence(filename: str):
             sys.exit(0)
 
 
-def restore_rng_state(filename: str, index: int):
-    """
-    Restores the random number generator (RNG) states for both PyTorch and NumPy from a RBM training archive.
-
-    Args:
-        filename (str): Path to the HDF5 file.
-        index (int): Training index to load.
-
-    Raises:
-        KeyError: If the specified index does not exist in the HDF5 file.
-        OSError: If the file cannot be opened or read.
-        ValueError: If the RNG state data is not in the expected format.
-    """
-    last_file_key = f"update_{index}"
-    with h5py.File(filename, "r") as f:
-        torch.set_rng_state(torch.tensor(np.array(f[last_file_key]["torch_rng_state"])))
-        np_rng_state = tuple(
-            [
-                f[last_file_key]["numpy_rng_arg0"][()].decode("utf-8"),
-                f[last_file_key]["numpy_rng_arg1"][()],
-                f[last_file_key]["numpy_rng_arg2"][()],
-                f[last_file_key]["numpy_rng_arg3"][()],
-                f[last_file_key]["numpy_rng_arg4"][()],
-            ]
-        )
-        np.random.set_state(np_rng_state)
-
-
 def log_to_csv(logs: dict[str, float], log_file: str) -> None:
     """
     Append log data to a CSV file.
@@ -201,6 +157,35 @@ def log_to_csv(logs: dict[str, float], log_file: str) -> None:
         f.write(to_write + "\n")
 
 
+def upgrade_log_file(log_file: str) -> None:
+    """
+    Rewrite a CSV log file written with another header so that its columns follow
+    `LOG_FILE_HEADER`, before new rows are appended. The columns are matched by name, the
+    missing ones are left empty and the unknown ones are dropped.
+
+    Parameters:
+        log_file (str): Path to the CSV file.
+    """
+    with open(log_file, "r", encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    if len(lines) == 0:
+        return
+    header = lines[0].split(",")
+    if header == LOG_FILE_HEADER:
+        return
+    columns = [header.index(k) if k in header else None for k in LOG_FILE_HEADER]
+    rows = [",".join(LOG_FILE_HEADER)]
+    for line in lines[1:]:
+        values = line.split(",")
+        rows.append(
+            ",".join(
+                values[c] if c is not None and c < len(values) else "" for c in columns
+            )
+        )
+    with open(log_file, "w", encoding="utf-8") as f:
+        f.write("\n".join(rows) + "\n")
+
+
 def compute_log_likelihood(
     v_data: Tensor, w_data: Tensor, params: RBM, log_z: float
 ) -> float:
@@ -279,26 +264,3 @@ def swap_chains(
     )
 
     return new_chain_1, new_chain_2
-
-
-def get_flagged_updates(filename: str, flag: str) -> np.ndarray:
-    """
-    Retrieve a sorted list of update indices from an HDF5 file that have a specific flag set.
-
-    Args:
-        filename (str): Path to the HDF5 file.
-        flag (str): Flag to check for in the updates.
-
-    Returns:
-        np.ndarray: Sorted array of update indices that have the specified flag set.
-    """
-    flagged_updates = []
-    with h5py.File(filename, "r") as f:
-        for key in f.keys():
-            if "update" in key:
-                update = int(key.replace("update_", ""))
-                if flag in f[key]["flags"]:
-                    if f[key]["flags"][flag][()]:
-                        flagged_updates.append(update)
-    flagged_updates = np.sort(np.array(flagged_updates))
-    return flagged_updates
@@ -96,3 +96,59 @@ def test_compute_gradient_centered(
     assert vbias.grad.dtype == vbias.dtype
     assert hbias.grad.dtype == hbias.dtype
     assert weight_matrix.grad.dtype == weight_matrix.dtype
+
+
+@pytest.mark.parametrize("centered", [True, False])
+def test_compute_gradient_values(
+    sample_params_bbrbm,
+    sample_binary_v_chains,
+    sample_binary_h_chains,
+    sample_binary_v_samples,
+    sample_binary_h_samples,
+    centered,
+):
+    v_chains, _ = sample_binary_v_chains
+    v_data, _ = sample_binary_v_samples
+    h_chains, _ = sample_binary_h_chains
+    _, mh_data = sample_binary_h_samples
+    vbias, hbias, weight_matrix = sample_params_bbrbm
+    w_data = torch.rand(pytest.NUM_SAMPLES, 1)
+    w_chains = torch.randn(pytest.NUM_CHAINS, 1)
+
+    vbias.grad = torch.zeros_like(vbias)
+    hbias.grad = torch.zeros_like(hbias)
+    weight_matrix.grad = torch.zeros_like(weight_matrix)
+
+    _compute_gradient(
+        v_data,
+        mh_data,
+        w_data,
+        v_chains,
+        h_chains,
+        w_chains,
+        vbias,
+        hbias,
+        weight_matrix,
+        centered=centered,
+    )
+
+    # Reference computed on explicitly centered copies
+    p_data = w_data / w_data.sum()
+    p_chains = torch.softmax(-w_chains, dim=0)
+    v_data_mean = (p_data * v_data).sum(0).clamp(1e-7, 1 - 1e-7)
+    h_data_mean = (p_data * mh_data).sum(0)
+    v_gen_mean = (p_chains * v_chains).sum(0).clamp(1e-7, 1 - 1e-7)
+    h_gen_mean = (p_chains * h_chains).sum(0)
+    if centered:
+        v_center, h_center = v_data_mean, h_data_mean
+    else:
+        v_center, h_center = torch.zeros_like(v_data_mean), torch.zeros_like(h_data_mean)
+    grad_weight_matrix = ((p_data * (v_data - v_center)).T @ (mh_data - h_center)) - (
+        (p_chains * (v_chains - v_center)).T @ (h_chains - h_center)
+    )
+    grad_vbias = v_data_mean - v_gen_mean - grad_weight_matrix @ h_center
+    grad_hbias = h_data_mean - h_gen_mean - v_center @ grad_weight_matrix
+
+    assert torch.allclose(weight_matrix.grad, grad_weight_matrix, atol=1e-6)
+    assert torch.allclose(vbias.grad, grad_vbias, atol=1e-6)
+    assert torch.allclose(hbias.grad, grad_hbias, atol=1e-6)
@@ -0,0 +1,35 @@
+import pytest
+import torch
+
+from rbms.bernoulli_bernoulli.implement import (
+    _compute_energy_visibles,
+    _compute_pseudo_log_likelihood,
+)
+
+
+def test_compute_pseudo_log_likelihood(sample_binary_v_samples, sample_params_bbrbm):
+    # Arrange
+    v, _ = sample_binary_v_samples
+    vbias, hbias, weight_matrix = sample_params_bbrbm
+
+    # Act
+    pll = _compute_pseudo_log_likelihood(v, vbias, hbias, weight_matrix)
+    # Blocks of a single visible unit
+    pll_blocks = _compute_pseudo_log_likelihood(
+        v, vbias, hbias, weight_matrix, max_elements=1
+    )
+
+    # Assert
+    assert pll.shape == (pytest.NUM_SAMPLES,)
+    assert torch.all(pll <= 0)
+    assert torch.allclose(pll, pll_blocks)
+
+    # Compare with the flips computed from the marginal energy
+    expected = torch.zeros(pytest.NUM_SAMPLES)
+    energy = _compute_energy_visibles(v, vbias, hbias, weight_matrix)
+    for i in range(pytest.NUM_VISIBLES):
+        v_flip = v.clone()
+        v_flip[:, i] = 1 - v_flip[:, i]
+        energy_flip = _compute_energy_visibles(v_flip, vbias, hbias, weight_matrix)
+        expected += -energy - torch.logaddexp(-energy, -energy_flip)
+    assert torch.allclose(pll, expected, atol=1e-4)
@@ -2,7 +2,10 @@ import numpy as np
 import pytest
 import torch
 
-from rbms.bernoulli_bernoulli.implement import _init_parameters
+from rbms.bernoulli_bernoulli.implement import (
+    _init_parameters,
+    _init_parameters_mean_field,
+)
 
 
 def test_init_parameters_cpu(sample_binary_v_samples):
@@ -62,3 +65,23 @@ def test_init_parameters_dummy_device(sample_binary_v_samples):
     assert vbias.dtype == dtype
     assert hbias.dtype == dtype
     assert weight_matrix.dtype == dtype
+
+
+def test_init_parameters_mean_field(sample_binary_v_samples):
+    data, _ = sample_binary_v_samples
+    weights = torch.rand(data.shape[0])
+    vbias, hbias, weight_matrix = _init_parameters_mean_field(
+        pytest.NUM_HIDDENS,
+        data,
+        weights,
+        torch.device("cpu"),
+        torch.float32,
+        0.0,
+    )
+    assert vbias.shape == (pytest.NUM_VISIBLES,)
+    assert hbias.shape == (pytest.NUM_HIDDENS,)
+    assert weight_matrix.shape == (pytest.NUM_VISIBLES, pytest.NUM_HIDDENS)
+    assert weight_matrix.dtype == torch.float32
+    # The input of the hidden units vanishes on the weighted mean of the data
+    frequencies = torch.clamp((weights @ data) / weights.sum(), min=1e-4, max=1 - 1e-4)
+    assert torch.allclose(hbias + frequencies @ weight_matrix, torch.zeros(1), atol=1e-5)
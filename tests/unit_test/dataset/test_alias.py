@@ -0,0 +1,43 @@
+import pytest
+import torch
+
+from rbms.dataset.alias import AliasTable
+
+
+def test_alias_table_frequencies():
+    weights = torch.tensor([0.0, 1.0, 2.0, 0.0, 3.0, 0.5])
+    table = AliasTable(weights)
+    generator = torch.Generator().manual_seed(0)
+    idx = table.sample(200_000, generator=generator)
+    freq = torch.bincount(idx, minlength=weights.shape[0]).double() / idx.shape[0]
+    assert torch.allclose(freq, (weights / weights.sum()).double(), atol=5e-3)
+    # Null weights are never drawn
+    assert freq[0] == 0
+    assert freq[3] == 0
+
+
+def test_alias_table_uniform():
+    table = AliasTable(torch.ones(7))
+    assert torch.all(table.prob == 1)
+    assert torch.equal(table.alias, torch.arange(7))
+
+
+def test_alias_table_seed():
+    table = AliasTable(torch.rand(50))
+    idx1 = table.sample(100, generator=torch.Generator().manual_seed(1))
+    idx2 = table.sample(100, generator=torch.Generator().manual_seed(1))
+    assert torch.equal(idx1, idx2)
+
+
+@pytest.mark.parametrize(
+    "weights",
+    [
+        torch.zeros(0),
+        torch.zeros(3),
+        torch.tensor([1.0, -1.0]),
+        torch.tensor([float("nan")]),
+    ],
+)
+def test_alias_table_invalid(weights):
+    with pytest.raises(ValueError):
+        AliasTable(weights)
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from rbms.dataset.fasta_utils import (
+    encode_sequence,
+    get_encoding_table,
+    get_tokens,
+    import_encoded_fasta,
+    import_from_fasta,
+    write_fasta,
+)
+from rbms.dataset.load_fasta import load_FASTA
+
+
+@pytest.fixture
+def sample_fasta(tmp_path):
+    filename = tmp_path / "msa.fasta"
+    # Multi-line records, blank lines and Windows line endings
+    filename.write_bytes(b">seq 1\nACD-\nEFG\n\n>seq2\r\nAAAAAAA\r\n>seq3  \n-CDEFG\nA")
+    return filename
+
+
+def test_import_from_fasta(sample_fasta):
+    names, sequences = import_from_fasta(sample_fasta)
+    assert names.tolist() == ["seq_1", "seq2", "seq3"]
+    assert sequences.tolist() == ["ACD-EFG", "AAAAAAA", "-CDEFGA"]
+
+
+def test_import_encoded_fasta(sample_fasta):
+    tokens = "-ACDEFG"
+    names, encoded = import_encoded_fasta(sample_fasta, tokens)
+    _, sequences = import_from_fasta(sample_fasta)
+    assert names.tolist() == ["seq_1", "seq2", "seq3"]
+    assert encoded.dtype == np.int8
+    assert encoded.shape == (3, 7)
+    for seq, enc in zip(sequences, encoded):
+        assert np.array_equal(enc, encode_sequence(seq, tokens))
+
+    table = get_encoding_table(tokens)
+    assert table.shape == (256,)
+    assert table[ord("C")] == 2
+    assert table[ord("Z")] == 255
+
+
+def test_import_encoded_fasta_invalid(tmp_path, sample_fasta):
+    # Letters outside of the alphabet
+    with pytest.raises(KeyError):
+        import_encoded_fasta(sample_fasta, "-ACDEF")
+    filename = tmp_path / "unaligned.fasta"
+    filename.write_text(">a\nACD\n>b\nAC\n")
+    with pytest.raises(ValueError):
+        import_encoded_fasta(filename, "-ACD")
+    filename.write_text("ACD\n>b\nACD\n")
+    with pytest.raises(RuntimeError):
+        import_encoded_fasta(filename, "-ACD")
+
+
+def test_load_fasta(tmp_path):
+    tokens = get_tokens("protein")
+    rng = np.random.default_rng(0)
+    sequences = rng.integers(0, len(tokens), (50, 30))
+    sequences[0] = np.arange(30) % len(tokens)
+    filename = tmp_path / "msa.fasta"
+    write_fasta(
+        str(filename),
+        [f"seq_{i}" for i in range(50)],
+        sequences,
+        numeric_input=True,
+        alphabet="protein",
+    )
+    dataset, weights, names = load_FASTA(filename, device="cpu")
+    assert dataset.dtype == np.int8
+    assert np.array_equal(dataset, sequences)
+    assert weights.shape == (50,)
+    assert names[3] == "seq_3"
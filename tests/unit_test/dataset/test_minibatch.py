@@ -0,0 +1,85 @@
+import pytest
+import torch
+
+from rbms.dataset.minibatch import MinibatchIterator
+
+
+@pytest.mark.parametrize("prefetch", [True, False])
+def test_minibatch_iterator_epoch(prefetch):
+    num_samples, batch_size = 23, 5
+    data = torch.arange(num_samples, dtype=torch.float32).unsqueeze(1).repeat(1, 3)
+    weights = torch.arange(num_samples, dtype=torch.float32)
+    batches = MinibatchIterator(
+        data, weights, batch_size=batch_size, seed=0, prefetch=prefetch
+    )
+    num_batches = num_samples // batch_size
+    seen = []
+    for _ in range(num_batches):
+        v_batch, w_batch = next(batches)
+        assert v_batch.shape == (batch_size, 3)
+        assert w_batch.shape == (batch_size,)
+        # Weights follow their samples
+        assert torch.equal(v_batch[:, 0], w_batch)
+        seen.append(w_batch)
+    seen = torch.cat(seen)
+    # No sample is repeated within an epoch
+    assert seen.unique().shape[0] == num_batches * batch_size
+    assert batches.epoch == 1
+    next(batches)
+    batches.close()
+    assert batches.epoch == 2
+
+
+def test_minibatch_iterator_seed():
+    data = torch.randn(31, 4)
+    weights = torch.ones(31)
+    b1 = MinibatchIterator(data, weights, batch_size=7, seed=3, prefetch=False)
+    b2 = MinibatchIterator(data, weights, batch_size=7, seed=3)
+    for _ in range(10):
+        assert torch.equal(next(b1)[0], next(b2)[0])
+    b2.close()
+
+
+def test_minibatch_iterator_weighted():
+    num_samples = 10
+    data = torch.arange(num_samples, dtype=torch.float32).unsqueeze(1)
+    weights = torch.zeros(num_samples)
+    weights[[2, 7]] = 1.0
+    batches = MinibatchIterator(
+        data, weights, batch_size=4, weighted=True, seed=0, prefetch=False
+    )
+    for _ in range(5):
+        v_batch, w_batch = next(batches)
+        assert set(v_batch[:, 0].tolist()) <= {2.0, 7.0}
+        assert torch.equal(w_batch, torch.ones(4))
+
+
+def test_minibatch_iterator_small_dataset():
+    data = torch.randn(3, 2)
+    batches = MinibatchIterator(data, torch.ones(3), batch_size=10, prefetch=False)
+    v_batch, _ = next(batches)
+    assert v_batch.shape == (3, 2)
+
+
+@pytest.mark.parametrize("weighted", [False, True])
+def test_minibatch_iterator_state(weighted):
+    data = torch.arange(23, dtype=torch.float32).unsqueeze(1)
+    weights = torch.rand(23)
+    batches = MinibatchIterator(data, weights, batch_size=5, weighted=weighted, seed=0)
+    assert batches.state_dict() is None
+    for _ in range(6):
+        next(batches)
+    state = batches.state_dict()
+    assert state["epoch"] == 2
+    assert state["num_batches"] == 2
+    expected = [next(batches)[0] for _ in range(10)]
+    batches.close()
+
+    # The restored iterator continues the same sequence, whatever its seed
+    with MinibatchIterator(
+        data, weights, batch_size=5, weighted=weighted, seed=1, state=state
+    ) as restored:
+        assert restored.epoch == 2
+        for v_batch in expected:
+            assert torch.equal(next(restored)[0], v_batch)
+    assert restored._thread is None
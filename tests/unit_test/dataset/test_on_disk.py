@@ -0,0 +1,255 @@
+import pickle
+
+import h5py
+import numpy as np
+import pytest
+import torch
+
+from rbms.dataset import load_dataset
+from rbms.dataset.load_h5 import load_HDF5
+from rbms.dataset.minibatch import BlockShuffleIterator, get_minibatch_iterator
+from rbms.dataset.on_disk import OnDiskArray, convert_HDF5_to_npy
+from rbms.io import load_minibatch_state
+from rbms.map_model import map_model
+from rbms.training.distributed import launch_distributed_training
+from rbms.training.pcd import train
+
+NUM_SAMPLES = 103
+NUM_VISIBLES = 7
+CHUNK_ROWS = 8
+
+
+@pytest.fixture
+def sample_h5_dataset(tmp_path):
+    filename = tmp_path / "dataset.h5"
+    rng = np.random.default_rng(0)
+    samples = 2 * rng.integers(0, 2, (NUM_SAMPLES, NUM_VISIBLES)) - 1
+    with h5py.File(filename, "w") as f:
+        f.create_dataset("samples", data=samples, chunks=(CHUNK_ROWS, NUM_VISIBLES))
+        # The labels identify the samples
+        f["labels"] = np.arange(NUM_SAMPLES)
+    return filename, samples
+
+
+def test_on_disk_array(sample_h5_dataset):
+    filename, samples = sample_h5_dataset
+    with h5py.File(filename, "r") as f:
+        data = OnDiskArray(f["samples"])
+        assert data.shape == samples.shape
+        assert data.block_size == CHUNK_ROWS
+        idx = torch.tensor([50, 3, 3, 90])
+        assert torch.equal(data[idx], torch.from_numpy(samples[idx]).float())
+        assert torch.equal(data[5], torch.from_numpy(samples[5]).float())
+        assert torch.equal(data[10:20], torch.from_numpy(samples[10:20]).float())
+
+        # Views keep the order of the storage
+        view = data.subset(np.array([60, 2, 31]))
+        assert len(view) == 3
+        assert torch.equal(view[[2, 0]], torch.from_numpy(samples[[60, 2]]).float())
+        assert torch.equal(
+            view.subset(np.array([1]))[0], torch.from_numpy(samples[31]).float()
+        )
+
+        data.ising = True
+        assert torch.equal(data[1:], (torch.from_numpy(samples[1:]).float() + 1) / 2)
+        assert data.max() == 1
+
+
+def test_on_disk_array_pickle(sample_h5_dataset, tmp_path):
+    filename, samples = sample_h5_dataset
+    npy_file = tmp_path / "dataset.npy"
+    convert_HDF5_to_npy(filename, npy_file)
+    with OnDiskArray(h5py.File(filename, "r")["samples"], ising=True) as data:
+        view = data.subset(np.arange(0, NUM_SAMPLES, 2))
+        npy_view = OnDiskArray(np.load(npy_file, mmap_mode="r")).subset(view.rows)
+        for v in [view, npy_view]:
+            dumped = pickle.dumps(v)
+            # The samples are not copied
+            assert len(dumped) < samples[::2].nbytes
+            with pickle.loads(dumped) as restored:
+                assert torch.equal(restored[:], view[:])
+                assert restored.block_size == v.block_size
+    # The file of the views is closed with the array
+    assert not view.source.id.valid
+    view.close()
+
+
+def test_load_HDF5_closes_file(tmp_path):
+    filename = tmp_path / "dataset.h5"
+    with h5py.File(filename, "w") as f:
+        f["samples"] = np.arange(12).reshape(4, 3)
+    with pytest.raises(ValueError):
+        load_HDF5(filename, in_memory=False)
+    # The file is not left open after the error
+    with h5py.File(filename, "w") as f:
+        f["samples"] = np.arange(12).reshape(4, 3) % 2
+    data, _ = load_HDF5(filename, in_memory=False)
+    assert data.source.id.valid
+    data.close()
+    assert not data.source.id.valid
+
+
+@pytest.mark.parametrize("buffer_blocks", [1, 3])
+def test_block_shuffle_iterator(tmp_path, buffer_blocks):
+    filename = tmp_path / "dataset.h5"
+    batch_size = 10
+    samples = np.arange(NUM_SAMPLES).reshape(-1, 1).repeat(NUM_VISIBLES, 1)
+    with h5py.File(filename, "w") as f:
+        f.create_dataset("samples", data=samples, chunks=(CHUNK_ROWS, NUM_VISIBLES))
+    with h5py.File(filename, "r") as f:
+        data = OnDiskArray(f["samples"])
+        weights = torch.arange(NUM_SAMPLES, dtype=torch.float32)
+        batches = BlockShuffleIterator(
+            data, weights, batch_size, buffer_blocks=buffer_blocks, seed=0
+        )
+        num_batches = NUM_SAMPLES // batch_size
+        seen = []
+        for _ in range(num_batches):
+            v_batch, w_batch = next(batches)
+            assert v_batch.shape == (batch_size, NUM_VISIBLES)
+            assert v_batch.dtype == torch.float32
+            # Weights follow their samples
+            assert torch.equal(v_batch[:, 0], w_batch)
+            seen.append(w_batch)
+        seen = torch.cat(seen)
+        # No sample is repeated within an epoch
+        assert seen.unique().shape[0] == num_batches * batch_size
+        assert batches.epoch == 1
+        next(batches)
+        batches.close()
+        assert batches.epoch == 2
+
+        with pytest.raises(ValueError):
+            get_minibatch_iterator(data, weights, batch_size, weighted=True)
+
+
+def test_block_shuffle_iterator_state(sample_h5_dataset):
+    filename, _ = sample_h5_dataset
+    with h5py.File(filename, "r") as f:
+        data = OnDiskArray(f["samples"])
+        weights = torch.rand(NUM_SAMPLES)
+        batches = BlockShuffleIterator(data, weights, 10, buffer_blocks=2, seed=0)
+        for _ in range(13):
+            next(batches)
+        state = batches.state_dict()
+        assert state["epoch"] == 2
+        expected = [next(batches) for _ in range(15)]
+        batches.close()
+
+        with BlockShuffleIterator(
+            data, weights, 10, buffer_blocks=2, seed=1, state=state
+        ) as restored:
+            assert restored.epoch == 2
+            for v_batch, w_batch in expected:
+                v_restored, w_restored = next(restored)
+                assert torch.equal(v_restored, v_batch)
+                assert torch.equal(w_restored, w_batch)
+
+
+def test_load_dataset_on_disk(sample_h5_dataset, tmp_path):
+    filename, _ = sample_h5_dataset
+    train_in_memory, test_in_memory = load_dataset(str(filename), binarize=True)
+    train_on_disk, test_on_disk = load_dataset(
+        str(filename), binarize=True, in_memory=False
+    )
+    assert train_on_disk.is_on_disk()
+    assert isinstance(train_on_disk.data, OnDiskArray)
+    for dataset, dataset_on_disk in [
+        (train_in_memory, train_on_disk),
+        (test_in_memory, test_on_disk),
+    ]:
+        order = torch.argsort(dataset.labels)
+        assert torch.equal(dataset.labels[order], dataset_on_disk.labels)
+        assert torch.equal(dataset.data[order], dataset_on_disk.data[:])
+    assert train_on_disk.get_num_visibles() == NUM_VISIBLES
+    subset = train_on_disk.in_memory(max_samples=10)
+    assert not subset.is_on_disk()
+    assert len(subset) == 10
+
+    # Memory-mapped copy of the samples
+    npy_file = tmp_path / "dataset.npy"
+    convert_HDF5_to_npy(filename, npy_file)
+    assert np.load(npy_file).dtype == np.uint8
+    train_npy, _ = load_dataset(str(npy_file), in_memory=False)
+    assert torch.equal(train_npy.data[:], train_on_disk.data[:])
+
+
+def test_train_on_disk(sample_h5_dataset, sample_args):
+    filename, _ = sample_h5_dataset
+    dataset, _ = load_dataset(str(filename), binarize=True, in_memory=False)
+    sample_args["restore"] = False
+    train(
+        dataset,
+        None,
+        "BBRBM",
+        sample_args,
+        torch.float32,
+        np.arange(1, sample_args["num_updates"] + 1),
+        map_model=map_model,
+    )
+    with h5py.File(sample_args["filename"], "r") as f:
+        assert f"update_{sample_args['num_updates']}" in f.keys()
+
+
+def test_train_restore_minibatches(sample_h5_dataset, sample_args, tmp_path):
+    filename, _ = sample_h5_dataset
+    dataset, _ = load_dataset(str(filename), binarize=True, in_memory=False)
+    sample_args["restore"] = False
+    sample_args["batch_size"] = 10
+    sample_args["num_updates"] = 4
+    reference_args = dict(sample_args, filename=tmp_path / "reference.h5")
+    for args in [reference_args, dict(sample_args, num_updates=2)]:
+        torch.manual_seed(0)
+        train(
+            dataset,
+            None,
+            "BBRBM",
+            args,
+            torch.float32,
+            np.arange(1, 5),
+            map_model=map_model,
+        )
+    # The first checkpoint is the initialized model
+    assert load_minibatch_state(str(sample_args["filename"]), 1) is None
+    state = load_minibatch_state(str(sample_args["filename"]), 2)
+    assert state["epoch"] == 1
+    assert state["num_batches"] == 1
+
+    # The restored training draws the same minibatches as the uninterrupted one
+    sample_args["restore"] = True
+    train(
+        dataset,
+        None,
+        "BBRBM",
+        sample_args,
+        torch.float32,
+        np.arange(1, 5),
+        map_model=map_model,
+    )
+    with (
+        h5py.File(sample_args["filename"], "r") as f,
+        h5py.File(reference_args["filename"], "r") as f_ref,
+    ):
+        for k in f["update_4"]["params"].keys():
+            assert np.allclose(
+                f["update_4"]["params"][k][()], f_ref["update_4"]["params"][k][()]
+            )
+
+
+def test_train_distributed_on_disk(sample_h5_dataset, sample_args, tmp_path):
+    filename, _ = sample_h5_dataset
+    dataset, _ = load_dataset(str(filename), binarize=True, in_memory=False)
+    sample_args["restore"] = False
+    launch_distributed_training(
+        dataset,
+        None,
+        "BBRBM",
+        sample_args,
+        torch.float32,
+        np.arange(1, sample_args["num_updates"] + 1),
+        num_workers=2,
+        init_method=f"file://{tmp_path / 'init'}",
+        map_model=map_model,
+    )
+    with h5py.File(sample_args["filename"], "r") as f:
+        assert f"update_{sample_args['num_updates']}" in f.keys()
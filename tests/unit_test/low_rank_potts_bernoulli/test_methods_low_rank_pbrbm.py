@@ -0,0 +1,198 @@
+import numpy as np
+import pytest
+import torch
+
+from rbms.io import load_params
+from rbms.low_rank_potts_bernoulli.classes import LowRankPBRBM
+from rbms.low_rank_potts_bernoulli.utils import ensure_zero_sum_gauge
+from rbms.map_model import map_model
+from rbms.potts_bernoulli.classes import PBRBM
+from rbms.training.distributed import launch_distributed_training
+from rbms.training.pcd import train
+from rbms.utils import get_eigenvalues_history
+
+RANK = 2
+
+
+@pytest.fixture
+def sample_params_class_low_rank_pbrbm():
+    return LowRankPBRBM(
+        visible_factor=torch.randn(
+            pytest.NUM_VISIBLES, pytest.NUM_STATES, RANK, dtype=torch.float64
+        ),
+        hidden_factor=torch.randn(RANK, pytest.NUM_HIDDENS, dtype=torch.float64),
+        vbias=torch.randn(pytest.NUM_VISIBLES, pytest.NUM_STATES, dtype=torch.float64),
+        hbias=torch.randn(pytest.NUM_HIDDENS, dtype=torch.float64),
+    )
+
+
+def _dense(params):
+    return PBRBM(
+        weight_matrix=params.weight_matrix(),
+        vbias=params.vbias.clone(),
+        hbias=params.hbias.clone(),
+    )
+
+
+def test_low_rank_pbrbm_energies(
+    sample_params_class_low_rank_pbrbm, sample_potts_v_samples, sample_chains_pbrbm
+):
+    params = sample_params_class_low_rank_pbrbm
+    dense = _dense(params)
+    v = sample_potts_v_samples.to(torch.float64)
+    h = sample_chains_pbrbm["hidden"].to(torch.float64)[: v.shape[0]]
+    assert torch.allclose(params.compute_energy(v, h), dense.compute_energy(v, h))
+    assert torch.allclose(
+        params.compute_energy_visibles(v), dense.compute_energy_visibles(v)
+    )
+    assert torch.allclose(
+        params.compute_energy_hiddens(h), dense.compute_energy_hiddens(h)
+    )
+    # Blocks of one site
+    assert torch.allclose(
+        params.compute_pseudo_log_likelihood(v, max_elements=1),
+        dense.compute_pseudo_log_likelihood(v),
+    )
+
+
+@pytest.mark.parametrize("centered", [True, False])
+def test_low_rank_pbrbm_compute_gradient(
+    sample_params_class_low_rank_pbrbm, sample_potts_v_samples, centered
+):
+    params = sample_params_class_low_rank_pbrbm
+    dense = _dense(params)
+    data = params.init_chains(
+        pytest.NUM_SAMPLES,
+        weights=torch.rand(pytest.NUM_SAMPLES, dtype=torch.float64),
+        start_v=sample_potts_v_samples,
+    )
+    chains = params.init_chains(pytest.NUM_CHAINS)
+    chains["weights"] = torch.randn(pytest.NUM_CHAINS, dtype=torch.float64)
+    for p in params.parameters() + dense.parameters():
+        p.grad = torch.zeros_like(p)
+    params.compute_gradient(data, chains, centered=centered)
+    dense.compute_gradient(data, chains, centered=centered)
+
+    # Chain rule through W = U V
+    grad_weight_matrix = dense.weight_matrix.grad.view(-1, pytest.NUM_HIDDENS)
+    visible_factor = params.visible_factor.view(-1, RANK)
+    assert torch.allclose(
+        params.visible_factor.grad.view(-1, RANK),
+        grad_weight_matrix @ params.hidden_factor.T,
+    )
+    assert torch.allclose(
+        params.hidden_factor.grad, visible_factor.T @ grad_weight_matrix
+    )
+    assert torch.allclose(params.vbias.grad, dense.vbias.grad)
+    assert torch.allclose(params.hbias.grad, dense.hbias.grad)
+
+
+def test_low_rank_pbrbm_gauge(
+    sample_params_class_low_rank_pbrbm, sample_potts_v_samples, sample_chains_pbrbm
+):
+    params = sample_params_class_low_rank_pbrbm
+    v = sample_potts_v_samples.to(torch.float64)
+    h = sample_chains_pbrbm["hidden"].to(torch.float64)[: v.shape[0]]
+    energy = params.compute_energy(v, h)
+    ensure_zero_sum_gauge(params)
+    assert torch.allclose(
+        params.weight_matrix().sum(1), torch.zeros(1, dtype=torch.float64), atol=1e-10
+    )
+    # The gauge only shifts the energy by a constant
+    delta = params.compute_energy(v, h) - energy
+    assert torch.allclose(delta, delta[0].expand_as(delta))
+
+
+@pytest.mark.parametrize("init", ["random", "mean_field"])
+def test_low_rank_pbrbm_init_parameters(sample_dataset_pbrbm, init):
+    params = LowRankPBRBM.init_parameters(
+        pytest.NUM_HIDDENS,
+        sample_dataset_pbrbm,
+        torch.device("cpu"),
+        torch.float32,
+        init=init,
+        rank=RANK,
+    )
+    assert params.visible_factor.shape == (
+        pytest.NUM_VISIBLES,
+        pytest.NUM_STATES,
+        RANK,
+    )
+    assert params.hidden_factor.shape == (RANK, pytest.NUM_HIDDENS)
+    assert torch.allclose(params.weight_matrix().sum(1), torch.zeros(1), atol=1e-5)
+    # The rank is at most the number of hidden units
+    params = LowRankPBRBM.init_parameters(
+        pytest.NUM_HIDDENS,
+        sample_dataset_pbrbm,
+        torch.device("cpu"),
+        torch.float32,
+        init=init,
+        rank=100,
+    )
+    assert params.rank() == pytest.NUM_HIDDENS
+    with pytest.raises(ValueError):
+        LowRankPBRBM.init_parameters(
+            pytest.NUM_HIDDENS,
+            sample_dataset_pbrbm,
+            torch.device("cpu"),
+            torch.float32,
+            init=init,
+            rank=0,
+        )
+
+
+def test_train_low_rank_pbrbm(sample_dataset_pbrbm, sample_args):
+    checkpoints = np.arange(1, sample_args["num_updates"] + 1)
+    sample_args["restore"] = False
+    sample_args["batch_size"] = pytest.NUM_SAMPLES
+    sample_args["rank"] = RANK
+    train(
+        sample_dataset_pbrbm,
+        sample_dataset_pbrbm,
+        "LowRankPBRBM",
+        sample_args,
+        torch.float32,
+        checkpoints,
+        map_model=map_model,
+    )
+    params = load_params(
+        sample_args["filename"],
+        index=sample_args["num_updates"],
+        device=sample_args["device"],
+        dtype=sample_args["dtype"],
+    )
+    assert isinstance(params, LowRankPBRBM)
+    assert params.rank() == RANK
+    assert torch.allclose(params.weight_matrix().sum(1), torch.zeros(1), atol=1e-5)
+    _, eigenvalues = get_eigenvalues_history(sample_args["filename"])
+    assert eigenvalues.shape[1] == RANK
+
+
+def test_train_low_rank_pbrbm_streamed(sample_dataset_pbrbm, sample_args):
+    sample_args["restore"] = False
+    sample_args["rank"] = RANK
+    # The gradient of the factors is not a sum of statistics over the samples
+    assert not LowRankPBRBM.has_gradient_statistics()
+    with pytest.raises(ValueError):
+        train(
+            sample_dataset_pbrbm,
+            sample_dataset_pbrbm,
+            "LowRankPBRBM",
+            dict(sample_args, chunk_size=4),
+            torch.float32,
+            np.arange(1, sample_args["num_updates"] + 1),
+            map_model=map_model,
+        )
+    with pytest.raises(ValueError):
+        launch_distributed_training(
+            sample_dataset_pbrbm,
+            sample_dataset_pbrbm,
+            "LowRankPBRBM",
+            sample_args,
+            torch.float32,
+            np.arange(1, sample_args["num_updates"] + 1),
+            num_workers=2,
+            map_model=map_model,
+        )
+    # Rejected before the archive is created
+    assert not sample_args["filename"].exists()
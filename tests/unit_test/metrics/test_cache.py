@@ -0,0 +1,99 @@
+import h5py
+import pytest
+import torch
+
+import rbms.metrics.cache
+from rbms.io import load_metric, save_metric, save_model
+from rbms.metrics.cache import get_log_likelihood, get_log_z
+from rbms.utils import get_categorical_configurations
+
+
+@pytest.fixture
+def sample_archive(tmp_path, sample_params_class_bbrbm, sample_chains_bbrbm):
+    filename = tmp_path / "test_model.h5"
+    save_model(str(filename), sample_params_class_bbrbm, sample_chains_bbrbm, 1, 0.0)
+    return filename
+
+
+def test_save_load_metric(sample_archive):
+    settings = {"method": "ais", "num_chains": 10, "num_beta": 20}
+    save_metric(sample_archive, 1, "log_z", {"log_z": 1.5}, settings)
+
+    assert load_metric(sample_archive, 1, "log_z", settings) == {"log_z": 1.5}
+    assert load_metric(sample_archive, 1, "log_z", {**settings, "num_beta": 30}) is None
+    assert load_metric(sample_archive, 1, "other", settings) is None
+
+    save_metric(sample_archive, 1, "log_z", {"log_z": 2.5}, settings)
+    assert load_metric(sample_archive, 1, "log_z", settings) == {"log_z": 2.5}
+
+
+def test_get_log_z_ais_cached(sample_archive, monkeypatch):
+    kwargs = dict(
+        device=torch.device("cpu"),
+        dtype=torch.float32,
+        method="ais",
+        num_chains=pytest.NUM_CHAINS,
+        num_beta=10,
+    )
+    log_z = get_log_z(sample_archive, 1, **kwargs)
+    with h5py.File(sample_archive, "r") as f:
+        assert "log_z" in f["update_1"]["metrics"]
+
+    def fail(*args, **kwargs):
+        raise AssertionError("The cached value should have been used.")
+
+    monkeypatch.setattr(rbms.metrics.cache, "compute_partition_function_ais_stats", fail)
+    assert get_log_z(sample_archive, 1, **kwargs) == log_z
+    with pytest.raises(AssertionError):
+        get_log_z(sample_archive, 1, **{**kwargs, "num_beta": 11})
+    with pytest.raises(AssertionError):
+        get_log_z(sample_archive, 1, **{**kwargs, "dtype": torch.float64})
+    with pytest.raises(AssertionError):
+        get_log_z(sample_archive, 1, recompute=True, **kwargs)
+
+
+def test_get_log_likelihood_exact_cached(
+    sample_archive, sample_binary_v_samples, monkeypatch
+):
+    v_data, _ = sample_binary_v_samples
+    w_data = torch.ones(v_data.shape[0])
+    all_config = get_categorical_configurations(n_states=2, n_dim=pytest.NUM_HIDDENS)
+    kwargs = dict(
+        device=torch.device("cpu"),
+        dtype=torch.float32,
+        method="exact",
+        all_config=all_config,
+    )
+    ll = get_log_likelihood(sample_archive, 1, v_data, w_data, **kwargs)
+    assert ll < 0
+
+    def fail(*args, **kwargs):
+        raise AssertionError("The cached value should have been used.")
+
+    monkeypatch.setattr(rbms.metrics.cache, "compute_log_likelihood", fail)
+    assert get_log_likelihood(sample_archive, 1, v_data, w_data, **kwargs) == ll
+    # Different data must not hit the cache
+    with pytest.raises(AssertionError):
+        get_log_likelihood(sample_archive, 1, 1 - v_data, w_data, **kwargs)
+
+
+def test_get_log_z_exact_settings(sample_archive, monkeypatch):
+    all_config = get_categorical_configurations(n_states=2, n_dim=pytest.NUM_HIDDENS)
+    kwargs = dict(device=torch.device("cpu"), method="exact", all_config=all_config)
+    log_z = get_log_z(sample_archive, 1, dtype=torch.float32, **kwargs)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("The cached value should have been used.")
+
+    monkeypatch.setattr(rbms.metrics.cache, "compute_partition_function", fail)
+    assert get_log_z(sample_archive, 1, dtype=torch.float32, **kwargs) == log_z
+    # The result of another dtype or enumeration is not reused
+    with pytest.raises(AssertionError):
+        get_log_z(sample_archive, 1, dtype=torch.float64, **kwargs)
+    with pytest.raises(AssertionError):
+        get_log_z(
+            sample_archive,
+            1,
+            dtype=torch.float32,
+            **{**kwargs, "all_config": all_config.flip(0)},
+        )
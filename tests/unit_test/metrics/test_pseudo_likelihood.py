@@ -0,0 +1,34 @@
+import pytest
+import torch
+
+from rbms.metrics.pseudo_likelihood import compute_pseudo_log_likelihood
+
+
+def test_compute_pseudo_log_likelihood_bbrbm(
+    sample_params_class_bbrbm, sample_binary_v_samples
+):
+    params = sample_params_class_bbrbm
+    v_data, _ = sample_binary_v_samples
+    w_data = torch.rand(pytest.NUM_SAMPLES)
+
+    pll = compute_pseudo_log_likelihood(params, v_data, w_data)
+    pll_batched = compute_pseudo_log_likelihood(params, v_data, w_data, batch_size=3)
+    expected = (
+        params.compute_pseudo_log_likelihood(v_data) @ w_data / w_data.sum()
+    ).item()
+
+    assert isinstance(pll, float)
+    assert pll == pytest.approx(expected, rel=1e-5)
+    assert pll_batched == pytest.approx(expected, rel=1e-5)
+
+
+def test_compute_pseudo_log_likelihood_pbrbm(
+    sample_params_class_pbrbm, sample_potts_v_samples
+):
+    params = sample_params_class_pbrbm
+    v_data = sample_potts_v_samples
+
+    pll = compute_pseudo_log_likelihood(params, v_data, batch_size=4)
+    expected = params.compute_pseudo_log_likelihood(v_data).mean().item()
+
+    assert pll == pytest.approx(expected, rel=1e-5)
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+import torch
+
+import rbms.metrics.spectrum
+from rbms.io import load_metric, save_model
+from rbms.metrics.spectrum import compute_top_singular_values, get_spectral_history
+from rbms.utils import get_eigenvalues_history
+
+NUM_ROWS = 200
+NUM_COLS = 60
+
+
+@pytest.fixture
+def sample_matrix():
+    generator = torch.Generator().manual_seed(0)
+    # Decreasing spectrum, as for the weight matrix of a trained RBM
+    u, _ = torch.linalg.qr(
+        torch.randn(NUM_ROWS, NUM_COLS, generator=generator, dtype=torch.float64)
+    )
+    v, _ = torch.linalg.qr(
+        torch.randn(NUM_COLS, NUM_COLS, generator=generator, dtype=torch.float64)
+    )
+    s = 10.0 * 0.8 ** torch.arange(NUM_COLS, dtype=torch.float64)
+    return (u * s) @ v.T
+
+
+@pytest.fixture
+def sample_archive(tmp_path, sample_params_class_bbrbm, sample_chains_bbrbm):
+    filename = tmp_path / "test_model.h5"
+    params = sample_params_class_bbrbm
+    for i in range(1, 6):
+        params.weight_matrix += 0.1 * torch.randn_like(params.weight_matrix)
+        save_model(str(filename), params, sample_chains_bbrbm, i, 0.0)
+    return filename
+
+
+def test_compute_top_singular_values(sample_matrix):
+    s_full = torch.linalg.svdvals(sample_matrix)
+    s, v = compute_top_singular_values(sample_matrix, k=5, num_iter=10, oversampling=5)
+    assert torch.allclose(s, s_full[:5])
+    assert v.shape == (NUM_COLS, 5)
+    # The right singular vectors satisfy W^T W v = s^2 v
+    assert torch.allclose(sample_matrix.T @ (sample_matrix @ v), v * s**2)
+
+    # Starting from the exact subspace, no iteration is needed
+    _, _, vt = torch.linalg.svd(sample_matrix, full_matrices=False)
+    s, _ = compute_top_singular_values(
+        sample_matrix, k=5, start=vt[:10].T, num_iter=0, oversampling=5
+    )
+    assert torch.allclose(s, s_full[:5])
+
+    # Full spectrum
+    s, v = compute_top_singular_values(sample_matrix)
+    assert torch.allclose(s, s_full)
+    with pytest.raises(ValueError):
+        compute_top_singular_values(sample_matrix, k=0)
+
+
+def test_get_spectral_history(sample_archive, monkeypatch):
+    updates, eigenvalues = get_eigenvalues_history(sample_archive)
+    assert np.array_equal(updates, np.arange(1, 6))
+    assert eigenvalues.shape == (5, pytest.NUM_HIDDENS)
+
+    k = 2
+    updates, singular_values, right_vectors = get_spectral_history(
+        sample_archive, k=k, num_iter=4, oversampling=1
+    )
+    assert np.allclose(singular_values, eigenvalues[:, :k])
+    assert right_vectors.shape == (5, pytest.NUM_HIDDENS, k)
+    settings = {"k": k, "num_iter": 4, "oversampling": 1}
+    assert load_metric(sample_archive, 3, "spectrum", settings) is not None
+
+    def fail(*args, **kwargs):
+        raise AssertionError("The cached value should have been used.")
+
+    monkeypatch.setattr(rbms.metrics.spectrum, "compute_top_singular_values", fail)
+    cached = get_spectral_history(sample_archive, k=k, num_iter=4, oversampling=1)
+    assert np.array_equal(cached[1], singular_values)
+    assert np.array_equal(cached[2], right_vectors)
+    with pytest.raises(AssertionError):
+        get_spectral_history(
+            sample_archive, k=k, num_iter=4, oversampling=1, recompute=True
+        )
+
+
+def test_get_spectral_history_workers(sample_archive):
+    _, eigenvalues = get_eigenvalues_history(sample_archive)
+    _, eigenvalues_workers = get_eigenvalues_history(sample_archive, num_workers=2)
+    assert np.allclose(eigenvalues_workers, eigenvalues)
@@ -98,3 +98,75 @@ def test_compute_gradient_centered(
     assert vbias.grad.dtype == vbias.dtype
     assert hbias.grad.dtype == hbias.dtype
     assert weight_matrix.grad.dtype == weight_matrix.dtype
+
+
+@pytest.mark.parametrize("centered", [True, False])
+def test_compute_gradient_values(
+    sample_params_pbrbm,
+    sample_potts_v_chains,
+    sample_binary_h_chains,
+    sample_potts_v_samples,
+    sample_binary_h_samples,
+    centered,
+):
+    v_chains = sample_potts_v_chains
+    v_data = sample_potts_v_samples
+    h_chains, _ = sample_binary_h_chains
+    _, mh_data = sample_binary_h_samples
+    vbias, hbias, weight_matrix = sample_params_pbrbm
+    w_data = torch.rand(pytest.NUM_SAMPLES, 1)
+    w_chains = torch.randn(pytest.NUM_CHAINS, 1)
+
+    vbias.grad = torch.zeros_like(vbias)
+    hbias.grad = torch.zeros_like(hbias)
+    weight_matrix.grad = torch.zeros_like(weight_matrix)
+
+    _compute_gradient(
+        v_data,
+        mh_data,
+        w_data,
+        v_chains,
+        h_chains,
+        w_chains,
+        vbias,
+        hbias,
+        weight_matrix,
+        centered=centered,
+    )
+
+    # Reference computed on explicitly centered one-hot copies
+    num_states = weight_matrix.shape[1]
+    v_data_oh = torch.nn.functional.one_hot(v_data.long(), num_states).float()
+    v_chains_oh = torch.nn.functional.one_hot(v_chains.long(), num_states).float()
+    p_data = (w_data / w_data.sum()).view(-1, 1, 1)
+    p_chains = torch.softmax(-w_chains, dim=0).view(-1, 1, 1)
+    v_data_mean = (p_data * v_data_oh).sum(0).clamp(1e-7, 1 - 1e-7)
+    h_data_mean = (p_data.view(-1, 1) * mh_data).sum(0)
+    v_gen_mean = (p_chains * v_chains_oh).sum(0).clamp(1e-7, 1 - 1e-7)
+    h_gen_mean = (p_chains.view(-1, 1) * h_chains).sum(0)
+    if centered:
+        # The centered products are averaged without the sample weights
+        grad_weight_matrix = (
+            torch.einsum("niq,nh->iqh", v_data_oh - v_data_mean, mh_data - h_data_mean)
+            / v_data.shape[0]
+            - torch.einsum(
+                "niq,nh->iqh", v_chains_oh - v_data_mean, h_chains - h_data_mean
+            )
+            / v_chains.shape[0]
+        )
+        grad_vbias = v_data_mean - v_gen_mean - grad_weight_matrix @ h_data_mean
+        grad_hbias = (
+            h_data_mean
+            - h_gen_mean
+            - torch.einsum("iq,iqh->h", v_data_mean, grad_weight_matrix)
+        )
+    else:
+        grad_weight_matrix = torch.einsum(
+            "niq,nh->iqh", p_data * v_data_oh, mh_data
+        ) - torch.einsum("niq,nh->iqh", p_chains * v_chains_oh, h_chains)
+        grad_vbias = v_data_mean - v_gen_mean
+        grad_hbias = h_data_mean - h_gen_mean
+
+    assert torch.allclose(weight_matrix.grad, grad_weight_matrix, atol=1e-6)
+    assert torch.allclose(vbias.grad, grad_vbias, atol=1e-6)
+    assert torch.allclose(hbias.grad, grad_hbias, atol=1e-6)
@@ -0,0 +1,39 @@
+import pytest
+import torch
+
+from rbms.potts_bernoulli.implement import (
+    _compute_energy_visibles,
+    _compute_pseudo_log_likelihood,
+)
+
+
+def test_compute_pseudo_log_likelihood(sample_potts_v_samples, sample_params_pbrbm):
+    # Arrange
+    v = sample_potts_v_samples
+    vbias, hbias, weight_matrix = sample_params_pbrbm
+
+    # Act
+    pll = _compute_pseudo_log_likelihood(v, vbias, hbias, weight_matrix)
+    # Blocks of a single visible unit
+    pll_blocks = _compute_pseudo_log_likelihood(
+        v, vbias, hbias, weight_matrix, max_elements=1
+    )
+
+    # Assert
+    assert pll.shape == (pytest.NUM_SAMPLES,)
+    assert torch.all(pll <= 0)
+    assert torch.allclose(pll, pll_blocks)
+
+    # Compare with the changes of state computed from the marginal energy
+    expected = torch.zeros(pytest.NUM_SAMPLES)
+    energy = _compute_energy_visibles(v, vbias, hbias, weight_matrix)
+    for i in range(pytest.NUM_VISIBLES):
+        all_energy = []
+        for a in range(pytest.NUM_STATES):
+            v_change = v.clone()
+            v_change[:, i] = a
+            all_energy.append(
+                -_compute_energy_visibles(v_change, vbias, hbias, weight_matrix)
+            )
+        expected += -energy - torch.logsumexp(torch.stack(all_energy), 0)
+    assert torch.allclose(pll, expected, atol=1e-4)
@@ -2,7 +2,10 @@ import numpy as np
 import pytest
 import torch
 
-from rbms.potts_bernoulli.implement import _init_parameters
+from rbms.potts_bernoulli.implement import (
+    _init_parameters,
+    _init_parameters_mean_field,
+)
 
 
 def test_init_parameters_cpu(sample_potts_v_samples):
@@ -70,3 +73,31 @@ def test_init_parameters_dummy_device(sample_potts_v_samples):
     assert vbias.dtype == dtype
     assert hbias.dtype == dtype
     assert weight_matrix.dtype == dtype
+
+
+def test_init_parameters_mean_field(sample_potts_v_samples):
+    data = sample_potts_v_samples
+    weights = torch.rand(data.shape[0])
+    vbias, hbias, weight_matrix = _init_parameters_mean_field(
+        pytest.NUM_HIDDENS,
+        data,
+        weights,
+        torch.device("cpu"),
+        torch.float32,
+        0.0,
+    )
+    num_states = int(data.max()) + 1
+    assert vbias.shape == (pytest.NUM_VISIBLES, num_states)
+    assert hbias.shape == (pytest.NUM_HIDDENS,)
+    assert weight_matrix.shape == (pytest.NUM_VISIBLES, num_states, pytest.NUM_HIDDENS)
+    assert weight_matrix.dtype == torch.float32
+    assert torch.allclose(vbias.sum(1), torch.zeros(1), atol=1e-5)
+    # The input of the hidden units vanishes on the weighted mean of the data
+    data_one_hot = torch.nn.functional.one_hot(data.long(), num_states).float()
+    frequencies = torch.einsum("n,niq->iq", weights, data_one_hot) / weights.sum()
+    frequencies = torch.clamp(frequencies, min=1e-4, max=1 - 1e-4)
+    assert torch.allclose(
+        hbias + torch.einsum("iq,iqh->h", frequencies, weight_matrix),
+        torch.zeros(1),
+        atol=1e-5,
+    )
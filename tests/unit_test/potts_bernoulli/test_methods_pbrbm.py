@@ -17,6 +17,31 @@ def test_pb_rbm_initialization(sample_params_class_pbrbm):
     assert pb_rbm.hbias.shape == (pytest.NUM_HIDDENS,)
 
 
+def test_pb_rbm_init_parameters_mean_field(sample_dataset_pbrbm):
+    pb_rbm = PBRBM.init_parameters(
+        pytest.NUM_HIDDENS,
+        sample_dataset_pbrbm,
+        torch.device("cpu"),
+        torch.float32,
+        init="mean_field",
+    )
+    assert pb_rbm.weight_matrix.shape == (
+        pytest.NUM_VISIBLES,
+        pytest.NUM_STATES,
+        pytest.NUM_HIDDENS,
+    )
+    # Zero-sum gauge
+    assert torch.allclose(pb_rbm.weight_matrix.sum(1), torch.zeros(1), atol=1e-5)
+    with pytest.raises(ValueError):
+        PBRBM.init_parameters(
+            pytest.NUM_HIDDENS,
+            sample_dataset_pbrbm,
+            torch.device("cpu"),
+            torch.float32,
+            init="pca",
+        )
+
+
 def test_pb_rbm_sample_hiddens(sample_params_class_pbrbm, sample_chains_pbrbm):
     pb_rbm = sample_params_class_pbrbm
     chains = sample_chains_pbrbm
@@ -0,0 +1,257 @@
+import numpy as np
+import pytest
+import torch
+
+from rbms.io import load_params
+from rbms.map_model import map_model
+from rbms.potts_bernoulli.classes import PBRBM
+from rbms.sparse_potts_bernoulli.classes import SparsePBRBM
+from rbms.sparse_potts_bernoulli.implement import _select_edges
+from rbms.sparse_potts_bernoulli.utils import ensure_zero_sum_gauge, prune_weights
+from rbms.training.distributed import launch_distributed_training
+from rbms.training.optimizer import get_optimizer
+from rbms.training.pcd import train
+from rbms.utils import get_eigenvalues_history
+
+NUM_CONNECTIONS = 3
+
+
+@pytest.fixture
+def sample_params_class_sparse_pbrbm():
+    edges = _select_edges(
+        torch.rand(pytest.NUM_VISIBLES, pytest.NUM_HIDDENS), NUM_CONNECTIONS
+    )
+    # The edges are sorted by the constructor
+    edges = edges[:, torch.randperm(edges.shape[1])]
+    return SparsePBRBM(
+        weight_values=torch.randn(edges.shape[1], pytest.NUM_STATES, dtype=torch.float64),
+        edges=edges,
+        vbias=torch.randn(pytest.NUM_VISIBLES, pytest.NUM_STATES, dtype=torch.float64),
+        hbias=torch.randn(pytest.NUM_HIDDENS, dtype=torch.float64),
+    )
+
+
+def _dense(params):
+    return PBRBM(
+        weight_matrix=params.weight_matrix(),
+        vbias=params.vbias.clone(),
+        hbias=params.hbias.clone(),
+    )
+
+
+def test_sparse_pbrbm_energies(
+    sample_params_class_sparse_pbrbm, sample_potts_v_samples, sample_chains_pbrbm
+):
+    params = sample_params_class_sparse_pbrbm
+    dense = _dense(params)
+    # Each hidden unit is connected to NUM_CONNECTIONS sites
+    assert torch.all((dense.weight_matrix != 0).any(1).sum(0) == NUM_CONNECTIONS)
+    v = sample_potts_v_samples.to(torch.float64)
+    h = sample_chains_pbrbm["hidden"].to(torch.float64)[: v.shape[0]]
+    assert torch.allclose(params.compute_energy(v, h), dense.compute_energy(v, h))
+    assert torch.allclose(
+        params.compute_energy_visibles(v), dense.compute_energy_visibles(v)
+    )
+    assert torch.allclose(
+        params.compute_energy_hiddens(h), dense.compute_energy_hiddens(h)
+    )
+    # Blocks of one site
+    assert torch.allclose(
+        params.compute_pseudo_log_likelihood(v, max_elements=1),
+        dense.compute_pseudo_log_likelihood(v),
+    )
+
+
+def test_sparse_pbrbm_compute_gradient(
+    sample_params_class_sparse_pbrbm, sample_potts_v_samples
+):
+    params = sample_params_class_sparse_pbrbm
+    dense = _dense(params)
+    mask = (dense.weight_matrix != 0).any(1, keepdim=True)
+    data = params.init_chains(
+        pytest.NUM_SAMPLES,
+        weights=torch.rand(pytest.NUM_SAMPLES, dtype=torch.float64),
+        start_v=sample_potts_v_samples,
+    )
+    chains = params.init_chains(pytest.NUM_CHAINS)
+    chains["weights"] = torch.randn(pytest.NUM_CHAINS, dtype=torch.float64)
+    for centered in [True, False]:
+        for p in params.parameters() + dense.parameters():
+            p.grad = torch.zeros_like(p)
+        params.compute_gradient(data, chains, centered=centered)
+        dense.compute_gradient(data, chains, centered=centered)
+        grad_params = SparsePBRBM(
+            weight_values=params.weight_values.grad,
+            edges=params.edges,
+            vbias=params.vbias.grad,
+            hbias=params.hbias.grad,
+        )
+        # The gradient of the couplings is the dense one restricted to the allowed edges
+        assert torch.allclose(
+            grad_params.weight_matrix(), dense.weight_matrix.grad * mask
+        )
+    # Without centering, the gradient of the biases does not depend on the couplings
+    assert torch.allclose(params.vbias.grad, dense.vbias.grad)
+    assert torch.allclose(params.hbias.grad, dense.hbias.grad)
+
+
+def test_sparse_pbrbm_gauge(
+    sample_params_class_sparse_pbrbm, sample_potts_v_samples, sample_chains_pbrbm
+):
+    params = sample_params_class_sparse_pbrbm
+    v = sample_potts_v_samples.to(torch.float64)
+    h = sample_chains_pbrbm["hidden"].to(torch.float64)[: v.shape[0]]
+    energy = params.compute_energy(v, h)
+    ensure_zero_sum_gauge(params)
+    assert torch.allclose(
+        params.weight_values.sum(1), torch.zeros(1, dtype=torch.float64), atol=1e-10
+    )
+    # The gauge only shifts the energy by a constant
+    delta = params.compute_energy(v, h) - energy
+    assert torch.allclose(delta, delta[0].expand_as(delta))
+
+
+def test_sparse_pbrbm_prune(sample_params_class_sparse_pbrbm, sample_potts_v_samples):
+    params = sample_params_class_sparse_pbrbm
+    for p in params.parameters():
+        p.grad = torch.ones_like(p)
+    optimizer = get_optimizer("adam", params.parameters(), learning_rate=0.01)
+    optimizer.step()
+    norms = torch.linalg.vector_norm(params.weight_values, dim=1)
+    threshold = norms.median().item()
+    exp_avg = optimizer.state[params.weight_values]["exp_avg"].clone()
+    kept_values = params.weight_values[norms >= threshold].clone()
+    kept_edges = params.edges[:, norms >= threshold].clone()
+
+    num_pruned = prune_weights(params, threshold=threshold, optimizer=optimizer)
+    assert num_pruned == int((norms < threshold).sum())
+    assert params.num_edges() == kept_values.shape[0]
+    assert torch.equal(params.weight_values, kept_values)
+    assert torch.equal(params.edges, kept_edges)
+    # The tensor registered in the optimizer is shrunk with its state
+    assert optimizer.param_groups[0]["params"][0] is params.weight_values
+    assert torch.equal(
+        optimizer.state[params.weight_values]["exp_avg"], exp_avg[norms >= threshold]
+    )
+    assert params.weight_values.grad.shape == params.weight_values.shape
+    optimizer.step()
+    # The pruned model is the dense model without the pruned edges
+    v = sample_potts_v_samples.to(torch.float64)
+    assert torch.allclose(
+        params.compute_energy_visibles(v), _dense(params).compute_energy_visibles(v)
+    )
+
+
+@pytest.mark.parametrize("init", ["random", "mean_field"])
+def test_sparse_pbrbm_init_parameters(sample_dataset_pbrbm, init):
+    params = SparsePBRBM.init_parameters(
+        pytest.NUM_HIDDENS,
+        sample_dataset_pbrbm,
+        torch.device("cpu"),
+        torch.float32,
+        init=init,
+        num_connections=NUM_CONNECTIONS,
+    )
+    assert params.num_edges() == NUM_CONNECTIONS * pytest.NUM_HIDDENS
+    assert params.weight_values.shape == (params.num_edges(), pytest.NUM_STATES)
+    assert torch.equal(
+        torch.bincount(params.edges[1]),
+        torch.full((pytest.NUM_HIDDENS,), NUM_CONNECTIONS),
+    )
+    with pytest.raises(ValueError):
+        SparsePBRBM.init_parameters(
+            pytest.NUM_HIDDENS,
+            sample_dataset_pbrbm,
+            torch.device("cpu"),
+            torch.float32,
+            init=init,
+            num_connections=0,
+        )
+
+
+def test_train_sparse_pbrbm(sample_dataset_pbrbm, sample_args):
+    checkpoints = np.arange(1, sample_args["num_updates"] + 1)
+    sample_args["restore"] = False
+    sample_args["batch_size"] = pytest.NUM_SAMPLES
+    sample_args["num_connections"] = NUM_CONNECTIONS
+    sample_args["prune_interval"] = 1
+    # All the edges are removed by the first pruning
+    sample_args["prune_threshold"] = 1e6
+    train(
+        sample_dataset_pbrbm,
+        sample_dataset_pbrbm,
+        "SparsePBRBM",
+        sample_args,
+        torch.float32,
+        checkpoints,
+        map_model=map_model,
+    )
+    params = load_params(
+        sample_args["filename"],
+        index=1,
+        device=sample_args["device"],
+        dtype=sample_args["dtype"],
+    )
+    assert isinstance(params, SparsePBRBM)
+    assert params.num_edges() == NUM_CONNECTIONS * pytest.NUM_HIDDENS
+    params = load_params(
+        sample_args["filename"],
+        index=sample_args["num_updates"],
+        device=sample_args["device"],
+        dtype=sample_args["dtype"],
+    )
+    assert params.num_edges() == 0
+    get_eigenvalues_history(sample_args["filename"])
+
+
+def test_train_prune_dense(sample_dataset_pbrbm, sample_args):
+    sample_args["restore"] = False
+    sample_args["prune_interval"] = 1
+    with pytest.raises(ValueError):
+        train(
+            sample_dataset_pbrbm,
+            sample_dataset_pbrbm,
+            "PBRBM",
+            sample_args,
+            torch.float32,
+            np.array([1]),
+            map_model=map_model,
+        )
+
+
+@pytest.mark.parametrize(
+    "options", [{"chunk_size": 4}, {"compile": True, "prune_interval": 1}]
+)
+def test_train_sparse_pbrbm_unsupported(sample_dataset_pbrbm, sample_args, options):
+    sample_args["restore"] = False
+    sample_args["num_connections"] = 3
+    with pytest.raises(ValueError):
+        train(
+            sample_dataset_pbrbm,
+            sample_dataset_pbrbm,
+            "SparsePBRBM",
+            dict(sample_args, **options),
+            torch.float32,
+            np.array([1]),
+            map_model=map_model,
+        )
+    # Rejected before the archive is created
+    assert not sample_args["filename"].exists()
+
+
+def test_train_distributed_sparse_pbrbm(sample_dataset_pbrbm, sample_args):
+    sample_args["restore"] = False
+    sample_args["num_connections"] = 3
+    assert not SparsePBRBM.has_gradient_statistics()
+    with pytest.raises(ValueError):
+        launch_distributed_training(
+            sample_dataset_pbrbm,
+            sample_dataset_pbrbm,
+            "SparsePBRBM",
+            sample_args,
+            torch.float32,
+            np.array([1]),
+            num_workers=2,
+            map_model=map_model,
+        )
+    assert not sample_args["filename"].exists()
@@ -0,0 +1,48 @@
+import numpy as np
+import torch
+
+from rbms.mean_field import get_covariance_matrix, get_mean_field_low_rank_weights
+from rbms.potts_bernoulli import tools
+
+
+def test_get_mean_field_low_rank_weights():
+    num_visibles = 30
+    variances = torch.rand(num_visibles, dtype=torch.float64) * 0.2 + 0.05
+    # Whitened covariance with two modes above the independent model
+    u = torch.linalg.qr(torch.randn(num_visibles, 2, dtype=torch.float64))[0]
+    eigenvalues = torch.tensor([4.0, 2.0], dtype=torch.float64)
+    whitened_cov = (
+        torch.eye(num_visibles, dtype=torch.float64)
+        + u @ torch.diag(eigenvalues - 1) @ u.T
+    )
+    std = torch.sqrt(variances)
+    cov_matrix = std.unsqueeze(1) * whitened_cov * std.unsqueeze(0)
+
+    weight_matrix, computed_eigenvalues = get_mean_field_low_rank_weights(
+        cov_matrix=cov_matrix, variances=variances, num_hiddens=5
+    )
+    assert weight_matrix.shape == (num_visibles, 5)
+    assert torch.allclose(computed_eigenvalues[:2], eigenvalues, atol=1e-3)
+    # The other modes are not above the independent model
+    assert torch.allclose(
+        weight_matrix[:, 2:], torch.zeros(1, dtype=torch.float64), atol=1e-6
+    )
+
+    # Mean-field couplings, up to the accuracy of the randomized SVD
+    couplings = weight_matrix @ weight_matrix.T / 4
+    expected = (
+        (1 / std).unsqueeze(1)
+        * (u @ torch.diag(1 - 1 / eigenvalues) @ u.T)
+        * (1 / std).unsqueeze(0)
+    )
+    assert torch.allclose(couplings, expected, atol=1e-2)
+
+
+def test_get_covariance_matrix():
+    data = torch.bernoulli(torch.full((100, 5), 0.4))
+    weights = torch.rand(100)
+    cov_matrix = get_covariance_matrix(data, weights=weights)
+    expected = np.cov(data.numpy(), rowvar=False, aweights=weights.numpy(), bias=True)
+    assert np.allclose(cov_matrix.numpy(), expected, atol=1e-6)
+    # Still available from its former module
+    assert tools.get_covariance_matrix is get_covariance_matrix
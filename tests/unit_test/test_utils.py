@@ -3,12 +3,17 @@ import numpy as np
 import pytest
 import torch
 
+import rbms.partition_function.ais
 from rbms.const import LOG_FILE_HEADER
-from rbms.io import load_params, save_model
-from rbms.partition_function.ais import update_weights_ais
+from rbms.io import AsyncCheckpointWriter, convert_archive, load_params, save_model
+from rbms.partition_function.ais import (
+    compute_partition_function_ais_stats,
+    update_weights_ais,
+)
 from rbms.partition_function.exact import compute_partition_function
 from rbms.sampling.gibbs import sample_state
-from rbms.training.utils import get_checkpoints
+from rbms.training.optimizer import get_optimizer
+from rbms.training.utils import create_machine, get_checkpoints
 from rbms.utils import (
     check_file_existence,
     compute_log_likelihood,
@@ -16,10 +21,12 @@ from rbms.utils import (
     get_eigenvalues_history,
     get_flagged_updates,
     get_saved_updates,
+    get_update_index,
     log_to_csv,
     query_yes_no,
     restore_rng_state,
     swap_chains,
+    upgrade_log_file,
 )
 
 
@@ -178,6 +185,24 @@ def test_log_to_csv(tmp_path):
         assert log_content == ",".join(map(str, logs.values()))
 
 
+def test_upgrade_log_file(tmp_path):
+    log_file = tmp_path / "test_log.csv"
+    # Header of a log written before the 'num_edges' and 'ess' columns
+    log_file.write_text("empty_col,update,pll_train,gibbs_steps\n,1,-3.5,10\n,2,-3.0,\n")
+    upgrade_log_file(str(log_file))
+    log_to_csv({"update": 3, "ess": 0.5}, str(log_file))
+    logs = np.genfromtxt(log_file, delimiter=",", names=True)
+    assert list(logs.dtype.names) == LOG_FILE_HEADER
+    assert np.array_equal(logs["update"], [1, 2, 3])
+    assert logs["pll_train"][0] == -3.5
+    assert np.isnan(logs["gibbs_steps"][1])
+    assert logs["ess"][2] == 0.5
+    # An up to date log is left untouched
+    content = log_file.read_text()
+    upgrade_log_file(str(log_file))
+    assert log_file.read_text() == content
+
+
 # Test compute_log_likelihood function
 def test_compute_log_likelihood(sample_params_class_bbrbm, sample_binary_v_samples):
     params = sample_params_class_bbrbm
@@ -221,6 +246,50 @@ def test_update_weights_ais(sample_params_class_bbrbm, sample_chains_bbrbm):
     assert isinstance(updated_chains, dict)
 
 
+# Test compute_partition_function_ais_stats function
+def test_compute_partition_function_ais_stats(sample_params_class_bbrbm):
+    params = sample_params_class_bbrbm
+    num_chains = 1000
+    all_config = get_categorical_configurations(n_states=2, n_dim=pytest.NUM_HIDDENS)
+    log_z_exact = compute_partition_function(params, all_config)
+
+    stats = compute_partition_function_ais_stats(
+        num_chains=num_chains, num_beta=100, params=params, num_replicates=4
+    )
+
+    assert set(stats.keys()) == {
+        "log_z",
+        "std_err",
+        "replicate_std_err",
+        "ess",
+        "log_weights_var",
+    }
+    assert 1.0 <= stats["ess"] <= num_chains
+    assert stats["std_err"] >= 0
+    assert stats["replicate_std_err"] >= 0
+    assert stats["log_weights_var"] >= 0
+    assert abs(stats["log_z"] - log_z_exact) < 5 * stats["std_err"] + 0.05
+    with pytest.raises(ValueError):
+        compute_partition_function_ais_stats(
+            num_chains=num_chains, num_beta=10, params=params, num_replicates=0
+        )
+
+
+def test_compute_partition_function_ais_stats_bootstrap_batches(
+    sample_params_class_bbrbm, monkeypatch
+):
+    # The bootstrap resamplings are drawn in several batches
+    monkeypatch.setattr(rbms.partition_function.ais, "BOOTSTRAP_BATCH_ELEMENTS", 3000)
+    stats = compute_partition_function_ais_stats(
+        num_chains=1000,
+        num_beta=10,
+        params=sample_params_class_bbrbm,
+        num_bootstrap=10,
+    )
+    assert np.isfinite(stats["std_err"])
+    assert stats["std_err"] > 0
+
+
 # Test save_model function
 def test_save_model(tmp_path, sample_params_class_bbrbm, sample_chains_bbrbm):
     filename = tmp_path / "test_model.h5"
@@ -239,6 +308,63 @@ def test_save_model(tmp_path, sample_params_class_bbrbm, sample_chains_bbrbm):
         assert "flag_2" in f["update_1"]["flags"]
 
 
+def test_async_checkpoint_writer(
+    tmp_path, sample_params_class_bbrbm, sample_chains_bbrbm
+):
+    filename = tmp_path / "test_model.h5"
+    params = sample_params_class_bbrbm
+    chains = sample_chains_bbrbm
+    weight_matrix = params.weight_matrix.clone()
+
+    with AsyncCheckpointWriter(str(filename)) as writer:
+        writer.save(params, chains, 1, 0.0, ["checkpoint"])
+        # The checkpoint is a snapshot, later updates are not written
+        params.weight_matrix.add_(1.0)
+        writer.save(params, chains, 2, 1.0, ["checkpoint"])
+
+    with h5py.File(filename, "r") as f:
+        assert "update_1" in f.keys()
+        assert "update_2" in f.keys()
+        assert "checkpoint" in f["update_2"]["flags"]
+        assert np.allclose(
+            f["update_1"]["params"]["weight_matrix"][()], weight_matrix.numpy()
+        )
+        assert np.allclose(
+            f["update_2"]["params"]["weight_matrix"][()], weight_matrix.numpy() + 1.0
+        )
+        assert "torch_rng_state" in f["update_2"].keys()
+
+    # Errors of the writer thread are raised in the main thread
+    writer = AsyncCheckpointWriter(str(filename))
+    writer.save(params, chains, 1, 0.0)
+    with pytest.raises(RuntimeError):
+        writer.flush()
+    writer.close()
+
+
+def test_async_checkpoint_writer_hold(
+    tmp_path, sample_params_class_bbrbm, sample_chains_bbrbm
+):
+    filename = tmp_path / "test_model.h5"
+    params = sample_params_class_bbrbm
+    chains = sample_chains_bbrbm
+
+    with AsyncCheckpointWriter(str(filename)) as writer:
+        writer.hold(params, chains, 1, 0.0, ["best"])
+        writer.hold(params, chains, 2, 1.0, ["best"])
+        # Written before the checkpoint
+        writer.save(params, chains, 3, 2.0, ["checkpoint"])
+        writer.hold(params, chains, 4, 3.0, ["best"])
+        # Superseded by the checkpoint, which keeps its flag
+        writer.save(params, chains, 4, 3.0, ["checkpoint"])
+        writer.hold(params, chains, 5, 4.0, ["best"])
+        writer.save(params, chains, 6, 5.0, ["checkpoint", "best"])
+        # Written when closing the writer
+        writer.hold(params, chains, 7, 6.0, ["best"])
+    assert np.array_equal(get_saved_updates(str(filename)), [2, 3, 4, 6, 7])
+    assert np.array_equal(get_flagged_updates(str(filename), "best"), [2, 4, 6, 7])
+
+
 # Test load_params function
 def test_load_params(tmp_path, sample_params_class_bbrbm):
     filename = create_temp_hdf5_file(
@@ -470,3 +596,129 @@ def test_get_flagged_updates(tmp_path):
 
     assert np.array_equal(flagged_updates_flag_1, np.array([2, 4]))
     assert np.array_equal(flagged_updates_flag_2, np.array([1, 3, 5]))
+
+
+def _create_archive(filename, params, archive_format):
+    create_machine(
+        filename=str(filename),
+        params=params,
+        num_visibles=pytest.NUM_VISIBLES,
+        num_hiddens=pytest.NUM_HIDDENS,
+        num_chains=pytest.NUM_CHAINS,
+        batch_size=pytest.BATCH_SIZE,
+        gibbs_steps=pytest.GIBBS_STEPS,
+        learning_rate=pytest.LEARNING_RATE,
+        log=False,
+        flags=["checkpoint"],
+        archive_format=archive_format,
+    )
+    for p in params.parameters():
+        p.grad = torch.ones_like(p)
+    optimizer = get_optimizer("adam", params.parameters(), learning_rate=0.01)
+    optimizer.step()
+    # The checkpoints are not written in order
+    for i in [5, 3]:
+        save_model(
+            str(filename),
+            params,
+            params.init_chains(pytest.NUM_CHAINS),
+            i,
+            float(i),
+            ["checkpoint", "best"] if i == 3 else ["checkpoint"],
+            optimizer=optimizer,
+        )
+
+
+# Test the layout of the archives of version 2
+def test_save_model_v2(tmp_path, sample_params_class_bbrbm):
+    filename = tmp_path / "test_model.h5"
+    params = sample_params_class_bbrbm
+    _create_archive(filename, params, archive_format=2)
+    with h5py.File(filename, "r") as f:
+        assert f.attrs["format_version"] == 2
+        assert np.array_equal(f["updates"][()], [1, 3, 5])
+        checkpoint = f["update_5"]
+        # The parameters are stored once, in compressed datasets
+        assert "weight_matrix" not in checkpoint.keys()
+        assert checkpoint["params"]["weight_matrix"].compression == "gzip"
+        assert checkpoint["optimizer"]["weight_matrix"]["exp_avg"].compression == "gzip"
+        assert not any(k.startswith("numpy_rng_arg") for k in checkpoint.keys())
+        assert not any(k.startswith("save_") for k in checkpoint.keys())
+    assert np.array_equal(get_saved_updates(filename), [1, 3, 5])
+    assert np.array_equal(get_flagged_updates(filename, "best"), [3])
+    updates, _ = get_eigenvalues_history(filename)
+    assert np.array_equal(updates, [1, 3, 5])
+
+    # Random state of the last checkpoint
+    restore_rng_state(filename, 5)
+    expected = (torch.rand(3), np.random.rand(3))
+    restore_rng_state(filename, 5)
+    assert torch.equal(torch.rand(3), expected[0])
+    assert np.array_equal(np.random.rand(3), expected[1])
+
+
+# Test convert_archive function
+def test_convert_archive(tmp_path, sample_params_class_bbrbm):
+    filename = tmp_path / "test_model.h5"
+    out_file = tmp_path / "test_model_v2.h5"
+    _create_archive(filename, sample_params_class_bbrbm, archive_format=1)
+    with h5py.File(filename, "r") as f:
+        assert "format_version" not in f.attrs
+        assert "weight_matrix" in f["update_5"].keys()
+    convert_archive(str(filename), str(out_file))
+
+    assert np.array_equal(get_saved_updates(out_file), get_saved_updates(filename))
+    assert np.array_equal(
+        get_flagged_updates(out_file, "best"), get_flagged_updates(filename, "best")
+    )
+    for i in [1, 3, 5]:
+        params = load_params(filename, i, torch.device("cpu"), torch.float32)
+        converted = load_params(out_file, i, torch.device("cpu"), torch.float32)
+        for name, param in params.named_parameters().items():
+            assert torch.equal(converted.named_parameters()[name], param)
+    restore_rng_state(filename, 3)
+    expected = (torch.rand(3), np.random.rand(3))
+    restore_rng_state(out_file, 3)
+    assert torch.equal(torch.rand(3), expected[0])
+    assert np.array_equal(np.random.rand(3), expected[1])
+    with h5py.File(filename, "r") as f_in, h5py.File(out_file, "r") as f_out:
+        assert f_out.attrs["format_version"] == 2
+        assert "weight_matrix" not in f_out["update_5"].keys()
+        assert np.array_equal(f_out["parallel_chains"][()], f_in["parallel_chains"][()])
+        assert np.array_equal(
+            f_out["update_5"]["optimizer"]["weight_matrix"]["exp_avg"][()],
+            f_in["update_5"]["optimizer"]["weight_matrix"]["exp_avg"][()],
+        )
+        assert (
+            f_out["update_5"]["optimizer"].attrs["param_groups"]
+            == f_in["update_5"]["optimizer"].attrs["param_groups"]
+        )
+        assert f_out["hyperparameters"]["batch_size"][()] == pytest.BATCH_SIZE
+
+    # The converted archive is already in the latest layout
+    with pytest.raises(ValueError):
+        convert_archive(str(out_file), str(tmp_path / "other.h5"))
+
+
+# Test get_update_index function
+@pytest.mark.parametrize("archive_format", [1, 2])
+def test_get_update_index(tmp_path, sample_params_class_bbrbm, archive_format):
+    filename = tmp_path / "test_model.h5"
+    _create_archive(filename, sample_params_class_bbrbm, archive_format=archive_format)
+    updates, times, flags = get_update_index(filename)
+    assert np.array_equal(updates, [1, 3, 5])
+    assert np.array_equal(times, [0.0, 3.0, 5.0])
+    assert set(flags.keys()) == {"checkpoint", "best"}
+    assert np.array_equal(flags["checkpoint"], [True, True, True])
+    assert np.array_equal(flags["best"], [False, True, False])
+    assert len(get_flagged_updates(filename, "missing")) == 0
+
+    if archive_format == 1:
+        # The index of the converted archive is the same
+        out_file = tmp_path / "test_model_v2.h5"
+        convert_archive(str(filename), str(out_file))
+        converted = get_update_index(out_file)
+        assert np.array_equal(converted[0], updates)
+        assert np.array_equal(converted[1], times)
+        for name, value in flags.items():
+            assert np.array_equal(converted[2][name], value)
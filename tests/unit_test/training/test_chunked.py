@@ -0,0 +1,129 @@
+import numpy as np
+import pytest
+import torch
+
+from rbms.io import load_params
+from rbms.map_model import map_model
+from rbms.training.chunked import fit_batch_pcd_chunked
+from rbms.training.pcd import fit_batch_pcd, train
+
+
+@pytest.mark.parametrize("chunk_size", [1, 4, 100])
+@pytest.mark.parametrize("centered", [True, False])
+@pytest.mark.parametrize("model", ["bbrbm", "pbrbm"])
+def test_fit_batch_pcd_chunked(
+    model,
+    centered,
+    chunk_size,
+    sample_params_class_bbrbm,
+    sample_params_class_pbrbm,
+    sample_binary_v_samples,
+    sample_potts_v_samples,
+):
+    if model == "bbrbm":
+        params = sample_params_class_bbrbm
+        v_data = sample_binary_v_samples[0]
+    else:
+        params = sample_params_class_pbrbm
+        v_data = sample_potts_v_samples
+    params = params.clone(dtype=torch.float64)
+    v_data = v_data.to(torch.float64)
+    batch = (v_data, torch.rand(v_data.shape[0], dtype=torch.float64))
+    chains = params.init_chains(pytest.NUM_CHAINS)
+    chains["weights"] = torch.randn(pytest.NUM_CHAINS, dtype=torch.float64)
+
+    # Without Gibbs steps, the hidden magnetizations of the chains are deterministic
+    for p in params.parameters():
+        p.grad = torch.zeros_like(p)
+    chains_ref, _ = fit_batch_pcd(
+        batch=batch,
+        parallel_chains=chains,
+        params=params,
+        gibbs_steps=0,
+        beta=1.0,
+        centered=centered,
+    )
+    grad_ref = [p.grad.clone() for p in params.parameters()]
+
+    for p in params.parameters():
+        p.grad = torch.zeros_like(p)
+    chains_chunked, _ = fit_batch_pcd_chunked(
+        batch=batch,
+        parallel_chains=chains,
+        params=params,
+        gibbs_steps=0,
+        beta=1.0,
+        chunk_size=chunk_size,
+        centered=centered,
+    )
+    for p, g in zip(params.parameters(), grad_ref):
+        assert torch.allclose(p.grad, g, atol=1e-12)
+    for k in ["visible", "hidden_mag", "weights"]:
+        assert torch.allclose(chains_chunked[k], chains_ref[k])
+    assert chains_chunked["hidden"].shape == chains_ref["hidden"].shape
+    assert "visible_mag" not in chains_chunked
+
+
+def test_fit_batch_pcd_chunked_sampling(sample_params_class_pbrbm):
+    params = sample_params_class_pbrbm
+    for p in params.parameters():
+        p.grad = torch.zeros_like(p)
+    v_data = params.init_chains(pytest.NUM_SAMPLES)["visible"]
+    batch = (v_data, torch.ones(pytest.NUM_SAMPLES))
+    chains = params.init_chains(pytest.NUM_CHAINS)
+    new_chains, _ = fit_batch_pcd_chunked(
+        batch=batch,
+        parallel_chains=chains,
+        params=params,
+        gibbs_steps=3,
+        beta=1.0,
+        chunk_size=5,
+    )
+    assert new_chains["visible"].shape == chains["visible"].shape
+    assert not torch.equal(new_chains["visible"], chains["visible"])
+    # The input chains are left untouched
+    assert torch.equal(chains["weights"], torch.ones(pytest.NUM_CHAINS))
+    for p in params.parameters():
+        assert not torch.any(torch.isnan(p.grad))
+
+
+def test_fit_batch_pcd_chunked_invalid(
+    sample_params_class_bbrbm, sample_binary_v_samples
+):
+    params = sample_params_class_bbrbm
+    v_data = sample_binary_v_samples[0]
+    with pytest.raises(ValueError):
+        fit_batch_pcd_chunked(
+            batch=(v_data, torch.ones(v_data.shape[0])),
+            parallel_chains=params.init_chains(pytest.NUM_CHAINS),
+            params=params,
+            gibbs_steps=1,
+            beta=1.0,
+            chunk_size=0,
+        )
+
+
+def test_train_chunked(sample_dataset_pbrbm, sample_args):
+    checkpoints = np.arange(1, sample_args["num_updates"] + 1)
+    sample_args["restore"] = False
+    sample_args["batch_size"] = pytest.NUM_SAMPLES
+    sample_args["chunk_size"] = 4
+    train(
+        sample_dataset_pbrbm,
+        sample_dataset_pbrbm,
+        "PBRBM",
+        sample_args,
+        torch.float32,
+        checkpoints,
+        map_model=map_model,
+    )
+    params_begin = load_params(
+        sample_args["filename"], index=1, device="cpu", dtype=torch.float32
+    )
+    params_end = load_params(
+        sample_args["filename"],
+        index=sample_args["num_updates"],
+        device="cpu",
+        dtype=torch.float32,
+    )
+    assert not torch.allclose(params_begin.weight_matrix, params_end.weight_matrix)
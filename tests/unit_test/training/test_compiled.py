@@ -0,0 +1,89 @@
+import pytest
+import torch
+from torch.optim import SGD
+
+from rbms.potts_bernoulli.classes import PBRBM
+from rbms.potts_bernoulli.utils import ensure_zero_sum_gauge
+from rbms.training.compiled import compile_pcd_step
+from rbms.training.pcd import fit_batch_pcd
+
+
+def _eager_step(params, batch, chains, gibbs_steps, learning_rate):
+    optimizer = SGD(params.parameters(), lr=learning_rate, maximize=True)
+    optimizer.zero_grad(set_to_none=False)
+    chains, _ = fit_batch_pcd(
+        batch=batch,
+        parallel_chains=chains,
+        params=params,
+        gibbs_steps=gibbs_steps,
+        beta=1.0,
+    )
+    optimizer.step()
+    if isinstance(params, PBRBM):
+        ensure_zero_sum_gauge(params)
+    return chains
+
+
+@pytest.mark.parametrize("model", ["bbrbm", "pbrbm"])
+def test_compiled_step_matches_eager(
+    model,
+    sample_params_class_bbrbm,
+    sample_params_class_pbrbm,
+    sample_binary_v_samples,
+    sample_potts_v_samples,
+):
+    if model == "bbrbm":
+        params = sample_params_class_bbrbm
+        v_data = sample_binary_v_samples[0]
+    else:
+        params = sample_params_class_pbrbm
+        v_data = sample_potts_v_samples
+    params_eager = params.clone()
+    for p in params.parameters() + params_eager.parameters():
+        p.grad = torch.zeros_like(p)
+    batch = (v_data, torch.ones(v_data.shape[0]))
+    chains = params.init_chains(pytest.NUM_CHAINS)
+
+    pcd_step = compile_pcd_step(params, backend="eager")
+    with torch.no_grad():
+        torch.manual_seed(0)
+        new_chains, logs = pcd_step(
+            batch=batch,
+            parallel_chains=chains,
+            gibbs_steps=0,
+            beta=1.0,
+            learning_rate=pytest.LEARNING_RATE,
+        )
+        torch.manual_seed(0)
+        new_chains_eager = _eager_step(
+            params_eager, batch, chains, 0, pytest.LEARNING_RATE
+        )
+
+    assert isinstance(logs, dict)
+    # The hidden units are random, compare their magnetizations
+    for k in ["visible", "hidden_mag"]:
+        assert torch.allclose(new_chains[k], new_chains_eager[k])
+    for k, p in params.named_parameters().items():
+        assert torch.allclose(p, params_eager.named_parameters()[k], atol=1e-6)
+
+
+def test_compiled_step_inductor(sample_params_class_bbrbm, sample_binary_v_samples):
+    params = sample_params_class_bbrbm
+    for p in params.parameters():
+        p.grad = torch.zeros_like(p)
+    params_begin = params.clone()
+    v_data = sample_binary_v_samples[0]
+    chains = params.init_chains(pytest.NUM_CHAINS)
+
+    pcd_step = compile_pcd_step(params)
+    with torch.no_grad():
+        new_chains, _ = pcd_step(
+            batch=(v_data, torch.ones(v_data.shape[0])),
+            parallel_chains=chains,
+            gibbs_steps=2,
+            beta=1.0,
+            learning_rate=pytest.LEARNING_RATE,
+        )
+    assert new_chains["visible"].shape == chains["visible"].shape
+    assert new_chains["hidden"].shape == chains["hidden"].shape
+    assert not torch.allclose(params.weight_matrix, params_begin.weight_matrix)
@@ -0,0 +1,187 @@
+import numpy as np
+import pytest
+import torch
+import torch.distributed as dist
+
+from rbms.bernoulli_bernoulli.classes import BBRBM
+from rbms.const import LOG_FILE_HEADER
+from rbms.io import load_minibatch_state, load_model
+from rbms.map_model import map_model
+from rbms.training.distributed import (
+    UNSUPPORTED_OPTIONS,
+    _get_init_method,
+    check_distributed_args,
+    launch_distributed_training,
+)
+from rbms.training.utils import create_machine, setup_training
+
+
+@pytest.mark.parametrize("centered", [True, False])
+@pytest.mark.parametrize("model", ["bbrbm", "pbrbm"])
+def test_gradient_from_statistics(
+    model,
+    centered,
+    sample_params_class_bbrbm,
+    sample_params_class_pbrbm,
+    sample_binary_v_samples,
+    sample_potts_v_samples,
+):
+    if model == "bbrbm":
+        params = sample_params_class_bbrbm
+        v_data = sample_binary_v_samples[0]
+    else:
+        params = sample_params_class_pbrbm
+        v_data = sample_potts_v_samples
+    for p in params.parameters():
+        p.grad = torch.zeros_like(p)
+    data = params.init_chains(
+        v_data.shape[0], weights=torch.rand(v_data.shape[0]), start_v=v_data
+    )
+    chains = params.init_chains(pytest.NUM_CHAINS)
+    chains["weights"] = torch.randn(pytest.NUM_CHAINS)
+
+    params.compute_gradient(data=data, chains=chains, centered=centered)
+    grad_ref = [p.grad.clone() for p in params.parameters()]
+
+    # Statistics summed over two shards
+    log_weight_shift = (-chains["weights"]).max()
+    statistics = None
+    for shard_data, shard_chains in [
+        (slice(None, 4), slice(None, 6)),
+        (slice(4, None), slice(6, None)),
+    ]:
+        stats = params.compute_gradient_statistics(
+            data={k: v[shard_data] for k, v in data.items()},
+            chains={k: v[shard_chains] for k, v in chains.items()},
+            log_weight_shift=log_weight_shift,
+            centered=centered,
+        )
+        if statistics is None:
+            statistics = stats
+        else:
+            statistics = {k: statistics[k] + stats[k] for k in statistics}
+    params.compute_gradient_from_statistics(statistics, centered=centered)
+    for p, g in zip(params.parameters(), grad_ref):
+        assert torch.allclose(p.grad, g, atol=1e-5)
+
+
+def test_train_distributed(sample_dataset_bbrbm, sample_args, tmp_path):
+    checkpoints = np.arange(1, sample_args["num_updates"] + 1)
+    sample_args["restore"] = False
+    sample_args["batch_size"] = pytest.NUM_SAMPLES
+    launch_distributed_training(
+        sample_dataset_bbrbm,
+        sample_dataset_bbrbm,
+        "BBRBM",
+        sample_args,
+        torch.float32,
+        checkpoints,
+        num_workers=2,
+        init_method=f"file://{tmp_path / 'init'}",
+        map_model=map_model,
+    )
+    params, chains, _, _ = load_model(
+        sample_args["filename"],
+        index=sample_args["num_updates"],
+        device=sample_args["device"],
+        dtype=sample_args["dtype"],
+    )
+    assert isinstance(params, BBRBM)
+    assert chains["visible"].shape[0] == pytest.NUM_CHAINS
+
+
+def test_train_distributed_restore(sample_dataset_bbrbm, sample_args, tmp_path):
+    sample_args["restore"] = False
+    sample_args["batch_size"] = pytest.NUM_SAMPLES // 2
+    checkpoints = np.arange(1, 6)
+    for num_updates, restore in [(3, False), (5, True)]:
+        sample_args["num_updates"] = num_updates
+        sample_args["restore"] = restore
+        launch_distributed_training(
+            sample_dataset_bbrbm,
+            sample_dataset_bbrbm,
+            "BBRBM",
+            sample_args,
+            torch.float32,
+            checkpoints,
+            num_workers=2,
+            init_method=f"file://{tmp_path / f'init_{num_updates}'}",
+            map_model=map_model,
+        )
+        # The number of chains of the archive is used on restore
+        sample_args["num_chains"] = 2000
+    _, chains, _, _ = load_model(
+        sample_args["filename"],
+        index=5,
+        device=sample_args["device"],
+        dtype=sample_args["dtype"],
+    )
+    assert chains["visible"].shape[0] == pytest.NUM_CHAINS
+
+    # The minibatch iterators of the workers are saved
+    for rank in range(2):
+        state = load_minibatch_state(
+            str(sample_args["filename"]), 5, rank=rank, world_size=2
+        )
+        assert state["epoch"] == 2
+    assert load_minibatch_state(str(sample_args["filename"]), 5) is None
+    assert load_minibatch_state(str(sample_args["filename"]), 5, 0, 4) is None
+
+
+def test_check_distributed_args(sample_dataset_bbrbm, sample_args):
+    check_distributed_args("BBRBM", sample_args, map_model)
+    check_distributed_args("PBRBM", sample_args, map_model)
+    assert not map_model["LowRankPBRBM"].has_gradient_statistics()
+    with pytest.raises(ValueError):
+        check_distributed_args("LowRankPBRBM", sample_args, map_model)
+    for key in UNSUPPORTED_OPTIONS:
+        with pytest.raises(ValueError):
+            check_distributed_args("BBRBM", dict(sample_args, **{key: 1}), map_model)
+
+    # The options are checked before the archive is created
+    sample_args["restore"] = False
+    with pytest.raises(ValueError):
+        launch_distributed_training(
+            sample_dataset_bbrbm,
+            sample_dataset_bbrbm,
+            "BBRBM",
+            dict(sample_args, compile=True),
+            torch.float32,
+            np.arange(1, sample_args["num_updates"] + 1),
+            num_workers=2,
+            map_model=map_model,
+        )
+    assert not sample_args["filename"].exists()
+
+
+def test_get_init_method(monkeypatch):
+    monkeypatch.delenv("MASTER_ADDR", raising=False)
+    monkeypatch.delenv("MASTER_PORT", raising=False)
+    assert _get_init_method().startswith("tcp://127.0.0.1:")
+    monkeypatch.setenv("MASTER_ADDR", "10.0.0.1")
+    monkeypatch.setenv("MASTER_PORT", "1234")
+    assert _get_init_method() == "tcp://10.0.0.1:1234"
+
+
+def test_setup_training_log_rank(sample_params_class_bbrbm, sample_args, monkeypatch):
+    create_machine(
+        filename=str(sample_args["filename"]),
+        params=sample_params_class_bbrbm,
+        num_visibles=pytest.NUM_VISIBLES,
+        num_hiddens=pytest.NUM_HIDDENS,
+        num_chains=pytest.NUM_CHAINS,
+        batch_size=pytest.BATCH_SIZE,
+        gibbs_steps=pytest.GIBBS_STEPS,
+        learning_rate=pytest.LEARNING_RATE,
+        log=True,
+        flags=["checkpoint"],
+    )
+    log_file = sample_args["filename"].parent / "log-test_model.csv"
+    old_log = "update,pll_train\n1,-3.5\n"
+    log_file.write_text(old_log)
+    monkeypatch.setattr(dist, "is_initialized", lambda: True)
+    # Only the first worker upgrades the log file
+    for rank, header in [(1, "update,pll_train"), (0, ",".join(LOG_FILE_HEADER))]:
+        monkeypatch.setattr(dist, "get_rank", lambda: rank)
+        setup_training(dict(sample_args), map_model=map_model)
+        assert log_file.read_text().splitlines()[0] == header
@@ -0,0 +1,149 @@
+import numpy as np
+import pytest
+import torch
+
+from rbms.bernoulli_bernoulli.classes import BBRBM
+from rbms.io import load_model
+from rbms.map_model import map_model
+from rbms.potts_bernoulli.classes import PBRBM
+from rbms.potts_bernoulli.utils import ensure_zero_sum_gauge
+from rbms.scripts.train_ensemble import create_parser
+from rbms.training.ensemble import RBMEnsemble, train_ensemble
+
+
+def _random_models(model_type, num_hiddens):
+    models = []
+    for h in num_hiddens:
+        if model_type == "BBRBM":
+            models.append(
+                BBRBM(
+                    weight_matrix=torch.randn(pytest.NUM_VISIBLES, h),
+                    vbias=torch.randn(pytest.NUM_VISIBLES),
+                    hbias=torch.randn(h),
+                )
+            )
+        else:
+            models.append(
+                PBRBM(
+                    weight_matrix=torch.randn(pytest.NUM_VISIBLES, pytest.NUM_STATES, h),
+                    vbias=torch.randn(pytest.NUM_VISIBLES, pytest.NUM_STATES),
+                    hbias=torch.randn(h),
+                )
+            )
+    return models
+
+
+@pytest.mark.parametrize("centered", [True, False])
+@pytest.mark.parametrize("model_type", ["BBRBM", "PBRBM"])
+def test_ensemble_matches_models(
+    model_type, centered, sample_binary_v_samples, sample_potts_v_samples
+):
+    models = _random_models(model_type, [2, 4, 3])
+    ensemble = RBMEnsemble(models)
+    v_data = (
+        sample_binary_v_samples[0] if model_type == "BBRBM" else sample_potts_v_samples
+    )
+    w_data = torch.rand(v_data.shape[0])
+    chains = ensemble.init_chains(pytest.NUM_CHAINS)
+    chains = ensemble.sample_state(chains, n_steps=2)
+    assert chains["visible"].shape == (3, pytest.NUM_CHAINS, pytest.NUM_VISIBLES)
+    # Padded hidden units are never active
+    assert torch.all(chains["hidden"][0, :, 2:] == 0)
+
+    gradients = ensemble.compute_gradient(v_data, w_data, chains, centered=centered)
+    learning_rates = torch.tensor([0.1, 0.01, 0.5])
+    ensemble.gradient_ascent_step(gradients, learning_rates)
+    for i, params in enumerate(models):
+        for p in params.parameters():
+            p.grad = torch.zeros_like(p)
+        data = params.init_chains(v_data.shape[0], weights=w_data, start_v=v_data)
+        model_chains = params.init_chains(pytest.NUM_CHAINS, start_v=chains["visible"][i])
+        params.compute_gradient(data=data, chains=model_chains, centered=centered)
+        for p in params.parameters():
+            p.add_(learning_rates[i] * p.grad)
+        if isinstance(params, PBRBM):
+            ensure_zero_sum_gauge(params)
+        updated = ensemble.get_model(i)
+        for k, p in params.named_parameters().items():
+            assert torch.allclose(updated.named_parameters()[k], p, atol=1e-5)
+
+
+def test_ensemble_mixed_types():
+    models = _random_models("BBRBM", [2]) + _random_models("PBRBM", [2])
+    with pytest.raises(ValueError):
+        RBMEnsemble(models)
+
+
+def test_train_ensemble(sample_dataset_bbrbm, sample_args, tmp_path):
+    checkpoints = np.arange(1, sample_args["num_updates"] + 1)
+    sample_args["restore"] = False
+    sample_args["batch_size"] = pytest.NUM_SAMPLES
+    filenames = [tmp_path / "model_0.h5", tmp_path / "model_1.h5"]
+    train_ensemble(
+        sample_dataset_bbrbm,
+        "BBRBM",
+        filenames=filenames,
+        num_hiddens=[2, 5],
+        learning_rates=[0.01, 0.05],
+        seeds=[0, 1],
+        args=sample_args,
+        dtype=torch.float32,
+        checkpoints=checkpoints,
+        map_model=map_model,
+    )
+    for f, num_hiddens in zip(filenames, [2, 5]):
+        params, chains, _, hyperparameters = load_model(
+            f,
+            index=sample_args["num_updates"],
+            device=sample_args["device"],
+            dtype=sample_args["dtype"],
+        )
+        assert isinstance(params, BBRBM)
+        assert params.weight_matrix.shape == (pytest.NUM_VISIBLES, num_hiddens)
+        assert chains["visible"].shape[0] == pytest.NUM_CHAINS
+
+
+def test_train_ensemble_restore(sample_dataset_bbrbm, sample_args, tmp_path):
+    sample_args["batch_size"] = pytest.NUM_SAMPLES // 3
+    sample_args["num_updates"] = 4
+    checkpoints = np.arange(1, 5)
+    runs = {
+        "reference": [(4, False)],
+        "restored": [(2, False), (4, True)],
+    }
+    for name, steps in runs.items():
+        for num_updates, restore in steps:
+            if not restore:
+                torch.manual_seed(0)
+            train_ensemble(
+                sample_dataset_bbrbm,
+                "BBRBM",
+                filenames=[tmp_path / f"{name}_{i}.h5" for i in range(2)],
+                num_hiddens=[2, 5],
+                learning_rates=[0.01, 0.05],
+                seeds=[0, 1],
+                args=dict(sample_args, num_updates=num_updates, restore=restore),
+                dtype=torch.float32,
+                checkpoints=checkpoints,
+                map_model=map_model,
+            )
+    # The restored training continues with the same chains and minibatches
+    for i in range(2):
+        params, chains, _, _ = load_model(
+            tmp_path / f"restored_{i}.h5", 4, "cpu", torch.float32
+        )
+        params_ref, chains_ref, _, _ = load_model(
+            tmp_path / f"reference_{i}.h5", 4, "cpu", torch.float32
+        )
+        assert torch.equal(chains["visible"], chains_ref["visible"])
+        for p, p_ref in zip(params.parameters(), params_ref.parameters()):
+            assert torch.allclose(p, p_ref)
+
+
+def test_train_ensemble_parser():
+    parser = create_parser()
+    args = vars(parser.parse_args(["-d", "data.h5", "--num_hiddens", "2", "5"]))
+    assert args["num_hiddens"] == [2, 5]
+    for option in ["--momentum", "--eval_interval", "--chunk_size", "--num_workers"]:
+        with pytest.raises(SystemExit):
+            parser.parse_args(["-d", "data.h5", option, "1"])
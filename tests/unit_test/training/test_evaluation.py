@@ -0,0 +1,155 @@
+import numpy as np
+import pytest
+import torch
+
+import rbms.training.evaluation
+from rbms.map_model import map_model
+from rbms.training.evaluation import (
+    EarlyStopping,
+    compute_moment_errors,
+    evaluate_test_set,
+)
+from rbms.training.pcd import train
+from rbms.utils import get_flagged_updates, get_saved_updates
+
+
+@pytest.mark.parametrize("num_states", [None, 4])
+def test_compute_moment_errors(num_states):
+    if num_states is None:
+        v = torch.bernoulli(torch.full((50, 6), 0.3))
+    else:
+        v = torch.randint(0, num_states, (50, 6)).float()
+    errors = compute_moment_errors(
+        v_data=v, w_data=torch.ones(50), v_gen=v, num_states=num_states
+    )
+    assert errors["mean_error"] == pytest.approx(0.0, abs=1e-12)
+    assert errors["corr_error"] == pytest.approx(0.0, abs=1e-12)
+
+    # Duplicating the samples is equivalent to doubling their weights
+    v_gen = v[:20]
+    w = torch.ones(50)
+    w[:5] = 2.0
+    errors_weighted = compute_moment_errors(
+        v_data=v, w_data=w, v_gen=v_gen, num_states=num_states
+    )
+    errors_duplicated = compute_moment_errors(
+        v_data=torch.cat([v, v[:5]]),
+        w_data=torch.ones(55),
+        v_gen=v_gen,
+        num_states=num_states,
+    )
+    for k in errors_weighted.keys():
+        assert errors_weighted[k] == pytest.approx(errors_duplicated[k])
+
+
+@pytest.mark.parametrize("num_states", [None, 4])
+def test_compute_moment_errors_blocks(monkeypatch, num_states):
+    if num_states is None:
+        v_data = torch.bernoulli(torch.full((40, 7), 0.3))
+        v_gen = torch.bernoulli(torch.full((30, 7), 0.6))
+    else:
+        v_data = torch.randint(0, num_states, (40, 7)).float()
+        v_gen = torch.randint(0, num_states, (30, 7)).float()
+    w_data = torch.rand(40)
+    errors = compute_moment_errors(v_data, w_data, v_gen, num_states=num_states)
+    # Blocks of a few rows, not aligned with the variables
+    monkeypatch.setattr(rbms.training.evaluation, "MOMENTS_BLOCK_ELEMENTS", 80)
+    errors_blocks = compute_moment_errors(v_data, w_data, v_gen, num_states=num_states)
+    for k in errors.keys():
+        assert errors_blocks[k] == pytest.approx(errors[k])
+
+
+def test_evaluate_test_set(sample_params_class_pbrbm, sample_potts_v_samples):
+    params = sample_params_class_pbrbm
+    v_gen = params.init_chains(pytest.NUM_CHAINS)["visible"]
+    logs = evaluate_test_set(
+        params=params,
+        v_test=sample_potts_v_samples,
+        w_test=torch.ones(pytest.NUM_SAMPLES),
+        v_gen=v_gen,
+    )
+    for k in ["pll_test", "mean_error", "corr_error", "aats_truth", "aats_syn", "aats"]:
+        assert np.isfinite(logs[k])
+    assert 0 <= logs["aats"] <= 0.5
+
+
+def test_early_stopping():
+    early_stopping = EarlyStopping(metric="pll_test", patience=2, min_delta=0.1)
+    assert early_stopping.update({"pll_test": -3.0}, update=1)
+    assert early_stopping.update({"pll_test": -2.0}, update=2)
+    assert not early_stopping.update({"pll_test": -1.95}, update=3)
+    assert not early_stopping.should_stop
+    assert not early_stopping.update({"pll_test": -2.5}, update=4)
+    assert early_stopping.should_stop
+    assert early_stopping.best_update == 2
+
+    early_stopping = EarlyStopping(metric="corr_error")
+    assert early_stopping.update({"corr_error": 1.0}, update=1)
+    assert not early_stopping.update({"corr_error": 2.0}, update=2)
+    assert early_stopping.update({"corr_error": 0.5}, update=3)
+    assert not early_stopping.should_stop
+
+    with pytest.raises(ValueError):
+        EarlyStopping(metric="log_likelihood")
+
+
+def test_train_early_stopping(sample_dataset_bbrbm, sample_args):
+    sample_args["restore"] = False
+    sample_args["num_updates"] = 20
+    sample_args["batch_size"] = pytest.NUM_SAMPLES
+    sample_args["eval_interval"] = 2
+    sample_args["patience"] = 1
+    # No evaluation can improve by that much after the first one
+    sample_args["min_delta"] = 1e6
+    checkpoints = np.array([sample_args["num_updates"]])
+    train(
+        sample_dataset_bbrbm,
+        sample_dataset_bbrbm,
+        "BBRBM",
+        sample_args,
+        torch.float32,
+        checkpoints,
+        map_model=map_model,
+    )
+    assert np.array_equal(get_flagged_updates(sample_args["filename"], "best"), [2])
+    # The training stopped at the second evaluation, which was saved
+    assert get_saved_updates(sample_args["filename"])[-1] == 4
+
+
+def test_train_eval_without_test_set(sample_dataset_bbrbm, sample_args):
+    sample_args["restore"] = False
+    sample_args["eval_interval"] = 1
+    with pytest.raises(ValueError):
+        train(
+            sample_dataset_bbrbm,
+            None,
+            "BBRBM",
+            sample_args,
+            torch.float32,
+            np.array([1]),
+            map_model=map_model,
+        )
+
+
+def test_train_best_at_checkpoints(sample_dataset_bbrbm, sample_args):
+    sample_args["restore"] = False
+    sample_args["num_updates"] = 12
+    sample_args["batch_size"] = pytest.NUM_SAMPLES
+    sample_args["eval_interval"] = 1
+    # Each evaluation is an improvement
+    sample_args["min_delta"] = -np.inf
+    checkpoints = np.array([4, 10, 12])
+    train(
+        sample_dataset_bbrbm,
+        sample_dataset_bbrbm,
+        "BBRBM",
+        sample_args,
+        torch.float32,
+        checkpoints,
+        map_model=map_model,
+    )
+    # The best models are only written along with the checkpoints
+    assert np.array_equal(get_saved_updates(sample_args["filename"]), [1, 4, 10, 12])
+    assert np.array_equal(
+        get_flagged_updates(sample_args["filename"], "best"), [4, 10, 12]
+    )
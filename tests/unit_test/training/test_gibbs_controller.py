@@ -0,0 +1,136 @@
+import math
+
+import h5py
+import numpy as np
+import pytest
+import torch
+
+from rbms.io import load_model
+from rbms.map_model import map_model
+from rbms.training.gibbs_controller import GibbsStepsController
+from rbms.training.pcd import train
+
+
+def test_controller_increases_steps():
+    controller = GibbsStepsController(
+        gibbs_steps=5, min_gibbs_steps=2, max_gibbs_steps=8, interval=1
+    )
+    energy = torch.randn(100)
+    # Chains that do not move
+    steps = []
+    for _ in range(10):
+        logs = controller.update(energy, energy)
+        steps.append(logs["gibbs_steps"])
+        assert logs["energy_autocorr"] == pytest.approx(1.0)
+    assert steps[0] == 5
+    assert np.all(np.diff(steps) >= 0)
+    assert controller.gibbs_steps == 8
+
+
+def test_controller_decreases_steps():
+    controller = GibbsStepsController(
+        gibbs_steps=5, min_gibbs_steps=2, max_gibbs_steps=8, interval=1
+    )
+    torch.manual_seed(0)
+    for _ in range(10):
+        controller.update(torch.randn(10_000), torch.randn(10_000))
+    assert controller.gibbs_steps == 2
+
+
+def test_controller_interval():
+    controller = GibbsStepsController(gibbs_steps=5, interval=3)
+    energy = torch.randn(100)
+    controller.update(energy, energy)
+    controller.update(energy, energy)
+    assert controller.gibbs_steps == 5
+    controller.update(energy, energy)
+    assert controller.gibbs_steps > 5
+
+
+def test_controller_state_dict():
+    controller = GibbsStepsController(gibbs_steps=5, max_gibbs_steps=10, interval=3)
+    assert math.isnan(controller.state_dict()["autocorr"])
+    energy = torch.randn(100)
+    controller.update(energy, energy)
+    restored = GibbsStepsController(gibbs_steps=1, max_gibbs_steps=10, interval=3)
+    restored.load_state_dict(controller.state_dict())
+    for c in [controller, restored]:
+        c.update(energy, energy)
+        c.update(energy, energy)
+    assert restored.state_dict() == controller.state_dict()
+    assert restored.gibbs_steps > 5
+    # The number of steps is kept within the bounds
+    restored.load_state_dict(dict(controller.state_dict(), gibbs_steps=20))
+    assert restored.gibbs_steps == 10
+
+
+def test_controller_invalid_bounds():
+    with pytest.raises(ValueError):
+        GibbsStepsController(gibbs_steps=5, min_gibbs_steps=10, max_gibbs_steps=2)
+
+
+def test_train_adaptive_gibbs_steps(sample_dataset_bbrbm, sample_args):
+    checkpoints = np.arange(1, sample_args["num_updates"] + 1)
+    sample_args["restore"] = False
+    sample_args["batch_size"] = pytest.NUM_SAMPLES
+    sample_args["adaptive_gibbs_steps"] = True
+    sample_args["max_gibbs_steps"] = 30
+    train(
+        sample_dataset_bbrbm,
+        sample_dataset_bbrbm,
+        "BBRBM",
+        sample_args,
+        torch.float32,
+        checkpoints,
+        map_model=map_model,
+    )
+    log_filename = (
+        sample_args["filename"].parent / f"log-{sample_args['filename'].stem}.csv"
+    )
+    logs = np.genfromtxt(log_filename, delimiter=",", names=True)
+    assert len(logs["gibbs_steps"]) == sample_args["num_updates"] - 1
+    assert np.all(logs["gibbs_steps"] <= 30)
+    assert np.all(np.abs(logs["energy_autocorr"]) <= 1.0 + 1e-6)
+
+
+def test_train_adaptive_gibbs_steps_restore(sample_dataset_bbrbm, sample_args):
+    sample_args["restore"] = False
+    sample_args["batch_size"] = pytest.NUM_SAMPLES
+    sample_args["adaptive_gibbs_steps"] = True
+    sample_args["max_gibbs_steps"] = 30
+    checkpoints = np.arange(1, 6)
+    train(
+        sample_dataset_bbrbm,
+        sample_dataset_bbrbm,
+        "BBRBM",
+        sample_args,
+        torch.float32,
+        checkpoints,
+        map_model=map_model,
+    )
+    _, _, _, hyperparameters = load_model(
+        sample_args["filename"], 3, "cpu", torch.float32
+    )
+    assert hyperparameters["gibbs_steps"] == pytest.GIBBS_STEPS
+    assert hyperparameters["gibbs_controller"]["num_observations"] == 2
+    with h5py.File(sample_args["filename"], "a") as f:
+        f["hyperparameters"]["gibbs_controller"]["gibbs_steps"][()] = 7
+
+    # The restored training continues with the saved number of steps
+    sample_args["restore"] = True
+    sample_args["num_updates"] = 5
+    train(
+        sample_dataset_bbrbm,
+        sample_dataset_bbrbm,
+        "BBRBM",
+        sample_args,
+        torch.float32,
+        checkpoints,
+        map_model=map_model,
+    )
+    log_filename = (
+        sample_args["filename"].parent / f"log-{sample_args['filename'].stem}.csv"
+    )
+    logs = np.genfromtxt(log_filename, delimiter=",", names=True)
+    assert np.array_equal(logs["update"], [2, 3, 4, 5])
+    assert np.array_equal(logs["gibbs_steps"][2:], [7, 7])
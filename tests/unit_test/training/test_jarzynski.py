@@ -0,0 +1,97 @@
+import h5py
+import numpy as np
+import pytest
+import torch
+
+from rbms.io import load_model
+from rbms.map_model import map_model
+from rbms.training.jarzynski import get_ess, systematic_resampling, update_weights
+from rbms.training.pcd import train
+
+
+def test_get_ess():
+    assert get_ess(torch.ones(pytest.NUM_CHAINS)) == pytest.approx(1.0)
+    weights = torch.full((pytest.NUM_CHAINS,), 1e4)
+    weights[3] = 0.0
+    assert get_ess(weights) == pytest.approx(1 / pytest.NUM_CHAINS)
+
+
+def test_update_weights(sample_params_class_bbrbm, sample_chains_bbrbm):
+    params = sample_params_class_bbrbm
+    chains = {k: v.clone() for k, v in sample_chains_bbrbm.items()}
+    energy_before = params.compute_energy_visibles(chains["visible"])
+    new_params = params.clone()
+    new_params.vbias += 0.1
+    energy_after = new_params.compute_energy_visibles(chains["visible"])
+    chains = update_weights(chains, energy_before, energy_after)
+    # The log-weights are the log-ratio of the Boltzmann weights of the new and old models
+    assert torch.allclose(
+        -chains["weights"].view(-1),
+        -sample_chains_bbrbm["weights"].view(-1) + energy_before - energy_after,
+    )
+
+
+def test_systematic_resampling(sample_chains_bbrbm):
+    chains = {k: v.clone() for k, v in sample_chains_bbrbm.items()}
+    num_chains = chains["visible"].shape[0]
+    chains["visible"] = torch.arange(num_chains, dtype=chains["visible"].dtype)
+    chains["visible"] = chains["visible"].unsqueeze(1)
+    # Uniform weights keep every chain
+    resampled = systematic_resampling(chains)
+    assert torch.equal(resampled["visible"], chains["visible"])
+    # Each chain is copied between floor and ceil of num_chains times its weight
+    chains["weights"] = -torch.log(torch.rand(num_chains, dtype=chains["weights"].dtype))
+    probs = torch.softmax(-chains["weights"], 0)
+    resampled = systematic_resampling(chains)
+    counts = torch.bincount(resampled["visible"].view(-1).long(), minlength=num_chains)
+    assert counts.sum() == num_chains
+    assert torch.all(counts >= torch.floor(probs * num_chains))
+    assert torch.all(counts <= torch.ceil(probs * num_chains))
+    assert torch.all(resampled["weights"] == 1)
+
+
+def test_train_jarzynski(sample_dataset_bbrbm, sample_args):
+    sample_args["restore"] = False
+    sample_args["batch_size"] = pytest.NUM_SAMPLES
+    sample_args["jarzynski"] = True
+    # The chains are never resampled
+    sample_args["ess_threshold"] = 0.0
+    train(
+        sample_dataset_bbrbm,
+        sample_dataset_bbrbm,
+        "BBRBM",
+        sample_args,
+        torch.float32,
+        np.arange(1, sample_args["num_updates"] + 1),
+        map_model=map_model,
+    )
+    log_file = sample_args["filename"].parent / f"log-{sample_args['filename'].stem}.csv"
+    logs = np.genfromtxt(log_file, delimiter=",", names=True)
+    assert np.all(logs["ess"] > 0)
+    assert np.all(logs["ess"] <= 1)
+    with h5py.File(sample_args["filename"], "r") as f:
+        weights = f["parallel_chains_weights"][()]
+    assert not np.allclose(weights, weights[0])
+    _, chains, _, _ = load_model(
+        sample_args["filename"],
+        sample_args["num_updates"],
+        device=sample_args["device"],
+        dtype=sample_args["dtype"],
+    )
+    assert np.allclose(chains["weights"].numpy(), weights)
+
+
+def test_train_jarzynski_compile(sample_dataset_bbrbm, sample_args):
+    sample_args["restore"] = False
+    sample_args["jarzynski"] = True
+    sample_args["compile"] = True
+    with pytest.raises(ValueError):
+        train(
+            sample_dataset_bbrbm,
+            sample_dataset_bbrbm,
+            "BBRBM",
+            sample_args,
+            torch.float32,
+            np.array([1]),
+            map_model=map_model,
+        )
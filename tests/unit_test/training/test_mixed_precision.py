@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+import torch
+
+from rbms.io import load_params
+from rbms.map_model import map_model
+from rbms.training.mixed_precision import sample_state_mixed_precision
+from rbms.training.pcd import fit_batch_pcd, train
+
+
+@pytest.mark.parametrize("sampling_dtype", [torch.bfloat16, torch.float16])
+@pytest.mark.parametrize("model", ["bbrbm", "pbrbm"])
+def test_sample_state_mixed_precision(
+    model, sampling_dtype, sample_params_class_bbrbm, sample_params_class_pbrbm
+):
+    params = sample_params_class_bbrbm if model == "bbrbm" else sample_params_class_pbrbm
+    chains = params.init_chains(pytest.NUM_CHAINS)
+    new_chains = sample_state_mixed_precision(
+        params=params,
+        sampling_params=params.clone(dtype=sampling_dtype),
+        chains=chains,
+        n_steps=5,
+    )
+    for k in ["visible", "hidden", "hidden_mag", "weights"]:
+        assert new_chains[k].dtype == params.dtype
+        assert new_chains[k].shape == chains[k].shape
+    # The hidden layer is sampled with the full precision parameters
+    mh = params.sample_hiddens({"visible": new_chains["visible"]})["hidden_mag"]
+    assert torch.equal(new_chains["hidden_mag"], mh)
+    if model == "pbrbm":
+        assert new_chains["visible"].max() < params.num_states()
+
+
+def test_fit_batch_pcd_mixed_precision(sample_params_class_pbrbm, sample_potts_v_samples):
+    params = sample_params_class_pbrbm
+    for p in params.parameters():
+        p.grad = torch.zeros_like(p)
+    chains = params.init_chains(pytest.NUM_CHAINS)
+    batch = (sample_potts_v_samples, torch.ones(pytest.NUM_SAMPLES))
+    fit_batch_pcd(
+        batch=batch,
+        parallel_chains=chains,
+        params=params,
+        gibbs_steps=2,
+        beta=1.0,
+        sampling_dtype=torch.bfloat16,
+    )
+    for p in params.parameters():
+        assert p.grad.dtype == torch.float32
+        assert not torch.any(torch.isnan(p.grad))
+
+
+def test_train_mixed_precision(sample_dataset_bbrbm, sample_args):
+    checkpoints = np.arange(1, sample_args["num_updates"] + 1)
+    sample_args["restore"] = False
+    sample_args["batch_size"] = pytest.NUM_SAMPLES
+    sample_args["sampling_dtype"] = torch.bfloat16
+    train(
+        sample_dataset_bbrbm,
+        sample_dataset_bbrbm,
+        "BBRBM",
+        sample_args,
+        torch.float32,
+        checkpoints,
+        map_model=map_model,
+    )
+    params = load_params(
+        sample_args["filename"],
+        index=sample_args["num_updates"],
+        device="cpu",
+        dtype=None,
+    )
+    for p in params.parameters():
+        assert p.dtype == torch.float32
@@ -0,0 +1,105 @@
+import h5py
+import numpy as np
+import pytest
+import torch
+
+from rbms.io import load_model, load_optimizer_state, save_model
+from rbms.map_model import map_model
+from rbms.training.optimizer import get_learning_rate, get_optimizer
+from rbms.training.pcd import train
+
+
+@pytest.mark.parametrize("name", ["sgd", "momentum", "adam", "rmsprop"])
+def test_get_optimizer(name, sample_params_class_bbrbm):
+    params = sample_params_class_bbrbm
+    optimizer = get_optimizer(name, params.parameters(), learning_rate=0.1)
+    assert optimizer.param_groups[0]["maximize"]
+    assert optimizer.param_groups[0]["lr"] == 0.1
+
+
+def test_get_optimizer_invalid(sample_params_class_bbrbm):
+    with pytest.raises(ValueError):
+        get_optimizer("invalid", sample_params_class_bbrbm.parameters(), 0.1)
+
+
+@pytest.mark.parametrize("schedule", ["constant", "linear", "exp", "cosine"])
+def test_get_learning_rate(schedule):
+    lr_start = get_learning_rate(schedule, 0.1, 0, 100, learning_rate_final=0.001)
+    lr_mid = get_learning_rate(schedule, 0.1, 50, 100, learning_rate_final=0.001)
+    lr_end = get_learning_rate(schedule, 0.1, 100, 100, learning_rate_final=0.001)
+    assert lr_start == pytest.approx(0.1)
+    if schedule == "constant":
+        assert lr_end == pytest.approx(0.1)
+    else:
+        assert lr_end == pytest.approx(0.001)
+        assert lr_end < lr_mid < lr_start
+
+
+def test_save_load_optimizer_state(
+    tmp_path, sample_params_class_bbrbm, sample_chains_bbrbm
+):
+    filename = tmp_path / "test_model.h5"
+    params = sample_params_class_bbrbm
+    optimizer = get_optimizer("adam", params.parameters(), learning_rate=0.1)
+    for _ in range(3):
+        for p in params.parameters():
+            p.grad = torch.randn_like(p)
+        optimizer.step()
+    save_model(str(filename), params, sample_chains_bbrbm, 1, 0.0, optimizer=optimizer)
+    with h5py.File(filename, "r") as f:
+        assert "exp_avg" in f["update_1"]["optimizer"]["weight_matrix"].keys()
+
+    new_optimizer = get_optimizer("adam", params.parameters(), learning_rate=0.1)
+    assert load_optimizer_state(str(filename), 1, new_optimizer, params)
+    for p in params.parameters():
+        for k, v in optimizer.state[p].items():
+            assert torch.allclose(new_optimizer.state[p][k], v)
+
+
+def test_train_restore_optimizer(sample_dataset_pbrbm, sample_args):
+    sample_args["restore"] = False
+    sample_args["batch_size"] = pytest.NUM_SAMPLES
+    sample_args["optimizer"] = "momentum"
+    sample_args["lr_schedule"] = "exp"
+    sample_args["momentum"] = 0.5
+    sample_args["learning_rate_final"] = 1e-3
+    train(
+        sample_dataset_pbrbm,
+        sample_dataset_pbrbm,
+        "PBRBM",
+        sample_args,
+        torch.float32,
+        np.arange(1, sample_args["num_updates"] + 1),
+        map_model=map_model,
+    )
+    with h5py.File(sample_args["filename"], "r") as f:
+        assert f["hyperparameters"]["optimizer"][()].decode() == "momentum"
+        momentum_buffer = f[f"update_{sample_args['num_updates']}"]["optimizer"][
+            "weight_matrix"
+        ]["momentum_buffer"][()]
+        assert np.any(momentum_buffer != 0)
+    _, _, _, hyperparameters = load_model(
+        sample_args["filename"], sample_args["num_updates"], "cpu", torch.float32
+    )
+    assert hyperparameters["momentum"] == 0.5
+    assert hyperparameters["lr_schedule"] == "exp"
+    assert hyperparameters["learning_rate_final"] == pytest.approx(1e-3)
+
+    # The options of the archive replace the defaults of the restored training
+    for k in ["momentum", "lr_schedule", "learning_rate_final"]:
+        del sample_args[k]
+    sample_args["restore"] = True
+    sample_args["num_updates"] = 5
+    train(
+        sample_dataset_pbrbm,
+        sample_dataset_pbrbm,
+        "PBRBM",
+        sample_args,
+        torch.float32,
+        np.arange(1, sample_args["num_updates"] + 1),
+        map_model=map_model,
+    )
+    with h5py.File(sample_args["filename"], "r") as f:
+        assert "optimizer" in f["update_5"].keys()
+    assert sample_args["lr_schedule"] == "exp"
+    assert sample_args["momentum"] == 0.5
@@ -0,0 +1,105 @@
+import h5py
+import numpy as np
+import pytest
+import torch
+
+from rbms.map_model import map_model
+from rbms.training.pcd import train
+from rbms.training.reservoir import ChainReservoir, get_storage_dtype
+
+RESERVOIR_SIZE = 4 * pytest.NUM_CHAINS
+
+
+def test_storage_dtype(sample_potts_v_samples):
+    assert get_storage_dtype(sample_potts_v_samples) == torch.uint8
+    assert get_storage_dtype(torch.rand(3, 4)) == torch.float32
+    assert get_storage_dtype(torch.full((3, 4), 300.0)) == torch.float32
+
+
+def test_reservoir_rotation(sample_params_class_pbrbm):
+    params = sample_params_class_pbrbm
+    pool = params.init_chains(RESERVOIR_SIZE)
+    pool["weights"] = torch.arange(RESERVOIR_SIZE, dtype=pool["weights"].dtype)
+    reservoir = ChainReservoir(pool, num_chains=pytest.NUM_CHAINS)
+    assert len(reservoir) == RESERVOIR_SIZE
+    assert reservoir.visible.dtype == torch.uint8
+    assert torch.equal(reservoir.chains()["visible"], pool["visible"])
+
+    used = []
+    for _ in range(RESERVOIR_SIZE // pytest.NUM_CHAINS):
+        chains = reservoir.draw(params)
+        assert chains["visible"].shape == (pytest.NUM_CHAINS, pytest.NUM_VISIBLES)
+        assert chains["visible"].dtype == pool["visible"].dtype
+        assert "hidden" in chains
+        used.append(chains["weights"].long())
+        # Mark the chains sampled at this update
+        chains["visible"] = torch.zeros_like(chains["visible"])
+        reservoir.store(chains)
+    # Every chain of the pool is used once per pass
+    assert torch.equal(torch.sort(torch.cat(used)).values, torch.arange(RESERVOIR_SIZE))
+    assert torch.all(reservoir.chains()["visible"] == 0)
+
+
+def test_reservoir_invalid(sample_params_class_pbrbm):
+    params = sample_params_class_pbrbm
+    pool = params.init_chains(pytest.NUM_CHAINS)
+    with pytest.raises(ValueError):
+        ChainReservoir(pool, num_chains=pytest.NUM_CHAINS + 1)
+    reservoir = ChainReservoir(pool, num_chains=pytest.NUM_CHAINS)
+    with pytest.raises(RuntimeError):
+        reservoir.store(pool)
+
+
+def test_train_reservoir(sample_dataset_pbrbm, sample_args):
+    checkpoints = np.arange(1, sample_args["num_updates"] + 1)
+    sample_args["restore"] = False
+    sample_args["batch_size"] = pytest.NUM_SAMPLES
+    sample_args["reservoir_size"] = RESERVOIR_SIZE
+    train(
+        sample_dataset_pbrbm,
+        sample_dataset_pbrbm,
+        "PBRBM",
+        sample_args,
+        torch.float32,
+        checkpoints,
+        map_model=map_model,
+    )
+    with h5py.File(sample_args["filename"], "r") as f:
+        assert f["parallel_chains"].shape == (RESERVOIR_SIZE, pytest.NUM_VISIBLES)
+        assert f["hyperparameters"]["reservoir_size"][()] == RESERVOIR_SIZE
+
+    # The pool and the number of chains per update are restored from the archive
+    sample_args = {
+        k: v for k, v in sample_args.items() if k not in ["reservoir_size", "num_chains"]
+    }
+    sample_args["num_chains"] = RESERVOIR_SIZE
+    sample_args["restore"] = True
+    sample_args["num_updates"] = 5
+    train(
+        sample_dataset_pbrbm,
+        sample_dataset_pbrbm,
+        "PBRBM",
+        sample_args,
+        torch.float32,
+        np.arange(1, sample_args["num_updates"] + 1),
+        map_model=map_model,
+    )
+    assert sample_args["num_chains"] == pytest.NUM_CHAINS
+    with h5py.File(sample_args["filename"], "r") as f:
+        assert "update_5" in f.keys()
+        assert f["parallel_chains"].shape == (RESERVOIR_SIZE, pytest.NUM_VISIBLES)
+
+
+def test_train_reservoir_too_small(sample_dataset_pbrbm, sample_args):
+    sample_args["restore"] = False
+    sample_args["reservoir_size"] = pytest.NUM_CHAINS - 1
+    with pytest.raises(ValueError):
+        train(
+            sample_dataset_pbrbm,
+            sample_dataset_pbrbm,
+            "PBRBM",
+            sample_args,
+            torch.float32,
+            np.array([1]),
+            map_model=map_model,
+        )